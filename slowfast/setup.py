@@ -28,6 +28,9 @@ setup(
         "tensorboard",
         "fairscale",
     ],
-    extras_require={"tensorboard_video_visualization": ["moviepy"]},
+    extras_require={
+        "tensorboard_video_visualization": ["moviepy"],
+        "onnx": ["onnx", "onnxruntime"],
+    },
     packages=find_packages(exclude=("configs", "tests")),
 )
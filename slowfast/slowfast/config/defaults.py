@@ -729,6 +729,12 @@ _C.DATA.TRAIN_JITTER_FPS = 0.0
 # Decoding backend, options include `pyav` or `torchvision`
 _C.DATA.DECODING_BACKEND = "torchvision"
 
+# If not empty, directory of the frame and keyframe PTS of the videos of every
+# split, built by tools/build_video_index.py. With the `pyav` backend, clips
+# are decoded from the start of the GOP of their first frame to their last
+# frame, instead of seeking with a margin and decoding past the clip.
+_C.DATA.VIDEO_INDEX_DIR = ""
+
 # Decoding resize to short size (set to native size for best speed)
 _C.DATA.DECODING_SHORT_SIZE = 256
 
@@ -807,6 +813,12 @@ _C.DATA.IN_VAL_CROP_RATIO = 0.875  # 224/256 = 0.875
 # don't use real video for kinetics.py
 _C.DATA.DUMMY_LOAD = False
 
+# If True, the MECCANO train and val loader workers only decode the uint8
+# clips and draw their random scale, crop and flip. The clips are scaled,
+# cropped, flipped and normalized by batch on the training device, see
+# slowfast/datasets/batch_transform.py. Supported by tools/train_net.py.
+_C.DATA.BATCH_AUGMENTATION = False
+
 # ---------------------------------------------------------------------------- #
 # Optimizer options
 # ---------------------------------------------------------------------------- #
@@ -949,6 +961,66 @@ _C.BENCHMARK.LOG_PERIOD = 100
 # If True, shuffle dataloader for epoch during benchmark.
 _C.BENCHMARK.SHUFFLE = True
 
+# Benchmark to run. Options include `loader` (full data loader throughput),
+# `meccano_decode` (MECCANO frame decoding, full-segment vs. sample-first),
+# `gaze_attention` (SlowFastGazeAtt gaze attention, loop vs. broadcast),
+# `test_meter` (TestMeter multi-view ensembling, loop vs. batched),
+# `quantized_x3d` (int8 QuantizedX3D latency for each bottleneck activation)
+# `inference` (CPU inference of the model variants of CFG_FILES), `server`
+# (InferenceServer under the load of concurrent synthetic camera streams),
+# `streaming` (streaming vs. clip inference of the demo on a synthetic stream),
+# `preprocess` (demo clip preprocessing, per-frame vs. ClipPreprocessor),
+# `batch_augment` (train loader clips/s, per-clip vs. batched augmentation),
+# `uint8_clips` (train loader clips/s, worker RSS and bytes per batch, clips
+# normalized before vs. after spatial sampling), `frame_index` (worker
+# memory of the AVA, Charades or SSv2 frame paths, lists vs. FramePathIndex)
+# `ava_startup` (AVA annotation loading, line by line vs. cached index) and
+# `pyav_decode` (Kinetics clips/s and decoded frames per clip with the `pyav`
+# backend, without vs. with container pool and PTS index).
+_C.BENCHMARK.MODE = "loader"
+
+# Batch sizes to sweep for the model micro-benchmarks, and maximum batch sizes
+# of the workers to sweep for the `server` benchmark.
+_C.BENCHMARK.BATCH_SIZES = [1, 2, 4, 8, 16, 32]
+
+# Number of random clip predictions for the `test_meter` benchmark.
+_C.BENCHMARK.NUM_PREDICTIONS = 100000
+
+# Number of clips to decode for the `meccano_decode` benchmark.
+_C.BENCHMARK.NUM_CLIPS = 200
+
+# Config files of the model variants of the `inference` benchmark, e.g. the
+# dense, pruned, QAT, PTQ and distilled models of configs/meccano. If empty,
+# benchmark the model of the current config.
+_C.BENCHMARK.CFG_FILES = []
+
+# Numbers of CPU threads to sweep for the `inference` benchmark. If empty, use
+# the default number of threads of torch.
+_C.BENCHMARK.NUM_THREADS = []
+
+# Input crop sizes to sweep for the `inference` benchmark. If empty, use
+# DATA.TEST_CROP_SIZE of every model.
+_C.BENCHMARK.CROP_SIZES = []
+
+# Number of timed forward passes per setting of the `inference` benchmark.
+_C.BENCHMARK.NUM_ITERS = 20
+
+# Number of untimed forward passes run first for every setting of the
+# `inference` benchmark.
+_C.BENCHMARK.NUM_WARMUP = 5
+
+# Numbers of concurrent synthetic camera streams to sweep for the `server`
+# benchmark.
+_C.BENCHMARK.NUM_STREAMS = [1, 2, 4, 8]
+
+# Clips per second sent by every stream of the `server` benchmark. If not
+# positive, every stream sends its next clip when the previous one is
+# predicted.
+_C.BENCHMARK.CLIPS_PER_SECOND = 2.0
+
+# Number of clips sent by every stream of the `server` benchmark.
+_C.BENCHMARK.NUM_REQUESTS = 20
+
 
 # ---------------------------------------------------------------------------- #
 # Common train/test data loader options
@@ -964,6 +1036,12 @@ _C.DATA_LOADER.PIN_MEMORY = True
 # Enable multi thread decoding.
 _C.DATA_LOADER.ENABLE_MULTI_THREAD_DECODE = False
 
+# Number of open PyAV containers kept by every data loader worker, least
+# recently used first closed, so that the clips of a video do not open it
+# again. Only used with the `pyav` decoding backend. 0 opens a container per
+# clip.
+_C.DATA_LOADER.CONTAINER_POOL_SIZE = 0
+
 
 # ---------------------------------------------------------------------------- #
 # Detection options.
@@ -1048,6 +1126,11 @@ _C.AVA.GROUNDTRUTH_FILE = "ava_val_v2.2.csv"
 # Backend to process image, includes `pytorch` and `cv2`.
 _C.AVA.IMG_PROC_BACKEND = "cv2"
 
+# If not empty, directory where the frame lists and box annotations of a split
+# are saved as a binary index once parsed, keyed by a hash of the contents of
+# the files. Later runs memory map the index instead of parsing the files.
+_C.AVA.ANNOTATION_CACHE_DIR = ""
+
 # ---------------------------------------------------------------------------- #
 # Multigrid training options
 # See https://arxiv.org/abs/1912.00998 for details about multigrid training.
@@ -1279,6 +1362,22 @@ _C.DEMO.COMMON_CLASS_NAMES = [
 # Slow-motion rate for the visualization. The visualized portions of the
 # video will be played `_C.DEMO.SLOWMO` times slower than usual speed.
 _C.DEMO.SLOWMO = 1
+# Backend running the video model: "pytorch", "torchscript" for the frozen
+# models of tools/export_torchscript.py or "onnxruntime" for the ONNX models of
+# tools/export_onnx.py. The exported models run on CPU.
+_C.DEMO.BACKEND = "pytorch"
+# Path to the exported model of the "torchscript" and "onnxruntime" backends.
+_C.DEMO.EXPORTED_MODEL_PATH = ""
+# Maximum number of pending clips the prediction workers predict together.
+_C.DEMO.MAX_BATCH_SIZE = 1
+# Maximum time in ms a prediction worker waits for more clips to fill a batch
+# after the first one.
+_C.DEMO.MAX_WAIT_MS = 0.0
+# If True, run the pytorch model as a causal stream, see
+# slowfast/models/streaming.py: only the new frames of every clip are computed,
+# the activations of the previous frames are cached. The cache holds a single
+# input stream, so not supported with InferenceServer, nor with detection.
+_C.DEMO.STREAMING = False
 
 # Add custom config with default values.
 custom_config.add_custom_config(_C)
@@ -1300,6 +1399,43 @@ _C.QUANTIZATION.BACKEND = 'fbgemm'
 # Number of batches to calibrate with for post-training quantization
 _C.QUANTIZATION.CALIBRATION_NUM_BATCHES = 10
 
+# If True, calibrate post-training quantization on a fixed subset of the
+# training set with seeded augmentations, preprocessed once and stored as uint8
+# clips, instead of on random training batches.
+_C.QUANTIZATION.CACHE_CALIBRATION = True
+
+# Directory of the calibration clip store. If empty, use
+# OUTPUT_DIR/calibration_cache.
+_C.QUANTIZATION.CALIBRATION_CACHE_DIR = ""
+
+# Observer of the activations for post-training quantization: `minmax`,
+# `histogram` (the default of PyTorch), `percentile` or `mse`.
+_C.QUANTIZATION.OBSERVER = "histogram"
+
+# Percentile of the activations kept by the `percentile` observer.
+_C.QUANTIZATION.OBSERVER_PERCENTILE = 99.99
+
+# If True, quantize the weights per output channel, otherwise per tensor.
+_C.QUANTIZATION.PER_CHANNEL_WEIGHTS = True
+
+# If True, keep the depthwise 3D convolutions in float for post-training
+# quantization and QuantizedX3D, since the int8 depthwise conv3d kernels are
+# slow on CPU. QuantizedX3D then also runs its stem and the SE and activation
+# of its bottlenecks in float.
+_C.QUANTIZATION.FLOAT_DEPTHWISE = True
+
+# Activation of the bottlenecks of QuantizedX3D. `swish` keeps the activation
+# of X3D, which runs in float between a dequantize and a quantize step.
+# `hardswish` and `relu6` replace it with activations with int8 kernels.
+_C.QUANTIZATION.ACTIVATION = "swish"
+
+# Path to a float checkpoint to start quantization aware training from, e.g.
+# a Swish X3D when QUANTIZATION.ACTIVATION replaces it. The BN statistics are
+# recomputed with the new activation before the model is prepared for QAT.
+# Post-training quantization also quantizes this checkpoint if set, so that
+# TEST.CHECKPOINT_FILE_PATH can point to the int8 model.
+_C.QUANTIZATION.FLOAT_CHECKPOINT_FILE_PATH = ""
+
 
 # ---------------------------------------------------------------------------- #
 # Knowledge Distillation options
@@ -1310,7 +1446,7 @@ _C.DISTILLATION = CfgNode()
 _C.DISTILLATION.ENABLE = False
 
 # The temperature of the softmax function.
-_C.DISTILLATION.TETEMPERATURE = 4.0
+_C.DISTILLATION.TEMPERATURE = 4.0
 
 # The temperature of the softmax function.
 _C.DISTILLATION.ALPHA = 0.5
@@ -1324,6 +1460,21 @@ _C.DISTILLATION.STUDENT_CHECKPOINT = ""
 
 _C.DISTILLATION.TEACHER_CFG_FILE = ""
 
+# If True, precompute the teacher logits once into a memory-mapped store and
+# read them during training instead of running the teacher forward.
+_C.DISTILLATION.CACHE_TEACHER_LOGITS = False
+
+# Directory of the teacher logit store. If empty, use
+# OUTPUT_DIR/teacher_logits.
+_C.DISTILLATION.TEACHER_CACHE_DIR = ""
+
+# Number of teacher logits to store per sample, 0 to store all of them.
+_C.DISTILLATION.TEACHER_CACHE_TOPK = 0
+
+# Number of augmentation seeds to precompute teacher logits for. Epoch e
+# replays the augmentations of seed e % TEACHER_CACHE_NUM_SEEDS.
+_C.DISTILLATION.TEACHER_CACHE_NUM_SEEDS = 1
+
 
 # PRUNNING options
 _C.PRUNING = CfgNode()
@@ -1346,8 +1497,71 @@ _C.PRUNING.CHECKPOINT_FILE_PATH = ""
 
 _C.PRUNING.CHECKPOINT_TYPE = 'pytorch'
 
+# Path to a pruned checkpoint whose manifest (the channel counts of every layer)
+# build_model uses to construct the slim model. If empty, the manifest is read
+# from the checkpoint the job loads its weights from, if it has one.
+_C.PRUNING.MANIFEST_FILE_PATH = ""
+
 _C.PRUNING.EVALUATE_AFTER_FINE_TUNNING = True
 
+# If True, prune iteratively inside one training run: the pruning rate grows
+# from PRUNING_RATE to PRUNING_MAX_RATE over NUM_STEPS steps, with
+# PRUNING_MAX_EPOCH finetuning epochs after every step.
+_C.PRUNING.ITERATIVE = False
+
+# Number of pruning steps of the iterative schedule.
+_C.PRUNING.NUM_STEPS = 5
+
+# Stop the iterative schedule once the batch 1 CPU latency (in ms) is at most
+# this target. 0 disables the latency target.
+_C.PRUNING.LATENCY_TARGET_MS = 0.0
+
+# Number of timed forward passes used to measure the CPU latency.
+_C.PRUNING.LATENCY_ITERS = 20
+
+
+# ---------------------------------------------------------------------------- #
+# MECCANO Dataset options
+# ---------------------------------------------------------------------------- #
+_C.MECCANO = CfgNode()
+
+# If True, compute the temporally sampled frame indices first and only decode
+# those frames. If False, decode every frame of the segment and sample after.
+_C.MECCANO.SAMPLE_FIRST = True
+
+# Frame storage backend. Options include `jpeg` (one JPEG file per frame) and
+# `shard` (one packed shard per video, see tools/pack_meccano_frames.py).
+_C.MECCANO.BACKEND = "jpeg"
+
+# Directory of the packed shards. If empty, use PATH_TO_DATA_DIR/shards.
+_C.MECCANO.SHARD_DIR = ""
+
+# Shard format. Options include `raw` (uint8 frame array) and `jpeg`
+# (concatenated JPEG bytes with an offset index).
+_C.MECCANO.SHARD_FORMAT = "raw"
+
+# Short side size of the frames stored in `raw` shards. If not positive, the
+# frames are stored at their original resolution.
+_C.MECCANO.SHARD_SHORT_SIDE = 320
+
+# If True, load the gaze tracks and return gaze heatmaps in `meta["gaze"]`.
+_C.MECCANO.GAZE_ENABLE = False
+
+# Directory of the gaze tracks, one `<video>.csv` file of `frame,x,y` rows
+# per video.
+_C.MECCANO.GAZE_DIR = ""
+
+# Directory of the gaze point cache. The heatmaps are rendered from the cached
+# points in the coordinates of the crop of every clip. If empty, use
+# PATH_TO_DATA_DIR/gaze_cache.
+_C.MECCANO.GAZE_CACHE_DIR = ""
+
+# Width and height of the frames the gaze points refer to.
+_C.MECCANO.GAZE_FRAME_SIZE = [1920, 1080]
+
+# Standard deviation of the gaze Gaussian, relative to the heatmap size.
+_C.MECCANO.GAZE_SIGMA = 0.5
+
 
 def assert_and_infer_cfg(cfg):
     # BN assertions.
@@ -1361,6 +1575,11 @@ def assert_and_infer_cfg(cfg):
     assert cfg.TEST.CHECKPOINT_TYPE in ["pytorch", "caffe2"]
     assert cfg.NUM_GPUS == 0 or cfg.TEST.BATCH_SIZE % cfg.NUM_GPUS == 0
 
+    # DATA assertions.
+    if cfg.DATA.BATCH_AUGMENTATION:
+        assert cfg.TRAIN.DATASET == "meccano"
+        assert not cfg.MULTIGRID.SHORT_CYCLE
+
     # RESNET assertions.
     assert cfg.RESNET.NUM_GROUPS > 0
     assert cfg.RESNET.WIDTH_PER_GROUP > 0
@@ -1372,6 +1591,17 @@ def assert_and_infer_cfg(cfg):
         cfg.SOLVER.WARMUP_START_LR *= cfg.NUM_SHARDS
         cfg.SOLVER.COSINE_END_LR *= cfg.NUM_SHARDS
 
+    # PRUNING assertions.
+    assert cfg.PRUNING.PRUNING_MAX_RATE > 0
+    assert 0 <= cfg.PRUNING.PRUNING_RATE <= cfg.PRUNING.PRUNING_MAX_RATE
+
+    # DEMO assertions.
+    assert cfg.DEMO.BACKEND in ["pytorch", "torchscript", "onnxruntime"]
+    assert cfg.DEMO.MAX_BATCH_SIZE >= 1
+    if cfg.DEMO.STREAMING:
+        assert cfg.DEMO.BACKEND == "pytorch"
+        assert not cfg.DETECTION.ENABLE
+
     # General assertions.
     assert cfg.SHARD_ID < cfg.NUM_SHARDS
     return cfg
@@ -7,7 +7,7 @@ import numpy as np
 import torch
 
 from . import (
-    ava_helper as ava_helper,
+    ava_index as ava_index,
     cv2_transform as cv2_transform,
     transform as transform,
     utils as utils,
@@ -56,32 +56,15 @@ class Ava(torch.utils.data.Dataset):
         Args:
             cfg (CfgNode): config
         """
-        # Loading frame paths.
+        # Loading frame paths, and keyframes with their boxes and labels.
         (
             self._image_paths,
             self._video_idx_to_name,
-        ) = ava_helper.load_image_lists(cfg, is_train=(self._split == "train"))
-
-        # Loading annotations for boxes and labels.
-        boxes_and_labels = ava_helper.load_boxes_and_labels(cfg, mode=self._split)
-
-        assert len(boxes_and_labels) == len(self._image_paths)
-
-        boxes_and_labels = [
-            boxes_and_labels[self._video_idx_to_name[i]]
-            for i in range(len(self._image_paths))
-        ]
-
-        # Get indices of keyframes and corresponding boxes and labels.
-        (
-            self._keyframe_indices,
-            self._keyframe_boxes_and_labels,
-        ) = ava_helper.get_keyframe_data(boxes_and_labels)
+            self._keyframes,
+        ) = ava_index.load_ava_index(cfg, mode=self._split)
 
         # Calculate the number of used boxes.
-        self._num_boxes_used = ava_helper.get_num_boxes_used(
-            self._keyframe_indices, self._keyframe_boxes_and_labels
-        )
+        self._num_boxes_used = self._keyframes.num_boxes
 
         self.print_summary()
 
@@ -89,9 +72,7 @@ class Ava(torch.utils.data.Dataset):
         logger.info("=== AVA dataset summary ===")
         logger.info("Split: {}".format(self._split))
         logger.info("Number of videos: {}".format(len(self._image_paths)))
-        total_frames = sum(
-            len(video_img_paths) for video_img_paths in self._image_paths
-        )
+        total_frames = self._image_paths.num_frames
         logger.info("Number of frames: {}".format(total_frames))
         logger.info("Number of key frames: {}".format(len(self)))
         logger.info("Number of boxes: {}.".format(self._num_boxes_used))
@@ -109,7 +90,7 @@ class Ava(torch.utils.data.Dataset):
         Returns:
             (int): the number of videos in the dataset.
         """
-        return len(self._keyframe_indices)
+        return len(self._keyframes)
 
     def _images_and_boxes_preprocessing_cv2(self, imgs, boxes):
         """
@@ -358,7 +339,7 @@ class Ava(torch.utils.data.Dataset):
             if self.cfg.MULTIGRID.SHORT_CYCLE:
                 idx, short_cycle_idx = idx
 
-        video_idx, sec_idx, sec, center_idx = self._keyframe_indices[idx]
+        video_idx, sec, center_idx = self._keyframes.get_keyframe(idx)
         # Get the frame idxs for current clip.
         seq = utils.get_sequence(
             center_idx,
@@ -367,18 +348,9 @@ class Ava(torch.utils.data.Dataset):
             num_frames=len(self._image_paths[video_idx]),
         )
 
-        clip_label_list = self._keyframe_boxes_and_labels[video_idx][sec_idx]
-        assert len(clip_label_list) > 0
-
         # Get boxes and labels for current clip.
-        boxes = []
-        labels = []
-        for box_labels in clip_label_list:
-            boxes.append(box_labels[0])
-            labels.append(box_labels[1])
-        boxes = np.array(boxes)
-        # Score is not used.
-        boxes = boxes[:, :4].copy()
+        boxes, labels = self._keyframes.get_boxes_and_labels(idx)
+        assert len(boxes) > 0
         ori_boxes = boxes.copy()
 
         # Load images of current clip.
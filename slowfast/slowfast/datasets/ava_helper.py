@@ -7,6 +7,8 @@ from collections import defaultdict
 
 from slowfast.utils.env import pathmgr
 
+from .frame_path_index import FramePathIndex
+
 logger = logging.getLogger(__name__)
 
 FPS = 30
@@ -22,9 +24,9 @@ def load_image_lists(cfg, is_train):
         is_train (bool): if it is training dataset or not.
 
     Returns:
-        image_paths (list[list]): a list of items. Each item (also a list)
-            corresponds to one video and contains the paths of images for
-            this video.
+        image_paths (FramePathIndex): the paths of the images of every video,
+            `image_paths[video_idx][frame_idx]`, packed so that they are not
+            copied in every data loader worker.
         video_idx_to_name (list): a list which stores video names.
     """
     list_filenames = [
@@ -53,7 +55,7 @@ def load_image_lists(cfg, is_train):
 
                 image_paths[data_key].append(os.path.join(cfg.AVA.FRAME_DIR, row[3]))
 
-    image_paths = [image_paths[i] for i in range(len(image_paths))]
+    image_paths = FramePathIndex([image_paths[i] for i in range(len(image_paths))])
 
     logger.info("Finished loading image paths from: %s" % ", ".join(list_filenames))
 
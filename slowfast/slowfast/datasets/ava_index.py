@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+"""
+Columnar index of the AVA frame lists and box annotations, parsed with
+vectorized readers and cached on disk, see AVA.ANNOTATION_CACHE_DIR.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+import pandas
+from slowfast.utils.env import pathmgr
+
+from .ava_helper import AVA_VALID_FRAMES, FPS
+from .frame_path_index import FramePathIndex
+
+logger = logging.getLogger(__name__)
+
+# Version of the cache format, part of the cache key.
+CACHE_VERSION = 1
+
+
+class AvaKeyframeIndex(object):
+    """
+    Keyframes of the AVA videos with their boxes and labels, stored as flat
+    numpy arrays: the keyframes index ranges of boxes, and the boxes ranges of
+    labels. It replaces the keyframe indices and the nested lists of boxes
+    and labels of `ava_helper.get_keyframe_data`, in the same order.
+    """
+
+    # Arrays holding the index, see `save` and `load`.
+    ARRAY_NAMES = (
+        "video_idx",
+        "sec",
+        "box_starts",
+        "boxes",
+        "label_starts",
+        "labels",
+    )
+
+    def __init__(self, video_idx, sec, box_starts, boxes, label_starts, labels):
+        """
+        Args:
+            video_idx (ndarray): video index of every keyframe.
+            sec (ndarray): second of every keyframe.
+            box_starts (ndarray): `num keyframes + 1` offsets of the boxes of
+                every keyframe.
+            boxes (ndarray): `num boxes` x 4 boxes, [x1, y1, x2, y2] in [0, 1].
+            label_starts (ndarray): `num boxes + 1` offsets of the labels of
+                every box.
+            labels (ndarray): labels of the boxes, -1 for the boxes without
+                label, e.g. predicted boxes.
+        """
+        self._video_idx = video_idx
+        self._sec = sec
+        self._box_starts = box_starts
+        self._boxes = boxes
+        self._label_starts = label_starts
+        self._labels = labels
+
+    def __len__(self):
+        """
+        Returns:
+            (int): the number of keyframes.
+        """
+        return len(self._video_idx)
+
+    @property
+    def num_boxes(self):
+        """
+        Returns:
+            (int): the total number of boxes of the keyframes.
+        """
+        return len(self._boxes)
+
+    @property
+    def num_labels(self):
+        """
+        Returns:
+            (int): the total number of labels of the boxes, without -1.
+        """
+        return int((self._labels != -1).sum())
+
+    def get_keyframe(self, idx):
+        """
+        Args:
+            idx (int): index of the keyframe.
+        Returns:
+            video_idx (int): index of the video.
+            sec (int): second of the keyframe.
+            center_idx (int): index of the frame of the keyframe in the video.
+        """
+        video_idx = int(self._video_idx[idx])
+        sec = int(self._sec[idx])
+        return video_idx, sec, (sec - 900) * FPS
+
+    def get_boxes_and_labels(self, idx):
+        """
+        Args:
+            idx (int): index of the keyframe.
+        Returns:
+            boxes (ndarray): `num boxes` x 4 boxes of the keyframe.
+            labels (list): array of the labels of every box.
+        """
+        start, end = self._box_starts[idx], self._box_starts[idx + 1]
+        label_starts = self._label_starts[start : end + 1]
+        labels = [
+            self._labels[label_starts[i] : label_starts[i + 1]]
+            for i in range(end - start)
+        ]
+        return np.array(self._boxes[start:end]), labels
+
+    def save(self, path):
+        """
+        Save the arrays of the index to a directory, one `.npy` file per
+        array.
+        Args:
+            path (str): directory to create.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(
+                os.path.join(path, name + ".npy"), getattr(self, "_" + name)
+            )
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Load an index saved by `save`.
+        Args:
+            path (str): directory of the index.
+            mmap_mode (str or None): memory map the arrays with this mode, see
+                `numpy.load`.
+        Returns:
+            (AvaKeyframeIndex): the index.
+        """
+        return cls(
+            *[
+                np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)
+                for name in cls.ARRAY_NAMES
+            ]
+        )
+
+
+def read_frame_lists(list_filenames, frame_dir):
+    """
+    Read AVA frame lists, as `ava_helper.load_image_lists`.
+    Args:
+        list_filenames (list): paths of the frame lists.
+        frame_dir (str): directory of the frames.
+    Returns:
+        image_paths (FramePathIndex): the paths of the frames of every video,
+            named after the videos.
+        video_idx_to_name (list): the names of the videos.
+    """
+    frames = []
+    for list_filename in list_filenames:
+        with pathmgr.open(list_filename, "r") as f:
+            # original_vido_id video_id frame_id path labels.
+            frames.append(
+                pandas.read_csv(
+                    f,
+                    sep=r"\s+",
+                    usecols=[0, 3],
+                    names=["video_name", "path"],
+                    skiprows=1,
+                    dtype=str,
+                    keep_default_na=False,
+                )
+            )
+    frames = pandas.concat(frames, ignore_index=True)
+    # Videos are indexed in order of first appearance, as in the lists.
+    video_idx, video_idx_to_name = pandas.factorize(frames["video_name"])
+    video_idx_to_name = list(video_idx_to_name)
+    paths = frames["path"].to_numpy()[np.argsort(video_idx, kind="stable")]
+    video_starts = np.cumsum(np.bincount(video_idx))[:-1]
+    image_paths = FramePathIndex(
+        [list(video_paths) for video_paths in np.split(paths, video_starts)],
+        video_names=video_idx_to_name,
+        root=frame_dir,
+    )
+    return image_paths, video_idx_to_name
+
+
+def read_boxes_files(
+    ann_filenames, ann_is_gt_box, detect_thresh, boxes_sample_rate=1
+):
+    """
+    Read AVA box files, as `ava_helper.parse_bboxes_file`.
+    Args:
+        ann_filenames (list): paths of the box files.
+        ann_is_gt_box (list): whether every file has ground-truth boxes.
+        detect_thresh (float): threshold for accepting predicted boxes.
+        boxes_sample_rate (int): keep the seconds multiple of this rate.
+    Returns:
+        rows (DataFrame): the kept rows, in the order of the files, with the
+            video name, second, box coordinates as in the files and label.
+    """
+    rows = []
+    for filename, is_gt_box in zip(ann_filenames, ann_is_gt_box):
+        with pathmgr.open(filename, "r") as f:
+            ann = pandas.read_csv(
+                f, header=None, dtype=str, keep_default_na=False
+            )
+        # When we use predicted boxes to train/eval, we need to ignore the
+        # boxes whose scores are below the threshold.
+        if not is_gt_box:
+            ann = ann[ann[7].astype(float) >= detect_thresh]
+        ann = ann[list(range(7))].set_axis(
+            ["video_name", "sec", "x1", "y1", "x2", "y2", "label"], axis=1
+        )
+        ann = ann.assign(sec=ann["sec"].astype(int))
+        ann = ann[ann["sec"] % boxes_sample_rate == 0]
+        rows.append(ann)
+    rows = pandas.concat(rows, ignore_index=True)
+    rows["label"] = np.where(
+        rows["label"] == "", "-1", rows["label"]
+    ).astype(int)
+    return rows
+
+
+def build_keyframe_index(rows, video_idx_to_name):
+    """
+    Group the box rows into the keyframes of the videos, as
+    `ava_helper.get_keyframe_data`: keyframes are ordered by video and
+    second, boxes by first occurrence, and boxes with the same coordinates in
+    a keyframe are merged with their labels.
+    Args:
+        rows (DataFrame): rows of `read_boxes_files`.
+        video_idx_to_name (list): the names of the videos.
+    Returns:
+        (AvaKeyframeIndex): the keyframe index.
+    """
+    video_idx = pandas.Categorical(
+        rows["video_name"], categories=video_idx_to_name
+    ).codes.astype(np.int64)
+    assert (video_idx >= 0).all() and len(np.unique(video_idx)) == len(
+        video_idx_to_name
+    ), "The annotated videos are not the videos of the frame lists"
+    sec = rows["sec"].to_numpy(dtype=np.int64)
+    valid = (sec >= AVA_VALID_FRAMES.start) & (sec < AVA_VALID_FRAMES.stop)
+    rows, video_idx, sec = rows[valid], video_idx[valid], sec[valid]
+
+    # Boxes are identified by their coordinates as written in the files.
+    box_id = (
+        rows.assign(video_idx=video_idx)
+        .groupby(["video_idx", "sec", "x1", "y1", "x2", "y2"], sort=False)
+        .ngroup()
+        .to_numpy()
+    )
+    order = np.lexsort((np.arange(len(rows)), box_id, sec, video_idx))
+    box_id, sec, video_idx = box_id[order], sec[order], video_idx[order]
+    labels = rows["label"].to_numpy(dtype=np.int64)[order]
+
+    box_first = np.flatnonzero(np.diff(box_id, prepend=-1) != 0)
+    label_starts = np.append(box_first, len(box_id))
+    boxes = (
+        rows[["x1", "y1", "x2", "y2"]].to_numpy()[order][box_first].astype(float)
+    )
+    keyframe_first = np.flatnonzero(
+        (np.diff(video_idx[box_first], prepend=-1) != 0)
+        | (np.diff(sec[box_first], prepend=-1) != 0)
+    )
+    box_starts = np.append(keyframe_first, len(box_first))
+    return AvaKeyframeIndex(
+        video_idx=video_idx[box_first][keyframe_first],
+        sec=sec[box_first][keyframe_first],
+        box_starts=box_starts,
+        boxes=boxes,
+        label_starts=label_starts,
+        labels=labels,
+    )
+
+
+def _get_source_files(cfg, mode):
+    """
+    Get the frame lists and box files of a split, as `load_image_lists` and
+    `load_boxes_and_labels` of ava_helper.
+    Args:
+        cfg (CfgNode): configs.
+        mode (str): 'train', 'val', or 'test' mode.
+    Returns:
+        list_filenames (list): paths of the frame lists.
+        ann_filenames (list): paths of the box files.
+        ann_is_gt_box (list): whether every box file has ground-truth boxes.
+    """
+    list_filenames = [
+        os.path.join(cfg.AVA.FRAME_LIST_DIR, filename)
+        for filename in (
+            cfg.AVA.TRAIN_LISTS if mode == "train" else cfg.AVA.TEST_LISTS
+        )
+    ]
+    gt_lists = cfg.AVA.TRAIN_GT_BOX_LISTS if mode == "train" else []
+    pred_lists = (
+        cfg.AVA.TRAIN_PREDICT_BOX_LISTS
+        if mode == "train"
+        else cfg.AVA.TEST_PREDICT_BOX_LISTS
+    )
+    ann_filenames = [
+        os.path.join(cfg.AVA.ANNOTATION_DIR, filename)
+        for filename in gt_lists + pred_lists
+    ]
+    ann_is_gt_box = [True] * len(gt_lists) + [False] * len(pred_lists)
+    return list_filenames, ann_filenames, ann_is_gt_box
+
+
+def _get_cache_key(filenames, params):
+    """
+    Args:
+        filenames (list): paths of the source files.
+        params (dict): parameters the index depends on.
+    Returns:
+        (str): hash of the contents of the files and of the parameters.
+    """
+    sha = hashlib.sha1()
+    sha.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    for filename in filenames:
+        with pathmgr.open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 24), b""):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def load_ava_index(cfg, mode):
+    """
+    Load the frame paths and keyframe annotations of an AVA split. If
+    AVA.ANNOTATION_CACHE_DIR is set, the index is built once and saved there,
+    keyed by a hash of the contents of the frame lists and box files, and
+    later runs memory map it instead of parsing the files.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+        mode (str): 'train', 'val', or 'test' mode.
+    Returns:
+        image_paths (FramePathIndex): the paths of the frames of every video.
+        video_idx_to_name (list): the names of the videos.
+        keyframes (AvaKeyframeIndex): the keyframes with their boxes and
+            labels.
+    """
+    list_filenames, ann_filenames, ann_is_gt_box = _get_source_files(cfg, mode)
+    # Only select frame_sec % 4 = 0 samples for validation if not
+    # set FULL_TEST_ON_VAL.
+    boxes_sample_rate = (
+        4 if mode == "val" and not cfg.AVA.FULL_TEST_ON_VAL else 1
+    )
+    cache_path = None
+    if cfg.AVA.ANNOTATION_CACHE_DIR:
+        params = {
+            "version": CACHE_VERSION,
+            "frame_dir": cfg.AVA.FRAME_DIR,
+            "num_frame_lists": len(list_filenames),
+            "ann_is_gt_box": ann_is_gt_box,
+            "detect_thresh": cfg.AVA.DETECTION_SCORE_THRESH,
+            "boxes_sample_rate": boxes_sample_rate,
+        }
+        cache_key = _get_cache_key(list_filenames + ann_filenames, params)
+        cache_path = os.path.join(
+            cfg.AVA.ANNOTATION_CACHE_DIR, "ava_{}".format(cache_key)
+        )
+        if os.path.isdir(cache_path):
+            image_paths = FramePathIndex.load(os.path.join(cache_path, "frames"))
+            keyframes = AvaKeyframeIndex.load(
+                os.path.join(cache_path, "keyframes")
+            )
+            video_idx_to_name = [
+                image_paths.get_video_name(i) for i in range(len(image_paths))
+            ]
+            logger.info("Loaded AVA annotation index from {}".format(cache_path))
+            return image_paths, video_idx_to_name, keyframes
+
+    image_paths, video_idx_to_name = read_frame_lists(
+        list_filenames, cfg.AVA.FRAME_DIR
+    )
+    rows = read_boxes_files(
+        ann_filenames,
+        ann_is_gt_box,
+        cfg.AVA.DETECTION_SCORE_THRESH,
+        boxes_sample_rate,
+    )
+    keyframes = build_keyframe_index(rows, video_idx_to_name)
+    logger.info(
+        "Built AVA annotation index from: {}".format(
+            ", ".join(list_filenames + ann_filenames)
+        )
+    )
+
+    if cache_path is not None:
+        # Write to a temporary directory first, so that concurrent jobs never
+        # read a partial index.
+        tmp_path = "{}.tmp{}".format(cache_path, os.getpid())
+        image_paths.save(os.path.join(tmp_path, "frames"))
+        keyframes.save(os.path.join(tmp_path, "keyframes"))
+        try:
+            os.rename(tmp_path, cache_path)
+            logger.info("Saved AVA annotation index to {}".format(cache_path))
+        except OSError:
+            # Saved by another job in the meantime.
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return image_paths, video_idx_to_name, keyframes
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+"""
+Batched spatial augmentation of collated uint8 clips, run on the training
+device instead of in the data loader workers. See DATA.BATCH_AUGMENTATION.
+"""
+
+import torch
+
+
+def _bilinear_indices(in_size, out_size, dst):
+    """
+    Get the source pixels and weights of bilinear interpolation with
+    `align_corners=False`, as `torch.nn.functional.interpolate`.
+    Args:
+        in_size (int): size of the input axis.
+        out_size (tensor): size of the interpolated axis of every clip, `batch
+            size` x 1.
+        dst (tensor): coordinates of the output pixels in the interpolated
+            axis, `batch size` x `num pixels`.
+    Returns:
+        idx0 (tensor): first source pixel of every output pixel.
+        idx1 (tensor): second source pixel of every output pixel.
+        lambda1 (tensor): weight of the second source pixel.
+    """
+    scale = in_size / out_size.float()
+    src = (scale * (dst + 0.5) - 0.5).clamp(min=0)
+    idx0 = src.long()
+    lambda1 = src - idx0
+    idx1 = (idx0 + 1).clamp(max=in_size - 1)
+    return idx0, idx1, lambda1
+
+
+def batch_spatial_sampling(frames, params, crop_size):
+    """
+    Scale, crop and flip every clip of a batch with its own parameters in a
+    few batched ops. The result matches `random_short_side_scale_jitter`,
+    `random_crop` and `horizontal_flip` with the same parameters, but only the
+    pixels of the crops are interpolated.
+    Args:
+        frames (tensor): uint8 clips, `batch size` x `num frames` x `height`
+            x `width` x `channel`.
+        params (tensor): parameters of every clip from
+            `transform.get_random_spatial_params`, `batch size` x 5.
+        crop_size (int): the size of height and width of the crops.
+    Returns:
+        frames (tensor): float crops in [0, 255], `batch size` x `channel` x
+            `num frames` x `crop size` x `crop size`.
+    """
+    batch_size, _, height, width, _ = frames.shape
+    device = frames.device
+    params = params.to(device)
+    new_height, new_width, y_offset, x_offset, flip = params.unbind(1)
+    pixels = torch.arange(crop_size, device=device, dtype=torch.float)
+    dst_y = y_offset[:, None] + pixels
+    dst_x = x_offset[:, None] + torch.where(
+        flip[:, None].bool(), crop_size - 1 - pixels, pixels
+    )
+    y0, y1, y_lambda1 = _bilinear_indices(height, new_height[:, None], dst_y)
+    x0, x1, x_lambda1 = _bilinear_indices(width, new_width[:, None], dst_x)
+
+    # Gather the source rows, then the source columns of the crops, so only
+    # the corner pixels of the crops are converted to float. `index_select`
+    # copies whole rows, much faster than advanced indexing of uint8 pixels.
+    corners = [[[], []], [[], []]]
+    for i in range(batch_size):
+        for y_idx, row_corners in zip([y0[i], y1[i]], corners):
+            # T x crop_y x W x C.
+            rows = frames[i].index_select(1, y_idx)
+            for x_idx, corner in zip([x0[i], x1[i]], row_corners):
+                corner.append(rows.index_select(2, x_idx))
+    (c00, c01), (c10, c11) = [
+        [torch.stack(corner).float() for corner in row_corners]
+        for row_corners in corners
+    ]
+    y_lambda1 = y_lambda1.view(batch_size, 1, crop_size, 1, 1)
+    x_lambda1 = x_lambda1.view(batch_size, 1, 1, crop_size, 1)
+    # In place, to only allocate the float corners.
+    x_lambda0 = 1 - x_lambda1
+    top = c00.mul_(x_lambda0).add_(c01.mul_(x_lambda1))
+    bottom = c10.mul_(x_lambda0).add_(c11.mul_(x_lambda1))
+    frames = top.mul_(1 - y_lambda1).add_(bottom.mul_(y_lambda1))
+    # N x T x crop_y x crop_x x C -> N x C x T x crop_y x crop_x.
+    return frames.permute(0, 4, 1, 2, 3)
+
+
+def batch_augment(frames, params, cfg):
+    """
+    Spatially sample, normalize and split into pathways a batch of uint8
+    clips of the data loader, the batched counterpart of the per-clip
+    transforms of the dataset.
+    Args:
+        frames (tensor): uint8 clips, `batch size` x `num frames` x `height`
+            x `width` x `channel`.
+        params (tensor): parameters of every clip from
+            `transform.get_random_spatial_params`, `batch size` x 5.
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    Returns:
+        frame_list (list): list of tensors, one per pathway, of dimension
+            `batch size` x `channel` x `num frames` x `height` x `width`.
+    """
+    frames = batch_spatial_sampling(frames, params, cfg.DATA.TRAIN_CROP_SIZE)
+    mean = torch.tensor(cfg.DATA.MEAN, device=frames.device).view(1, -1, 1, 1, 1)
+    std = torch.tensor(cfg.DATA.STD, device=frames.device).view(1, -1, 1, 1, 1)
+    frames = frames.div_(255.0).sub_(mean).div_(std)
+    if cfg.DATA.REVERSE_INPUT_CHANNEL:
+        frames = frames[:, [2, 1, 0]]
+    if cfg.MODEL.ARCH in cfg.MODEL.MULTI_PATHWAY_ARCH:
+        # Perform temporal sampling from the fast pathway.
+        slow_pathway = torch.index_select(
+            frames,
+            2,
+            torch.linspace(
+                0,
+                frames.shape[2] - 1,
+                frames.shape[2] // cfg.SLOWFAST.ALPHA,
+                device=frames.device,
+            ).long(),
+        )
+        return [slow_pathway, frames]
+    return [frames]
@@ -5,6 +5,7 @@ import os
 import random
 from itertools import chain as chain
 
+import numpy as np
 import slowfast.utils.logging as logging
 import torch
 import torch.utils.data
@@ -79,15 +80,15 @@ class Charades(torch.utils.data.Dataset):
         )
         assert pathmgr.exists(path_to_file), "{} dir not found".format(path_to_file)
         (self._path_to_videos, self._labels) = utils.load_image_lists(
-            path_to_file, self.cfg.DATA.PATH_PREFIX, return_list=True
+            path_to_file, self.cfg.DATA.PATH_PREFIX, return_index=True
         )
 
         if self.mode != "train":
             # Form video-level labels from frame level annotations.
             self._labels = utils.convert_to_video_level_labels(self._labels)
 
-        self._path_to_videos = list(
-            chain.from_iterable([[x] * self._num_clips for x in self._path_to_videos])
+        self._path_to_videos = self._path_to_videos.select(
+            np.repeat(np.arange(len(self._path_to_videos)), self._num_clips)
         )
         self._labels = list(
             chain.from_iterable([[x] * self._num_clips for x in self._labels])
@@ -213,13 +214,12 @@ class Charades(torch.utils.data.Dataset):
             utils.as_binary_vector(label, self.cfg.MODEL.NUM_CLASSES)
         )
 
-        # Perform color normalization.
-        frames = utils.tensor_normalize(frames, self.cfg.DATA.MEAN, self.cfg.DATA.STD)
-        # T H W C -> C T H W.
-        frames = frames.permute(3, 0, 1, 2)
-        # Perform data augmentation.
-        frames = utils.spatial_sampling(
+        # Perform data augmentation on the uint8 frames, then color
+        # normalization of the crop only. T H W C -> C T H W.
+        frames = utils.normalized_spatial_sampling(
             frames,
+            self.cfg.DATA.MEAN,
+            self.cfg.DATA.STD,
             spatial_idx=spatial_sample_index,
             min_scale=min_scale,
             max_scale=max_scale,
@@ -67,6 +67,28 @@ def random_short_side_scale_jitter_list(images, min_size, max_size, boxes=None):
     )
 
 
+def scale_size(size, height, width):
+    """
+    Get the size of an image whose short side is scaled to size.
+    Args:
+        size (int): size to scale the image.
+        height (int): height of the image.
+        width (int): width of the image.
+    Returns:
+        new_height (int): height of the scaled image.
+        new_width (int): width of the scaled image.
+    """
+    if (width <= height and width == size) or (height <= width and height == size):
+        return height, width
+    new_width = size
+    new_height = size
+    if width < height:
+        new_height = int(math.floor((float(height) / width) * size))
+    else:
+        new_width = int(math.floor((float(width) / height) * size))
+    return new_height, new_width
+
+
 def scale(size, image):
     """
     Scale the short side of the image to size.
@@ -80,14 +102,9 @@ def scale(size, image):
     """
     height = image.shape[0]
     width = image.shape[1]
-    if (width <= height and width == size) or (height <= width and height == size):
+    new_height, new_width = scale_size(size, height, width)
+    if (new_height, new_width) == (height, width):
         return image
-    new_width = size
-    new_height = size
-    if width < height:
-        new_height = int(math.floor((float(height) / width) * size))
-    else:
-        new_width = int(math.floor((float(width) / height) * size))
     img = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
     return img.astype(np.float32)
 
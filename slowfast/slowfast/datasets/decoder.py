@@ -9,7 +9,7 @@ import numpy as np
 import torch
 import torchvision.io as io
 
-from . import transform as transform
+from . import transform as transform, video_index as video_index
 
 logger = logging.getLogger(__name__)
 
@@ -184,7 +184,7 @@ def get_multiple_start_end_idx(
 
 
 def pyav_decode_stream(
-    container, start_pts, end_pts, stream, stream_name, buffer_size=0
+    container, start_pts, end_pts, stream, stream_name, buffer_size=0, seek_pts=None
 ):
     """
     Decode the video with PyAV decoder.
@@ -197,16 +197,22 @@ def pyav_decode_stream(
         stream_name (dict): a dictionary of streams. For example, {"video": 0}
             means video stream at stream index 0.
         buffer_size (int): number of additional frames to decode beyond end_pts.
+        seek_pts (int or None): if given, the PTS of the keyframe starting the
+            GOP of start_pts, and end_pts is the PTS of a frame, both from a PTS
+            index. The stream is seeked to the keyframe without margin, and
+            decoding stops at end_pts.
     Returns:
         result (list): list of frames decoded.
         max_pts (int): max Presentation TimeStamp of the video sequence.
     """
-    # Seeking in the stream is imprecise. Thus, seek to an ealier PTS by a
-    # margin pts.
-    margin = 1024
-    seek_offset = max(start_pts - margin, 0)
-
-    container.seek(seek_offset, any_frame=False, backward=True, stream=stream)
+    exact = seek_pts is not None
+    if not exact:
+        # Seeking in the stream is imprecise. Thus, seek to an ealier PTS by a
+        # margin pts.
+        margin = 1024
+        seek_pts = max(start_pts - margin, 0)
+
+    container.seek(seek_pts, any_frame=False, backward=True, stream=stream)
     frames = {}
     buffer_count = 0
     max_pts = 0
@@ -216,6 +222,8 @@ def pyav_decode_stream(
             continue
         if frame.pts <= end_pts:
             frames[frame.pts] = frame
+            if exact and frame.pts == end_pts and buffer_size == 0:
+                break
         else:
             buffer_count += 1
             frames[frame.pts] = frame
@@ -378,6 +386,8 @@ def pyav_decode(
     num_clips_uniform=10,
     target_fps=30,
     use_offset=False,
+    video_pts=(None, None),
+    close_container=True,
 ):
     """
     Convert the video from its original fps to the target_fps. If the video
@@ -388,9 +398,9 @@ def pyav_decode(
 
     Args:
         container (container): pyav container.
-        sampling_rate (int): frame sampling rate (interval between two sampled
-            frames.
-        num_frames (int): number of frames to sample.
+        sampling_rate (list of ints): frame sampling rate (interval between two
+            sampled frames) of every clip.
+        num_frames (list of ints): number of frames to sample of every clip.
         clip_idx (int): if clip_idx is -1, perform random temporal sampling. If
             clip_idx is larger than -1, uniformly split the video to num_clips_uniform
             clips, and select the clip_idx-th video clip.
@@ -398,11 +408,18 @@ def pyav_decode(
             given video.
         target_fps (int): the input video may has different fps, convert it to
             the target video fps before frame sampling.
+        video_pts (tuple): the frame and keyframe PTS of the video from
+            `VideoPtsIndex.get`, or None if the video is not indexed. If
+            given, every clip is decoded from the start of the GOP of its first
+            frame to its last frame.
+        close_container (bool): if True, close the container once decoded.
     Returns:
-        frames (tensor): decoded frames from the video. Return None if the no
-            video stream was found.
+        frames (list): decoded frames from the video of every clip. Return None
+            if the no video stream was found.
         fps (float): the number of frames per second of the video.
         decode_all_video (bool): If True, the entire video was decoded.
+        start_end_delta_time (ndarray): the start and end frame indices of every
+            clip, None if the entire video was decoded.
     """
     # Try to fetch the decoding information from the video head. Some of the
     # videos does not support fetching the decoding information, for that case
@@ -410,43 +427,63 @@ def pyav_decode(
     fps = float(container.streams.video[0].average_rate)
     frames_length = container.streams.video[0].frames
     duration = container.streams.video[0].duration
+    frame_pts, keyframe_pts = video_pts
+    if frame_pts is not None:
+        frames_length = len(frame_pts)
 
-    if duration is None:
+    if duration is None and frame_pts is None:
         # If failed to fetch the decoding information, decode the entire video.
         decode_all_video = True
-        video_start_pts, video_end_pts = 0, math.inf
+        start_end_delta_time = None
+        clips_pts = [(0, math.inf, None)]
     else:
         # Perform selective decoding.
         decode_all_video = False
-        clip_size = np.maximum(
-            1.0, np.ceil(sampling_rate * (num_frames - 1) / target_fps * fps)
-        )
-        start_idx, end_idx, fraction = get_start_end_idx(
+        clip_sizes = [
+            np.maximum(
+                1.0, np.ceil(sampling_rate[i] * (num_frames[i] - 1) / target_fps * fps)
+            )
+            for i in range(len(sampling_rate))
+        ]
+        start_end_delta_time = get_multiple_start_end_idx(
             frames_length,
-            clip_size,
+            clip_sizes,
             clip_idx,
             num_clips_uniform,
             use_offset=use_offset,
         )
-        timebase = duration / frames_length
-        video_start_pts = int(start_idx * timebase)
-        video_end_pts = int(end_idx * timebase)
+        clips_pts = []
+        for start_idx, end_idx, _ in start_end_delta_time:
+            if frame_pts is not None:
+                clips_pts.append(
+                    video_index.get_clip_pts(
+                        frame_pts, keyframe_pts, start_idx, end_idx
+                    )
+                )
+            else:
+                timebase = duration / frames_length
+                clips_pts.append(
+                    (int(start_idx * timebase), int(end_idx * timebase), None)
+                )
 
-    frames = None
+    frames_out = None
     # If video stream was found, fetch video frames from the video.
     if container.streams.video:
-        video_frames, max_pts = pyav_decode_stream(
-            container,
-            video_start_pts,
-            video_end_pts,
-            container.streams.video[0],
-            {"video": 0},
-        )
+        frames_out = []
+        for video_start_pts, video_end_pts, seek_pts in clips_pts:
+            video_frames, max_pts = pyav_decode_stream(
+                container,
+                video_start_pts,
+                video_end_pts,
+                container.streams.video[0],
+                {"video": 0},
+                seek_pts=seek_pts,
+            )
+            frames = [frame.to_rgb().to_ndarray() for frame in video_frames]
+            frames_out.append(torch.as_tensor(np.stack(frames)))
+    if close_container:
         container.close()
-
-        frames = [frame.to_rgb().to_ndarray() for frame in video_frames]
-        frames = torch.as_tensor(np.stack(frames))
-    return frames, fps, decode_all_video
+    return frames_out, fps, decode_all_video, start_end_delta_time
 
 
 def decode(
@@ -465,6 +502,8 @@ def decode(
     min_delta=-math.inf,
     max_delta=math.inf,
     temporally_rnd_clips=True,
+    video_pts=(None, None),
+    close_container=True,
 ):
     """
     Decode the video and perform temporal sampling.
@@ -488,6 +527,11 @@ def decode(
         max_spatial_scale (int): keep the aspect ratio and resize the frame so
             that shorter edge size is max_spatial_scale. Only used in
             `torchvision` backend.
+        video_pts (tuple): the frame and keyframe PTS of the video from
+            `VideoPtsIndex.get`, see `pyav_decode`. Only used in `pyav`
+            backend.
+        close_container (bool): if False, leave the container open, e.g. when
+            it is pooled. Only used in `pyav` backend.
     Returns:
         frames (tensor): decoded frames from the video.
     """
@@ -507,7 +551,12 @@ def decode(
             assert (
                 min_delta == -math.inf and max_delta == math.inf
             ), "delta sampling not supported in pyav"
-            frames_decoded, fps, decode_all_video = pyav_decode(
+            (
+                frames_decoded,
+                fps,
+                decode_all_video,
+                start_end_delta_time,
+            ) = pyav_decode(
                 container,
                 sampling_rate,
                 num_frames,
@@ -515,6 +564,8 @@ def decode(
                 num_clips_uniform,
                 target_fps,
                 use_offset=use_offset,
+                video_pts=video_pts,
+                close_container=close_container,
             )
         elif backend == "torchvision":
             (
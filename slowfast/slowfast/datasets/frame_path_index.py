@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+"""
+Compact index of the frame paths of frame list datasets, e.g. AVA, Charades
+and Something-Something V2.
+"""
+
+import copy
+import os
+
+import numpy as np
+
+
+def _pack_strings(strings):
+    """
+    Pack strings into a single byte buffer.
+    Args:
+        strings (list): list of strings.
+    Returns:
+        buffer (ndarray): uint8 array of the utf-8 encoded strings, one after
+            the other.
+        offsets (ndarray): int64 array of `len(strings) + 1` offsets of the
+            strings in the buffer.
+    """
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(
+        np.array([len(string) for string in encoded], dtype=np.int64),
+        out=offsets[1:],
+    )
+    buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return buffer, offsets
+
+
+def _unpack_string(buffer, offsets, idx):
+    """
+    Args:
+        buffer (ndarray): buffer of `_pack_strings`.
+        offsets (ndarray): offsets of `_pack_strings`.
+        idx (int): index of the string.
+    Returns:
+        string (str): the idx-th packed string.
+    """
+    return buffer[offsets[idx] : offsets[idx + 1]].tobytes().decode("utf-8")
+
+
+class FramePathIndex(object):
+    """
+    Frame paths of videos packed in a few numpy arrays instead of one Python
+    string per frame. The paths of a video share a prefix, stored once per
+    video, and the rest of every path is packed in a single byte buffer.
+    Paths are built on demand. As the index holds no Python object per
+    frame, the data loader workers forked from the main process do not copy
+    the pages of the paths when they are read, which happens with lists of
+    strings through their reference counts.
+
+    `index[video_idx][frame_idx]` and `len(index[video_idx])` give the paths
+    and number of frames of a video, as the nested lists of paths did.
+    """
+
+    # Arrays holding the index, see `save` and `load`.
+    ARRAY_NAMES = (
+        "prefix_buffer",
+        "prefix_offsets",
+        "suffix_buffer",
+        "suffix_offsets",
+        "video_starts",
+        "name_buffer",
+        "name_offsets",
+        "video_ids",
+    )
+
+    def __init__(self, paths_per_video, video_names=None, root=""):
+        """
+        Args:
+            paths_per_video (list): list of the lists of frame paths of every
+                video.
+            video_names (list or None): optional names of the videos.
+            root (str): optional directory the paths are relative to, joined
+                once per video instead of once per frame.
+        """
+        prefixes = []
+        suffixes = []
+        num_frames = np.zeros(len(paths_per_video) + 1, dtype=np.int64)
+        for video_idx, paths in enumerate(paths_per_video):
+            prefix = os.path.commonprefix(paths) if len(paths) > 1 else ""
+            prefixes.append(os.path.join(root, prefix) if root else prefix)
+            suffixes.extend(path[len(prefix) :] for path in paths)
+            num_frames[video_idx + 1] = len(paths)
+        self._prefix_buffer, self._prefix_offsets = _pack_strings(prefixes)
+        self._suffix_buffer, self._suffix_offsets = _pack_strings(suffixes)
+        self._video_starts = np.cumsum(num_frames)
+        self._name_buffer, self._name_offsets = _pack_strings(
+            video_names if video_names is not None else []
+        )
+        # Index of the packed video of every video of the index, see
+        # `select`.
+        self._video_ids = np.arange(len(paths_per_video), dtype=np.int64)
+
+    def __len__(self):
+        """
+        Returns:
+            (int): the number of videos.
+        """
+        return len(self._video_ids)
+
+    def __getitem__(self, video_idx):
+        """
+        Args:
+            video_idx (int): index of the video.
+        Returns:
+            (VideoFramePaths): the frame paths of the video.
+        """
+        if video_idx < 0:
+            video_idx += len(self)
+        if not 0 <= video_idx < len(self):
+            raise IndexError("Video index {} out of range".format(video_idx))
+        return VideoFramePaths(self, int(self._video_ids[video_idx]))
+
+    def __iter__(self):
+        for video_idx in range(len(self)):
+            yield self[video_idx]
+
+    @property
+    def num_frames(self):
+        """
+        Returns:
+            (int): the total number of frames of the videos.
+        """
+        counts = self._video_starts[1:] - self._video_starts[:-1]
+        return int(counts[self._video_ids].sum())
+
+    def get_video_name(self, video_idx):
+        """
+        Args:
+            video_idx (int): index of the video.
+        Returns:
+            (str): the name of the video given at construction.
+        """
+        return _unpack_string(
+            self._name_buffer, self._name_offsets, self._video_ids[video_idx]
+        )
+
+    def select(self, video_indices):
+        """
+        Get an index of the given videos, e.g. to repeat every video for the
+        clips of multi-view testing. The packed paths are shared, not copied.
+        Args:
+            video_indices (list or ndarray): indices of the videos to keep, in
+                order. Videos may be repeated.
+        Returns:
+            (FramePathIndex): the index of the selected videos.
+        """
+        selected = copy.copy(self)
+        selected._video_ids = self._video_ids[
+            np.asarray(video_indices, dtype=np.int64)
+        ]
+        return selected
+
+    def save(self, path):
+        """
+        Save the arrays of the index to a directory, one `.npy` file per
+        array.
+        Args:
+            path (str): directory to create.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(
+                os.path.join(path, name + ".npy"), getattr(self, "_" + name)
+            )
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Load an index saved by `save`.
+        Args:
+            path (str): directory of the index.
+            mmap_mode (str or None): memory map the arrays with this mode, see
+                `numpy.load`. The pages of memory mapped arrays are shared by
+                all the processes reading them.
+        Returns:
+            (FramePathIndex): the index.
+        """
+        index = cls.__new__(cls)
+        for name in cls.ARRAY_NAMES:
+            setattr(
+                index,
+                "_" + name,
+                np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode),
+            )
+        return index
+
+    def _get_path(self, packed_idx, frame_idx):
+        """
+        Args:
+            packed_idx (int): index of the video in the packed arrays.
+            frame_idx (int): index of the frame in the video.
+        Returns:
+            (str): path of the frame.
+        """
+        return _unpack_string(
+            self._prefix_buffer, self._prefix_offsets, packed_idx
+        ) + _unpack_string(
+            self._suffix_buffer,
+            self._suffix_offsets,
+            self._video_starts[packed_idx] + frame_idx,
+        )
+
+
+class VideoFramePaths(object):
+    """
+    Lightweight view of the frame paths of a video of a FramePathIndex,
+    behaving as a read-only list of paths.
+    """
+
+    def __init__(self, index, packed_idx):
+        """
+        Args:
+            index (FramePathIndex): index holding the paths.
+            packed_idx (int): index of the video in the packed arrays.
+        """
+        self._index = index
+        self._packed_idx = packed_idx
+
+    def __len__(self):
+        starts = self._index._video_starts
+        return int(starts[self._packed_idx + 1] - starts[self._packed_idx])
+
+    def __getitem__(self, frame_idx):
+        if frame_idx < 0:
+            frame_idx += len(self)
+        if not 0 <= frame_idx < len(self):
+            raise IndexError("Frame index {} out of range".format(frame_idx))
+        return self._index._get_path(self._packed_idx, frame_idx)
+
+    def __iter__(self):
+        for frame_idx in range(len(self)):
+            yield self[frame_idx]
@@ -18,6 +18,7 @@ from . import (
     transform as transform,
     utils as utils,
     video_container as container,
+    video_index as video_index,
 )
 from .build import DATASET_REGISTRY
 from .random_erasing import RandomErasing
@@ -89,6 +90,18 @@ class Kinetics(torch.utils.data.Dataset):
 
         logger.info("Constructing Kinetics {}...".format(mode))
         self._construct_loader()
+        self._container_pool = None
+        self._video_index = None
+        if self.cfg.DATA.DECODING_BACKEND == "pyav":
+            if self.cfg.DATA_LOADER.CONTAINER_POOL_SIZE > 0:
+                self._container_pool = container.VideoContainerPool(
+                    self.cfg.DATA_LOADER.CONTAINER_POOL_SIZE,
+                    self.cfg.DATA_LOADER.ENABLE_MULTI_THREAD_DECODE,
+                )
+            if self.cfg.DATA.VIDEO_INDEX_DIR:
+                self._video_index = video_index.VideoPtsIndex.load(
+                    os.path.join(self.cfg.DATA.VIDEO_INDEX_DIR, self.mode)
+                )
         self.aug = False
         self.rand_erase = False
         self.use_temporal_gradient = False
@@ -259,11 +272,16 @@ class Kinetics(torch.utils.data.Dataset):
         for i_try in range(self._num_retries):
             video_container = None
             try:
-                video_container = container.get_video_container(
-                    self._path_to_videos[index],
-                    self.cfg.DATA_LOADER.ENABLE_MULTI_THREAD_DECODE,
-                    self.cfg.DATA.DECODING_BACKEND,
-                )
+                if self._container_pool is not None:
+                    video_container = self._container_pool.get(
+                        self._path_to_videos[index]
+                    )
+                else:
+                    video_container = container.get_video_container(
+                        self._path_to_videos[index],
+                        self.cfg.DATA_LOADER.ENABLE_MULTI_THREAD_DECODE,
+                        self.cfg.DATA.DECODING_BACKEND,
+                    )
             except Exception as e:
                 logger.info(
                     "Failed to load video from {} with error {}".format(
@@ -336,6 +354,12 @@ class Kinetics(torch.utils.data.Dataset):
                 temporally_rnd_clips=True,
                 min_delta=self.cfg.CONTRASTIVE.DELTA_CLIPS_MIN,
                 max_delta=self.cfg.CONTRASTIVE.DELTA_CLIPS_MAX,
+                video_pts=(
+                    self._video_index.get(self._path_to_videos[index])
+                    if self._video_index is not None
+                    else (None, None)
+                ),
+                close_container=self._container_pool is None,
             )
             frames_decoded = frames
             time_idx_decoded = time_idx
@@ -348,6 +372,8 @@ class Kinetics(torch.utils.data.Dataset):
                         index, self._path_to_videos[index], i_try
                     )
                 )
+                if self._container_pool is not None:
+                    self._container_pool.discard(self._path_to_videos[index])
                 if (
                     self.mode not in ["test"]
                     and (i_try % (self._num_retries // 8)) == 0
@@ -366,73 +392,54 @@ class Kinetics(torch.utils.data.Dataset):
             idx = -1
             label = self._labels[index]
 
+            scl, asp = (
+                self.cfg.DATA.TRAIN_JITTER_SCALES_RELATIVE,
+                self.cfg.DATA.TRAIN_JITTER_ASPECT_RELATIVE,
+            )
+            relative_scales = (
+                None if (self.mode not in ["train"] or len(scl) == 0) else scl
+            )
+            relative_aspect = (
+                None if (self.mode not in ["train"] or len(asp) == 0) else asp
+            )
+            # Without color augmentations nor relative scale jitter, the
+            # frames are scaled, cropped and flipped in uint8 and only the
+            # crops are normalized.
+            color_aug = (
+                self.mode in ["train"] and self.cfg.DATA.SSL_COLOR_JITTER
+            ) or (self.aug and self.cfg.AUG.AA_TYPE)
+            uint8_sampling = (
+                not color_aug
+                and relative_scales is None
+                and relative_aspect is None
+            )
+
             for i in range(num_decode):
                 for _ in range(num_aug):
                     idx += 1
-                    f_out[idx] = frames_decoded[i].clone()
                     time_idx_out[idx] = time_idx_decoded[i, :]
-
-                    f_out[idx] = f_out[idx].float()
-                    f_out[idx] = f_out[idx] / 255.0
-
-                    if self.mode in ["train"] and self.cfg.DATA.SSL_COLOR_JITTER:
-                        f_out[idx] = transform.color_jitter_video_ssl(
-                            f_out[idx],
-                            bri_con_sat=self.cfg.DATA.SSL_COLOR_BRI_CON_SAT,
-                            hue=self.cfg.DATA.SSL_COLOR_HUE,
-                            p_convert_gray=self.p_convert_gray,
-                            moco_v2_aug=self.cfg.DATA.SSL_MOCOV2_AUG,
-                            gaussan_sigma_min=self.cfg.DATA.SSL_BLUR_SIGMA_MIN,
-                            gaussan_sigma_max=self.cfg.DATA.SSL_BLUR_SIGMA_MAX,
+                    if uint8_sampling:
+                        f_out[idx] = utils.normalized_spatial_sampling(
+                            frames_decoded[i],
+                            self.cfg.DATA.MEAN,
+                            self.cfg.DATA.STD,
+                            spatial_idx=spatial_sample_index,
+                            min_scale=min_scale[i],
+                            max_scale=max_scale[i],
+                            crop_size=crop_size[i],
+                            random_horizontal_flip=self.cfg.DATA.RANDOM_FLIP,
+                            inverse_uniform_sampling=self.cfg.DATA.INV_UNIFORM_SAMPLE,
                         )
-
-                    if self.aug and self.cfg.AUG.AA_TYPE:
-                        aug_transform = create_random_augment(
-                            input_size=(f_out[idx].size(1), f_out[idx].size(2)),
-                            auto_augment=self.cfg.AUG.AA_TYPE,
-                            interpolation=self.cfg.AUG.INTERPOLATION,
+                    else:
+                        f_out[idx] = self._float_spatial_sampling(
+                            frames_decoded[i],
+                            spatial_sample_index,
+                            min_scale[i],
+                            max_scale[i],
+                            crop_size[i],
+                            relative_scales,
+                            relative_aspect,
                         )
-                        # T H W C -> T C H W.
-                        f_out[idx] = f_out[idx].permute(0, 3, 1, 2)
-                        list_img = self._frame_to_list_img(f_out[idx])
-                        list_img = aug_transform(list_img)
-                        f_out[idx] = self._list_img_to_frames(list_img)
-                        f_out[idx] = f_out[idx].permute(0, 2, 3, 1)
-
-                    # Perform color normalization.
-                    f_out[idx] = utils.tensor_normalize(
-                        f_out[idx], self.cfg.DATA.MEAN, self.cfg.DATA.STD
-                    )
-
-                    # T H W C -> C T H W.
-                    f_out[idx] = f_out[idx].permute(3, 0, 1, 2)
-
-                    scl, asp = (
-                        self.cfg.DATA.TRAIN_JITTER_SCALES_RELATIVE,
-                        self.cfg.DATA.TRAIN_JITTER_ASPECT_RELATIVE,
-                    )
-                    relative_scales = (
-                        None if (self.mode not in ["train"] or len(scl) == 0) else scl
-                    )
-                    relative_aspect = (
-                        None if (self.mode not in ["train"] or len(asp) == 0) else asp
-                    )
-                    f_out[idx] = utils.spatial_sampling(
-                        f_out[idx],
-                        spatial_idx=spatial_sample_index,
-                        min_scale=min_scale[i],
-                        max_scale=max_scale[i],
-                        crop_size=crop_size[i],
-                        random_horizontal_flip=self.cfg.DATA.RANDOM_FLIP,
-                        inverse_uniform_sampling=self.cfg.DATA.INV_UNIFORM_SAMPLE,
-                        aspect_ratio=relative_aspect,
-                        scale=relative_scales,
-                        motion_shift=(
-                            self.cfg.DATA.TRAIN_JITTER_MOTION_SHIFT
-                            if self.mode in ["train"]
-                            else False
-                        ),
-                    )
 
                     if self.rand_erase:
                         erase_transform = RandomErasing(
@@ -467,6 +474,84 @@ class Kinetics(torch.utils.data.Dataset):
                 "Failed to fetch video after {} retries.".format(self._num_retries)
             )
 
+    def _float_spatial_sampling(
+        self,
+        frames,
+        spatial_sample_index,
+        min_scale,
+        max_scale,
+        crop_size,
+        relative_scales,
+        relative_aspect,
+    ):
+        """
+        Perform the color augmentations and normalization of the frames in
+        float, then their spatial sampling.
+        Args:
+            frames (tensor): uint8 frames, `num frames` x `height` x `width` x
+                `channel`.
+            spatial_sample_index (int): see `utils.spatial_sampling`.
+            min_scale (int): the minimal size of scaling.
+            max_scale (int): the maximal size of scaling.
+            crop_size (int): the size of height and width of the crop.
+            relative_scales (list or None): scale range for resizing.
+            relative_aspect (list or None): aspect ratio range for resizing.
+        Returns:
+            frames (tensor): normalized crop, `channel` x `num frames` x
+                `crop size` x `crop size`.
+        """
+        frames = frames.float()
+        frames = frames / 255.0
+
+        if self.mode in ["train"] and self.cfg.DATA.SSL_COLOR_JITTER:
+            frames = transform.color_jitter_video_ssl(
+                frames,
+                bri_con_sat=self.cfg.DATA.SSL_COLOR_BRI_CON_SAT,
+                hue=self.cfg.DATA.SSL_COLOR_HUE,
+                p_convert_gray=self.p_convert_gray,
+                moco_v2_aug=self.cfg.DATA.SSL_MOCOV2_AUG,
+                gaussan_sigma_min=self.cfg.DATA.SSL_BLUR_SIGMA_MIN,
+                gaussan_sigma_max=self.cfg.DATA.SSL_BLUR_SIGMA_MAX,
+            )
+
+        if self.aug and self.cfg.AUG.AA_TYPE:
+            aug_transform = create_random_augment(
+                input_size=(frames.size(1), frames.size(2)),
+                auto_augment=self.cfg.AUG.AA_TYPE,
+                interpolation=self.cfg.AUG.INTERPOLATION,
+            )
+            # T H W C -> T C H W.
+            frames = frames.permute(0, 3, 1, 2)
+            list_img = self._frame_to_list_img(frames)
+            list_img = aug_transform(list_img)
+            frames = self._list_img_to_frames(list_img)
+            frames = frames.permute(0, 2, 3, 1)
+
+        # Perform color normalization.
+        frames = utils.tensor_normalize(
+            frames, self.cfg.DATA.MEAN, self.cfg.DATA.STD
+        )
+
+        # T H W C -> C T H W.
+        frames = frames.permute(3, 0, 1, 2)
+
+        return utils.spatial_sampling(
+            frames,
+            spatial_idx=spatial_sample_index,
+            min_scale=min_scale,
+            max_scale=max_scale,
+            crop_size=crop_size,
+            random_horizontal_flip=self.cfg.DATA.RANDOM_FLIP,
+            inverse_uniform_sampling=self.cfg.DATA.INV_UNIFORM_SAMPLE,
+            aspect_ratio=relative_aspect,
+            scale=relative_scales,
+            motion_shift=(
+                self.cfg.DATA.TRAIN_JITTER_MOTION_SHIFT
+                if self.mode in ["train"]
+                else False
+            ),
+        )
+
     def _gen_mask(self):
         if self.cfg.AUG.MASK_TUBE:
             num_masking_patches = round(
@@ -10,6 +10,7 @@ from fvcore.common.file_io import PathManager
 import slowfast.utils.logging as logging
 
 from . import decoder as decoder
+from . import meccano_helper as meccano_helper
 from . import transform as transform
 from . import utils as utils
 from . import video_container as container
@@ -63,6 +64,9 @@ class Meccano(torch.utils.data.Dataset):
 
         self._video_meta = {}
         self._num_retries = num_retries
+        # If not None, the random augmentation of every sample is seeded from
+        # (aug_seed, index), e.g. to match precomputed teacher logits.
+        self.aug_seed = None
         # For training or validation mode, one single clip is sampled from every
         # video. For testing, NUM_ENSEMBLE_VIEWS clips are sampled from every
         # video. For every clip, NUM_SPATIAL_CROPS is cropped spatially from
@@ -77,6 +81,20 @@ class Meccano(torch.utils.data.Dataset):
         logger.info("Constructing MECCANO {}...".format(mode))
         self._construct_loader()
 
+        assert cfg.MECCANO.BACKEND in [
+            "jpeg",
+            "shard",
+        ], "Backend {} not supported for MECCANO".format(cfg.MECCANO.BACKEND)
+        self._shard_reader = None
+        if cfg.MECCANO.BACKEND == "shard":
+            self._shard_reader = meccano_helper.FrameShardReader(
+                meccano_helper.get_shard_dir(cfg, self.mode),
+                cfg.MECCANO.SHARD_FORMAT,
+            )
+        self._gaze_points = None
+        if cfg.MECCANO.GAZE_ENABLE:
+            self._load_gaze_points()
+
     def _construct_loader(self):
         """
         Construct the data loader.
@@ -94,6 +112,8 @@ class Meccano(torch.utils.data.Dataset):
         self._spatial_temporal_idx = []
         self._frame_start = []
         self._frame_end = []
+        self._segment_idx = []
+        self._segments = []
         with PathManager.open(path_to_file, "r") as f:
             #print("splitlines", f.read().splitlines())
             for clip_idx, path_label in enumerate(f.read().splitlines()):
@@ -103,6 +123,13 @@ class Meccano(torch.utils.data.Dataset):
                 #print("path_label:", path_label)
                 assert len(path_label.split(',')) == 5
                 video_path, action_label, action_noun, frame_start, frame_end  = path_label.split(',')
+                self._segments.append(
+                    (
+                        video_path.zfill(4),
+                        int(frame_start[:-4]),
+                        int(frame_end[:-4]),
+                    )
+                )
                 for idx in range(self._num_clips):
                     self._path_to_videos.append(
                         os.path.join(self.cfg.DATA.PATH_TO_DATA_DIR, self.mode, video_path.zfill(4))
@@ -111,6 +138,7 @@ class Meccano(torch.utils.data.Dataset):
                     self._frame_end.append(frame_end)
                     self._labels.append(int(action_label))
                     self._spatial_temporal_idx.append(idx)
+                    self._segment_idx.append(len(self._segments) - 1)
                     self._video_meta[clip_idx * self._num_clips + idx] = {}
         assert (
             len(self._path_to_videos) > 0
@@ -121,6 +149,43 @@ class Meccano(torch.utils.data.Dataset):
             )
         )
 
+    def _load_gaze_points(self):
+        """
+        Load the gaze points of every segment of the split, reading them into
+        the on-disk cache first if needed. The points are memory mapped, so
+        workers share them through the page cache.
+        """
+        cache_path = meccano_helper.get_gaze_cache_path(self.cfg, self.mode)
+        if not os.path.exists(cache_path):
+            meccano_helper.build_gaze_cache(self.cfg, cache_path, self._segments)
+        self._gaze_points = np.load(cache_path, mmap_mode="r")
+        assert len(self._gaze_points) == len(
+            self._segments
+        ), "Gaze cache {} does not match split {}".format(cache_path, self.mode)
+        logger.info("Loaded gaze points from {}".format(cache_path))
+
+    def _get_gaze_heatmaps(self, index, params, crop_size):
+        """
+        Render the gaze heatmaps of a clip at the spatial resolution of the
+        last stage features, in the coordinates of its crop.
+        Args:
+            index (int): the video index.
+            params (list): the spatial sampling parameters of the clip, see
+                `utils.get_spatial_params`.
+            crop_size (int): the size of height and width of the crop.
+        Returns:
+            heatmaps (tensor): the heatmaps, dimension is `num frames` x
+                `crop size // 32` x `crop size // 32`.
+        """
+        points = meccano_helper.crop_gaze_points(
+            self._gaze_points[self._segment_idx[index]], params, crop_size
+        )
+        return torch.from_numpy(
+            meccano_helper.render_gaze_heatmaps(
+                points, crop_size // 32, self.cfg.MECCANO.GAZE_SIGMA
+            )
+        )
+
     def __getitem__(self, index):
         """
         Given the video index, return the list of frames, label, and video
@@ -133,6 +198,8 @@ class Meccano(torch.utils.data.Dataset):
             label (int): the label of the current video.
             index (int): if the video provided by pytorch sampler.
         """
+        if self.aug_seed is not None:
+            np.random.seed((self.aug_seed * len(self) + index) % 2**32)
         if self.mode in ["train", "val"]:
             # -1 indicates random sampling.
             temporal_sample_index = -1
@@ -159,46 +226,115 @@ class Meccano(torch.utils.data.Dataset):
             )
 
         # Recover frames
-        frames = []
-        frame_count = int(self._frame_start[index][:-4]) #to obtain the number of the frame
-        while(frame_count <= int(self._frame_end[index][:-4])):
-            #rebuild original filename
-            name_frame = str(frame_count)
-            if(len(name_frame) == 4): #add a prefix 0
-                name_frame = "0"+name_frame
-            elif(len(name_frame) == 3): #add two prefix 0
-                name_frame = "00"+name_frame
-            elif(len(name_frame) == 2): #add three prefix 0
-                name_frame = "000"+name_frame
-            elif(len(name_frame) == 1): #add four prefix 0
-                name_frame = "0000"+name_frame
-            image = Image.open(self._path_to_videos[index]+"/"+name_frame+".jpg")
-            image = np.asarray(image)
-            frames.append(torch.from_numpy(image))
-            frame_count+=1
-        frames= torch.stack(frames)
-        #sampling frames
-        frames = sampling.temporal_sampling(frames, int(self._frame_start[index][:-4]), int(self._frame_end[index][:-4]), self.cfg.DATA.NUM_FRAMES)
+        frames = self._load_frames(index)
+        label = self._labels[index]
+        # Draw the spatial sampling of the uint8 frames, shared by the
+        # frames and the gaze heatmaps.
+        assert spatial_sample_index == -1 or crop_size == min_scale
+        params = utils.get_spatial_params(
+            frames.shape[1],
+            frames.shape[2],
+            spatial_idx=spatial_sample_index,
+            min_scale=min_scale,
+            max_scale=max_scale,
+            crop_size=crop_size,
+            random_horizontal_flip=self.cfg.DATA.RANDOM_FLIP,
+            inverse_uniform_sampling=self.cfg.DATA.INV_UNIFORM_SAMPLE,
+        )
+        meta = {}
+        if self._gaze_points is not None:
+            meta["gaze"] = self._get_gaze_heatmaps(index, params, crop_size)
 
-        # Perform color normalization.
-        frames = frames / 255.0
-        frames = frames - torch.tensor(self.cfg.DATA.MEAN)
-        frames = frames / torch.tensor(self.cfg.DATA.STD)
-        # T H W C -> C T H W.
-        frames = frames.permute(3, 0, 1, 2)
+        if self.cfg.DATA.BATCH_AUGMENTATION and self.mode in ["train", "val"]:
+            # The uint8 clips are transformed by batch, see
+            # batch_transform.batch_augment.
+            meta["spatial_params"] = torch.tensor(params)
+            return [frames], label, index, {}, meta
 
-        # Perform data augmentation.
-        frames = self.spatial_sampling(
-                frames,
-                spatial_idx=spatial_sample_index,
-                min_scale=min_scale,
-                max_scale=max_scale,
-                crop_size=crop_size,
-                random_horizontal_flip=self.cfg.DATA.RANDOM_FLIP,
-            )
-        label = self._labels[index]
+        # Perform data augmentation on the uint8 frames, then color
+        # normalization of the crop only. T H W C -> C T H W.
+        frames = utils.normalized_crop(
+            frames, params, self.cfg.DATA.MEAN, self.cfg.DATA.STD, crop_size
+        )
         frames = utils.pack_pathway_output(self.cfg, frames)
-        return frames, label, index, {}, {}
+        return frames, label, index, {}, meta
+
+    def _get_frame_range(self, index):
+        """
+        Args:
+            index (int): the video index.
+        Returns:
+            frame_start (int): the number of the first frame of the segment.
+            frame_end (int): the number of the last frame of the segment.
+        """
+        # Strip the ".jpg" extension to obtain the number of the frame.
+        frame_start = int(self._frame_start[index][:-4])
+        frame_end = int(self._frame_end[index][:-4])
+        return frame_start, frame_end
+
+    def get_frame_paths(self, index, sample_first=True):
+        """
+        Get the paths of the frames to decode for the given video index.
+        Args:
+            index (int): the video index.
+            sample_first (bool): if True, only return the paths of the
+                `DATA.NUM_FRAMES` frames kept by temporal sampling. Otherwise,
+                return the paths of every frame of the segment.
+        Returns:
+            frame_paths (list): list of paths of the frames to decode.
+        """
+        frame_start, frame_end = self._get_frame_range(index)
+        if sample_first:
+            frame_idx = sampling.get_temporal_sample_index(
+                frame_start, frame_end, self.cfg.DATA.NUM_FRAMES
+            ).tolist()
+        else:
+            frame_idx = range(frame_start, frame_end + 1)
+        # Frames are named with a 5 digit zero-padded frame number.
+        return [
+            os.path.join(self._path_to_videos[index], "{:05d}.jpg".format(idx))
+            for idx in frame_idx
+        ]
+
+    def _load_frames(self, index, sample_first=None):
+        """
+        Decode the temporally sampled frames of the given video index.
+        Args:
+            index (int): the video index.
+            sample_first (bool or None): if True, compute the sampled frame
+                indices first and only decode those frames. If False, decode
+                every frame of the segment and sample afterwards. If None,
+                use `MECCANO.SAMPLE_FIRST`. Both paths return identical frames.
+                Ignored by the `shard` backend, which always reads only the
+                sampled frames.
+        Returns:
+            frames (tensor): the sampled frames, dimension is
+                `num frames` x `height` x `width` x `channel`.
+        """
+        if self._shard_reader is not None:
+            frame_start, frame_end = self._get_frame_range(index)
+            frame_idx = sampling.get_temporal_sample_index(
+                frame_start, frame_end, self.cfg.DATA.NUM_FRAMES
+            )
+            frames = self._shard_reader.read(
+                os.path.basename(self._path_to_videos[index]), frame_idx.numpy()
+            )
+            return torch.from_numpy(frames)
+        if sample_first is None:
+            sample_first = self.cfg.MECCANO.SAMPLE_FIRST
+        frame_paths = self.get_frame_paths(index, sample_first=sample_first)
+        frames = torch.stack(
+            [
+                torch.from_numpy(np.asarray(Image.open(path)))
+                for path in frame_paths
+            ]
+        )
+        if not sample_first:
+            frame_start, frame_end = self._get_frame_range(index)
+            frames = sampling.temporal_sampling(
+                frames, frame_start, frame_end, self.cfg.DATA.NUM_FRAMES
+            )
+        return frames
 
     def __len__(self):
         """
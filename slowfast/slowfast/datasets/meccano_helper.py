@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+import slowfast.utils.logging as logging
+
+logger = logging.get_logger(__name__)
+
+SHARD_FORMATS = ["raw", "jpeg"]
+
+
+def get_shard_dir(cfg, split):
+    """
+    Get the directory holding the frame shards of the given split.
+    Args:
+        cfg (CfgNode): configs.
+        split (str): the split name, `train`, `val` or `test`.
+    Returns:
+        shard_dir (str): directory of the shards of the split.
+    """
+    shard_root = cfg.MECCANO.SHARD_DIR
+    if shard_root == "":
+        shard_root = os.path.join(cfg.DATA.PATH_TO_DATA_DIR, "shards")
+    return os.path.join(shard_root, split)
+
+
+def get_shard_paths(shard_dir, video_name, shard_format):
+    """
+    Get the files making up the shard of one video. Every shard has an index
+    file holding the frame numbers of the packed frames. A `raw` shard stores
+    the frames as a `num frames` x `height` x `width` x `channel` uint8 array
+    in a `.npy` file. A `jpeg` shard stores the concatenated JPEG bytes in a
+    `.bin` file and the byte offsets of every frame in the index file.
+    Args:
+        shard_dir (str): directory of the shards.
+        video_name (str): name of the video folder.
+        shard_format (str): `raw` or `jpeg`.
+    Returns:
+        data_path (str): path of the frame data.
+        index_path (str): path of the frame index.
+    """
+    assert shard_format in SHARD_FORMATS, "Shard format {} not supported".format(
+        shard_format
+    )
+    prefix = os.path.join(shard_dir, video_name)
+    if shard_format == "raw":
+        data_path = prefix + ".frames.npy"
+    else:
+        data_path = prefix + ".jpeg.bin"
+    return data_path, prefix + ".index.npz"
+
+
+def _short_side_resize(image, short_side):
+    """
+    Resize a PIL image so that its short side equals short_side. If
+    short_side is not positive, return the image unchanged.
+    """
+    if short_side <= 0:
+        return image
+    width, height = image.size
+    if width < height:
+        new_width = short_side
+        new_height = int(round(height * short_side / width))
+    else:
+        new_height = short_side
+        new_width = int(round(width * short_side / height))
+    if (new_width, new_height) == (width, height):
+        return image
+    return image.resize((new_width, new_height), Image.BILINEAR)
+
+
+def pack_video(video_dir, shard_dir, shard_format, short_side=0):
+    """
+    Pack all the frames of one video folder into a single shard. The shard is
+    first written to temporary files and then moved in place, so an
+    interrupted run never leaves a partial shard behind.
+    Args:
+        video_dir (str): folder holding the `<frame>.jpg` files of the video.
+        shard_dir (str): directory to write the shard to.
+        shard_format (str): `raw` or `jpeg`.
+        short_side (int): short side size of the frames of a `raw` shard. If
+            not positive, frames are stored at their original resolution.
+            `jpeg` shards always keep the original bytes.
+    Returns:
+        num_frames (int): the number of packed frames.
+    """
+    video_name = os.path.basename(os.path.normpath(video_dir))
+    data_path, index_path = get_shard_paths(shard_dir, video_name, shard_format)
+    frame_names = sorted(
+        name for name in os.listdir(video_dir) if name.endswith(".jpg")
+    )
+    assert len(frame_names) > 0, "No frames found in {}".format(video_dir)
+    frame_ids = np.array(
+        [int(name[:-4]) for name in frame_names], dtype=np.int64
+    )
+    order = np.argsort(frame_ids, kind="stable")
+    frame_ids = frame_ids[order]
+    frame_names = [frame_names[i] for i in order]
+
+    tmp_data_path = data_path + ".tmp"
+    if shard_format == "raw":
+        first = _short_side_resize(
+            Image.open(os.path.join(video_dir, frame_names[0])), short_side
+        )
+        first = np.asarray(first)
+        frames = np.lib.format.open_memmap(
+            tmp_data_path,
+            mode="w+",
+            dtype=np.uint8,
+            shape=(len(frame_names),) + first.shape,
+        )
+        frames[0] = first
+        for i, name in enumerate(frame_names[1:], start=1):
+            image = Image.open(os.path.join(video_dir, name))
+            frames[i] = np.asarray(_short_side_resize(image, short_side))
+        frames.flush()
+        del frames
+        index = {"frame_ids": frame_ids}
+    else:
+        offsets = np.zeros(len(frame_names) + 1, dtype=np.int64)
+        with open(tmp_data_path, "wb") as f:
+            for i, name in enumerate(frame_names):
+                with open(os.path.join(video_dir, name), "rb") as frame_file:
+                    offsets[i + 1] = offsets[i] + f.write(frame_file.read())
+        index = {"frame_ids": frame_ids, "offsets": offsets}
+
+    # np.savez appends `.npz` to the file name if it is missing.
+    tmp_index_path = index_path[: -len(".npz")] + ".tmp.npz"
+    np.savez(tmp_index_path, **index)
+    os.replace(tmp_data_path, data_path)
+    os.replace(tmp_index_path, index_path)
+    return len(frame_names)
+
+
+class FrameShardReader(object):
+    """
+    Read frames from the packed shards of a split through `numpy.memmap`.
+    Shards are opened lazily and kept open, so every DataLoader worker opens
+    each shard once and a clip only costs the page faults of its frames.
+    """
+
+    def __init__(self, shard_dir, shard_format):
+        """
+        Args:
+            shard_dir (str): directory of the shards of the split.
+            shard_format (str): `raw` or `jpeg`.
+        """
+        assert (
+            shard_format in SHARD_FORMATS
+        ), "Shard format {} not supported".format(shard_format)
+        self._shard_dir = shard_dir
+        self._shard_format = shard_format
+        self._shards = {}
+
+    def __getstate__(self):
+        # Do not send open memmaps to the DataLoader workers.
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+
+    def _open(self, video_name):
+        if video_name not in self._shards:
+            data_path, index_path = get_shard_paths(
+                self._shard_dir, video_name, self._shard_format
+            )
+            with np.load(index_path) as index:
+                index = {key: index[key] for key in index.files}
+            if self._shard_format == "raw":
+                data = np.load(data_path, mmap_mode="r")
+            else:
+                data = np.memmap(data_path, dtype=np.uint8, mode="r")
+            self._shards[video_name] = (data, index)
+        return self._shards[video_name]
+
+    def read(self, video_name, frame_ids):
+        """
+        Read the given frames of a video.
+        Args:
+            video_name (str): name of the video folder.
+            frame_ids (list or ndarray): frame numbers to read.
+        Returns:
+            frames (ndarray): the frames, dimension is
+                `num frames` x `height` x `width` x `channel`.
+        """
+        data, index = self._open(video_name)
+        frame_ids = np.asarray(frame_ids, dtype=np.int64)
+        rows = np.searchsorted(index["frame_ids"], frame_ids)
+        rows = np.minimum(rows, len(index["frame_ids"]) - 1)
+        assert np.array_equal(
+            index["frame_ids"][rows], frame_ids
+        ), "Frames {} missing from shard of video {}".format(
+            frame_ids, video_name
+        )
+        if self._shard_format == "raw":
+            # Fancy indexing only copies the requested frames out of the
+            # memory-mapped shard.
+            return data[rows]
+        offsets = index["offsets"]
+        return np.stack(
+            [
+                np.asarray(
+                    Image.open(
+                        io.BytesIO(data[offsets[row] : offsets[row + 1]])
+                    )
+                )
+                for row in rows
+            ]
+        )
+
+
+def get_gaze_cache_path(cfg, split):
+    """
+    Get the path of the gaze point cache of a split. The file name holds a
+    hash of the gaze tracks directory and frame size the points are read
+    with, so changing them never reuses a stale cache.
+    Args:
+        cfg (CfgNode): configs.
+        split (str): the split name, `train`, `val` or `test`.
+    Returns:
+        cache_path (str): path of the `.npy` gaze point cache.
+    """
+    cache_dir = cfg.MECCANO.GAZE_CACHE_DIR
+    if cache_dir == "":
+        cache_dir = os.path.join(cfg.DATA.PATH_TO_DATA_DIR, "gaze_cache")
+    key = hashlib.sha1(
+        json.dumps(
+            [
+                os.path.abspath(cfg.MECCANO.GAZE_DIR),
+                list(cfg.MECCANO.GAZE_FRAME_SIZE),
+            ]
+        ).encode("utf-8")
+    ).hexdigest()[:16]
+    return os.path.join(
+        cache_dir, "{}_t{}_{}.npy".format(split, cfg.DATA.NUM_FRAMES, key)
+    )
+
+
+def load_gaze_track(path, frame_size):
+    """
+    Load the gaze track of one video. The csv file has a header and one
+    `frame,x,y` row per frame, with the gaze point in pixel coordinates.
+    Args:
+        path (str): path of the csv file.
+        frame_size (list): width and height of the frames the gaze points
+            refer to.
+    Returns:
+        gaze (ndarray): array of dimension `max frame + 1` x 2 with the gaze
+            point of every frame normalized to [0, 1]. Frames without a gaze
+            point are NaN.
+    """
+    track = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+    frame_ids = track[:, 0].astype(np.int64)
+    gaze = np.full((frame_ids.max() + 1, 2), np.nan, dtype=np.float32)
+    gaze[frame_ids] = track[:, 1:3] / np.asarray(frame_size, dtype=np.float32)
+    return gaze
+
+
+def render_gaze_heatmaps(points, size, sigma):
+    """
+    Render Gaussian heatmaps centered on the given gaze points.
+    Args:
+        points (ndarray): gaze points normalized to [0, 1], with dimension
+            `...` x 2. NaN points render as all-ones maps, so that frames
+            without gaze are left unweighted.
+        size (int): spatial size of the heatmaps.
+        sigma (float): standard deviation of the Gaussian, relative to size.
+    Returns:
+        heatmaps (ndarray): heatmaps with peak value 1, with dimension
+            `...` x `size` x `size`.
+    """
+    # Centers of the cells of the heatmap grid, in cell units.
+    grid = np.arange(size, dtype=np.float32) + 0.5
+    x = points[..., 0, None] * size
+    y = points[..., 1, None] * size
+    dx = (grid - x) ** 2
+    dy = (grid - y) ** 2
+    heatmaps = np.exp(
+        -(dy[..., :, None] + dx[..., None, :]) / (2 * (sigma * size) ** 2)
+    )
+    return np.nan_to_num(heatmaps, nan=1.0).astype(np.float32)
+
+
+def crop_gaze_points(points, params, crop_size):
+    """
+    Map gaze points from full frame coordinates to the coordinates of a
+    scaled, cropped and flipped clip.
+    Args:
+        points (ndarray): gaze points normalized to [0, 1] in the full frame,
+            with dimension `...` x 2.
+        params (list): the scaled height and width, the y and x offsets of
+            the crop in the scaled frames, and 1 if the crop is flipped, from
+            `utils.get_spatial_params`.
+        crop_size (int): the size of height and width of the crop.
+    Returns:
+        points (ndarray): gaze points normalized to [0, 1] in the crop. Points
+            outside of the crop are out of [0, 1], NaN points stay NaN.
+    """
+    new_height, new_width, y_offset, x_offset, flip = params
+    x = (points[..., 0] * new_width - x_offset) / crop_size
+    y = (points[..., 1] * new_height - y_offset) / crop_size
+    if flip:
+        x = 1.0 - x
+    return np.stack([x, y], axis=-1).astype(np.float32)
+
+
+def build_gaze_cache(cfg, cache_path, segments):
+    """
+    Read the gaze points of the temporally sampled frames of every segment of
+    a split and store them in a single `num segments` x `num frames` x 2
+    float32 array, normalized to the full frame. Frames without gaze are NaN.
+    The heatmaps depend on the spatial sampling of every clip, and are
+    rendered from these points by the loader, see `crop_gaze_points`.
+    Args:
+        cfg (CfgNode): configs.
+        cache_path (str): path to write the cache to.
+        segments (list): list of `(video name, frame start, frame end)`.
+    """
+    # Imported here since sampling depends on torch and this module is also
+    # used by the offline packer.
+    from .sampling import get_temporal_sample_index
+
+    points = np.full(
+        (len(segments), cfg.DATA.NUM_FRAMES, 2), np.nan, dtype=np.float32
+    )
+    by_video = {}
+    for segment_idx, (video_name, frame_start, frame_end) in enumerate(segments):
+        by_video.setdefault(video_name, []).append(
+            (segment_idx, frame_start, frame_end)
+        )
+    for video_name, video_segments in by_video.items():
+        gaze_path = os.path.join(cfg.MECCANO.GAZE_DIR, video_name + ".csv")
+        if not os.path.exists(gaze_path):
+            logger.warning("No gaze track found at {}".format(gaze_path))
+            continue
+        gaze = load_gaze_track(gaze_path, cfg.MECCANO.GAZE_FRAME_SIZE)
+        rows = [segment_idx for segment_idx, _, _ in video_segments]
+        frame_idx = np.stack(
+            [
+                get_temporal_sample_index(
+                    frame_start, frame_end, cfg.DATA.NUM_FRAMES
+                ).numpy()
+                for _, frame_start, frame_end in video_segments
+            ]
+        )
+        # Frames past the end of the track have no gaze.
+        video_points = np.full(frame_idx.shape + (2,), np.nan, dtype=np.float32)
+        valid = frame_idx < len(gaze)
+        video_points[valid] = gaze[frame_idx[valid]]
+        points[rows] = video_points
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    # Every rank may build the cache, write to a private file and move it in
+    # place. np.save appends `.npy` to the file name if it is missing.
+    tmp_path = cache_path[: -len(".npy")] + ".{}.tmp.npy".format(os.getpid())
+    np.save(tmp_path, points)
+    os.replace(tmp_path, cache_path)
+    logger.info(
+        "Cached the gaze points of {} segments into {}".format(
+            len(segments), cache_path
+        )
+    )
@@ -7,6 +7,24 @@ import torch
 import torchvision.io as io
 
 
+def get_temporal_sample_index(start_idx, end_idx, num_samples):
+    """
+    Compute the absolute frame indices that `temporal_sampling` keeps when
+    sampling num_samples frames between start_idx and end_idx. This allows
+    a loader to decode only the frames that will actually be used.
+    Args:
+        start_idx (int): the index of the start frame.
+        end_idx (int): the index of the end frame.
+        num_samples (int): number of frames to sample.
+    Returns:
+        index (tensor): a long tensor of `num_samples` frame indices in the
+            range [start_idx, end_idx].
+    """
+    index = torch.linspace(start_idx, end_idx, num_samples)
+    index = torch.clamp(index, 0, end_idx).long()
+    return index
+
+
 def temporal_sampling(frames, start_idx, end_idx, num_samples):
     """
     Given the start and end frame index, sample num_samples frames between
@@ -23,9 +41,7 @@ def temporal_sampling(frames, start_idx, end_idx, num_samples):
     """
 
 
-    length = (end_idx - start_idx)+1
-    index = torch.linspace(start_idx, end_idx, num_samples)
-    index = torch.clamp(index, 0, end_idx).long()
+    index = get_temporal_sample_index(start_idx, end_idx, num_samples)
     index = index-start_idx
 
     out_frames = torch.index_select(frames, 0, index)
@@ -121,7 +121,7 @@ class Ssv2(torch.utils.data.Dataset):
         assert pathmgr.exists(path_to_file), "{} dir not found".format(path_to_file)
 
         self._path_to_videos, _ = utils.load_image_lists(
-            path_to_file, self.cfg.DATA.PATH_PREFIX
+            path_to_file, self.cfg.DATA.PATH_PREFIX, return_index=True
         )
 
         assert len(self._path_to_videos) == len(self._video_names), (
@@ -129,19 +129,22 @@ class Ssv2(torch.utils.data.Dataset):
             len(self._video_names),
         )
 
-        # From dict to list.
-        new_paths, new_labels = [], []
+        # Order the videos as the labels.
+        name_to_video_idx = {
+            self._path_to_videos.get_video_name(video_idx): video_idx
+            for video_idx in range(len(self._path_to_videos))
+        }
+        video_indices, new_labels = [], []
         for index in range(len(self._video_names)):
-            if self._video_names[index] in self._path_to_videos:
-                new_paths.append(self._path_to_videos[self._video_names[index]])
+            if self._video_names[index] in name_to_video_idx:
+                video_indices.append(name_to_video_idx[self._video_names[index]])
                 new_labels.append(self._labels[index])
 
         self._labels = new_labels
-        self._path_to_videos = new_paths
 
         # Extend self when self._num_clips > 1 (during testing).
-        self._path_to_videos = list(
-            chain.from_iterable([[x] * self._num_clips for x in self._path_to_videos])
+        self._path_to_videos = self._path_to_videos.select(
+            np.repeat(video_indices, self._num_clips)
         )
         self._labels = list(
             chain.from_iterable([[x] * self._num_clips for x in self._labels])
@@ -282,16 +285,12 @@ class Ssv2(torch.utils.data.Dataset):
                     crop_size,
                 )
         else:
-            # Perform color normalization.
-            frames = utils.tensor_normalize(
-                frames, self.cfg.DATA.MEAN, self.cfg.DATA.STD
-            )
-
-            # T H W C -> C T H W.
-            frames = frames.permute(3, 0, 1, 2)
-            # Perform data augmentation.
-            frames = utils.spatial_sampling(
+            # Perform data augmentation on the uint8 frames, then color
+            # normalization of the crop only. T H W C -> C T H W.
+            frames = utils.normalized_spatial_sampling(
                 frames,
+                self.cfg.DATA.MEAN,
+                self.cfg.DATA.STD,
                 spatial_idx=spatial_sample_index,
                 min_scale=min_scale,
                 max_scale=max_scale,
@@ -184,6 +184,104 @@ def horizontal_flip(prob, images, boxes=None):
     return images, flipped_boxes
 
 
+def _get_short_side_scale_size(height, width, size):
+    """
+    Get the size of frames scaled by `random_short_side_scale_jitter`.
+    Args:
+        height (int): height of the frames.
+        width (int): width of the frames.
+        size (int): the size of the short side after scaling.
+    Returns:
+        new_height (int): height of the scaled frames.
+        new_width (int): width of the scaled frames.
+    """
+    if (width <= height and width == size) or (height <= width and height == size):
+        return height, width
+    if width < height:
+        return int(math.floor((float(height) / width) * size)), size
+    return size, int(math.floor((float(width) / height) * size))
+
+
+def get_random_spatial_params(
+    height,
+    width,
+    min_size,
+    max_size,
+    crop_size,
+    inverse_uniform_sampling=False,
+    random_horizontal_flip=True,
+):
+    """
+    Draw the random short side scale, crop and flip of a clip, without
+    transforming it. The random draws are the ones of
+    `random_short_side_scale_jitter`, `random_crop` and `horizontal_flip`
+    applied in this order, so both give the same clip for the same seed.
+    Args:
+        height (int): height of the frames.
+        width (int): width of the frames.
+        min_size (int): the minimal size to scale the frames.
+        max_size (int): the maximal size to scale the frames.
+        crop_size (int): the size of height and width of the crop.
+        inverse_uniform_sampling (bool): see `random_short_side_scale_jitter`.
+        random_horizontal_flip (bool): if True, flip with probability 0.5.
+    Returns:
+        params (list): the scaled height and width, the y and x offsets of
+            the crop in the scaled frames, and 1 to flip the crop, 0 otherwise.
+    """
+    if inverse_uniform_sampling:
+        size = int(round(1.0 / np.random.uniform(1.0 / max_size, 1.0 / min_size)))
+    else:
+        size = int(round(np.random.uniform(min_size, max_size)))
+    new_height, new_width = _get_short_side_scale_size(height, width, size)
+
+    y_offset = 0
+    x_offset = 0
+    if new_height != crop_size or new_width != crop_size:
+        if new_height > crop_size:
+            y_offset = int(np.random.randint(0, new_height - crop_size))
+        if new_width > crop_size:
+            x_offset = int(np.random.randint(0, new_width - crop_size))
+    flip = 0
+    if random_horizontal_flip and np.random.uniform() < 0.5:
+        flip = 1
+    return [new_height, new_width, y_offset, x_offset, flip]
+
+
+def get_uniform_spatial_params(height, width, scale_size, crop_size, spatial_idx):
+    """
+    Get the short side scale and uniform crop of a clip, without transforming
+    it, in the format of `get_random_spatial_params`. Both give the same clip
+    as `random_short_side_scale_jitter` with `scale_size` as min and max size
+    followed by `uniform_crop`.
+    Args:
+        height (int): height of the frames.
+        width (int): width of the frames.
+        scale_size (int): the size of the short side after scaling.
+        crop_size (int): the size of height and width of the crop.
+        spatial_idx (int): 0, 1, or 2 for left, center, and right crop if width
+            is larger than height. Or 0, 1, or 2 for top, center, and bottom
+            crop if height is larger than width.
+    Returns:
+        params (list): the scaled height and width, the y and x offsets of
+            the crop in the scaled frames, and 0 as the crop is not flipped.
+    """
+    assert spatial_idx in [0, 1, 2]
+    new_height, new_width = _get_short_side_scale_size(height, width, scale_size)
+    y_offset = int(math.ceil((new_height - crop_size) / 2))
+    x_offset = int(math.ceil((new_width - crop_size) / 2))
+    if new_height > new_width:
+        if spatial_idx == 0:
+            y_offset = 0
+        elif spatial_idx == 2:
+            y_offset = new_height - crop_size
+    else:
+        if spatial_idx == 0:
+            x_offset = 0
+        elif spatial_idx == 2:
+            x_offset = new_width - crop_size
+    return [new_height, new_width, y_offset, x_offset, 0]
+
+
 def uniform_crop(images, size, spatial_idx, boxes=None, scale_size=None):
     """
     Perform uniform spatial sampling on the images and corresponding boxes.
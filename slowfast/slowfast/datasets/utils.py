@@ -16,6 +16,8 @@ from torch.utils.data.distributed import DistributedSampler
 from torchvision import transforms
 
 from . import transform as transform
+from .batch_transform import batch_spatial_sampling
+from .frame_path_index import FramePathIndex
 
 from .random_erasing import RandomErasing
 from .transform import create_random_augment
@@ -100,7 +102,10 @@ def pack_pathway_output(cfg, frames):
             frames,
             1,
             torch.linspace(
-                0, frames.shape[1] - 1, frames.shape[1] // cfg.SLOWFAST.ALPHA
+                0,
+                frames.shape[1] - 1,
+                frames.shape[1] // cfg.SLOWFAST.ALPHA,
+                device=frames.device,
             ).long(),
         )
         frame_list = [slow_pathway, fast_pathway]
@@ -188,6 +193,126 @@ def spatial_sampling(
     return frames
 
 
+def get_spatial_params(
+    height,
+    width,
+    spatial_idx=-1,
+    min_scale=256,
+    max_scale=320,
+    crop_size=224,
+    random_horizontal_flip=True,
+    inverse_uniform_sampling=False,
+):
+    """
+    Draw the short side scale, crop and flip of `spatial_sampling` for frames
+    of the given size, without transforming them. The random draws are the
+    ones of `spatial_sampling`.
+    Args:
+        height (int): height of the frames.
+        width (int): width of the frames.
+        spatial_idx (int): if -1, perform random spatial sampling. If 0, 1,
+            or 2, perform uniform spatial sampling, see `spatial_sampling`.
+        min_scale (int): the minimal size of scaling.
+        max_scale (int): the maximal size of scaling.
+        crop_size (int): the size of height and width used to crop the
+            frames.
+        random_horizontal_flip (bool): if True, flip with probability 0.5.
+        inverse_uniform_sampling (bool): see `spatial_sampling`.
+    Returns:
+        params (list): the parameters of the clip, see
+            `transform.get_random_spatial_params`.
+    """
+    assert spatial_idx in [-1, 0, 1, 2]
+    if spatial_idx == -1:
+        return transform.get_random_spatial_params(
+            height,
+            width,
+            min_scale,
+            max_scale,
+            crop_size,
+            inverse_uniform_sampling,
+            random_horizontal_flip,
+        )
+    # The testing is deterministic and no jitter should be performed.
+    assert len({min_scale, max_scale}) == 1
+    # Make the draw of `random_short_side_scale_jitter`, so the random
+    # stream is the one of `spatial_sampling`.
+    np.random.uniform(min_scale, max_scale)
+    return transform.get_uniform_spatial_params(
+        height, width, min_scale, crop_size, spatial_idx
+    )
+
+
+def normalized_crop(frames, params, mean, std, crop_size):
+    """
+    Scale, crop and flip uint8 frames with the given parameters, then
+    normalize the crop.
+    Args:
+        frames (tensor): uint8 frames of images sampled from the video. The
+            dimension is `num frames` x `height` x `width` x `channel`.
+        params (list): the parameters of the clip, from `get_spatial_params`.
+        mean (list): mean value to subtract.
+        std (list): std to divide.
+        crop_size (int): the size of height and width of the crop.
+    Returns:
+        frames (tensor): normalized crop, the dimension is `channel` x
+            `num frames` x `crop size` x `crop size`.
+    """
+    frames = batch_spatial_sampling(
+        frames[None], torch.tensor([params]), crop_size
+    )[0]
+    mean = torch.tensor(mean).view(-1, 1, 1, 1)
+    std = torch.tensor(std).view(-1, 1, 1, 1)
+    return frames.div_(255.0).sub_(mean).div_(std)
+
+
+def normalized_spatial_sampling(
+    frames,
+    mean,
+    std,
+    spatial_idx=-1,
+    min_scale=256,
+    max_scale=320,
+    crop_size=224,
+    random_horizontal_flip=True,
+    inverse_uniform_sampling=False,
+):
+    """
+    Perform the short side scale, crop and flip of `spatial_sampling` on uint8
+    frames, then normalize the crop. The result matches `tensor_normalize`
+    followed by `spatial_sampling` for the same seed, but the full resolution
+    frames are never converted to float: only the pixels of the crop are
+    interpolated and normalized.
+    Args:
+        frames (tensor): uint8 frames of images sampled from the video. The
+            dimension is `num frames` x `height` x `width` x `channel`.
+        mean (list): mean value to subtract.
+        std (list): std to divide.
+        spatial_idx (int): if -1, perform random spatial sampling. If 0, 1,
+            or 2, perform uniform spatial sampling, see `spatial_sampling`.
+        min_scale (int): the minimal size of scaling.
+        max_scale (int): the maximal size of scaling.
+        crop_size (int): the size of height and width used to crop the
+            frames.
+        random_horizontal_flip (bool): if True, flip with probability 0.5.
+        inverse_uniform_sampling (bool): see `spatial_sampling`.
+    Returns:
+        frames (tensor): normalized crop, the dimension is `channel` x
+            `num frames` x `crop size` x `crop size`.
+    """
+    params = get_spatial_params(
+        frames.shape[1],
+        frames.shape[2],
+        spatial_idx,
+        min_scale,
+        max_scale,
+        crop_size,
+        random_horizontal_flip,
+        inverse_uniform_sampling,
+    )
+    return normalized_crop(frames, params, mean, std, crop_size)
+
+
 def as_binary_vector(labels, num_classes):
     """
     Construct binary label vector given a list of label indices.
@@ -235,7 +360,9 @@ def convert_to_video_level_labels(labels):
     return labels
 
 
-def load_image_lists(frame_list_file, prefix="", return_list=False):
+def load_image_lists(
+    frame_list_file, prefix="", return_list=False, return_index=False
+):
     """
     Load image paths and labels from a "frame list".
     Each line of the frame list contains:
@@ -244,9 +371,14 @@ def load_image_lists(frame_list_file, prefix="", return_list=False):
         frame_list_file (string): path to the frame list.
         prefix (str): the prefix for the path.
         return_list (bool): if True, return a list. If False, return a dict.
+        return_index (bool): if True, return the image paths as a
+            FramePathIndex of the videos in the order of the file, with their
+            names, and the labels as a list. The packed paths are not copied
+            in every data loader worker, unlike lists of paths.
     Returns:
-        image_paths (list or dict): list of list containing path to each frame.
-            If return_list is False, then return in a dict form.
+        image_paths (list or dict or FramePathIndex): list of list containing
+            path to each frame. If return_list is False, then return in a dict
+            form.
         labels (list or dict): list of list containing label of each frame.
             If return_list is False, then return in a dict form.
     """
@@ -270,6 +402,13 @@ def load_image_lists(frame_list_file, prefix="", return_list=False):
             else:
                 labels[video_name].append([])
 
+    if return_index:
+        keys = list(image_paths.keys())
+        labels = [labels[key] for key in keys]
+        image_paths = FramePathIndex(
+            [image_paths[key] for key in keys], video_names=keys
+        )
+        return image_paths, labels
     if return_list:
         keys = image_paths.keys()
         image_paths = [image_paths[key] for key in keys]
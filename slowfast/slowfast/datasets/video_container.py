@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
 
+import collections
+import os
+
 import av
 
 
@@ -27,3 +30,58 @@ def get_video_container(path_to_vid, multi_thread_decode=False, backend="pyav"):
         return container
     else:
         raise NotImplementedError("Unknown backend {}".format(backend))
+
+
+class VideoContainerPool(object):
+    """
+    LRU pool of open PyAV containers, so that the clips sampled from a video
+    reuse its container instead of opening and parsing the video again. The
+    pool belongs to the process using it: a data loader worker forked from
+    the process owning a pool starts with an empty pool.
+    """
+
+    def __init__(self, capacity, multi_thread_decode=False):
+        """
+        Args:
+            capacity (int): maximum number of open containers.
+            multi_thread_decode (bool): if True, perform multi-thread decoding.
+        """
+        self._capacity = capacity
+        self._multi_thread_decode = multi_thread_decode
+        self._containers = collections.OrderedDict()
+        self._pid = os.getpid()
+
+    def get(self, path_to_vid):
+        """
+        Get the open container of a video, opening it if it is not pooled.
+        Args:
+            path_to_vid (str): path to the video.
+        Returns:
+            container (container): video container, to be left open.
+        """
+        if self._pid != os.getpid():
+            # The containers of the parent process are not shared.
+            self._containers = collections.OrderedDict()
+            self._pid = os.getpid()
+        if path_to_vid in self._containers:
+            self._containers.move_to_end(path_to_vid)
+            return self._containers[path_to_vid]
+        container = get_video_container(
+            path_to_vid, self._multi_thread_decode, backend="pyav"
+        )
+        self._containers[path_to_vid] = container
+        if len(self._containers) > self._capacity:
+            _, evicted = self._containers.popitem(last=False)
+            evicted.close()
+        return container
+
+    def discard(self, path_to_vid):
+        """
+        Close and remove the container of a video from the pool, e.g. after
+        it failed to decode.
+        Args:
+            path_to_vid (str): path to the video.
+        """
+        container = self._containers.pop(path_to_vid, None)
+        if container is not None and self._pid == os.getpid():
+            container.close()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+"""
+Index of the frame and keyframe PTS of the videos of a dataset, used by the
+PyAV decoder to seek to the exact start of the GOP of a clip and to stop
+decoding at its last frame. See DATA.VIDEO_INDEX_DIR and
+tools/build_video_index.py.
+"""
+
+import os
+from multiprocessing import Pool
+
+import av
+import numpy as np
+import slowfast.utils.logging as logging
+
+logger = logging.get_logger(__name__)
+
+
+def probe_video_pts(path_to_vid):
+    """
+    Read the PTS of the frames of the first video stream of a video from its
+    packets, without decoding them.
+    Args:
+        path_to_vid (str): path to the video.
+    Returns:
+        frame_pts (ndarray): sorted int64 PTS of the frames.
+        keyframe_pts (ndarray): sorted int64 PTS of the keyframes.
+    """
+    frame_pts = []
+    keyframe_pts = []
+    with av.open(path_to_vid) as container:
+        for packet in container.demux(video=0):
+            # Flushing packets have no PTS, and discarded packets are not
+            # returned by the decoder.
+            if packet.pts is None or packet.is_discard:
+                continue
+            frame_pts.append(packet.pts)
+            if packet.is_keyframe:
+                keyframe_pts.append(packet.pts)
+    return (
+        np.sort(np.array(frame_pts, dtype=np.int64)),
+        np.sort(np.array(keyframe_pts, dtype=np.int64)),
+    )
+
+
+def _probe(path_to_vid):
+    try:
+        return path_to_vid, probe_video_pts(path_to_vid)
+    except Exception as e:
+        logger.info("Failed to index video {} with error {}".format(path_to_vid, e))
+        return path_to_vid, (None, None)
+
+
+def build_video_index(paths, num_workers=1):
+    """
+    Index the PTS of videos. Videos failing to be probed or without frames are
+    not indexed, and are decoded without the index.
+    Args:
+        paths (list): paths of the videos.
+        num_workers (int): number of processes probing the videos.
+    Returns:
+        (VideoPtsIndex): the index.
+    """
+    indexed_paths, frame_pts, keyframe_pts = [], [], []
+    with Pool(max(num_workers, 1)) as pool:
+        for path, (video_frame_pts, video_keyframe_pts) in pool.imap_unordered(
+            _probe, sorted(set(paths)), chunksize=16
+        ):
+            if video_frame_pts is None or len(video_frame_pts) == 0:
+                continue
+            indexed_paths.append(path)
+            frame_pts.append(video_frame_pts)
+            keyframe_pts.append(video_keyframe_pts)
+    return VideoPtsIndex(indexed_paths, frame_pts, keyframe_pts)
+
+
+def _concat(arrays):
+    """
+    Args:
+        arrays (list): list of 1D int64 arrays.
+    Returns:
+        values (ndarray): the concatenated arrays.
+        starts (ndarray): `len(arrays) + 1` offsets of the arrays in values.
+    """
+    starts = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(array) for array in arrays], out=starts[1:])
+    values = (
+        np.concatenate(arrays) if len(arrays) > 0 else np.zeros(0, np.int64)
+    )
+    return values.astype(np.int64), starts
+
+
+class VideoPtsIndex(object):
+    """
+    Frame and keyframe PTS of videos packed in a few numpy arrays, looked up
+    by video path. The paths are stored sorted in a fixed width bytes array,
+    so lookups are binary searches and the index holds no Python object per
+    video, and a loaded index can be memory mapped by all the data loader
+    workers.
+    """
+
+    # Arrays holding the index, see `save` and `load`.
+    ARRAY_NAMES = (
+        "paths",
+        "frame_pts",
+        "frame_starts",
+        "keyframe_pts",
+        "keyframe_starts",
+    )
+
+    def __init__(self, paths, frame_pts, keyframe_pts):
+        """
+        Args:
+            paths (list): paths of the videos.
+            frame_pts (list): sorted PTS of the frames of every video, from
+                `probe_video_pts`.
+            keyframe_pts (list): sorted PTS of the keyframes of every video.
+        """
+        order = sorted(range(len(paths)), key=lambda i: paths[i])
+        self._paths = np.array(
+            [paths[i].encode("utf-8") for i in order], dtype=np.bytes_
+        )
+        self._frame_pts, self._frame_starts = _concat(
+            [frame_pts[i] for i in order]
+        )
+        self._keyframe_pts, self._keyframe_starts = _concat(
+            [keyframe_pts[i] for i in order]
+        )
+
+    def __len__(self):
+        """
+        Returns:
+            (int): the number of videos.
+        """
+        return len(self._paths)
+
+    @property
+    def num_frames(self):
+        """
+        Returns:
+            (int): the total number of frames of the videos.
+        """
+        return len(self._frame_pts)
+
+    @property
+    def num_keyframes(self):
+        """
+        Returns:
+            (int): the total number of keyframes of the videos.
+        """
+        return len(self._keyframe_pts)
+
+    def get(self, path_to_vid):
+        """
+        Args:
+            path_to_vid (str): path to the video.
+        Returns:
+            frame_pts (ndarray): sorted PTS of the frames of the video, None if
+                the video is not indexed.
+            keyframe_pts (ndarray): sorted PTS of the keyframes of the video,
+                None if the video is not indexed.
+        """
+        key = path_to_vid.encode("utf-8")
+        video_idx = int(np.searchsorted(self._paths, key))
+        if video_idx == len(self._paths) or self._paths[video_idx] != key:
+            return None, None
+        return (
+            self._frame_pts[
+                self._frame_starts[video_idx] : self._frame_starts[video_idx + 1]
+            ],
+            self._keyframe_pts[
+                self._keyframe_starts[video_idx] : self._keyframe_starts[
+                    video_idx + 1
+                ]
+            ],
+        )
+
+    def save(self, path):
+        """
+        Save the arrays of the index to a directory, one `.npy` file per
+        array.
+        Args:
+            path (str): directory to create.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(os.path.join(path, name + ".npy"), getattr(self, "_" + name))
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Load an index saved by `save`.
+        Args:
+            path (str): directory of the index.
+            mmap_mode (str or None): memory map the arrays with this mode, see
+                `numpy.load`.
+        Returns:
+            (VideoPtsIndex): the index.
+        """
+        index = cls.__new__(cls)
+        for name in cls.ARRAY_NAMES:
+            setattr(
+                index,
+                "_" + name,
+                np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode),
+            )
+        return index
+
+
+def get_clip_pts(frame_pts, keyframe_pts, start_idx, end_idx):
+    """
+    Get the PTS range of the frames to decode for a clip, and the PTS of the
+    keyframe starting the GOP of its first frame. The range ends with the
+    frame following the clip, which the decoding with a margin returns too,
+    and temporal sampling may pick.
+    Args:
+        frame_pts (ndarray): sorted PTS of the frames of the video.
+        keyframe_pts (ndarray): sorted PTS of the keyframes of the video.
+        start_idx (float): index of the first frame of the clip.
+        end_idx (float): index of the last frame of the clip.
+    Returns:
+        start_pts (int): PTS of the first frame to decode.
+        end_pts (int): PTS of the last frame to decode.
+        seek_pts (int): PTS of the keyframe to seek to.
+    """
+    last_idx = len(frame_pts) - 1
+    start_pts = int(frame_pts[min(int(np.ceil(start_idx)), last_idx)])
+    end_pts = int(frame_pts[min(max(int(np.floor(end_idx)) + 1, 0), last_idx)])
+    end_pts = max(start_pts, end_pts)
+    keyframe_idx = int(np.searchsorted(keyframe_pts, start_pts, side="right"))
+    seek_pts = int(keyframe_pts[keyframe_idx - 1]) if keyframe_idx > 0 else 0
+    return start_pts, end_pts, seek_pts
@@ -6,6 +6,7 @@
 import slowfast.utils.logging as logging
 import torch
 from fvcore.common.registry import Registry
+from slowfast.models.pruning_helper import apply_pruned_manifest
 from torch.distributed.algorithms.ddp_comm_hooks import default as comm_hooks_default
 
 logger = logging.get_logger(__name__)
@@ -40,6 +41,18 @@ def build_model(cfg, gpu_id=None):
     name = cfg.MODEL.MODEL_NAME
     model = MODEL_REGISTRY.get(name)(cfg)
 
+    if cfg.PRUNING.ENABLE:
+        # Imported here since checkpoint imports the models package.
+        from slowfast.utils.checkpoint import load_pruned_manifest
+
+        # Construct the slim architecture of a pruned checkpoint.
+        manifest = load_pruned_manifest(cfg)
+        if manifest is not None:
+            num_resized = apply_pruned_manifest(model, manifest)
+            logger.info(
+                "Built pruned model with {} resized layers".format(num_resized)
+            )
+
     if cfg.BN.NORM_TYPE == "sync_batchnorm_apex":
         try:
             import apex
@@ -552,7 +552,6 @@ class ResNetModBasicHead(nn.Module):
             )
 
     def forward(self, inputs, gaze_attention_maps):
-        #print("FORWARD-GAZE", gaze_attention_maps)
         assert (
             len(inputs) == self.num_pathways
         ), "Input tensor does not contain {} pathway".format(self.num_pathways)
@@ -586,40 +585,43 @@ class ResNetModBasicHead(nn.Module):
 
 
 def gaze_attention(feature_map, gaze_attention_maps):
-
-    #input: 
-    #   feature_map[0]: N, C, T, H, W SLOWPATH:  1, 2048, 8, 8, 8
-    #   feature_map[1]: N, C, T1, H, W FASTPATH: 1, 256, 32, 8, 8 
-    #   gaze: T1, x, y
-    
-    N = feature_map[0].shape[0]
-    width = feature_map[0].shape[3] 
-    height = feature_map[0].shape[4]
-    slow_channels = feature_map[0].shape[1]
-    fast_channels = feature_map[1].shape[1]
+    """
+    Weight the SlowFast features with the gaze attention maps. The maps are
+    given at the temporal resolution of the fast pathway and are downsampled
+    to the slow pathway by strided indexing. Every channel of a pathway is
+    multiplied with the map of its frame in a single broadcast operation, on
+    the device of the features.
+    Args:
+        feature_map (list): the slow and fast pathway features, with
+            dimension `N` x `C` x `T` x `H` x `W` and `N` x `C1` x `T1` x `H` x
+            `W`, e.g. 1x2048x8x8x8 and 1x256x32x8x8.
+        gaze_attention_maps (tensor): the gaze attention maps, with dimension
+            `N` x `T'` x `H` x `W` where `T'` >= `T1`.
+    Returns:
+        feature_map (list): the gaze weighted slow and fast pathway features.
+            The features are updated in place unless autograd needs them.
+    """
     slow_T = feature_map[0].shape[2]
     fast_T = feature_map[1].shape[2]
-    sigma = height/2
-    slow_rescaled_gaze = torch.zeros([N,slow_T,2])
-    fast_rescaled_gaze = torch.zeros([N,fast_T, 2])
-    sampling_factor = 4
-    slow_attention_map = torch.zeros([N,slow_T, height, width], device="cuda")
-    fast_attention_map = torch.zeros([N,fast_T, height, width], device="cuda")
-     
-    for n in range(N):
-        slow_count = 0
-        for t in range(fast_T):
-            fast_attention_map[n][t] = gaze_attention_maps[n][t]
-            if(t%sampling_factor == 0):
-                slow_attention_map[n][slow_count] = fast_attention_map[n][t]
-                slow_count += 1         
-
-    #multiplicate the attention map for each channel
-    for n in range(N):
-        for i in range(fast_channels):
-            feature_map[1][n][i] *= fast_attention_map[n]
-
-        for j in range(slow_channels):
-            feature_map[0][n][i] *= slow_attention_map[n]
-    
-    return feature_map
\ No newline at end of file
+    sampling_factor = fast_T // slow_T
+
+    fast_attention_map = gaze_attention_maps[:, :fast_T].to(
+        device=feature_map[1].device, dtype=feature_map[1].dtype
+    )
+    slow_attention_map = fast_attention_map[:, ::sampling_factor][:, :slow_T].to(
+        dtype=feature_map[0].dtype
+    )
+
+    # N x T x H x W -> N x 1 x T x H x W, broadcast over the channels.
+    attention_maps = [
+        slow_attention_map.unsqueeze(1),
+        fast_attention_map.unsqueeze(1),
+    ]
+    for pathway, attention_map in enumerate(attention_maps):
+        # The features are the output of an in-place ReLU, modifying them in
+        # place would break its backward pass.
+        if torch.is_grad_enabled() and feature_map[pathway].requires_grad:
+            feature_map[pathway] = feature_map[pathway] * attention_map
+        else:
+            feature_map[pathway].mul_(attention_map)
+    return feature_map
@@ -29,29 +29,42 @@ class DistillationLoss(nn.Module):
     This combines the standard task loss (e.g. cross entropy) with a distillation loss
     that makes the student model mimic the teacher's output distributions.
     """
-    def __init__(self, alpha=0.5, temperature=2.0, reduction="mean"):
+    def __init__(
+        self, alpha=0.5, temperature=2.0, reduction="mean", teacher_store=None
+    ):
         """
         Args:
             alpha (float): weight for balancing hard loss vs soft loss
             temperature (float): temperature for softening the teacher logits
             reduction (str): reduction method for the loss
+            teacher_store (TeacherLogitStore): optional store of precomputed
+                teacher logits, read when no teacher logits are given
         """
         super(DistillationLoss, self).__init__()
         self.alpha = alpha
         self.temperature = temperature
         self.reduction = reduction
+        self.teacher_store = teacher_store
         # Hard loss (standard cross-entropy with true labels)
         self.hard_loss_fn = nn.CrossEntropyLoss(reduction=reduction)
         
-    def forward(self, student_logits, teacher_logits, labels):
+    def forward(self, student_logits, teacher_logits, labels, index=None, aug_seed=0):
         """
         Args:
             student_logits (tensor): output from the student model
-            teacher_logits (tensor): output from the teacher model
+            teacher_logits (tensor or None): output from the teacher model. If
+                None, read the logits of the samples from the teacher store
             labels (tensor): ground truth labels
+            index (tensor): sample indices, used with the teacher store
+            aug_seed (int): augmentation seed, used with the teacher store
         Returns:
             loss (tensor): combined hard loss and distillation (soft) loss
         """
+        if teacher_logits is None:
+            assert self.teacher_store is not None and index is not None
+            teacher_logits = self.teacher_store.read(
+                aug_seed, index, device=student_logits.device
+            )
         # Hard Loss: cross-entropy with true labels
         hard_loss = self.hard_loss_fn(student_logits, labels)
         
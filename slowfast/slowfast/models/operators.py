@@ -60,7 +60,8 @@ class SE(nn.Module):
 
     def forward(self, x_in):
         # Check if input is quantized
-        if hasattr(x_in, 'is_quantized') and x_in.is_quantized:
+        # FX proxies are not tensors, so FX traces the floating point branch.
+        if isinstance(x_in, torch.Tensor) and x_in.is_quantized:
             # Save quantization parameters
             scale = x_in.q_scale()
             zero_point = x_in.q_zero_point()
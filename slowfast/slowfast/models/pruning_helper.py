@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+"""Physical channel removal for structurally pruned video models."""
+
+import torch
+import torch.nn as nn
+
+from slowfast.models.head_helper import X3DHead
+from slowfast.models.resnet_helper import (
+    BasicTransform,
+    BottleneckTransform,
+    X3DTransform,
+)
+
+# Norm layers that can be rebuilt with fewer channels.
+_BN_TYPES = (nn.BatchNorm1d, nn.BatchNorm2d, nn.BatchNorm3d)
+
+
+class ChannelGroup(object):
+    """
+    A set of channels that can be removed together without touching the rest
+    of the network. The channels are produced by `producers` (conv + norm
+    pairs whose output channels are removed), may go through `depthwise`
+    (conv + norm pairs with one group per channel) and `se` blocks, and are
+    read by `consumers` (convs or linears whose input channels are removed).
+    Channels feeding a residual addition are shared across blocks and are
+    never part of a group.
+
+    A channel is dead, and removing it leaves the outputs of the model
+    unchanged, when the filter of the last producer (`gate`) and its norm
+    affine parameters are all zero: the channel is then exactly zero after the
+    norm and after ReLU, Swish and SE. It is also dead when no layer reads
+    it: the input channel of every consumer and of the first layer of every
+    SE block is all zero.
+    """
+
+    def __init__(self, name, producers, consumers, depthwise=(), se=()):
+        """
+        Args:
+            name (str): name of the group, the prefix of its modules.
+            producers (list): list of (parent, conv name, norm name) of the
+                layers producing the channels. The norm name may be None.
+            consumers (list): list of (parent, layer name) of the conv or
+                linear layers reading the channels.
+            depthwise (list): list of (parent, conv name, norm name) of the
+                depthwise layers the channels go through.
+            se (list): list of the SE blocks the channels go through.
+        """
+        self.name = name
+        self.producers = list(producers)
+        self.consumers = list(consumers)
+        self.depthwise = list(depthwise)
+        self.se = list(se)
+
+    @property
+    def gate(self):
+        """
+        Returns:
+            conv (nn.Module): the last layer producing the channels.
+            norm (nn.Module or None): its norm layer.
+        """
+        parent, conv_name, norm_name = (self.depthwise or self.producers)[-1]
+        norm = getattr(parent, norm_name) if norm_name is not None else None
+        return getattr(parent, conv_name), norm
+
+    @property
+    def num_channels(self):
+        return self.gate[0].weight.shape[0]
+
+    def dead_channels(self):
+        """
+        Returns:
+            dead (tensor): bool tensor, True for the channels whose gate filter
+                and norm affine parameters are all zero, or whose input
+                weights are all zero in every layer reading them.
+        """
+        conv, norm = self.gate
+        weight = conv.weight.detach()
+        dead = weight.view(weight.shape[0], -1).abs().sum(1) == 0
+        if norm is not None and norm.affine:
+            dead &= (norm.weight.detach() == 0) & (norm.bias.detach() == 0)
+        unread = torch.ones_like(dead)
+        readers = [getattr(parent, name) for parent, name in self.consumers]
+        for layer in readers + [se.fc1 for se in self.se]:
+            weight = layer.weight.detach().transpose(0, 1)
+            unread &= weight.reshape(weight.shape[0], -1).abs().sum(1) == 0
+        return (dead | unread).cpu()
+
+
+def get_removable_layers(model, dim=0):
+    """
+    Get the layers whose pruned filters or input channels
+    `remove_dead_channels` physically removes: the gates of the channel
+    groups of the model for filter pruning, and the consumers of the channel
+    groups without SE for channel pruning. Pruning any other filter or input
+    channel only zeroes weights.
+    Args:
+        model (nn.Module): the model.
+        dim (int): 0 for filter pruning, 1 for input channel pruning.
+    Returns:
+        layers (list): the removable layers.
+    """
+    assert dim in [0, 1], "Unknown pruning dimension {}".format(dim)
+    layers = []
+    for group in get_channel_groups(model):
+        if dim == 0:
+            layers.append(group.gate[0])
+        elif not group.se:
+            layers.extend(getattr(parent, name) for parent, name in group.consumers)
+    return layers
+
+
+def get_channel_groups(model):
+    """
+    Find the removable channel groups of a ResNet, SlowFast or X3D model:
+    the inner channels of every BasicTransform, BottleneckTransform and
+    X3DTransform block and the inner channels of the X3D head. The channels
+    of the residual stream, and hence the input of ResNetBasicHead, are
+    shared across blocks and are left intact.
+    Args:
+        model (nn.Module): the model.
+    Returns:
+        groups (list): list of ChannelGroup, in the order of the modules.
+    """
+    groups = []
+    for name, module in model.named_modules():
+        if isinstance(module, X3DTransform):
+            if module.b.groups != module.b.in_channels:
+                continue
+            groups.append(
+                ChannelGroup(
+                    name,
+                    producers=[(module, "a", "a_bn")],
+                    depthwise=[(module, "b", "b_bn")],
+                    se=[module.se] if hasattr(module, "se") else [],
+                    consumers=[(module, "c")],
+                )
+            )
+        elif isinstance(module, BottleneckTransform):
+            # Grouped convs couple the channels of the two inner groups.
+            if module.b.groups != 1:
+                continue
+            groups.append(
+                ChannelGroup(
+                    name + ".a",
+                    producers=[(module, "a", "a_bn")],
+                    consumers=[(module, "b")],
+                )
+            )
+            groups.append(
+                ChannelGroup(
+                    name + ".b",
+                    producers=[(module, "b", "b_bn")],
+                    consumers=[(module, "c")],
+                )
+            )
+        elif isinstance(module, BasicTransform):
+            groups.append(
+                ChannelGroup(
+                    name,
+                    producers=[(module, "a", "a_bn")],
+                    consumers=[(module, "b")],
+                )
+            )
+        elif isinstance(module, X3DHead):
+            groups.append(
+                ChannelGroup(
+                    name + ".conv_5",
+                    producers=[(module, "conv_5", "conv_5_bn")],
+                    consumers=[(module, "lin_5")],
+                )
+            )
+            groups.append(
+                ChannelGroup(
+                    name + ".lin_5",
+                    producers=[
+                        (
+                            module,
+                            "lin_5",
+                            "lin_5_bn" if module.bn_lin5_on else None,
+                        )
+                    ],
+                    consumers=[(module, "projection")],
+                )
+            )
+    return [
+        group
+        for group in groups
+        if all(
+            type(getattr(parent, norm_name)) in _BN_TYPES
+            for parent, _, norm_name in group.producers + group.depthwise
+            if norm_name is not None
+        )
+    ]
+
+
+def _copy_flags(old, new):
+    # Flags read by the weight initialization, e.g. `final_conv`, and the
+    # train/eval mode, so eval models keep using the BN running stats.
+    for key in ["final_conv", "transform_final_bn"]:
+        if hasattr(old, key):
+            setattr(new, key, getattr(old, key))
+    return new.train(old.training)
+
+
+def _new_conv(conv, in_channels, out_channels, groups):
+    """
+    Build a conv like the given one, with different channel counts.
+    """
+    new = type(conv)(
+        in_channels,
+        out_channels,
+        kernel_size=conv.kernel_size,
+        stride=conv.stride,
+        padding=conv.padding,
+        dilation=conv.dilation,
+        groups=groups,
+        bias=conv.bias is not None,
+        padding_mode=conv.padding_mode,
+    ).to(conv.weight)
+    return _copy_flags(conv, new)
+
+
+def _new_bn(bn, num_features):
+    new = type(bn)(
+        num_features,
+        eps=bn.eps,
+        momentum=bn.momentum,
+        affine=bn.affine,
+        track_running_stats=bn.track_running_stats,
+    ).to(bn.weight if bn.affine else bn.running_mean)
+    return _copy_flags(bn, new)
+
+
+def _new_linear(linear, in_features, out_features):
+    new = nn.Linear(
+        in_features, out_features, bias=linear.bias is not None
+    ).to(linear.weight)
+    return _copy_flags(linear, new)
+
+
+def _shrink_conv(conv, out_idx=None, in_idx=None, depthwise=False):
+    """
+    Build a copy of a conv with only the given output/input channels.
+    """
+    weight = conv.weight.detach()
+    bias = conv.bias.detach() if conv.bias is not None else None
+    if out_idx is not None:
+        weight = weight[out_idx]
+        bias = bias[out_idx] if bias is not None else None
+    if in_idx is not None and not depthwise:
+        weight = weight[:, in_idx]
+    out_channels = weight.shape[0]
+    if depthwise:
+        new = _new_conv(conv, out_channels, out_channels, out_channels)
+    else:
+        new = _new_conv(
+            conv, weight.shape[1] * conv.groups, out_channels, conv.groups
+        )
+    new.weight.data.copy_(weight)
+    if bias is not None:
+        new.bias.data.copy_(bias)
+    return new
+
+
+def _shrink_linear(linear, in_idx):
+    weight = linear.weight.detach()[:, in_idx]
+    new = _new_linear(linear, weight.shape[1], weight.shape[0])
+    new.weight.data.copy_(weight)
+    if linear.bias is not None:
+        new.bias.data.copy_(linear.bias.detach())
+    return new
+
+
+def _shrink_bn(bn, idx):
+    new = _new_bn(bn, len(idx))
+    if bn.affine:
+        new.weight.data.copy_(bn.weight.detach()[idx])
+        new.bias.data.copy_(bn.bias.detach()[idx])
+    if bn.track_running_stats:
+        new.running_mean.copy_(bn.running_mean[idx])
+        new.running_var.copy_(bn.running_var[idx])
+        new.num_batches_tracked.copy_(bn.num_batches_tracked)
+    return new
+
+
+def shrink_group(group, keep):
+    """
+    Physically keep only the given channels of a group.
+    Args:
+        group (ChannelGroup): the channel group.
+        keep (tensor): indices of the channels to keep.
+    """
+    keep = torch.as_tensor(keep, dtype=torch.long)
+    for parent, conv_name, norm_name in group.producers:
+        conv = getattr(parent, conv_name)
+        keep = keep.to(conv.weight.device)
+        setattr(parent, conv_name, _shrink_conv(conv, out_idx=keep))
+        if norm_name is not None:
+            norm = getattr(parent, norm_name)
+            setattr(parent, norm_name, _shrink_bn(norm, keep))
+    for parent, conv_name, norm_name in group.depthwise:
+        conv = getattr(parent, conv_name)
+        setattr(
+            parent, conv_name, _shrink_conv(conv, out_idx=keep, depthwise=True)
+        )
+        setattr(parent, norm_name, _shrink_bn(getattr(parent, norm_name), keep))
+    for se in group.se:
+        se.fc1 = _shrink_conv(se.fc1, in_idx=keep)
+        se.fc2 = _shrink_conv(se.fc2, out_idx=keep)
+    for parent, layer_name in group.consumers:
+        layer = getattr(parent, layer_name)
+        if isinstance(layer, nn.Linear):
+            setattr(parent, layer_name, _shrink_linear(layer, keep))
+        else:
+            setattr(parent, layer_name, _shrink_conv(layer, in_idx=keep))
+
+
+def remove_dead_channels(model):
+    """
+    Remove the dead channels of every channel group of the model. At least
+    one channel is kept per group so that the network stays connected.
+    Args:
+        model (nn.Module): the model, modified in place.
+    Returns:
+        spec (dict): the number of channels of every group of the model, keyed
+            by group name.
+    """
+    spec = {}
+    for group in get_channel_groups(model):
+        dead = group.dead_channels()
+        if dead.all():
+            dead[0] = False
+        if dead.any():
+            shrink_group(group, torch.nonzero(~dead).view(-1))
+        spec[group.name] = group.num_channels
+    return spec
+
+
+def _layer_dims(module):
+    """
+    Returns:
+        dims (dict): the channel counts of a conv, BN or linear layer, or None
+            for other modules.
+    """
+    if isinstance(module, nn.modules.conv._ConvNd):
+        return {
+            "in_channels": module.in_channels,
+            "out_channels": module.out_channels,
+            "groups": module.groups,
+        }
+    if type(module) in _BN_TYPES:
+        return {"num_features": module.num_features}
+    if type(module) is nn.Linear:
+        return {
+            "in_features": module.in_features,
+            "out_features": module.out_features,
+        }
+    return None
+
+
+def get_pruned_manifest(model):
+    """
+    Describe the architecture of a pruned model by the channel counts of its
+    conv, BN and linear layers. The manifest only holds python builtins, so it
+    can be stored next to the state dict and loaded with `weights_only=True`.
+    Args:
+        model (nn.Module): the pruned model.
+    Returns:
+        manifest (dict): `{"version": 1, "layers": {layer name: dims}}`, where
+            dims holds the channel counts and the type name of the layer.
+    """
+    layers = {}
+    for name, module in model.named_modules():
+        dims = _layer_dims(module)
+        if dims is not None:
+            dims["type"] = type(module).__name__
+            layers[name] = dims
+    return {"version": 1, "layers": layers}
+
+
+def apply_pruned_manifest(model, manifest):
+    """
+    Resize the conv, BN and linear layers of a dense model to the channel
+    counts of a pruned manifest, so the state dict of the pruned model can be
+    loaded into it. The weights of the resized layers are freshly initialized.
+    Args:
+        model (nn.Module): the dense model, modified in place.
+        manifest (dict): manifest returned by `get_pruned_manifest`.
+    Returns:
+        num_resized (int): the number of resized layers.
+    """
+    assert manifest["version"] == 1, "Unsupported pruned manifest version {}".format(
+        manifest["version"]
+    )
+    layers = manifest["layers"]
+    modules = dict(model.named_modules())
+    unknown = set(layers) - set(modules)
+    assert not unknown, "Layers {} of the pruned manifest not found in model".format(
+        sorted(unknown)
+    )
+    num_resized = 0
+    for name, dims in layers.items():
+        module = modules[name]
+        dims = dict(dims)
+        layer_type = dims.pop("type")
+        assert layer_type == type(module).__name__, (
+            "Layer {} is a {} in the pruned manifest but a {} in the "
+            "model".format(name, layer_type, type(module).__name__)
+        )
+        if dims == _layer_dims(module):
+            continue
+        if "groups" in dims:
+            new = _new_conv(
+                module, dims["in_channels"], dims["out_channels"], dims["groups"]
+            )
+        elif "num_features" in dims:
+            new = _new_bn(module, dims["num_features"])
+        else:
+            new = _new_linear(module, dims["in_features"], dims["out_features"])
+        parent_name, _, child_name = name.rpartition(".")
+        parent = modules[parent_name] if parent_name else model
+        setattr(parent, child_name, new)
+        num_resized += 1
+    return num_resized
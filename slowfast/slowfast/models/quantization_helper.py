@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+"""Helper functions for FX graph mode quantization of video models."""
+
+import torch
+import torch.nn as nn
+from torch.ao.quantization import (
+    HistogramObserver,
+    MinMaxObserver,
+    QConfig,
+    default_per_channel_weight_observer,
+    default_weight_observer,
+    get_default_qconfig_mapping,
+)
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+from torch.ao.quantization.fx.custom_config import PrepareCustomConfig
+
+from slowfast.models.head_helper import ResNetBasicHead
+from slowfast.models.operators import SE
+from slowfast.models.utils import replace_swish
+
+# Modules kept as single leaf calls of the FX graph, which run in float: their
+# inputs are dequantized and their outputs quantized again where needed. The
+# head has shape-dependent control flow.
+NON_TRACEABLE_MODULES = (ResNetBasicHead,)
+
+# Name of the group of all the SE blocks, which are kept in float by default
+# to keep their sigmoid gating accurate.
+SE_GROUP = "se"
+
+
+class PercentileObserver(HistogramObserver):
+    """
+    Histogram observer clipping the range of the activations to the given
+    lower and upper percentiles of the calibration values, e.g. to ignore the
+    few outliers which would widen the quantization step.
+    """
+
+    def __init__(self, percentile=99.99, **kwargs):
+        """
+        Args:
+            percentile (float): percentile of the values kept at both ends,
+                in [50, 100].
+            kwargs (dict): arguments of HistogramObserver.
+        """
+        super(PercentileObserver, self).__init__(**kwargs)
+        self.percentile = percentile
+
+    def _non_linear_param_search(self):
+        bin_width = (self.max_val - self.min_val) / self.bins
+        cdf = torch.cumsum(self.histogram, dim=0) / torch.sum(self.histogram)
+        start_bin = torch.searchsorted(cdf, 1.0 - self.percentile / 100.0)
+        end_bin = torch.searchsorted(cdf, self.percentile / 100.0)
+        end_bin = torch.clamp(end_bin, max=self.bins - 1)
+        new_min = self.min_val + bin_width * start_bin
+        new_max = self.min_val + bin_width * (end_bin + 1)
+        return new_min, new_max
+
+
+class MSEObserver(HistogramObserver):
+    """
+    Histogram observer picking the range of the activations with the lowest
+    quantization mean squared error over a grid of clipped ranges. Unlike the
+    greedy search of HistogramObserver, the lower and upper bounds are
+    searched independently.
+    """
+
+    def __init__(self, num_steps=16, **kwargs):
+        """
+        Args:
+            num_steps (int): number of evenly spaced and of quantile
+                candidate bounds at each end of the histogram.
+            kwargs (dict): arguments of HistogramObserver.
+        """
+        super(MSEObserver, self).__init__(**kwargs)
+        self.num_steps = num_steps
+
+    def _non_linear_param_search(self):
+        bin_width = (self.max_val - self.min_val) / self.bins
+        half = self.bins // 2
+        # Candidates evenly spaced in the range and in the quantiles of the
+        # values, which are dense where most of the values are.
+        cdf = torch.cumsum(self.histogram, dim=0) / torch.sum(self.histogram)
+        quantiles = torch.linspace(0.0, 0.5, self.num_steps)
+        start_bins = torch.cat(
+            [
+                torch.linspace(0, half - 1, self.num_steps).long(),
+                torch.searchsorted(cdf, quantiles).clamp(max=half - 1),
+            ]
+        ).unique()
+        end_bins = torch.cat(
+            [
+                torch.linspace(half, self.bins - 1, self.num_steps).long(),
+                torch.searchsorted(cdf, 1.0 - quantiles).clamp(
+                    min=half, max=self.bins - 1
+                ),
+            ]
+        ).unique()
+        best = (float("inf"), 0, self.bins - 1)
+        for start_bin in start_bins.tolist():
+            for end_bin in end_bins.tolist():
+                norm = self._compute_quantization_error(start_bin, end_bin)
+                if norm < best[0]:
+                    best = (norm, start_bin, end_bin)
+        _, start_bin, end_bin = best
+        new_min = self.min_val + bin_width * start_bin
+        new_max = self.min_val + bin_width * (end_bin + 1)
+        return new_min, new_max
+
+
+# Activation observers of post-training static quantization.
+OBSERVERS = {
+    "minmax": MinMaxObserver,
+    "histogram": HistogramObserver,
+    "percentile": PercentileObserver,
+    "mse": MSEObserver,
+}
+
+
+def get_qconfig(
+    backend, observer="histogram", per_channel=True, percentile=99.99
+):
+    """
+    Get the static int8 qconfig with the given observers.
+    Args:
+        backend (str): quantized engine, `fbgemm`, `x86` or `qnnpack`.
+        observer (str): activation observer, one of OBSERVERS.
+        per_channel (bool): if True, quantize the weights per output channel,
+            otherwise per tensor.
+        percentile (float): percentile of the `percentile` observer.
+    Returns:
+        qconfig (QConfig): the qconfig.
+    """
+    assert observer in OBSERVERS, "Observer {} not supported".format(observer)
+    kwargs = {"reduce_range": backend != "qnnpack"}
+    if observer == "percentile":
+        kwargs["percentile"] = percentile
+    weight_observer = (
+        default_per_channel_weight_observer
+        if per_channel
+        else default_weight_observer
+    )
+    return QConfig(
+        activation=OBSERVERS[observer].with_args(**kwargs),
+        weight=weight_observer,
+    )
+
+
+class SinglePathwayInputs(nn.Module):
+    """
+    Call a single pathway model with its input tensor instead of a list, so
+    that FX traces a list of known length.
+    """
+
+    def __init__(self, model):
+        """
+        Args:
+            model (nn.Module): model taking a list of one pathway tensor.
+        """
+        super(SinglePathwayInputs, self).__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model([x])
+
+
+class TwoPathwayInputs(SinglePathwayInputs):
+    """
+    Call a two pathway model, e.g. SlowFast, with its Slow and Fast input
+    tensors instead of a list.
+    """
+
+    def forward(self, x_slow, x_fast):
+        return self.model([x_slow, x_fast])
+
+
+class PathwayListInputs(nn.Module):
+    """
+    Call a traced model taking the pathways as separate tensors with a list
+    of pathways, so it is a drop-in replacement of the float model.
+    """
+
+    def __init__(self, model):
+        """
+        Args:
+            model (nn.Module): model taking one tensor per pathway.
+        """
+        super(PathwayListInputs, self).__init__()
+        self.model = model
+
+    def forward(self, inputs):
+        return self.model(*inputs)
+
+
+def get_quantization_groups(model):
+    """
+    Split a model into the module groups quantized together: every top-level
+    module with parameters, e.g. the stem, the res stages and the head, and
+    the group of all the SE blocks.
+    Args:
+        model (nn.Module): float model taking a list of pathways.
+    Returns:
+        groups (dict): ordered dict from group name to the names of its
+            modules.
+    """
+    groups = {}
+    for name, module in model.named_children():
+        if any(True for _ in module.parameters()):
+            groups[name] = [name]
+    se_names = [
+        name for name, module in model.named_modules() if isinstance(module, SE)
+    ]
+    if len(se_names) > 0:
+        groups[SE_GROUP] = se_names
+    return groups
+
+
+def get_qconfig_mapping(
+    model, backend, quantized_groups=None, float_depthwise=True, qconfig=None
+):
+    """
+    Get the static int8 qconfig mapping of a model, quantizing only the given
+    module groups.
+    Args:
+        model (nn.Module): float model taking a list of pathways.
+        backend (str): quantized engine, `fbgemm`, `x86` or `qnnpack`.
+        quantized_groups (list): names of the groups of
+            `get_quantization_groups` to quantize. If None, quantize all of
+            them but the SE blocks.
+        float_depthwise (bool): if True, keep the depthwise 3D convolutions,
+            e.g. of X3D, in float. The int8 depthwise conv3d kernels are much
+            slower than the float ones on CPU.
+        qconfig (QConfig): qconfig of the quantized groups, e.g. from
+            `get_qconfig`. If None, use the default qconfig of the backend.
+    Returns:
+        qconfig_mapping (QConfigMapping): the qconfig mapping.
+    """
+    groups = get_quantization_groups(model)
+    if quantized_groups is None:
+        quantized_groups = [name for name in groups if name != SE_GROUP]
+    assert all(
+        name in groups for name in quantized_groups
+    ), "Unknown groups {}, the groups are {}".format(
+        quantized_groups, list(groups)
+    )
+    qconfig_mapping = get_default_qconfig_mapping(backend)
+    if qconfig is None:
+        qconfig = qconfig_mapping.global_qconfig
+    qconfig_mapping.set_global(qconfig)
+    # Names are prefixed by the pathway input wrapper. The names of the SE
+    # blocks are more specific than the ones of the stages holding them, so
+    # they take precedence.
+    for group, names in groups.items():
+        for name in names:
+            qconfig_mapping.set_module_name(
+                "model." + name, qconfig if group in quantized_groups else None
+            )
+    if float_depthwise:
+        for name, module in model.named_modules():
+            if isinstance(module, nn.Conv3d) and module.groups > 1:
+                qconfig_mapping.set_module_name("model." + name, None)
+    return qconfig_mapping
+
+
+def get_prepare_custom_config():
+    """
+    Returns:
+        prepare_custom_config (PrepareCustomConfig): config marking the
+            modules of NON_TRACEABLE_MODULES as leaves of the FX graph.
+    """
+    return PrepareCustomConfig().set_non_traceable_module_classes(
+        list(NON_TRACEABLE_MODULES)
+    )
+
+
+def prepare_model_fx(
+    model,
+    example_inputs,
+    backend,
+    qconfig_mapping=None,
+    quantized_groups=None,
+    float_depthwise=True,
+    qconfig=None,
+):
+    """
+    Trace a float model in eval mode, fuse its conv, bn and relu layers and
+    insert the observers of post-training static quantization.
+    Args:
+        model (nn.Module): float model on CPU, taking a list of pathways. Its
+            Swish activations are replaced in place, see `replace_swish`.
+        example_inputs (list): list of pathway tensors, one per pathway.
+        backend (str): quantized engine, `fbgemm`, `x86` or `qnnpack`.
+        qconfig_mapping (QConfigMapping): mapping to use. If None, use the
+            mapping of `get_qconfig_mapping`.
+        quantized_groups (list): groups to quantize when using the mapping of
+            `get_qconfig_mapping`, None for its default.
+        float_depthwise (bool): keep the depthwise convolutions in float when
+            using the mapping of `get_qconfig_mapping`.
+        qconfig (QConfig): qconfig of the quantized groups when using the
+            mapping of `get_qconfig_mapping`, None for the default one.
+    Returns:
+        prepared (GraphModule): the observed model, taking one tensor per
+            pathway. It should be calibrated and passed to `convert_fx`.
+    """
+    assert len(example_inputs) in [1, 2], "{} pathways not supported".format(
+        len(example_inputs)
+    )
+    replace_swish(model)
+    if len(example_inputs) == 1:
+        wrapped = SinglePathwayInputs(model)
+    else:
+        wrapped = TwoPathwayInputs(model)
+    wrapped.eval()
+    if qconfig_mapping is None:
+        qconfig_mapping = get_qconfig_mapping(
+            model, backend, quantized_groups, float_depthwise, qconfig
+        )
+    torch.backends.quantized.engine = backend
+    return prepare_fx(
+        wrapped,
+        qconfig_mapping,
+        tuple(example_inputs),
+        prepare_custom_config=get_prepare_custom_config(),
+    )
+
+
+def convert_model_fx(prepared):
+    """
+    Convert a calibrated model to int8.
+    Args:
+        prepared (GraphModule): model returned by `prepare_model_fx`.
+    Returns:
+        quantized (nn.Module): int8 model taking a list of pathways.
+    """
+    return PathwayListInputs(convert_fx(prepared)).eval()
+
+
+def count_quantized_modules(model):
+    """
+    Count the modules running int8 kernels and the float modules with
+    parameters left in a converted model.
+    Args:
+        model (nn.Module): converted model.
+    Returns:
+        num_quantized (int): number of int8 modules.
+        float_modules (list): names of the float modules with parameters.
+    """
+    num_quantized = 0
+    float_modules = []
+    for name, module in model.named_modules():
+        if module.__module__.startswith("torch.ao.nn.quantized") or (
+            module.__module__.startswith("torch.ao.nn.intrinsic.quantized")
+        ):
+            num_quantized += 1
+        elif any(True for _ in module.parameters(recurse=False)):
+            float_modules.append(name)
+    return num_quantized, float_modules
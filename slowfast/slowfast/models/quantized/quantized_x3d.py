@@ -11,6 +11,7 @@ from torch.quantization import QuantStub, DeQuantStub
 from torch.quantization.qconfig import QConfig
 import torch.quantization as quant
 import pytorchvideo.layers.swish
+from torch.ao.nn.quantized import FloatFunctional
 
 import slowfast.utils.logging as logging
 import slowfast.utils.weight_init_helper as init_helper
@@ -19,6 +20,8 @@ from slowfast.models.utils import round_width
 
 from ..build import MODEL_REGISTRY
 from .. import head_helper, resnet_helper, stem_helper
+from ..common import drop_path
+from ..operators import SE
 
 logger = logging.get_logger(__name__)
 
@@ -37,6 +40,98 @@ _POOL1 = {
     "x3d": [[1, 1, 1]],
 }
 
+# Replacements of the Swish of the X3D bottlenecks which have int8 kernels.
+_ACTIVATIONS = {
+    "hardswish": nn.Hardswish,
+    "relu6": nn.ReLU6,
+}
+
+
+class FloatSwish(nn.Module):
+    """
+    Swish run in float inside a quantized model, since it has no int8 kernel.
+    Its input is dequantized and its output quantized again.
+    """
+
+    def __init__(self):
+        super(FloatSwish, self).__init__()
+        self.dequant = DeQuantStub()
+        self.swish = pytorchvideo.layers.swish.Swish()
+        self.quant = QuantStub()
+
+    def forward(self, x):
+        return self.quant(self.swish(self.dequant(x)))
+
+
+class QuantizableResBlock(resnet_helper.ResBlock):
+    """
+    Residual block computing the residual sum with a FloatFunctional, which
+    eager mode quantization converts to an int8 add.
+    """
+
+    @classmethod
+    def from_res_block(cls, block):
+        """
+        Args:
+            block (ResBlock): residual block to convert in place.
+        Returns:
+            block (QuantizableResBlock): the converted block.
+        """
+        block.__class__ = cls
+        block.skip_add = FloatFunctional()
+        return block
+
+    def forward(self, x):
+        f_x = self.branch2(x)
+        if self.training and self._drop_connect_rate > 0.0:
+            f_x = drop_path(f_x, self._drop_connect_rate)
+        if hasattr(self, "branch1"):
+            x = self.branch1_bn(self.branch1(x))
+        x = self.skip_add.add(x, f_x)
+        x = self.relu(x)
+        return x
+
+
+class QuantizableX3DTransform(resnet_helper.X3DTransform):
+    """
+    X3D bottleneck running its depthwise Tx3x3 conv in float, since the int8
+    depthwise conv3d kernels are much slower than the float ones on CPU. The
+    output of the first 1x1x1 conv is dequantized and the input of the last
+    one quantized again, so the SE and the activation in between run in float
+    with a single dequantize/quantize round trip.
+    """
+
+    @classmethod
+    def from_transform(cls, transform):
+        """
+        Args:
+            transform (X3DTransform): bottleneck to convert in place.
+        Returns:
+            transform (QuantizableX3DTransform): the converted bottleneck.
+        """
+        transform.__class__ = cls
+        transform.dequant = DeQuantStub()
+        transform.quant = QuantStub()
+        return transform
+
+    def float_modules(self):
+        """
+        Returns:
+            modules (list): the modules run in float.
+        """
+        modules = [self.b, self.b_bn, self.b_relu]
+        if hasattr(self, "se"):
+            modules.append(self.se)
+        return modules
+
+    def forward(self, x):
+        x = self.a_relu(self.a_bn(self.a(x)))
+        x = self.b_bn(self.b(self.dequant(x)))
+        if hasattr(self, "se"):
+            x = self.se(x)
+        x = self.quant(self.b_relu(x))
+        return self.c_bn(self.c(x))
+
 
 @MODEL_REGISTRY.register()
 class QuantizedX3D(nn.Module):
@@ -68,6 +163,7 @@ class QuantizedX3D(nn.Module):
         # Quantization configuration
         self.quantize_model = cfg.QUANTIZATION.ENABLE
         self.quant_aware_training = cfg.QUANTIZATION.QAT
+        self.float_depthwise = cfg.QUANTIZATION.FLOAT_DEPTHWISE
         
         # QAT stubs
         self.quant = QuantStub()
@@ -93,6 +189,9 @@ class QuantizedX3D(nn.Module):
             [3, self.dim_res5, 2],
         ]
         self._construct_network(cfg)
+        self._make_quantizable(
+            cfg.QUANTIZATION.ACTIVATION, cfg.QUANTIZATION.FLOAT_DEPTHWISE
+        )
         init_helper.init_weights(
             self, cfg.MODEL.FC_INIT_STD, cfg.RESNET.ZERO_INIT_FINAL_BN
         )
@@ -108,6 +207,39 @@ class QuantizedX3D(nn.Module):
             return repeats
         return int(math.ceil(multiplier * repeats))
 
+    def _make_quantizable(self, activation, float_depthwise):
+        """
+        Replace the residual sums with int8 adds and the Swish of the
+        bottlenecks with the given activation, and dequantize the input of the
+        final activation of the head. Activations and quantization stubs have
+        no weights, so float X3D checkpoints still load into the model.
+        Args:
+            activation (str): `swish` to keep Swish and run it in float,
+                `hardswish` or `relu6` to replace it.
+            float_depthwise (bool): if True, run the stem and the depthwise
+                Tx3x3 conv, SE and activation of the bottlenecks in float, see
+                QuantizableX3DTransform.
+        """
+        assert (
+            activation == "swish" or activation in _ACTIVATIONS
+        ), "Activation {} not supported".format(activation)
+        for module in list(self.modules()):
+            if isinstance(module, resnet_helper.ResBlock):
+                QuantizableResBlock.from_res_block(module)
+            if isinstance(module, resnet_helper.X3DTransform) and isinstance(
+                module.b_relu, pytorchvideo.layers.swish.Swish
+            ):
+                # Assigning an existing child keeps its position, so the
+                # transform still applies it between b_bn (and SE) and c.
+                if activation != "swish":
+                    module.b_relu = _ACTIVATIONS[activation]()
+                elif not float_depthwise:
+                    module.b_relu = FloatSwish()
+            if float_depthwise and isinstance(module, resnet_helper.X3DTransform):
+                QuantizableX3DTransform.from_transform(module)
+        # There is no eager int8 softmax, run the final activation in float.
+        self.head.act = nn.Sequential(DeQuantStub(), self.head.act)
+
     def prepare_qat(self):
         """
         Prepare model for Quantization Aware Training
@@ -120,6 +252,20 @@ class QuantizedX3D(nn.Module):
             # Use QNNPACK for ARM CPU
             self.qconfig = torch.quantization.get_default_qat_qconfig('qnnpack')
                 
+        # SE runs in float: it dequantizes its input and quantizes its
+        # output with the input parameters.
+        for module in self.modules():
+            if isinstance(module, SE):
+                module.qconfig = None
+        if self.float_depthwise:
+            # The stem ends with a depthwise conv, the input is quantized
+            # after it.
+            self.s1.qconfig = None
+            for module in self.modules():
+                if isinstance(module, QuantizableX3DTransform):
+                    for float_module in module.float_modules():
+                        float_module.qconfig = None
+
         # Fuse modules before preparing the model for QAT
         self._fuse_modules()
         
@@ -133,8 +279,13 @@ class QuantizedX3D(nn.Module):
         
     def _fuse_modules(self):
         """
-        Fuse Conv+BN+ReLU modules for better quantization based on X3D architecture,
-        but skip Swish activations since they're not supported by PyTorch's fusion.
+        Fuse Conv+BN+ReLU modules for better quantization based on X3D architecture.
+        The Tx3x3 conv is only fused with its BN: PyTorch has no fused kernel
+        for Swish, Hardswish or ReLU6, and SE sits between the BN and the
+        activation. With QUANTIZATION.FLOAT_DEPTHWISE, the fused Tx3x3 conv
+        and the activation run in float. Otherwise, Hardswish and ReLU6 run as
+        int8 ops on the output of the fused conv, while Swish needs a
+        dequantize/quantize round trip.
         """
         
         self.eval()  # Set to eval mode for fusing
@@ -184,9 +335,8 @@ class QuantizedX3D(nn.Module):
                                 inplace=True
                             )
                         
-                        # 2. Handle b pathway - fuse only Conv+BN and skip the activation if it's Swish
+                        # 2. Fuse b + b_bn (Tx3x3 conv, its activation has no fused kernel)
                         if hasattr(transform, "b") and hasattr(transform, "b_bn"):
-                            # Always fuse just Conv+BN, regardless of SE module presence or activation type
                             torch.quantization.fuse_modules(
                                 transform,
                                 ["b", "b_bn"],
@@ -230,7 +380,10 @@ class QuantizedX3D(nn.Module):
                         inplace=True
                     )
                 
-        logger.info("Model modules fused for QAT based on X3D architecture (skipping Swish activations)")
+        logger.info(
+            "Model modules fused for QAT based on X3D architecture "
+            "({} activations)".format(self.cfg.QUANTIZATION.ACTIVATION)
+        )
 
     def _construct_network(self, cfg):
         """
@@ -320,11 +473,14 @@ class QuantizedX3D(nn.Module):
     def forward(self, x, bboxes=None):
         if self.quantize_model:
             x = x[0] 
-            x = self.quant(x)
+            if not self.float_depthwise:
+                x = self.quant(x)
             
         # Process through the standard X3D model stages        
         x = [x] # Convert to list for single pathway
         x = self.s1(x)
+        if self.quantize_model and self.float_depthwise:
+            x = [self.quant(x[0])]
         
         for stage_idx in range(2, 6):
             stage = getattr(self, f"s{stage_idx}")
@@ -356,3 +512,4 @@ class QuantizedX3D(nn.Module):
         torch.quantization.convert(self, inplace=True)
         
         logger.info("Model converted to quantized format")
+        return self
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+"""
+Streaming inference of clip models. The temporal layers of a converted model
+keep the activations of the last frames they have seen, so that every call
+only computes the new frames of a stream instead of the whole clip.
+"""
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.nn.modules.utils import _triple
+
+from slowfast.models.head_helper import ResNetBasicHead, X3DHead
+from slowfast.models.operators import SE
+
+
+class StreamingConv3d(nn.Module):
+    """
+    Causal temporal version of a 3D convolution. The last `kernel - stride`
+    input frames are cached between calls and prepended to the next frames,
+    instead of the symmetric temporal zero padding of the clip model. The
+    output of a frame thus only depends on the frames before it. The stream
+    starts with zero frames, as the clip model at the start of a clip.
+    """
+
+    def __init__(self, conv):
+        """
+        Args:
+            conv (nn.Conv3d): convolution to run on the stream. Its weights
+                are shared.
+        """
+        super(StreamingConv3d, self).__init__()
+        assert conv.dilation[0] == 1, "Temporal dilation not supported"
+        self.conv = conv
+        self.kernel_t = conv.kernel_size[0]
+        self.stride_t = conv.stride[0]
+        self.padding = (0,) + tuple(conv.padding[1:])
+        self.reset_state()
+
+    def reset_state(self):
+        self.cache = None
+
+    def forward(self, x):
+        assert x.shape[2] % self.stride_t == 0, (
+            f"{x.shape[2]} frames are not a multiple of the temporal stride "
+            f"{self.stride_t}"
+        )
+        num_cached = self.kernel_t - self.stride_t
+        if num_cached > 0:
+            if self.cache is None:
+                self.cache = x.new_zeros(
+                    x.shape[:2] + (num_cached,) + x.shape[3:]
+                )
+            x = torch.cat([self.cache, x], dim=2)
+            self.cache = x[:, :, -num_cached:]
+        elif num_cached < 0:
+            # The kernel only covers the last frames of every stride.
+            x = x[:, :, -num_cached:]
+        return F.conv3d(
+            x,
+            self.conv.weight,
+            self.conv.bias,
+            self.conv.stride,
+            self.padding,
+            self.conv.dilation,
+            self.conv.groups,
+        )
+
+
+class StreamingSE(nn.Module):
+    """
+    Causal version of the SE block. The excitation of every frame is computed
+    from the average of the features over the last `window` frames of the
+    stream, instead of over the whole clip.
+    """
+
+    def __init__(self, se, window):
+        """
+        Args:
+            se (SE): float SE block. Its layers are shared.
+            window (int): number of frames averaged, e.g. the number of
+                frames of a clip.
+        """
+        super(StreamingSE, self).__init__()
+        self.se = se
+        self.window = window
+        self.reset_state()
+
+    def reset_state(self):
+        self.cache = None
+
+    def forward(self, x):
+        num_frames = x.shape[2]
+        pooled = x.mean((3, 4), keepdim=True)
+        if self.cache is not None:
+            pooled = torch.cat([self.cache, pooled], dim=2)
+        self.cache = pooled[:, :, max(pooled.shape[2] - self.window + 1, 0) :]
+        # Sliding mean over the window ending at every new frame, shorter at
+        # the start of the stream.
+        sums = F.pad(torch.cumsum(pooled, dim=2), (0, 0, 0, 0, 1, 0))
+        end = torch.arange(
+            pooled.shape[2] - num_frames + 1,
+            pooled.shape[2] + 1,
+            device=x.device,
+        )
+        start = (end - self.window).clamp(min=0)
+        counts = (end - start).to(x.dtype).view(1, 1, -1, 1, 1)
+        pooled = (sums[:, :, end] - sums[:, :, start]) / counts
+        scale = self.se.fc2_sig(
+            self.se.fc2(self.se.fc1_act(self.se.fc1(pooled)))
+        )
+        return x * scale
+
+
+class StreamingAvgPool3d(nn.Module):
+    """
+    Streaming version of the global average pooling of a head. Frames are
+    pooled spatially as in the clip model, then averaged over the last
+    `window` frames of the stream. Only the newest window is returned, so the
+    head predicts the clip ending at the last frame.
+    """
+
+    def __init__(self, pool, window):
+        """
+        Args:
+            pool (nn.AvgPool3d or nn.AdaptiveAvgPool3d): global pooling of
+                the head over a clip.
+            window (int): number of frames averaged.
+        """
+        super(StreamingAvgPool3d, self).__init__()
+        if isinstance(pool, nn.AvgPool3d):
+            self.spatial_pool = nn.AvgPool3d(
+                [1] + list(_triple(pool.kernel_size)[1:]), stride=1
+            )
+        else:
+            self.spatial_pool = nn.AdaptiveAvgPool3d((None, 1, 1))
+        self.window = window
+        self.reset_state()
+
+    def reset_state(self):
+        self.cache = None
+
+    def forward(self, x):
+        x = self.spatial_pool(x)
+        if self.cache is not None:
+            x = torch.cat([self.cache, x], dim=2)
+        self.cache = x[:, :, max(x.shape[2] - self.window + 1, 0) :]
+        return x[:, :, -self.window :].mean(2, keepdim=True)
+
+
+def convert_to_streaming(model, num_frames):
+    """
+    Convert a float model in place for streaming inference: its temporal
+    convolutions, SE blocks and head poolings are replaced by the streaming
+    modules sharing their weights. The forward of the model is unchanged, it
+    takes the pathways of the new frames of the stream, see
+    `pack_stream_pathways`, and returns the predictions of the clip ending at
+    the last frame. Streaming is causal: the predictions approximate the
+    ones of the clip model, they are not equal.
+    Args:
+        model (nn.Module): float model in eval mode with a global average
+            pooling head, e.g. X3D or SlowFast.
+        num_frames (list): number of frames of a clip of every pathway.
+    Returns:
+        model (nn.Module): the streaming model.
+    """
+    assert not model.training, "Streaming is only supported in eval mode"
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, nn.Conv3d) and (
+                child.kernel_size[0] > 1 or child.stride[0] > 1
+            ):
+                setattr(module, name, StreamingConv3d(child))
+            elif isinstance(child, SE):
+                # SE blocks are only used by single pathway models.
+                setattr(module, name, StreamingSE(child, num_frames[0]))
+            elif isinstance(module, (X3DHead, ResNetBasicHead)) and isinstance(
+                child, (nn.AvgPool3d, nn.AdaptiveAvgPool3d)
+            ):
+                pathway = (
+                    int(name[len("pathway")]) if name.startswith("pathway") else 0
+                )
+                setattr(
+                    module,
+                    name,
+                    StreamingAvgPool3d(child, num_frames[pathway]),
+                )
+            elif isinstance(child, (nn.MaxPool3d, nn.AvgPool3d)):
+                kernel_t = _triple(child.kernel_size)[0]
+                stride_t = _triple(child.stride)[0]
+                assert kernel_t == 1 and stride_t == 1, (
+                    f"Temporal pooling {name} is not supported for streaming"
+                )
+    return model
+
+
+def reset_streaming_state(model):
+    """
+    Clear the cached frames of a streaming model, to start a new stream.
+    Args:
+        model (nn.Module): model returned by `convert_to_streaming`.
+    """
+    for module in model.modules():
+        if isinstance(
+            module, (StreamingConv3d, StreamingSE, StreamingAvgPool3d)
+        ):
+            module.reset_state()
+
+
+def get_stream_num_frames(cfg):
+    """
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    Returns:
+        num_frames (list): number of frames of a clip of every pathway, the
+            windows of the streaming model.
+    """
+    if cfg.MODEL.ARCH in cfg.MODEL.MULTI_PATHWAY_ARCH:
+        return [cfg.DATA.NUM_FRAMES // cfg.SLOWFAST.ALPHA, cfg.DATA.NUM_FRAMES]
+    return [cfg.DATA.NUM_FRAMES]
+
+
+def get_stream_chunk_size(cfg):
+    """
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    Returns:
+        chunk_size (int): number of frames the streaming model is fed at
+            least at once, one Slow frame for SlowFast.
+    """
+    if cfg.MODEL.ARCH in cfg.MODEL.MULTI_PATHWAY_ARCH:
+        return cfg.SLOWFAST.ALPHA
+    return 1
+
+
+def pack_stream_pathways(frames, num_pathways, alpha):
+    """
+    Split the new frames of a stream into the pathways of the model. The
+    Slow pathway of SlowFast keeps the last frame of every `alpha` frames.
+    Args:
+        frames (tensor): new frames, `batch` x `channel` x `num frames` x
+            `height` x `width`. For SlowFast, the number of frames is a
+            multiple of `alpha`.
+        num_pathways (int): number of pathways of the model.
+        alpha (int): frame rate ratio between the Fast and Slow pathways.
+    Returns:
+        frame_list (list): list of tensors, one per pathway.
+    """
+    if num_pathways == 1:
+        return [frames]
+    assert num_pathways == 2, f"{num_pathways} pathways not supported"
+    assert frames.shape[2] % alpha == 0, (
+        f"{frames.shape[2]} frames are not a multiple of alpha {alpha}"
+    )
+    return [frames[:, :, alpha - 1 :: alpha], frames]
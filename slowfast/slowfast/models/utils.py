@@ -4,6 +4,8 @@ import numpy as np
 
 import slowfast.utils.logging as logging
 import torch
+import torch.nn as nn
+from pytorchvideo.layers.swish import Swish
 
 logger = logging.get_logger(__name__)
 
@@ -24,6 +26,23 @@ def round_width(width, multiplier, min_width=1, divisor=1, verbose=False):
     return int(width_out)
 
 
+def replace_swish(model):
+    """
+    Replace the Swish activations of a model in place with the equivalent
+    nn.SiLU. Swish is a python autograd function, which TorchScript cannot
+    export.
+    Args:
+        model (nn.Module): model to update.
+    Returns:
+        model (nn.Module): the model with nn.SiLU activations.
+    """
+    for module in list(model.modules()):
+        for name, child in module.named_children():
+            if isinstance(child, Swish):
+                setattr(module, name, nn.SiLU())
+    return model
+
+
 def validate_checkpoint_wrapper_import(checkpoint_wrapper):
     """
     Check if checkpoint_wrapper is imported.
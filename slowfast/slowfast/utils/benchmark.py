@@ -3,7 +3,13 @@
 Functions for benchmarks.
 """
 
+import csv
+import json
+import os
 import pprint
+import resource
+import threading
+import time
 
 import numpy as np
 
@@ -100,3 +106,1488 @@ def benchmark_data_loading(cfg):
             np.std(epoch_times),
         )
     )
+
+
+def benchmark_meccano_decoding(cfg):
+    """
+    Benchmark MECCANO frame decoding with and without sampling the frame
+    indices first. Reports clips/s, decoded bytes per clip (compressed JPEG
+    bytes read and raw pixel bytes decoded) and checks that both paths return
+    identical frames.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    # Set up environment.
+    setup_environment()
+    # Set random seed from configs.
+    np.random.seed(cfg.RNG_SEED)
+    torch.manual_seed(cfg.RNG_SEED)
+
+    # Setup logging format.
+    logging.setup_logging(cfg.OUTPUT_DIR)
+
+    # Import here to avoid a circular import with the datasets registry.
+    from slowfast.datasets.meccano import Meccano
+
+    dataset = Meccano(cfg, "train")
+    num_clips = min(cfg.BENCHMARK.NUM_CLIPS, len(dataset))
+    indices = np.random.choice(len(dataset), num_clips, replace=False)
+
+    results = {}
+    outputs = {}
+    for sample_first in [False, True]:
+        name = "sample_first" if sample_first else "decode_all"
+        file_bytes = 0
+        pixel_bytes = 0
+        seconds = 0.0
+        for idx in tqdm.tqdm(indices, desc=name):
+            timer = Timer()
+            frames = dataset._load_frames(idx, sample_first=sample_first)
+            seconds += timer.seconds()
+            frame_paths = dataset.get_frame_paths(idx, sample_first=sample_first)
+            file_bytes += sum(os.path.getsize(path) for path in frame_paths)
+            # Raw bytes produced by the JPEG decoder, before sampling.
+            pixel_bytes += len(frame_paths) * frames[0].numel()
+            if idx == indices[0]:
+                outputs[name] = frames
+        results[name] = (
+            num_clips / seconds,
+            file_bytes / num_clips,
+            pixel_bytes / num_clips,
+        )
+        logger.info(
+            "{}: {} clips in {:.2f} seconds, {:.2f} clips/s, "
+            "{:.2f} MB read and {:.2f} MB decoded per clip.".format(
+                name,
+                num_clips,
+                seconds,
+                results[name][0],
+                results[name][1] / 1024**2,
+                results[name][2] / 1024**2,
+            )
+        )
+    assert torch.equal(
+        outputs["decode_all"], outputs["sample_first"]
+    ), "Sample-first decoding does not match full-segment decoding."
+    logger.info(
+        "Sample-first decoding is {:.2f}x faster and decodes {:.2f}x fewer "
+        "bytes per clip.".format(
+            results["sample_first"][0] / results["decode_all"][0],
+            results["decode_all"][2] / results["sample_first"][2],
+        )
+    )
+
+
+def _gaze_attention_loop(feature_map, gaze_attention_maps):
+    """
+    Reference per-sample, per-channel implementation of gaze attention, kept
+    to measure and check the broadcast implementation of
+    `custom_video_model_builder_MECCANO_gaze.gaze_attention`.
+    """
+    N, slow_channels, slow_T, height, width = feature_map[0].shape
+    fast_channels, fast_T = feature_map[1].shape[1:3]
+    sampling_factor = fast_T // slow_T
+    device = feature_map[0].device
+    slow_attention_map = torch.zeros([N, slow_T, height, width], device=device)
+    fast_attention_map = torch.zeros([N, fast_T, height, width], device=device)
+    for n in range(N):
+        slow_count = 0
+        for t in range(fast_T):
+            fast_attention_map[n][t] = gaze_attention_maps[n][t]
+            if t % sampling_factor == 0 and slow_count < slow_T:
+                slow_attention_map[n][slow_count] = fast_attention_map[n][t]
+                slow_count += 1
+    for n in range(N):
+        for i in range(fast_channels):
+            feature_map[1][n][i] *= fast_attention_map[n]
+        for j in range(slow_channels):
+            feature_map[0][n][j] *= slow_attention_map[n]
+    return feature_map
+
+
+def benchmark_gaze_attention(cfg):
+    """
+    Benchmark the gaze attention of the SlowFastGazeAtt head against the
+    reference loop implementation for the batch sizes in
+    `BENCHMARK.BATCH_SIZES`, on GPU if available and on CPU otherwise.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    from slowfast.models.custom_video_model_builder_MECCANO_gaze import (
+        gaze_attention,
+    )
+
+    setup_environment()
+    torch.manual_seed(cfg.RNG_SEED)
+    logging.setup_logging(cfg.OUTPUT_DIR)
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    slow_channels = cfg.RESNET.WIDTH_PER_GROUP * cfg.RESNET.NUM_GROUPS * 32
+    fast_channels = slow_channels // cfg.SLOWFAST.BETA_INV
+    fast_T = cfg.DATA.NUM_FRAMES
+    slow_T = fast_T // cfg.SLOWFAST.ALPHA
+    size = cfg.DATA.TRAIN_CROP_SIZE // 32
+
+    def _time(func, inputs, maps):
+        # Warm up, then average over a few runs on fresh copies.
+        times = []
+        for i in range(3 + cfg.BENCHMARK.NUM_EPOCHS):
+            features = [x.clone() for x in inputs]
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            timer = Timer()
+            out = func(features, maps)
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            if i >= 3:
+                times.append(timer.seconds())
+        return np.mean(times), out
+
+    with torch.no_grad():
+        for batch_size in cfg.BENCHMARK.BATCH_SIZES:
+            inputs = [
+                torch.rand(batch_size, slow_channels, slow_T, size, size),
+                torch.rand(batch_size, fast_channels, fast_T, size, size),
+            ]
+            inputs = [x.to(device) for x in inputs]
+            maps = torch.rand(batch_size, fast_T, size, size, device=device)
+            loop_time, loop_out = _time(_gaze_attention_loop, inputs, maps)
+            vec_time, vec_out = _time(gaze_attention, inputs, maps)
+            for loop_x, vec_x in zip(loop_out, vec_out):
+                assert torch.allclose(loop_x, vec_x)
+            logger.info(
+                "Gaze attention on {}, batch size {}: loop {:.2f} ms, "
+                "broadcast {:.2f} ms, speedup {:.1f}x.".format(
+                    device.type,
+                    batch_size,
+                    loop_time * 1000,
+                    vec_time * 1000,
+                    loop_time / vec_time,
+                )
+            )
+
+
+def _test_meter_update_loop(test_meter, preds, labels, clip_ids):
+    """
+    Reference per-clip implementation of `TestMeter.update_stats`, kept to
+    measure and check the batched implementation.
+    """
+    for ind in range(preds.shape[0]):
+        vid_id = int(clip_ids[ind]) // test_meter.num_clips
+        if test_meter.video_labels[vid_id].sum() > 0:
+            assert torch.equal(
+                test_meter.video_labels[vid_id].type(torch.FloatTensor),
+                labels[ind].type(torch.FloatTensor),
+            )
+        test_meter.video_labels[vid_id] = labels[ind]
+        if test_meter.ensemble_method == "sum":
+            test_meter.video_preds[vid_id] += preds[ind]
+        else:
+            test_meter.video_preds[vid_id] = torch.max(
+                test_meter.video_preds[vid_id], preds[ind]
+            )
+        test_meter.clip_count[vid_id] += 1
+
+
+def benchmark_test_meter(cfg):
+    """
+    Benchmark the multi-view ensembling of `TestMeter.update_stats` on
+    `BENCHMARK.NUM_PREDICTIONS` random clip predictions against the reference
+    per-clip loop, and check that both produce identical video predictions.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    from slowfast.utils.meters import TestMeter
+
+    setup_environment()
+    torch.manual_seed(cfg.RNG_SEED)
+    logging.setup_logging(cfg.OUTPUT_DIR)
+
+    num_clips = cfg.TEST.NUM_ENSEMBLE_VIEWS * cfg.TEST.NUM_SPATIAL_CROPS
+    num_videos = cfg.BENCHMARK.NUM_PREDICTIONS // num_clips
+    num_cls = cfg.MODEL.NUM_CLASSES
+    batch_size = cfg.TEST.BATCH_SIZE
+    video_labels = torch.randint(num_cls, (num_videos,))
+    clip_ids = torch.randperm(num_videos * num_clips)
+    preds = torch.rand(num_videos * num_clips, num_cls)
+    labels = video_labels[clip_ids // num_clips]
+    if cfg.DATA.MULTI_LABEL:
+        labels = torch.nn.functional.one_hot(labels, num_cls).float()
+
+    meters = {}
+    for name, update in [
+        ("loop", _test_meter_update_loop),
+        ("batched", TestMeter.update_stats),
+    ]:
+        meters[name] = TestMeter(
+            num_videos,
+            num_clips,
+            num_cls,
+            len(clip_ids) // batch_size,
+            cfg.DATA.MULTI_LABEL,
+            cfg.DATA.ENSEMBLE_METHOD,
+        )
+        timer = Timer()
+        for start in range(0, len(clip_ids), batch_size):
+            end = start + batch_size
+            update(
+                meters[name], preds[start:end], labels[start:end], clip_ids[start:end]
+            )
+        seconds = timer.seconds()
+        logger.info(
+            "{} ensembling of {} clip predictions ({} videos x {} views) in "
+            "{:.2f} seconds, {:.0f} clips/s.".format(
+                name,
+                len(clip_ids),
+                num_videos,
+                num_clips,
+                seconds,
+                len(clip_ids) / seconds,
+            )
+        )
+    for attr in ["video_preds", "video_labels", "clip_count"]:
+        assert torch.equal(
+            getattr(meters["loop"], attr), getattr(meters["batched"], attr)
+        ), "Batched ensembling does not match the loop for {}.".format(attr)
+
+
+def benchmark_quantized_x3d(cfg):
+    """
+    Benchmark the CPU latency of the int8 QuantizedX3D for each bottleneck
+    activation of QUANTIZATION.ACTIVATION against the fp32 model. With
+    QUANTIZATION.FLOAT_DEPTHWISE, the depthwise convs and the activations of
+    the bottlenecks run in float. Otherwise, with Swish, every bottleneck goes
+    through a dequantize/quantize round trip, while Hardswish and ReLU6 run in
+    int8. The models are calibrated on random
+    clips and use the float weights of QUANTIZATION.FLOAT_CHECKPOINT_FILE_PATH
+    if set.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    import slowfast.utils.checkpoint as cu
+    from slowfast.datasets.utils import pack_pathway_output
+    from slowfast.models import build_model
+
+    setup_environment()
+    torch.manual_seed(cfg.RNG_SEED)
+    logging.setup_logging(cfg.OUTPUT_DIR)
+    assert cfg.MODEL.ARCH == "x3d", "QuantizedX3D requires the x3d arch"
+    torch.backends.quantized.engine = cfg.QUANTIZATION.BACKEND
+
+    def _random_clip():
+        frames = torch.rand(
+            3,
+            cfg.DATA.NUM_FRAMES,
+            cfg.DATA.TEST_CROP_SIZE,
+            cfg.DATA.TEST_CROP_SIZE,
+        )
+        return [x.unsqueeze(0) for x in pack_pathway_output(cfg, frames)]
+
+    inputs = _random_clip()
+    fp32_latency = None
+    for activation in ["swish", "hardswish", "relu6"]:
+        model_cfg = cfg.clone()
+        model_cfg.NUM_GPUS = 0
+        model_cfg.MODEL.MODEL_NAME = "QuantizedX3D"
+        model_cfg.QUANTIZATION.ENABLE = True
+        model_cfg.QUANTIZATION.QAT = False
+        model_cfg.QUANTIZATION.ACTIVATION = activation
+        model = build_model(model_cfg)
+        if cfg.QUANTIZATION.FLOAT_CHECKPOINT_FILE_PATH:
+            cu.load_checkpoint(
+                cfg.QUANTIZATION.FLOAT_CHECKPOINT_FILE_PATH, model, False
+            )
+        model.eval()
+        if fp32_latency is None:
+            fp32_latency = misc.measure_cpu_latency(model, model_cfg)
+            logger.info("fp32 X3D: {:.2f} ms.".format(fp32_latency))
+        with torch.no_grad():
+            float_out = model(inputs)
+            model.prepare_qat()
+            model.eval()
+            for _ in range(cfg.QUANTIZATION.CALIBRATION_NUM_BATCHES):
+                model(_random_clip())
+            model.convert_to_quantized_model()
+            error = (model(inputs) - float_out).abs().max().item()
+        latency = misc.measure_cpu_latency(model, model_cfg)
+        logger.info(
+            "int8 X3D with {} (float depthwise {}): {:.2f} ms, speedup "
+            "{:.2f}x over fp32, max output error {:.2e}.".format(
+                activation,
+                cfg.QUANTIZATION.FLOAT_DEPTHWISE,
+                latency,
+                fp32_latency / latency,
+                error,
+            )
+        )
+
+
+def build_inference_model(cfg):
+    """
+    Build a compressed or dense model on CPU for inference, the way the
+    compression tools save it: a TorchScript file as TEST.CHECKPOINT_FILE_PATH,
+    e.g. the int8 model of ptq_x3d, an int8 QuantizedX3D trained with QAT, a
+    pruned model, or a dense, e.g. distilled, model.
+    Args:
+        cfg (CfgNode): configs of the model. Details can be found in
+            slowfast/config/defaults.py
+    Returns:
+        model (nn.Module): the model in eval mode.
+        kind (str): `ptq`, `qat`, `pruned`, `distilled` or `dense`.
+    """
+    import slowfast.utils.checkpoint as cu
+    from slowfast.models import build_model
+
+    if cfg.TEST.CHECKPOINT_FILE_PATH.endswith(".pt"):
+        model = torch.jit.load(cfg.TEST.CHECKPOINT_FILE_PATH, map_location="cpu")
+        return model.eval(), "ptq"
+    if cfg.QUANTIZATION.ENABLE:
+        torch.backends.quantized.engine = cfg.QUANTIZATION.BACKEND
+    model = build_model(cfg)
+    if cfg.QUANTIZATION.ENABLE and hasattr(model, "convert_to_quantized_model"):
+        model.eval()
+        model.convert_to_quantized_model()
+        cu.load_test_checkpoint(cfg, model, quantized=True)
+        kind = "qat"
+    elif cfg.PRUNING.ENABLE and cu.load_pruned_manifest(cfg) is not None:
+        model = cu.load_test_checkpoint(cfg, model, prunned=True)
+        kind = "pruned"
+    else:
+        cu.load_test_checkpoint(cfg, model)
+        kind = "distilled" if cfg.DISTILLATION.ENABLE else "dense"
+    return model.eval(), kind
+
+
+def _reset_peak_rss():
+    """
+    Reset the peak resident set size of the process. Only supported on Linux,
+    elsewhere the peak is the one of the whole process.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb(pid="self"):
+    """
+    Args:
+        pid (int or str): pid of the process, the current process by default.
+    Returns:
+        float: peak resident set size of the process in MB since the last
+            `_reset_peak_rss`.
+    """
+    try:
+        with open("/proc/{}/status".format(pid), "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark_inference(cfg):
+    """
+    Benchmark the CPU inference of the model variants of
+    `BENCHMARK.CFG_FILES`, e.g. the dense, pruned, QAT, PTQ and distilled
+    models of configs/meccano, over the batch sizes of
+    `BENCHMARK.BATCH_SIZES`, the thread counts of `BENCHMARK.NUM_THREADS` and
+    the input crop sizes of `BENCHMARK.CROP_SIZES`. The p50/p95/p99 latency,
+    throughput, peak RSS and model size of every setting are written to
+    OUTPUT_DIR/inference_benchmark.json and .csv for regression tracking.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    from slowfast.config.defaults import assert_and_infer_cfg, get_cfg
+
+    setup_environment()
+    np.random.seed(cfg.RNG_SEED)
+    torch.manual_seed(cfg.RNG_SEED)
+    logging.setup_logging(cfg.OUTPUT_DIR)
+    logger.info("Benchmark inference with config:")
+    logger.info(pprint.pformat(cfg))
+
+    default_num_threads = torch.get_num_threads()
+    results = []
+    for cfg_file in cfg.BENCHMARK.CFG_FILES or [None]:
+        if cfg_file is None:
+            model_cfg = cfg.clone()
+            name = "model"
+        else:
+            model_cfg = get_cfg()
+            model_cfg.merge_from_file(cfg_file)
+            name = os.path.splitext(os.path.basename(cfg_file))[0]
+        model_cfg.NUM_GPUS = 0
+        model_cfg = assert_and_infer_cfg(model_cfg)
+        test_crop_size = model_cfg.DATA.TEST_CROP_SIZE
+        for crop_size in cfg.BENCHMARK.CROP_SIZES or [test_crop_size]:
+            if (
+                model_cfg.TEST.CHECKPOINT_FILE_PATH.endswith(".pt")
+                and crop_size != test_crop_size
+            ):
+                logger.info(
+                    "Skipping crop size {} for {}, its TorchScript model is "
+                    "traced for crop size {}.".format(
+                        crop_size, name, test_crop_size
+                    )
+                )
+                continue
+            # The pooling of the heads depends on the crop size.
+            model_cfg.DATA.TRAIN_CROP_SIZE = crop_size
+            model_cfg.DATA.TEST_CROP_SIZE = crop_size
+            model, kind = build_inference_model(model_cfg)
+            size_mb = misc.get_model_size(model)
+            for num_threads in cfg.BENCHMARK.NUM_THREADS or [
+                default_num_threads
+            ]:
+                torch.set_num_threads(num_threads)
+                for batch_size in cfg.BENCHMARK.BATCH_SIZES:
+                    inputs = misc.get_random_inputs(
+                        model_cfg, batch_size, crop_size
+                    )
+                    _reset_peak_rss()
+                    latencies = misc.measure_latencies(
+                        model,
+                        inputs,
+                        cfg.BENCHMARK.NUM_ITERS,
+                        cfg.BENCHMARK.NUM_WARMUP,
+                    )
+                    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                    clips_per_second = batch_size * 1000.0 / np.mean(latencies)
+                    result = {
+                        "model": name,
+                        "kind": kind,
+                        "cfg_file": cfg_file or "",
+                        "crop_size": crop_size,
+                        "num_frames": model_cfg.DATA.NUM_FRAMES,
+                        "num_threads": num_threads,
+                        "batch_size": batch_size,
+                        "p50_ms": float(p50),
+                        "p95_ms": float(p95),
+                        "p99_ms": float(p99),
+                        "clips_per_second": float(clips_per_second),
+                        "frames_per_second": float(
+                            clips_per_second * model_cfg.DATA.NUM_FRAMES
+                        ),
+                        "peak_rss_mb": _peak_rss_mb(),
+                        "model_size_mb": size_mb,
+                    }
+                    logger.info(
+                        "{} ({}), crop {}, {} threads, batch size {}: p50 "
+                        "{:.2f} ms, p95 {:.2f} ms, p99 {:.2f} ms, {:.2f} "
+                        "clips/s, peak RSS {:.0f} MB, size {:.2f} MB.".format(
+                            name,
+                            kind,
+                            crop_size,
+                            num_threads,
+                            batch_size,
+                            p50,
+                            p95,
+                            p99,
+                            clips_per_second,
+                            result["peak_rss_mb"],
+                            size_mb,
+                        )
+                    )
+                    results.append(result)
+            del model
+    torch.set_num_threads(default_num_threads)
+
+    if len(results) == 0:
+        logger.warning(
+            "No setting was benchmarked, check BENCHMARK.BATCH_SIZES and "
+            "BENCHMARK.CROP_SIZES."
+        )
+        return
+    report_path = os.path.join(cfg.OUTPUT_DIR, "inference_benchmark")
+    with open(report_path + ".json", "w") as f:
+        json.dump(
+            {
+                "torch_version": torch.__version__,
+                "cpu_count": os.cpu_count(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    with open(report_path + ".csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    logger.info("Inference benchmark saved to {}.json/.csv".format(report_path))
+
+
+def _run_streams(server, frames, num_streams, num_requests, clips_per_second):
+    """
+    Send the clips of concurrent synthetic camera streams to a server.
+    Args:
+        server (InferenceServer): server to send the clips to.
+        frames (list): frames of the clips of the streams.
+        num_streams (int): number of streams.
+        num_requests (int): number of clips sent by every stream.
+        clips_per_second (float): clips per second sent by every stream. If
+            not positive, send the next clip when the previous one is done.
+    Returns:
+        latencies (ndarray): latency of every request in milliseconds.
+        elapsed (float): seconds from the first request to the last result.
+    """
+    from slowfast.visualization.utils import TaskInfo
+
+    latencies = []
+    errors = []
+
+    def _stream():
+        try:
+            _send_clips()
+        except Exception as e:
+            errors.append(e)
+
+    def _send_clips():
+        futures = []
+        for idx in range(num_requests):
+            task = TaskInfo()
+            task.add_frames(idx, frames)
+            task.img_height, task.img_width = frames[0].shape[:2]
+            start = time.perf_counter()
+            future = server.submit(task)
+            future.add_done_callback(
+                lambda _, start=start: latencies.append(
+                    time.perf_counter() - start
+                )
+            )
+            futures.append(future)
+            if clips_per_second > 0:
+                next_start = start + 1.0 / clips_per_second
+                time.sleep(max(next_start - time.perf_counter(), 0))
+            else:
+                future.result()
+        for future in futures:
+            future.result()
+
+    streams = [threading.Thread(target=_stream) for _ in range(num_streams)]
+    start = time.perf_counter()
+    for stream in streams:
+        stream.start()
+    for stream in streams:
+        stream.join()
+    if len(errors) > 0:
+        raise errors[0]
+    return np.array(latencies) * 1000.0, time.perf_counter() - start
+
+
+def benchmark_server(cfg):
+    """
+    Benchmark InferenceServer under the load of `BENCHMARK.NUM_STREAMS`
+    concurrent synthetic camera streams, each sending
+    `BENCHMARK.NUM_REQUESTS` clips of VGA frames at
+    `BENCHMARK.CLIPS_PER_SECOND`, for every maximum batch size of
+    `BENCHMARK.BATCH_SIZES` with the wait of `DEMO.MAX_WAIT_MS`. The request
+    latency, including the preprocessing, and the throughput of every setting
+    are written to OUTPUT_DIR/server_benchmark.json and .csv.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    from slowfast.visualization.async_predictor import InferenceServer
+
+    setup_environment()
+    np.random.seed(cfg.RNG_SEED)
+    torch.manual_seed(cfg.RNG_SEED)
+    logging.setup_logging(cfg.OUTPUT_DIR)
+    logger.info("Benchmark inference server with config:")
+    logger.info(pprint.pformat(cfg))
+
+    frames = [
+        np.random.randint(0, 256, (480, 640, 3), dtype=np.uint8)
+        for _ in range(cfg.DATA.NUM_FRAMES * cfg.DATA.SAMPLING_RATE)
+    ]
+    results = []
+    for max_batch_size in cfg.BENCHMARK.BATCH_SIZES:
+        server_cfg = cfg.clone()
+        server_cfg.DEMO.MAX_BATCH_SIZE = max_batch_size
+        server = InferenceServer(server_cfg)
+        # Stop the workers even if a request fails.
+        try:
+            _run_streams(server, frames, 1, cfg.BENCHMARK.NUM_WARMUP, 0)
+            for num_streams in cfg.BENCHMARK.NUM_STREAMS:
+                latencies, elapsed = _run_streams(
+                    server,
+                    frames,
+                    num_streams,
+                    cfg.BENCHMARK.NUM_REQUESTS,
+                    cfg.BENCHMARK.CLIPS_PER_SECOND,
+                )
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                result = {
+                    "max_batch_size": max_batch_size,
+                    "max_wait_ms": cfg.DEMO.MAX_WAIT_MS,
+                    "num_streams": num_streams,
+                    "clips_per_second_per_stream": cfg.BENCHMARK.CLIPS_PER_SECOND,
+                    "p50_ms": float(p50),
+                    "p95_ms": float(p95),
+                    "p99_ms": float(p99),
+                    "clips_per_second": float(len(latencies) / elapsed),
+                }
+                logger.info(
+                    "Max batch size {}, {} streams: p50 {:.2f} ms, p95 {:.2f} ms, "
+                    "p99 {:.2f} ms, {:.2f} clips/s.".format(
+                        max_batch_size,
+                        num_streams,
+                        p50,
+                        p95,
+                        p99,
+                        result["clips_per_second"],
+                    )
+                )
+                results.append(result)
+        finally:
+            server.shutdown()
+
+    if len(results) == 0:
+        logger.warning(
+            "No setting was benchmarked, check BENCHMARK.BATCH_SIZES and "
+            "BENCHMARK.NUM_STREAMS."
+        )
+        return
+    report_path = os.path.join(cfg.OUTPUT_DIR, "server_benchmark")
+    with open(report_path + ".json", "w") as f:
+        json.dump(
+            {
+                "torch_version": torch.__version__,
+                "cpu_count": os.cpu_count(),
+                "num_gpus": cfg.NUM_GPUS,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    with open(report_path + ".csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    logger.info("Server benchmark saved to {}.json/.csv".format(report_path))
+
+
+def benchmark_streaming(cfg):
+    """
+    Benchmark the streaming inference of the demo, see
+    slowfast.models.streaming, against the clip model on a synthetic stream.
+    Every clip of the demo brings `NUM_FRAMES - DEMO.BUFFER_SIZE //
+    SAMPLING_RATE` new sampled frames, which the clip model recomputes with
+    the whole clip and the streaming model computes alone. The parity of the
+    streaming model, its agreement with the clip model and the latency of
+    both are written to OUTPUT_DIR/streaming_benchmark.json.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    import copy
+
+    from slowfast.models.streaming import (
+        convert_to_streaming,
+        get_stream_chunk_size,
+        get_stream_num_frames,
+        pack_stream_pathways,
+        reset_streaming_state,
+    )
+
+    setup_environment()
+    np.random.seed(cfg.RNG_SEED)
+    torch.manual_seed(cfg.RNG_SEED)
+    logging.setup_logging(cfg.OUTPUT_DIR)
+    logger.info("Benchmark streaming inference with config:")
+    logger.info(pprint.pformat(cfg))
+
+    assert not cfg.MECCANO.GAZE_ENABLE, "Gaze models are not supported"
+    model, kind = build_inference_model(cfg)
+    assert kind not in ["ptq", "qat"], "Streaming needs a float model"
+    num_frames = get_stream_num_frames(cfg)
+    stream_model = convert_to_streaming(copy.deepcopy(model), num_frames)
+    num_pathways = len(num_frames)
+    chunk_size = get_stream_chunk_size(cfg)
+    clip_size = cfg.DATA.NUM_FRAMES
+    step_size = clip_size - cfg.DEMO.BUFFER_SIZE // cfg.DATA.SAMPLING_RATE
+    # The Slow pathway of SlowFast needs whole chunks of frames.
+    step_size = -(-max(step_size, 1) // chunk_size) * chunk_size
+    crop_size = cfg.DATA.TEST_CROP_SIZE
+
+    def _pathways(frames):
+        return pack_stream_pathways(frames, num_pathways, cfg.SLOWFAST.ALPHA)
+
+    num_steps = cfg.BENCHMARK.NUM_ITERS
+    frames = torch.rand(
+        1, 3, clip_size + num_steps * step_size, crop_size, crop_size
+    )
+    with torch.no_grad():
+        # The predictions must not depend on how the stream is chunked.
+        reset_streaming_state(stream_model)
+        whole = stream_model(_pathways(frames))
+        reset_streaming_state(stream_model)
+        for start in range(0, frames.shape[2], chunk_size):
+            chunked = stream_model(
+                _pathways(frames[:, :, start : start + chunk_size])
+            )
+        chunk_max_abs_diff = (whole - chunked).abs().max().item()
+
+        # Streaming is causal, so it approximates the clip model.
+        reset_streaming_state(stream_model)
+        stream_model(_pathways(frames[:, :, :clip_size]))
+        diffs, agreements = [], []
+        for end in range(clip_size + step_size, frames.shape[2] + 1, step_size):
+            stream_preds = stream_model(
+                _pathways(frames[:, :, end - step_size : end])
+            )
+            clip_preds = model(_pathways(frames[:, :, end - clip_size : end]))
+            diffs.append((stream_preds - clip_preds).abs().max().item())
+            agreements.append(
+                (stream_preds.argmax(1) == clip_preds.argmax(1)).item()
+            )
+
+    clip_latencies = misc.measure_latencies(
+        model,
+        (_pathways(frames[:, :, :clip_size]),),
+        cfg.BENCHMARK.NUM_ITERS,
+        cfg.BENCHMARK.NUM_WARMUP,
+    )
+    results = []
+    for num_new_frames in sorted({chunk_size, step_size}):
+        stream_latencies = misc.measure_latencies(
+            stream_model,
+            (_pathways(frames[:, :, :num_new_frames]),),
+            cfg.BENCHMARK.NUM_ITERS,
+            cfg.BENCHMARK.NUM_WARMUP,
+        )
+        clip_ms = float(np.median(clip_latencies))
+        stream_ms = float(np.median(stream_latencies))
+        result = {
+            "num_new_frames": num_new_frames,
+            "clip_ms": clip_ms,
+            "stream_ms": stream_ms,
+            "clip_ms_per_new_frame": clip_ms / num_new_frames,
+            "stream_ms_per_new_frame": stream_ms / num_new_frames,
+            "speedup": clip_ms / stream_ms,
+        }
+        logger.info(
+            "{} new frames: clip {:.2f} ms, stream {:.2f} ms, "
+            "{:.2f}x.".format(
+                num_new_frames, clip_ms, stream_ms, result["speedup"]
+            )
+        )
+        results.append(result)
+
+    report = {
+        "torch_version": torch.__version__,
+        "num_threads": torch.get_num_threads(),
+        "kind": kind,
+        "num_frames": num_frames,
+        "demo_new_frames": step_size,
+        "chunk_max_abs_diff": chunk_max_abs_diff,
+        "clip_top1_agreement": float(np.mean(agreements)),
+        "clip_max_abs_diff": float(np.max(diffs)),
+        "results": results,
+    }
+    logger.info(
+        "Chunking max abs diff {:.3g}, top-1 agreement with the clip model "
+        "{:.3f}, max abs diff {:.3g}.".format(
+            chunk_max_abs_diff,
+            report["clip_top1_agreement"],
+            report["clip_max_abs_diff"],
+        )
+    )
+    report_path = os.path.join(cfg.OUTPUT_DIR, "streaming_benchmark.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info("Streaming benchmark saved to {}".format(report_path))
+
+
+def _preprocess_per_frame(frames, cfg):
+    """
+    Preprocess a demo clip the way the Predictor did before ClipPreprocessor:
+    convert and scale every frame, then `process_cv2_inputs`.
+    """
+    import cv2
+
+    from slowfast.datasets import cv2_transform
+    from slowfast.visualization.utils import process_cv2_inputs
+
+    if cfg.DEMO.INPUT_FORMAT == "BGR":
+        frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+    frames = [
+        cv2_transform.scale(cfg.DATA.TEST_CROP_SIZE, frame) for frame in frames
+    ]
+    return process_cv2_inputs(frames, cfg)
+
+
+def _measure_allocations(func):
+    """
+    Measure the memory allocated by a call.
+    Args:
+        func (callable): function to call without arguments.
+    Returns:
+        numpy_peak_mb (float): peak of the NumPy and OpenCV buffers allocated
+            during the call, traced by tracemalloc.
+        torch_allocated_mb (float): total size of the torch CPU allocations.
+        torch_num_allocations (int): number of torch CPU allocations.
+    """
+    import tracemalloc
+
+    from torch.profiler import ProfilerActivity, profile
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        func()
+    numpy_peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    allocations = [
+        event.self_cpu_memory_usage
+        for event in prof.events()
+        if event.self_cpu_memory_usage > 0
+    ]
+    return numpy_peak / 1024**2, sum(allocations) / 1024**2, len(allocations)
+
+
+def benchmark_preprocessing(cfg):
+    """
+    Benchmark the preprocessing of a demo clip of `NUM_FRAMES *
+    SAMPLING_RATE` VGA frames, per frame as the Predictor did before vs. the
+    fused ClipPreprocessor. The time and the allocations per clip of both
+    are written to OUTPUT_DIR/preprocess_benchmark.json.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    from slowfast.visualization.utils import ClipPreprocessor
+
+    setup_environment()
+    np.random.seed(cfg.RNG_SEED)
+    torch.manual_seed(cfg.RNG_SEED)
+    logging.setup_logging(cfg.OUTPUT_DIR)
+    logger.info("Benchmark clip preprocessing with config:")
+    logger.info(pprint.pformat(cfg))
+
+    frames = [
+        np.random.randint(0, 256, (480, 640, 3), dtype=np.uint8)
+        for _ in range(cfg.DATA.NUM_FRAMES * cfg.DATA.SAMPLING_RATE)
+    ]
+    preprocessor = ClipPreprocessor(cfg)
+    variants = {
+        "per_frame": lambda: _preprocess_per_frame(frames, cfg),
+        "fused": lambda: preprocessor(frames),
+    }
+    outputs = {name: func() for name, func in variants.items()}
+    max_abs_diff = max(
+        (x.cpu() - y).abs().max().item()
+        for x, y in zip(outputs["fused"], outputs["per_frame"])
+    )
+    results = {}
+    for name, func in variants.items():
+        for _ in range(cfg.BENCHMARK.NUM_WARMUP):
+            func()
+        times = []
+        for _ in range(cfg.BENCHMARK.NUM_ITERS):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        numpy_peak_mb, torch_mb, torch_count = _measure_allocations(func)
+        results[name] = {
+            "ms_per_clip": float(np.median(times) * 1000.0),
+            "numpy_peak_mb": numpy_peak_mb,
+            "torch_allocated_mb": torch_mb,
+            "torch_num_allocations": torch_count,
+        }
+        logger.info(
+            "{}: {:.2f} ms per clip, NumPy peak {:.1f} MB, torch {:.1f} MB "
+            "in {} allocations.".format(
+                name,
+                results[name]["ms_per_clip"],
+                numpy_peak_mb,
+                torch_mb,
+                torch_count,
+            )
+        )
+    speedup = results["per_frame"]["ms_per_clip"] / results["fused"]["ms_per_clip"]
+    logger.info(
+        "Fused preprocessing {:.2f}x faster, max abs diff {:.3g}.".format(
+            speedup, max_abs_diff
+        )
+    )
+
+    report_path = os.path.join(cfg.OUTPUT_DIR, "preprocess_benchmark.json")
+    with open(report_path, "w") as f:
+        json.dump(
+            {
+                "torch_version": torch.__version__,
+                "num_frames": len(frames),
+                "max_abs_diff": max_abs_diff,
+                "speedup": speedup,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    logger.info("Preprocessing benchmark saved to {}".format(report_path))
+
+
+def benchmark_batch_augmentation(cfg):
+    """
+    Benchmark the clips/s of the train loader with the per-clip augmentation
+    of the workers vs. DATA.BATCH_AUGMENTATION, where the workers only decode
+    and the batch is augmented after the transfer to the device, the GPU if
+    NUM_GPUS > 0. Every variant runs `BENCHMARK.NUM_EPOCHS` epochs with
+    `DATA_LOADER.NUM_WORKERS` workers. The results are written to
+    OUTPUT_DIR/batch_augment_benchmark.json.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    from slowfast.datasets.batch_transform import batch_augment
+
+    setup_environment()
+    np.random.seed(cfg.RNG_SEED)
+    torch.manual_seed(cfg.RNG_SEED)
+    logging.setup_logging(cfg.OUTPUT_DIR)
+    logger.info("Benchmark batched augmentation with config:")
+    logger.info(pprint.pformat(cfg))
+
+    device = torch.device("cuda" if cfg.NUM_GPUS > 0 else "cpu")
+    results = {}
+    for batch_augmentation in [False, True]:
+        variant_cfg = cfg.clone()
+        variant_cfg.DATA.BATCH_AUGMENTATION = batch_augmentation
+        dataloader = loader.construct_loader(variant_cfg, "train")
+        num_clips = 0
+        start = time.perf_counter()
+        for cur_epoch in range(cfg.BENCHMARK.NUM_EPOCHS):
+            loader.shuffle_dataset(dataloader, cur_epoch)
+            for inputs, _, _, _, meta in dataloader:
+                inputs = [x.to(device, non_blocking=True) for x in inputs]
+                if batch_augmentation:
+                    inputs = batch_augment(
+                        inputs[0], meta["spatial_params"], variant_cfg
+                    )
+                if device.type == "cuda":
+                    torch.cuda.synchronize()
+                num_clips += inputs[0].shape[0]
+        elapsed = time.perf_counter() - start
+        name = "batched" if batch_augmentation else "per_clip"
+        results[name] = {
+            "num_clips": num_clips,
+            "seconds": elapsed,
+            "clips_per_second": num_clips / elapsed,
+        }
+        logger.info(
+            "{}: {} clips in {:.2f} s, {:.2f} clips/s.".format(
+                name, num_clips, elapsed, num_clips / elapsed
+            )
+        )
+
+    report_path = os.path.join(cfg.OUTPUT_DIR, "batch_augment_benchmark.json")
+    with open(report_path, "w") as f:
+        json.dump(
+            {
+                "torch_version": torch.__version__,
+                "cpu_count": os.cpu_count(),
+                "num_workers": cfg.DATA_LOADER.NUM_WORKERS,
+                "device": device.type,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    logger.info("Batched augmentation benchmark saved to {}".format(report_path))
+
+
+def _normalize_then_sample(
+    frames,
+    mean,
+    std,
+    spatial_idx=-1,
+    min_scale=256,
+    max_scale=320,
+    crop_size=224,
+    random_horizontal_flip=True,
+    inverse_uniform_sampling=False,
+):
+    """
+    Spatially sample a clip the way the datasets did before
+    `normalized_spatial_sampling`: normalize the full resolution float frames,
+    then scale, crop and flip them.
+    """
+    from slowfast.datasets import utils
+
+    frames = utils.tensor_normalize(frames, mean, std)
+    # T H W C -> C T H W.
+    frames = frames.permute(3, 0, 1, 2)
+    return utils.spatial_sampling(
+        frames,
+        spatial_idx=spatial_idx,
+        min_scale=min_scale,
+        max_scale=max_scale,
+        crop_size=crop_size,
+        random_horizontal_flip=random_horizontal_flip,
+        inverse_uniform_sampling=inverse_uniform_sampling,
+    )
+
+
+def _update_worker_peak_rss(peak_rss):
+    """
+    Update the peak resident set size of the data loader workers, the
+    children of the process.
+    Args:
+        peak_rss (dict): peak RSS in MB of every worker pid, updated in place.
+    """
+    import psutil
+
+    for child in psutil.Process().children():
+        peak_rss[child.pid] = max(
+            peak_rss.get(child.pid, 0.0), _peak_rss_mb(child.pid)
+        )
+
+
+def benchmark_uint8_clips(cfg):
+    """
+    Benchmark the train loader of `TRAIN.DATASET` with the clips normalized at
+    full resolution before spatial sampling, as the datasets did before, vs.
+    sampled in uint8 with only the crops normalized. Every variant runs
+    `BENCHMARK.NUM_EPOCHS` epochs and reports the clips/s, the peak RSS of the
+    data loader workers, and the bytes of tensors per batch sent by the
+    workers through shared memory. The peak RSS of the workers includes the
+    memory shared with the main process they are forked from, so the torch
+    memory allocated to load a clip is reported too. The previous pipeline
+    is swapped in the workers by patching `normalized_spatial_sampling`
+    before they are forked.
+    For MECCANO, DATA.BATCH_AUGMENTATION is benchmarked too: the workers send
+    the uint8 clips and the crops are sampled and normalized on the device.
+    The results are written to OUTPUT_DIR/uint8_clips_benchmark.json.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    from slowfast.datasets import utils
+    from slowfast.datasets.batch_transform import batch_augment
+
+    setup_environment()
+    np.random.seed(cfg.RNG_SEED)
+    torch.manual_seed(cfg.RNG_SEED)
+    logging.setup_logging(cfg.OUTPUT_DIR)
+    logger.info("Benchmark uint8 clip sampling with config:")
+    logger.info(pprint.pformat(cfg))
+
+    device = torch.device("cuda" if cfg.NUM_GPUS > 0 else "cpu")
+    uint8_sampling = utils.normalized_spatial_sampling
+    variants = [
+        ("float_first", _normalize_then_sample, False),
+        ("uint8", uint8_sampling, False),
+    ]
+    if cfg.TRAIN.DATASET == "meccano":
+        variants.append(("batch_augmentation", uint8_sampling, True))
+    results = {}
+    for name, sampling_func, batch_augmentation in variants:
+        variant_cfg = cfg.clone()
+        variant_cfg.DATA.BATCH_AUGMENTATION = batch_augmentation
+        utils.normalized_spatial_sampling = sampling_func
+        try:
+            dataloader = loader.construct_loader(variant_cfg, "train")
+            num_clips = 0
+            num_batches = 0
+            batch_bytes = 0
+            peak_rss = {}
+            _reset_peak_rss()
+            start = time.perf_counter()
+            for cur_epoch in range(cfg.BENCHMARK.NUM_EPOCHS):
+                loader.shuffle_dataset(dataloader, cur_epoch)
+                for inputs, _, _, _, meta in dataloader:
+                    _update_worker_peak_rss(peak_rss)
+                    batch_bytes += sum(
+                        x.nelement() * x.element_size() for x in inputs
+                    )
+                    num_batches += 1
+                    inputs = [x.to(device, non_blocking=True) for x in inputs]
+                    if batch_augmentation:
+                        inputs = batch_augment(
+                            inputs[0], meta["spatial_params"], variant_cfg
+                        )
+                    if device.type == "cuda":
+                        torch.cuda.synchronize()
+                    num_clips += inputs[0].shape[0]
+            elapsed = time.perf_counter() - start
+            _, clip_allocated_mb, _ = _measure_allocations(
+                lambda: dataloader.dataset[0]
+            )
+        finally:
+            utils.normalized_spatial_sampling = uint8_sampling
+        results[name] = {
+            "num_clips": num_clips,
+            "seconds": elapsed,
+            "clips_per_second": num_clips / elapsed,
+            "transfer_mb_per_batch": batch_bytes / max(num_batches, 1) / 1024**2,
+            # Without workers, the clips are loaded by the main process.
+            "worker_peak_rss_mb": (
+                max(peak_rss.values()) if len(peak_rss) > 0 else _peak_rss_mb()
+            ),
+            "clip_allocated_mb": clip_allocated_mb,
+        }
+        logger.info(
+            "{}: {:.2f} clips/s, {:.2f} MB per batch, worker peak RSS "
+            "{:.1f} MB, {:.1f} MB allocated per clip.".format(
+                name,
+                results[name]["clips_per_second"],
+                results[name]["transfer_mb_per_batch"],
+                results[name]["worker_peak_rss_mb"],
+                clip_allocated_mb,
+            )
+        )
+
+    report_path = os.path.join(cfg.OUTPUT_DIR, "uint8_clips_benchmark.json")
+    with open(report_path, "w") as f:
+        json.dump(
+            {
+                "torch_version": torch.__version__,
+                "cpu_count": os.cpu_count(),
+                "dataset": cfg.TRAIN.DATASET,
+                "num_workers": cfg.DATA_LOADER.NUM_WORKERS,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    logger.info("uint8 clip sampling benchmark saved to {}".format(report_path))
+
+
+class _FramePathReader(torch.utils.data.Dataset):
+    """
+    Dataset reading every frame path of a video, as the data loader workers
+    of a frame list dataset do over an epoch.
+    """
+
+    def __init__(self, image_paths):
+        """
+        Args:
+            image_paths (list or FramePathIndex): frame paths of every video.
+        """
+        self.image_paths = image_paths
+
+    def __getitem__(self, index):
+        return sum(len(path) for path in self.image_paths[index])
+
+    def __len__(self):
+        return len(self.image_paths)
+
+
+def _load_frame_path_index(cfg):
+    """
+    Load the frame paths of the train split of `TRAIN.DATASET`, one of `ava`,
+    `charades` or `ssv2`.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    Returns:
+        image_paths (FramePathIndex): the frame paths of every video.
+    """
+    from slowfast.datasets import ava_helper, utils
+
+    if cfg.TRAIN.DATASET == "ava":
+        return ava_helper.load_image_lists(cfg, is_train=True)[0]
+    assert cfg.TRAIN.DATASET in ["charades", "ssv2"], (
+        "Frame lists of {} not supported".format(cfg.TRAIN.DATASET)
+    )
+    path_to_file = os.path.join(cfg.DATA.PATH_TO_DATA_DIR, "train.csv")
+    return utils.load_image_lists(
+        path_to_file, cfg.DATA.PATH_PREFIX, return_index=True
+    )[0]
+
+
+def benchmark_frame_index(cfg):
+    """
+    Benchmark the memory of the frame paths of the train split of
+    `TRAIN.DATASET` (`ava`, `charades` or `ssv2`) in the data loader workers,
+    as nested lists of path strings vs. a FramePathIndex. The workers read
+    every path once, as over an epoch, and their peak RSS and unique set size
+    (USS, the memory not shared with the main process, e.g. the pages copied
+    on write) are reported with the size of the paths in the main process.
+    The results are written to OUTPUT_DIR/frame_index_benchmark.json.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    import gc
+    import tracemalloc
+
+    import psutil
+
+    setup_environment()
+    logging.setup_logging(cfg.OUTPUT_DIR)
+    logger.info("Benchmark frame path index with config:")
+    logger.info(pprint.pformat(cfg))
+
+    start = time.perf_counter()
+    index = _load_frame_path_index(cfg)
+    logger.info(
+        "Loaded {} frames of {} videos in {:.1f} s.".format(
+            index.num_frames, len(index), time.perf_counter() - start
+        )
+    )
+    index_mb = (
+        sum(
+            array.nbytes
+            for array in vars(index).values()
+            if isinstance(array, np.ndarray)
+        )
+        / 1024**2
+    )
+    tracemalloc.start()
+    lists = [list(video_paths) for video_paths in index]
+    lists_mb = tracemalloc.get_traced_memory()[0] / 1024**2
+    tracemalloc.stop()
+
+    results = {}
+    for name, image_paths, size_mb in [
+        ("lists", lists, lists_mb),
+        ("index", index, index_mb),
+    ]:
+        gc.collect()
+        dataloader = torch.utils.data.DataLoader(
+            _FramePathReader(image_paths),
+            batch_size=1,
+            num_workers=cfg.DATA_LOADER.NUM_WORKERS,
+        )
+        peak_rss, peak_uss = {}, {}
+        start = time.perf_counter()
+        for _ in dataloader:
+            _update_worker_peak_rss(peak_rss)
+            for child in psutil.Process().children():
+                try:
+                    uss = child.memory_full_info().uss / 1024**2
+                except psutil.NoSuchProcess:
+                    continue
+                peak_uss[child.pid] = max(peak_uss.get(child.pid, 0.0), uss)
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "size_mb": size_mb,
+            "seconds": elapsed,
+            "worker_peak_rss_mb": max(peak_rss.values(), default=0.0),
+            "worker_peak_uss_mb": max(peak_uss.values(), default=0.0),
+        }
+        logger.info(
+            "{}: {:.1f} MB of paths, worker peak RSS {:.1f} MB, USS {:.1f} "
+            "MB, {:.1f} s.".format(
+                name,
+                size_mb,
+                results[name]["worker_peak_rss_mb"],
+                results[name]["worker_peak_uss_mb"],
+                elapsed,
+            )
+        )
+        del dataloader
+    results["worker_uss_drop_mb"] = (
+        results["lists"]["worker_peak_uss_mb"]
+        - results["index"]["worker_peak_uss_mb"]
+    )
+
+    report_path = os.path.join(cfg.OUTPUT_DIR, "frame_index_benchmark.json")
+    with open(report_path, "w") as f:
+        json.dump(
+            {
+                "dataset": cfg.TRAIN.DATASET,
+                "num_videos": len(index),
+                "num_frames": index.num_frames,
+                "num_workers": cfg.DATA_LOADER.NUM_WORKERS,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    logger.info("Frame path index benchmark saved to {}".format(report_path))
+
+
+def benchmark_ava_startup(cfg):
+    """
+    Benchmark the startup time of the AVA dataset of every split: parsing the
+    frame lists and box files line by line with ava_helper vs. building the
+    index of `ava_index.load_ava_index` with vectorized parsing and saving it
+    (cold), vs. loading the saved index (warm). The index is cached in
+    OUTPUT_DIR/ava_annotation_cache, cleared first. The results are written
+    to OUTPUT_DIR/ava_startup_benchmark.json.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    import shutil
+
+    from slowfast.datasets import ava_helper, ava_index
+
+    setup_environment()
+    logging.setup_logging(cfg.OUTPUT_DIR)
+    logger.info("Benchmark AVA startup with config:")
+    logger.info(pprint.pformat(cfg))
+
+    cache_dir = os.path.join(cfg.OUTPUT_DIR, "ava_annotation_cache")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    index_cfg = cfg.clone()
+    index_cfg.AVA.ANNOTATION_CACHE_DIR = cache_dir
+
+    results = {}
+    for split in ["train", "val", "test"]:
+        start = time.perf_counter()
+        image_paths, video_idx_to_name = ava_helper.load_image_lists(
+            cfg, is_train=(split == "train")
+        )
+        boxes_and_labels = ava_helper.load_boxes_and_labels(cfg, mode=split)
+        boxes_and_labels = [
+            boxes_and_labels[video_idx_to_name[i]]
+            for i in range(len(image_paths))
+        ]
+        keyframe_indices, keyframe_boxes_and_labels = (
+            ava_helper.get_keyframe_data(boxes_and_labels)
+        )
+        num_boxes = ava_helper.get_num_boxes_used(
+            keyframe_indices, keyframe_boxes_and_labels
+        )
+        results[split] = {"line_by_line_seconds": time.perf_counter() - start}
+        del image_paths, boxes_and_labels, keyframe_boxes_and_labels
+
+        for name in ["cold", "warm"]:
+            start = time.perf_counter()
+            _, _, keyframes = ava_index.load_ava_index(index_cfg, split)
+            results[split][name + "_seconds"] = time.perf_counter() - start
+        assert len(keyframes) == len(keyframe_indices)
+        assert keyframes.num_boxes == num_boxes
+        results[split]["num_keyframes"] = len(keyframes)
+        results[split]["num_boxes"] = num_boxes
+        logger.info(
+            "{}: {} keyframes, line by line {:.2f} s, cold {:.2f} s, warm "
+            "{:.2f} s.".format(
+                split,
+                len(keyframes),
+                results[split]["line_by_line_seconds"],
+                results[split]["cold_seconds"],
+                results[split]["warm_seconds"],
+            )
+        )
+
+    report_path = os.path.join(cfg.OUTPUT_DIR, "ava_startup_benchmark.json")
+    with open(report_path, "w") as f:
+        json.dump({"results": results}, f, indent=2)
+    logger.info("AVA startup benchmark saved to {}".format(report_path))
+
+
+class _CountingContainer(object):
+    """
+    PyAV container counting the frames it decodes.
+    """
+
+    def __init__(self, container, counter):
+        self._container = container
+        self._counter = counter
+
+    def __getattr__(self, name):
+        return getattr(self._container, name)
+
+    def decode(self, *args, **kwargs):
+        for frame in self._container.decode(*args, **kwargs):
+            self._counter[0] += 1
+            yield frame
+
+
+def benchmark_pyav_decode(cfg):
+    """
+    Benchmark the Kinetics clips of `TRAIN.DATASET` decoded with the `pyav`
+    backend: a container opened per clip and seeked with a margin, as before,
+    vs. containers kept in a DATA_LOADER.CONTAINER_POOL_SIZE pool (16 if 0),
+    vs. the pool and a PTS index, seeking to the exact GOP start of every clip
+    and stopping at its last frame. The index of DATA.VIDEO_INDEX_DIR is used
+    if set, otherwise it is built in OUTPUT_DIR/video_index. Every variant
+    loads `BENCHMARK.NUM_CLIPS` clips in the main process, in a random order
+    of the train split, where the videos are rarely revisited, and in order
+    of the test split, where the views of a video follow each other. The
+    clips/s and the frames decoded per clip are written to
+    OUTPUT_DIR/pyav_decode_benchmark.json.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    import random
+
+    from slowfast.datasets import video_container, video_index
+    from slowfast.datasets.build import build_dataset
+
+    setup_environment()
+    logging.setup_logging(cfg.OUTPUT_DIR)
+    logger.info("Benchmark PyAV decoding with config:")
+    logger.info(pprint.pformat(cfg))
+
+    pool_size = cfg.DATA_LOADER.CONTAINER_POOL_SIZE or 16
+    build_index = not cfg.DATA.VIDEO_INDEX_DIR
+    index_dir = cfg.DATA.VIDEO_INDEX_DIR or os.path.join(
+        cfg.OUTPUT_DIR, "video_index"
+    )
+    counter = [0]
+    get_video_container = video_container.get_video_container
+
+    def get_counting_container(*args, **kwargs):
+        return _CountingContainer(get_video_container(*args, **kwargs), counter)
+
+    results = {}
+    video_container.get_video_container = get_counting_container
+    try:
+        for split in ["train", "test"]:
+            if build_index:
+                dataset = build_dataset(cfg.TRAIN.DATASET, cfg, split)
+                video_index.build_video_index(
+                    dataset._path_to_videos, cfg.DATA_LOADER.NUM_WORKERS
+                ).save(os.path.join(index_dir, split))
+            results[split] = {}
+            for name, variant_pool_size, variant_index_dir in [
+                ("reopen", 0, ""),
+                ("pool", pool_size, ""),
+                ("pool_index", pool_size, index_dir),
+            ]:
+                variant_cfg = cfg.clone()
+                variant_cfg.DATA.DECODING_BACKEND = "pyav"
+                variant_cfg.DATA_LOADER.CONTAINER_POOL_SIZE = variant_pool_size
+                variant_cfg.DATA.VIDEO_INDEX_DIR = variant_index_dir
+                dataset = build_dataset(cfg.TRAIN.DATASET, variant_cfg, split)
+                random.seed(cfg.RNG_SEED)
+                np.random.seed(cfg.RNG_SEED)
+                torch.manual_seed(cfg.RNG_SEED)
+                if split == "train":
+                    indices = np.random.permutation(len(dataset))
+                else:
+                    indices = np.arange(len(dataset))
+                num_clips = min(cfg.BENCHMARK.NUM_CLIPS, len(indices))
+                counter[0] = 0
+                start = time.perf_counter()
+                for index in indices[:num_clips]:
+                    dataset[int(index)]
+                elapsed = time.perf_counter() - start
+                results[split][name] = {
+                    "num_clips": num_clips,
+                    "seconds": elapsed,
+                    "clips_per_second": num_clips / elapsed,
+                    "decoded_frames_per_clip": counter[0] / num_clips,
+                }
+                logger.info(
+                    "{} {}: {:.2f} clips/s, {:.1f} decoded frames per "
+                    "clip.".format(
+                        split, name, num_clips / elapsed, counter[0] / num_clips
+                    )
+                )
+    finally:
+        video_container.get_video_container = get_video_container
+
+    report_path = os.path.join(cfg.OUTPUT_DIR, "pyav_decode_benchmark.json")
+    with open(report_path, "w") as f:
+        json.dump(
+            {"pool_size": pool_size, "cpu_count": os.cpu_count(), "results": results},
+            f,
+            indent=2,
+        )
+    logger.info("PyAV decoding benchmark saved to {}".format(report_path))
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+"""Memory-mapped store of preprocessed clips for quantization calibration."""
+
+import json
+import os
+
+import numpy as np
+import torch
+
+
+class CalibrationCache(object):
+    """
+    Preprocessed calibration clips stored in uint8 `numpy.memmap` arrays, one
+    per pathway, of dimension `num samples` x `channel` x `num frames` x
+    `height` x `width`. The normalized clips are stored as pixel values and
+    normalized back with the mean and std of the store when read. Iterating
+    over the store yields the batches in the format of the data loaders.
+    """
+
+    def __init__(self, path, mode="r"):
+        """
+        Open an existing store.
+        Args:
+            path (str): directory of the store.
+            mode (str): `r` to read, `r+` to also write.
+        """
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        self.path = path
+        self.num_samples = meta["num_samples"]
+        self.batch_size = meta["batch_size"]
+        self.key = meta["key"]
+        self.mean = torch.tensor(meta["mean"]).view(-1, 1, 1, 1)
+        self.std = torch.tensor(meta["std"]).view(-1, 1, 1, 1)
+        self.pathways = [
+            np.load(
+                os.path.join(path, "pathway{}.npy".format(i)), mmap_mode=mode
+            )
+            for i in range(meta["num_pathways"])
+        ]
+        self.labels = np.load(os.path.join(path, "labels.npy"), mmap_mode=mode)
+
+    @staticmethod
+    def exists(path, key=None):
+        """
+        Args:
+            path (str): directory of the store.
+            key (dict): if not None, the settings the store must be built
+                with.
+        Returns:
+            (bool): True if a complete store built with key exists at path.
+        """
+        if not os.path.exists(os.path.join(path, "complete")):
+            return False
+        if key is None:
+            return True
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            return json.load(f)["key"] == json.loads(json.dumps(key))
+
+    @staticmethod
+    def create(path, shapes, num_samples, batch_size, mean, std, key):
+        """
+        Allocate a new store on disk, replacing any existing one.
+        Args:
+            path (str): directory of the store.
+            shapes (list): shape of a clip of every pathway, `channel` x
+                `num frames` x `height` x `width`.
+            num_samples (int): number of clips.
+            batch_size (int): number of clips per batch when reading.
+            mean (list): per channel mean the clips are normalized with.
+            std (list): per channel std the clips are normalized with.
+            key (dict): settings the store is built with, e.g. the data
+                configs, to detect stale stores.
+        """
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, "complete")):
+            os.remove(os.path.join(path, "complete"))
+        for i, shape in enumerate(shapes):
+            np.lib.format.open_memmap(
+                os.path.join(path, "pathway{}.npy".format(i)),
+                mode="w+",
+                dtype=np.uint8,
+                shape=(num_samples,) + tuple(shape),
+            )
+        np.lib.format.open_memmap(
+            os.path.join(path, "labels.npy"),
+            mode="w+",
+            dtype=np.int64,
+            shape=(num_samples,),
+        )
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "num_samples": num_samples,
+                    "num_pathways": len(shapes),
+                    "batch_size": batch_size,
+                    "mean": list(mean),
+                    "std": list(std),
+                    "key": key,
+                },
+                f,
+            )
+
+    @staticmethod
+    def mark_complete(path):
+        """
+        Mark the store as fully written, so later runs reuse it.
+        Args:
+            path (str): directory of the store.
+        """
+        with open(os.path.join(path, "complete"), "w") as f:
+            f.write("")
+
+    def write(self, start, inputs, labels):
+        """
+        Args:
+            start (int): position of the first clip of the batch in the store.
+            inputs (list): normalized clips of every pathway, dimension is
+                `N` x `channel` x `num frames` x `height` x `width`.
+            labels (tensor): labels of the clips, dimension is `N`.
+        """
+        end = start + labels.size(0)
+        for pathway, x in zip(self.pathways, inputs):
+            pixels = (x.cpu().float() * self.std + self.mean) * 255.0
+            pixels = pixels.round_().clamp_(0, 255).to(torch.uint8)
+            pathway[start:end] = pixels.numpy()
+        self.labels[start:end] = labels.cpu().numpy()
+
+    def flush(self):
+        for pathway in self.pathways:
+            pathway.flush()
+        self.labels.flush()
+
+    def __len__(self):
+        """
+        Returns:
+            (int): the number of batches of the store.
+        """
+        return (self.num_samples + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        """
+        Yields:
+            batch (tuple): normalized float clips of every pathway, labels,
+                clip indices, and empty time and meta, as the data loaders.
+        """
+        for start in range(0, self.num_samples, self.batch_size):
+            end = min(start + self.batch_size, self.num_samples)
+            inputs = []
+            for pathway in self.pathways:
+                x = torch.from_numpy(np.ascontiguousarray(pathway[start:end]))
+                inputs.append((x.float() / 255.0 - self.mean) / self.std)
+            labels = torch.from_numpy(np.array(self.labels[start:end]))
+            yield inputs, labels, torch.arange(start, end), {}, {}
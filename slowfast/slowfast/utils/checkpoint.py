@@ -14,6 +14,7 @@ import numpy as np
 import slowfast.utils.distributed as du
 import slowfast.utils.logging as logging
 import torch
+from slowfast.models.pruning_helper import get_pruned_manifest
 from slowfast.utils.c2_model_loading import get_name_convert_func
 from slowfast.utils.env import checkpoint_pathmgr as pathmgr
 
@@ -90,6 +91,57 @@ def has_checkpoint(path_to_job):
     return any("checkpoint" in f for f in files)
 
 
+def get_pruned_manifest_path(cfg):
+    """
+    Get the checkpoint whose pruned manifest defines the model architecture:
+    PRUNING.MANIFEST_FILE_PATH if given, otherwise the checkpoint the current
+    job will load its weights from.
+    Args:
+        cfg (CfgNode): configs.
+    Returns:
+        path (str): path to the checkpoint, "" if there is none.
+    """
+    if cfg.PRUNING.MANIFEST_FILE_PATH != "":
+        return cfg.PRUNING.MANIFEST_FILE_PATH
+    if cfg.TRAIN.ENABLE:
+        if cfg.TRAIN.AUTO_RESUME and has_checkpoint(cfg.OUTPUT_DIR):
+            return get_last_checkpoint(cfg.OUTPUT_DIR, task=cfg.TASK)
+        return cfg.TRAIN.CHECKPOINT_FILE_PATH
+    if cfg.TEST.CHECKPOINT_FILE_PATH != "":
+        return cfg.TEST.CHECKPOINT_FILE_PATH
+    if has_checkpoint(cfg.OUTPUT_DIR):
+        return get_last_checkpoint(cfg.OUTPUT_DIR, task=cfg.TASK)
+    return cfg.TRAIN.CHECKPOINT_FILE_PATH
+
+
+def load_pruned_manifest(cfg):
+    """
+    Read the pruned manifest saved by `save_checkpoint(..., pruned=True)`.
+    The checkpoint is memory-mapped, so only the manifest is actually read.
+    Args:
+        cfg (CfgNode): configs.
+    Returns:
+        manifest (dict): the pruned manifest, None if the checkpoint does not
+            exist or holds a dense model.
+    """
+    path = get_pruned_manifest_path(cfg)
+    if path == "" or not pathmgr.exists(path):
+        return None
+    try:
+        checkpoint = torch.load(
+            pathmgr.get_local_path(path),
+            map_location="cpu",
+            weights_only=True,
+            mmap=True,
+        )
+    except (pickle.UnpicklingError, RuntimeError):
+        # Legacy pickled models and non-zip (e.g. caffe2) checkpoints.
+        return None
+    if not isinstance(checkpoint, dict):
+        return None
+    return checkpoint.get("pruned_manifest")
+
+
 def is_checkpoint_epoch(cfg, cur_epoch, multigrid_schedule=None):
     """
     Determine if a checkpoint should be saved on current epoch.
@@ -121,7 +173,8 @@ def save_checkpoint(path_to_job, model, optimizer, epoch, cfg, scaler=None, prun
         epoch (int): current number of epoch of the model.
         cfg (CfgNode): configs to save.
         scaler (GradScaler): the mixed precision scale.
-        pruned (bool): if True, save the entire model object instead of just state_dict.
+        pruned (bool): if True, also save the pruned manifest (the channel
+            counts of every layer) needed to rebuild the slim architecture.
     """
     # Save checkpoints only from the master process.
     if not du.is_master_proc(cfg.NUM_GPUS * cfg.NUM_SHARDS):
@@ -129,24 +182,18 @@ def save_checkpoint(path_to_job, model, optimizer, epoch, cfg, scaler=None, prun
     # Ensure that the checkpoint dir exists.
     pathmgr.mkdirs(get_checkpoint_dir(path_to_job))
     # Omit the DDP wrapper in the multi-gpu setting.
-    sd = model.module.state_dict() if cfg.NUM_GPUS > 1 else model.state_dict()
+    ms = model.module if cfg.NUM_GPUS > 1 else model
+    sd = ms.state_dict()
     normalized_sd = sub_to_normal_bn(sd)
 
+    checkpoint = {
+        "epoch": epoch,
+        "model_state": normalized_sd,
+        "optimizer_state": optimizer.state_dict(),
+        "cfg": cfg.dump(),
+    }
     if pruned:
-        # Store the entire model object rather than just the state dict
-        checkpoint = {
-            "epoch": epoch,
-            "model": model,  # Save the entire model object
-            "optimizer_state": optimizer.state_dict(),
-            "cfg": cfg.dump(),
-        }
-    else:
-        checkpoint = {
-            "epoch": epoch,
-            "model_state": normalized_sd,
-            "optimizer_state": optimizer.state_dict(),
-            "cfg": cfg.dump(),
-        }
+        checkpoint["pruned_manifest"] = get_pruned_manifest(ms)
         
     if scaler is not None:
         checkpoint["scaler_state"] = scaler.state_dict()
@@ -222,8 +269,13 @@ def load_checkpoint(
         epoch_reset (bool): if True, reset #train iterations from the checkpoint.
         clear_name_pattern (string): if given, this (sub)string will be cleared
             from a layer name if it can be matched.
+        pruned (bool): if True, the checkpoint may hold a pruned model. Its
+            weights are loaded strictly, so the model must have been built
+            from the pruned manifest of the checkpoint.
     Returns:
         (int): the number of training epoch of the checkpoint.
+        (model): if pruned, also the model holding the weights. It is the
+            given model, except for legacy checkpoints of pickled models.
     """
     logger.info("Loading network weights from {}.".format(path_to_checkpoint))
                 
@@ -233,27 +285,47 @@ def load_checkpoint(
     else:
         ms = model
 
-    if pruned:
+    checkpoint = None
+    if pruned and not convert_from_caffe2:
         with pathmgr.open(path_to_checkpoint, "rb") as f:
-            checkpoint = torch.load(f, weights_only=weights_only)
-
-            print("Checkpoint keys: ", checkpoint.keys())
+            checkpoint = torch.load(f, map_location="cpu", weights_only=weights_only)
 
+        if "model" in checkpoint:
+            # Legacy pruned checkpoints pickle the entire model object.
+            logger.warning(
+                "Loading a pickled pruned model from {}. Re-save it to store a "
+                "pruned manifest instead.".format(path_to_checkpoint)
+            )
             loaded_model = checkpoint["model"]
-            
-            if optimizer in checkpoint.keys():
+        elif "pruned_manifest" in checkpoint:
+            # The model must have been built from the pruned manifest of the
+            # checkpoint (see PRUNING.MANIFEST_FILE_PATH), so that every
+            # weight matches.
+            model_state = normal_to_sub_bn(checkpoint["model_state"], ms.state_dict())
+            mismatch = [
+                k
+                for k, v in ms.state_dict().items()
+                if k in model_state and v.shape != model_state[k].shape
+            ]
+            assert not mismatch, (
+                "Weights {} of {} do not match the model. Build the model from "
+                "its pruned manifest with PRUNING.MANIFEST_FILE_PATH.".format(
+                    mismatch[:5], path_to_checkpoint
+                )
+            )
+            ms.load_state_dict(model_state)
+            loaded_model = model
+
+        if "model" in checkpoint or "pruned_manifest" in checkpoint:
+            if optimizer and "optimizer_state" in checkpoint:
                 optimizer.load_state_dict(checkpoint["optimizer_state"])
-            
-            if scaler and scaler in checkpoint.keys():
+            if scaler and "scaler_state" in checkpoint:
                 scaler.load_state_dict(checkpoint["scaler_state"])
-            
-            if "epoch" in checkpoint.keys() and not epoch_reset:
-                epoch = checkpoint["epoch"]
-                return epoch, loaded_model
-
+            if "epoch" in checkpoint and not epoch_reset:
+                return checkpoint["epoch"], loaded_model
             return -1, loaded_model
+        # Dense checkpoints go through the regular loading below.
 
-    
     if convert_from_caffe2:
         with pathmgr.open(path_to_checkpoint, "rb") as f:
             caffe2_checkpoint = pickle.load(f, encoding="latin1")
@@ -321,8 +393,11 @@ def load_checkpoint(
         epoch = -1
     else:
         # Load the checkpoint on CPU to avoid GPU mem spike.
-        with pathmgr.open(path_to_checkpoint, "rb") as f:
-            checkpoint = torch.load(f, map_location="cpu", weights_only=weights_only)
+        if checkpoint is None:
+            with pathmgr.open(path_to_checkpoint, "rb") as f:
+                checkpoint = torch.load(
+                    f, map_location="cpu", weights_only=weights_only
+                )
         # Check if model has a module attribute before trying to access it
         if data_parallel and hasattr(model, 'module'):
             model_state_dict_3d = model.module.state_dict()
@@ -565,6 +640,8 @@ def load_checkpoint(
                 scaler.load_state_dict(checkpoint["scaler_state"])
         else:
             epoch = -1
+    if pruned:
+        return epoch, model
     return epoch
 
 
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+"""
+Minimal loaders of the frozen TorchScript models of tools/export_torchscript.py
+and of the ONNX models of tools/export_onnx.py. They only depend on torch and
+onnxruntime, so serving does not import the config system or the model
+builders.
+"""
+
+import json
+
+import torch
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+# Name of the metadata file in the TorchScript archive, and of the metadata
+# property of the ONNX models.
+META_FILE = "meta.json"
+
+
+class BaseExportedModel(object):
+    """
+    Exported video model with the metadata needed to feed it: the clip size,
+    the normalization and the pathway layout of its inputs.
+    """
+
+    def pack_pathways(self, frames):
+        """
+        Split normalized clips into the inputs of the pathways of the model,
+        as `slowfast.datasets.utils.pack_pathway_output`.
+        Args:
+            frames (tensor): clips, dimension is `N` x `channel` x
+                `num frames` x `height` x `width`.
+        Returns:
+            inputs (list): one tensor per pathway.
+        """
+        if self.meta["reverse_input_channel"]:
+            frames = frames[:, [2, 1, 0]]
+        if self.meta["num_pathways"] == 1:
+            return [frames]
+        index = torch.linspace(
+            0, frames.shape[2] - 1, frames.shape[2] // self.meta["alpha"]
+        ).long()
+        return [torch.index_select(frames, 2, index), frames]
+
+
+class ExportedModel(BaseExportedModel):
+    """
+    Frozen TorchScript video model.
+    """
+
+    def __init__(self, path, num_threads=0, optimize=None):
+        """
+        Args:
+            path (str): path to the exported model.
+            num_threads (int): number of CPU threads, 0 to keep the default.
+            optimize (bool): if True, run `torch.jit.optimize_for_inference`
+                on the model, which converts it to MKLDNN layouts. These cannot
+                be saved, so the exported model is only frozen and optimized
+                when loaded. If None, optimize if it was faster at export time.
+        """
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        extra_files = {META_FILE: ""}
+        self.model = torch.jit.load(
+            path, map_location="cpu", _extra_files=extra_files
+        )
+        self.meta = json.loads(extra_files[META_FILE])
+        if optimize is None:
+            optimize = self.meta["optimize"]
+        if optimize:
+            self.model = torch.jit.optimize_for_inference(self.model)
+
+    def __call__(self, inputs, *extra_inputs):
+        """
+        Args:
+            inputs (list): one tensor per pathway, e.g. from `pack_pathways`.
+            extra_inputs (tuple): other inputs of the model, e.g. the gaze
+                heatmaps.
+        Returns:
+            preds (tensor): the predictions of the model.
+        """
+        with torch.inference_mode():
+            return self.model(inputs, *extra_inputs)
+
+
+class OnnxModel(BaseExportedModel):
+    """
+    ONNX video model run with ONNX Runtime on CPU, with all its graph
+    optimizations.
+    """
+
+    def __init__(self, path, num_threads=0):
+        """
+        Args:
+            path (str): path to the ONNX model.
+            num_threads (int): number of CPU threads, 0 to keep the default.
+        """
+        assert onnxruntime is not None, "onnxruntime is required for ONNX models"
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.meta = json.loads(
+            self.session.get_modelmeta().custom_metadata_map[META_FILE]
+        )
+        self.input_names = [x.name for x in self.session.get_inputs()]
+
+    def __call__(self, inputs, *extra_inputs):
+        """
+        Args:
+            inputs (list): one tensor per pathway, e.g. from `pack_pathways`.
+            extra_inputs (tuple): other inputs of the model, e.g. the gaze
+                heatmaps.
+        Returns:
+            preds (tensor): the predictions of the model.
+        """
+        feeds = {
+            name: x.detach().cpu().contiguous().numpy()
+            for name, x in zip(self.input_names, list(inputs) + list(extra_inputs))
+        }
+        return torch.from_numpy(self.session.run(None, feeds)[0])
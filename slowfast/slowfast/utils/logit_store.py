@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+"""Memory-mapped store of precomputed teacher logits for distillation."""
+
+import json
+import os
+
+import numpy as np
+import torch
+
+# Value given to the logits outside of the stored top-k. It is low enough to
+# get a zero probability after the softmax, and finite to avoid NaNs in KL.
+_MISSING_LOGIT = -1e4
+
+
+class TeacherLogitStore(object):
+    """
+    Teacher logits stored in fp16 `numpy.memmap` arrays of dimension
+    `num seeds` x `num samples` x `k`, keyed by augmentation seed and sample
+    index. If topk is 0, the full logits are stored (`k` is the number of
+    classes). Otherwise only the top-k logits and their class indices are
+    stored, and the other logits are read back as a large negative value.
+    """
+
+    def __init__(self, path, mode="r"):
+        """
+        Open an existing store.
+        Args:
+            path (str): directory of the store.
+            mode (str): `r` to read, `r+` to also write.
+        """
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        self.path = path
+        self.num_seeds = meta["num_seeds"]
+        self.num_samples = meta["num_samples"]
+        self.num_classes = meta["num_classes"]
+        self.topk = meta["topk"]
+        self.teacher_seconds = None
+        if self.exists(path):
+            with open(os.path.join(path, "complete"), "r") as f:
+                self.teacher_seconds = json.load(f)["teacher_seconds"]
+        self.logits = np.load(os.path.join(path, "logits.npy"), mmap_mode=mode)
+        self.classes = None
+        if self.topk > 0:
+            self.classes = np.load(
+                os.path.join(path, "classes.npy"), mmap_mode=mode
+            )
+
+    @staticmethod
+    def exists(path):
+        """
+        Returns:
+            (bool): True if a complete store exists at path.
+        """
+        return os.path.exists(os.path.join(path, "complete"))
+
+    @staticmethod
+    def create(path, num_seeds, num_samples, num_classes, topk=0):
+        """
+        Allocate a new store on disk.
+        Args:
+            path (str): directory of the store.
+            num_seeds (int): number of augmentation seeds.
+            num_samples (int): number of samples of the dataset.
+            num_classes (int): number of classes of the teacher.
+            topk (int): number of logits to keep per sample, 0 to keep all.
+        """
+        os.makedirs(path, exist_ok=True)
+        k = topk if topk > 0 else num_classes
+        shape = (num_seeds, num_samples, k)
+        np.lib.format.open_memmap(
+            os.path.join(path, "logits.npy"),
+            mode="w+",
+            dtype=np.float16,
+            shape=shape,
+        )
+        if topk > 0:
+            assert num_classes <= np.iinfo(np.int16).max
+            np.lib.format.open_memmap(
+                os.path.join(path, "classes.npy"),
+                mode="w+",
+                dtype=np.int16,
+                shape=shape,
+            )
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "num_seeds": num_seeds,
+                    "num_samples": num_samples,
+                    "num_classes": num_classes,
+                    "topk": topk,
+                },
+                f,
+            )
+
+    @staticmethod
+    def mark_complete(path, teacher_seconds):
+        """
+        Mark the store as fully written, so later runs reuse it.
+        Args:
+            path (str): directory of the store.
+            teacher_seconds (float): time of the teacher forward for one pass
+                over the dataset, i.e. the time the store saves per epoch.
+        """
+        with open(os.path.join(path, "complete"), "w") as f:
+            json.dump({"teacher_seconds": teacher_seconds}, f)
+
+    def write(self, seed, index, logits):
+        """
+        Args:
+            seed (int): augmentation seed of the logits.
+            index (tensor): sample indices, dimension is `N`.
+            logits (tensor): teacher logits, dimension is `N` x `num classes`.
+        """
+        index = index.cpu().numpy()
+        logits = logits.detach().float()
+        if self.topk > 0:
+            logits, classes = logits.topk(self.topk, dim=1)
+            self.classes[seed, index] = classes.cpu().numpy().astype(np.int16)
+        self.logits[seed, index] = logits.cpu().numpy().astype(np.float16)
+
+    def flush(self):
+        self.logits.flush()
+        if self.classes is not None:
+            self.classes.flush()
+
+    def read(self, seed, index, device=None):
+        """
+        Args:
+            seed (int): augmentation seed of the logits.
+            index (tensor): sample indices, dimension is `N`.
+            device (torch.device): device to return the logits on.
+        Returns:
+            logits (tensor): fp32 teacher logits, dimension is
+                `N` x `num classes`.
+        """
+        index = index.cpu().numpy()
+        logits = torch.from_numpy(self.logits[seed % self.num_seeds, index])
+        logits = logits.to(device=device, dtype=torch.float32)
+        if self.topk == 0:
+            return logits
+        classes = torch.from_numpy(self.classes[seed % self.num_seeds, index])
+        classes = classes.to(device=device, dtype=torch.long)
+        full = torch.full(
+            (len(index), self.num_classes), _MISSING_LOGIT, device=device
+        )
+        return full.scatter_(1, classes, logits)
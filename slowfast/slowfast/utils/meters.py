@@ -316,25 +316,44 @@ class TestMeter:
             clip_ids (tensor): clip indexes of the current batch, dimension is
                 N.
         """
-        for ind in range(preds.shape[0]):
-            vid_id = int(clip_ids[ind]) // self.num_clips
-            if self.video_labels[vid_id].sum() > 0:
-                assert torch.equal(
-                    self.video_labels[vid_id].type(torch.FloatTensor),
-                    labels[ind].type(torch.FloatTensor),
-                )
-            self.video_labels[vid_id] = labels[ind]
-            if self.ensemble_method == "sum":
-                self.video_preds[vid_id] += preds[ind]
-            elif self.ensemble_method == "max":
-                self.video_preds[vid_id] = torch.max(
-                    self.video_preds[vid_id], preds[ind]
-                )
-            else:
-                raise NotImplementedError(
-                    "Ensemble Method {} is not supported".format(self.ensemble_method)
-                )
-            self.clip_count[vid_id] += 1
+        if self.ensemble_method not in ["sum", "max"]:
+            raise NotImplementedError(
+                "Ensemble Method {} is not supported".format(self.ensemble_method)
+            )
+        vid_ids = clip_ids.long().cpu() // self.num_clips
+        preds = preds.to(self.video_preds)
+        labels = labels.to(self.video_labels)
+
+        # Every clip of a video must have the label already recorded for the
+        # video, and the label of the first clip of the video in the batch.
+        float_labels = labels.float()
+        recorded = self.video_labels[vid_ids].float()
+        has_label = recorded.view(len(vid_ids), -1).sum(1) > 0
+        assert torch.equal(recorded[has_label], float_labels[has_label])
+        uniq_ids, inverse = torch.unique(vid_ids, return_inverse=True)
+        positions = torch.arange(len(vid_ids))
+        first = torch.full((len(uniq_ids),), len(vid_ids)).scatter_reduce_(
+            0, inverse, positions, reduce="amin"
+        )
+        group_labels = float_labels[first[inverse]]
+        has_label = group_labels.view(len(vid_ids), -1).sum(1) > 0
+        assert torch.equal(group_labels[has_label], float_labels[has_label])
+
+        # As in sequential updates, the last clip of a video sets its label.
+        last = torch.zeros(len(uniq_ids), dtype=torch.long).scatter_reduce_(
+            0, inverse, positions, reduce="amax"
+        )
+        self.video_labels[uniq_ids] = labels[last]
+        if self.ensemble_method == "sum":
+            self.video_preds.index_add_(0, vid_ids, preds)
+        else:
+            self.video_preds.scatter_reduce_(
+                0,
+                vid_ids.view(-1, 1).expand_as(preds),
+                preds,
+                reduce="amax",
+            )
+        self.clip_count.index_add_(0, vid_ids, torch.ones_like(vid_ids))
 
     def log_iter_stats(self, cur_iter):
         """
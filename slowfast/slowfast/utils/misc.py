@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
 
+import copy
 import json
 import logging
 import math
 import os
+import time
 from datetime import datetime
+from io import BytesIO
 
 import numpy as np
 import psutil
@@ -199,6 +202,85 @@ def log_model_info(model, cfg, use_train_input=True):
     return flops, params
 
 
+def get_random_inputs(cfg, batch_size=1, crop_size=None):
+    """
+    Random test clips on CPU in the input format of the model.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+        batch_size (int): number of clips.
+        crop_size (int): height and width of the clips. If None, use
+            DATA.TEST_CROP_SIZE.
+    Returns:
+        inputs (tuple): positional inputs of the model, the list of pathway
+            tensors followed by the gaze heatmaps if MECCANO.GAZE_ENABLE.
+    """
+    crop_size = crop_size or cfg.DATA.TEST_CROP_SIZE
+    input_tensors = torch.rand(3, cfg.DATA.NUM_FRAMES, crop_size, crop_size)
+    inputs = [
+        x.unsqueeze(0).repeat(batch_size, 1, 1, 1, 1)
+        for x in pack_pathway_output(cfg, input_tensors)
+    ]
+    if cfg.MECCANO.GAZE_ENABLE:
+        gaze_size = crop_size // 32
+        gaze = torch.ones(batch_size, cfg.DATA.NUM_FRAMES, gaze_size, gaze_size)
+        return (inputs, gaze)
+    return (inputs,)
+
+
+def measure_latencies(model, inputs, num_iters=20, num_warmup=5):
+    """
+    Time the forward passes of a model on CPU.
+    Args:
+        model (model): model to measure.
+        inputs (tuple): positional inputs of the model, e.g. from
+            `get_random_inputs`.
+        num_iters (int): number of timed forward passes.
+        num_warmup (int): number of untimed forward passes run first.
+    Returns:
+        latencies (ndarray): the latency of every timed pass in milliseconds.
+    """
+    times = []
+    with torch.no_grad():
+        for i in range(num_warmup + num_iters):
+            start = time.perf_counter()
+            model(*inputs)
+            if i >= num_warmup:
+                times.append(time.perf_counter() - start)
+    return np.array(times) * 1000.0
+
+
+def measure_cpu_latency(model, cfg, num_iters=20, num_warmup=5):
+    """
+    Measure the latency of a test forward pass of batch size 1 on CPU. The
+        model is copied to CPU, so the given model is left untouched.
+    Args:
+        model (model): model to measure.
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+        num_iters (int): number of timed forward passes.
+        num_warmup (int): number of untimed forward passes run first.
+    Returns:
+        float: the median latency in milliseconds.
+    """
+    cpu_model = copy.deepcopy(model.module if hasattr(model, "module") else model)
+    cpu_model = cpu_model.cpu().eval()
+    latencies = measure_latencies(
+        cpu_model, get_random_inputs(cfg), num_iters, num_warmup
+    )
+    return float(np.median(latencies))
+
+
+def get_model_size(model):
+    """
+    Returns:
+        float: size of the serialized state dict of the model in MB.
+    """
+    buffer = BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes / (1024 * 1024)
+
+
 def is_eval_epoch(cfg, cur_epoch, multigrid_schedule):
     """
     Determine if the model should be evaluated at the current epoch.
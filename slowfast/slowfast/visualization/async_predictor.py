@@ -2,7 +2,12 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
 
 import atexit
+import itertools
 import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
 
 import numpy as np
 
@@ -46,14 +51,44 @@ class AsycnActionPredictor:
             # Build the video model and print model statistics.
             model = Predictor(self.cfg, gpu_id=self.gpu_id)
             while True:
-                task = self.task_queue.get()
-                if isinstance(task, _StopToken):
+                tasks, stop = _get_batch(
+                    self.task_queue,
+                    self.cfg.DEMO.MAX_BATCH_SIZE,
+                    self.cfg.DEMO.MAX_WAIT_MS,
+                )
+                if len(tasks) > 0:
+                    self._predict_batch(model, tasks)
+                if stop:
                     break
-                task = model(task)
+
+        def _predict_batch(self, model, tasks):
+            """
+            Predict a batch of tasks and put them on the result queue. If the
+            prediction of InferenceServer tasks fails, put their error
+            instead and keep serving.
+            Args:
+                model (Predictor): the video model.
+                tasks (list): the tasks of the batch.
+            """
+            try:
+                tasks = model.predict_batch(tasks)
+            except Exception:
+                request_ids = [task.request_id for task in tasks]
+                if min(request_ids) < 0:
+                    raise
+                # The traceback is sent as text, since the exception may not
+                # be picklable.
+                logger.exception(
+                    "Failed to predict requests {}".format(request_ids)
+                )
+                tasks = [_PredictionError(request_ids, traceback.format_exc())]
+            for task in tasks:
                 self.result_queue.put(task)
 
     def __init__(self, cfg, result_queue=None):
-        num_workers = cfg.NUM_GPUS
+        # One worker per GPU, or a single CPU worker. A stream is predicted
+        # by a single worker, which caches its frames.
+        num_workers = 1 if cfg.DEMO.STREAMING else max(cfg.NUM_GPUS, 1)
 
         self.task_queue = mp.Queue()
         self.result_queue = mp.Queue() if result_queue is None else result_queue
@@ -63,11 +98,14 @@ class AsycnActionPredictor:
         self.procs = []
         cfg = cfg.clone()
         cfg.defrost()
-        cfg.NUM_GPUS = 1
-        for gpu_id in range(num_workers):
+        cfg.NUM_GPUS = min(cfg.NUM_GPUS, 1)
+        for worker_id in range(num_workers):
             self.procs.append(
                 AsycnActionPredictor._Predictor(
-                    cfg, self.task_queue, self.result_queue, gpu_id
+                    cfg,
+                    self.task_queue,
+                    self.result_queue,
+                    worker_id if cfg.NUM_GPUS else None,
                 )
             )
 
@@ -124,6 +162,124 @@ class AsycnActionPredictor:
         return len(self.procs) * 5
 
 
+class InferenceServer:
+    """
+    Local inference server sharing the video models of the workers of
+    AsycnActionPredictor between clients, e.g. several camera streams. The
+    requests are queued and every worker coalesces the pending clips into
+    batches of up to DEMO.MAX_BATCH_SIZE clips, waiting up to DEMO.MAX_WAIT_MS
+    for a batch to fill.
+    """
+
+    # Seconds between the checks of the workers while no result arrives.
+    WORKER_CHECK_PERIOD = 1.0
+
+    def __init__(self, cfg):
+        """
+        Args:
+            cfg (CfgNode): configs. Details can be found in
+                slowfast/config/defaults.py
+        """
+        # A streaming model holds the temporal state of a single stream,
+        # which the clips of different clients would be mixed into.
+        assert (
+            not cfg.DEMO.STREAMING
+        ), "DEMO.STREAMING is not supported by InferenceServer."
+        self.result_queue = mp.Queue()
+        self.predictor = AsycnActionPredictor(cfg, self.result_queue)
+        self.request_ids = itertools.count()
+        self.futures = {}
+        # Set when a worker died, every request then fails with it.
+        self.error = None
+        self.lock = threading.Lock()
+        self.result_thread = threading.Thread(target=self._set_results, daemon=True)
+        self.result_thread.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, task):
+        """
+        Queue a task for prediction. Thread safe.
+        Args:
+            task (TaskInfo object): task object that contain
+                the necessary information for action prediction. (e.g. frames)
+        Returns:
+            future (Future): future of the task filled with its predictions.
+        """
+        future = Future()
+        with self.lock:
+            if self.error is not None:
+                future.set_exception(self.error)
+                return future
+            task.request_id = next(self.request_ids)
+            self.futures[task.request_id] = future
+            self.predictor.put(task)
+        return future
+
+    def _set_results(self):
+        """
+        Resolve the futures of the predicted tasks, or fail them with the
+        error of their prediction. If a worker dies, the tasks it held are
+        lost, so every pending and later request fails.
+        """
+        while True:
+            try:
+                task = self.result_queue.get(timeout=self.WORKER_CHECK_PERIOD)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if isinstance(task, _StopToken):
+                break
+            if isinstance(task, _PredictionError):
+                error = RuntimeError(
+                    "Prediction failed in worker:\n{}".format(task.traceback)
+                )
+                with self.lock:
+                    futures = [
+                        self.futures.pop(request_id, None)
+                        for request_id in task.request_ids
+                    ]
+                for future in futures:
+                    if future is not None:
+                        future.set_exception(error)
+                continue
+            with self.lock:
+                future = self.futures.pop(task.request_id, None)
+            # None if the future already failed with a dead worker.
+            if future is not None:
+                future.set_result(task)
+        with self.lock:
+            for future in self.futures.values():
+                future.cancel()
+            self.futures = {}
+
+    def _check_workers(self):
+        """
+        Fail the pending requests if a worker exited with an error.
+        """
+        exitcodes = [p.exitcode for p in self.predictor.procs]
+        if all(exitcode in [None, 0] for exitcode in exitcodes):
+            return
+        with self.lock:
+            if self.error is None:
+                self.error = RuntimeError(
+                    "Prediction worker died with exit codes {}".format(exitcodes)
+                )
+                logger.error(str(self.error))
+            futures = list(self.futures.values())
+            self.futures = {}
+        for future in futures:
+            future.set_exception(self.error)
+
+    def shutdown(self):
+        if not self.result_thread.is_alive():
+            return
+        self.predictor.shutdown()
+        for p in self.predictor.procs:
+            p.join()
+        self.result_queue.put(_StopToken())
+        self.result_thread.join()
+
+
 class AsyncVis:
     class _VisWorker(mp.Process):
         def __init__(self, video_vis, task_queue, result_queue):
@@ -233,6 +389,55 @@ class _StopToken:
     pass
 
 
+class _PredictionError:
+    """
+    Failure of the prediction of a batch of InferenceServer requests, sent
+    back by the worker in place of their tasks.
+    """
+
+    def __init__(self, request_ids, traceback):
+        """
+        Args:
+            request_ids (list): the request ids of the tasks of the batch.
+            traceback (str): the formatted traceback of the exception.
+        """
+        self.request_ids = request_ids
+        self.traceback = traceback
+
+
+def _get_batch(task_queue, max_batch_size, max_wait_ms):
+    """
+    Wait for a task, then coalesce the tasks already pending or arriving
+    within `max_wait_ms` of it into a batch.
+    Args:
+        task_queue (mp.Queue): a shared queue for incoming task.
+        max_batch_size (int): maximum number of tasks of a batch.
+        max_wait_ms (float): maximum time to wait for more tasks after the
+            first one, in milliseconds.
+    Returns:
+        tasks (list): the tasks of the batch.
+        stop (bool): True if a stop token was received.
+    """
+    task = task_queue.get()
+    if isinstance(task, _StopToken):
+        return [], True
+    tasks = [task]
+    deadline = time.perf_counter() + max_wait_ms / 1000.0
+    while len(tasks) < max_batch_size:
+        timeout = deadline - time.perf_counter()
+        try:
+            if timeout > 0:
+                task = task_queue.get(timeout=timeout)
+            else:
+                task = task_queue.get(block=False)
+        except queue.Empty:
+            break
+        if isinstance(task, _StopToken):
+            return tasks, True
+        tasks.append(task)
+    return tasks, False
+
+
 class AsyncDemo:
     """
     Asynchronous Action Prediction and Visualization pipeline with AsyncVis.
@@ -12,8 +12,17 @@ from detectron2.config import get_cfg
 from detectron2.engine import DefaultPredictor
 from slowfast.datasets import cv2_transform
 from slowfast.models import build_model
+from slowfast.models.streaming import (
+    convert_to_streaming,
+    get_stream_chunk_size,
+    get_stream_num_frames,
+)
 from slowfast.utils import logging
-from slowfast.visualization.utils import process_cv2_inputs
+from slowfast.utils.exported_model import ExportedModel, OnnxModel
+from slowfast.visualization.utils import (
+    ClipPreprocessor,
+    process_cv2_stream_inputs,
+)
 
 logger = logging.get_logger(__name__)
 
@@ -33,10 +42,28 @@ class Predictor:
         if cfg.NUM_GPUS:
             self.gpu_id = torch.cuda.current_device() if gpu_id is None else gpu_id
 
+        self.cfg = cfg
+        self.preprocessor = ClipPreprocessor(cfg, gpu_id=gpu_id)
+        if cfg.DEMO.BACKEND != "pytorch":
+            assert (
+                cfg.NUM_GPUS == 0
+            ), "Exported models only run on CPU, set NUM_GPUS to 0"
+            assert (
+                not cfg.DETECTION.ENABLE
+            ), "Detection models cannot be exported"
+            if cfg.DEMO.BACKEND == "torchscript":
+                self.model = ExportedModel(cfg.DEMO.EXPORTED_MODEL_PATH)
+            else:
+                self.model = OnnxModel(cfg.DEMO.EXPORTED_MODEL_PATH)
+            logger.info(
+                f"Loaded {cfg.DEMO.BACKEND} model from "
+                f"{cfg.DEMO.EXPORTED_MODEL_PATH}"
+            )
+            return
+
         # Build the video model and print model statistics.
         self.model = build_model(cfg, gpu_id=gpu_id)
         self.model.eval()
-        self.cfg = cfg
 
         if cfg.DETECTION.ENABLE:
             self.object_detector = Detectron2Predictor(cfg, gpu_id=self.gpu_id)
@@ -45,6 +72,12 @@ class Predictor:
         cu.load_test_checkpoint(cfg, self.model)
         logger.info("Finish loading model weights")
 
+        if cfg.DEMO.STREAMING:
+            convert_to_streaming(self.model, get_stream_num_frames(cfg))
+            self.num_stream_frames = 0
+            self.pending_frames = []
+            self.stream_preds = torch.zeros((1, cfg.MODEL.NUM_CLASSES))
+
     def __call__(self, task):
         """
         Returns the prediction results for the current task.
@@ -56,10 +89,51 @@ class Predictor:
                 prediction values (a tensor) and the corresponding boxes for
                 action detection task.
         """
+        return self.predict_batch([task])[0]
+
+    def predict_batch(self, tasks):
+        """
+        Returns the prediction results for a batch of tasks, e.g. the clips of
+        several camera streams. The clips of the same size are predicted with
+        a single forward pass.
+        Args:
+            tasks (list): TaskInfo objects that contain the necessary
+                information for action prediction. (e.g. frames, boxes)
+        Returns:
+            tasks (list): the same task info objects but filled with
+                prediction values (a tensor) and the corresponding boxes for
+                action detection task.
+        """
+        if self.cfg.DEMO.STREAMING:
+            # The stream is causal, its clips are predicted in order.
+            for task in sorted(tasks, key=lambda task: task.id):
+                self.predict_stream(task)
+            return tasks
+
         if self.cfg.DETECTION.ENABLE:
-            task = self.object_detector(task)
+            tasks = [self.object_detector(task) for task in tasks]
+
+        groups = {}
+        for task in tasks:
+            inputs, bboxes = self.prepare_inputs(task)
+            groups.setdefault(tuple(inputs[0].shape), []).append(
+                (task, inputs, bboxes)
+            )
+        for group in groups.values():
+            self.predict_group(group)
+        return tasks
 
-        frames, bboxes = task.frames, task.bboxes
+    def prepare_inputs(self, task):
+        """
+        Preprocess the clip and the boxes of a task.
+        Args:
+            task (TaskInfo object): task object that contain
+                the necessary information for action prediction. (e.g. frames, boxes)
+        Returns:
+            inputs (list): one tensor per pathway, of batch size 1.
+            bboxes (tensor): boxes scaled to the clip, or None.
+        """
+        bboxes = task.bboxes
         if bboxes is not None:
             bboxes = cv2_transform.scale_boxes(
                 self.cfg.DATA.TEST_CROP_SIZE,
@@ -67,35 +141,89 @@ class Predictor:
                 task.img_height,
                 task.img_width,
             )
+        return self.preprocessor(task.frames), bboxes
+
+    def predict_stream(self, task):
+        """
+        Predict a task with the streaming model: only its frames after the
+        buffer frames overlapping the previous task are new. One frame every
+        `SAMPLING_RATE` frames of the stream is kept, and the kept frames are
+        fed to the model by chunks of `get_stream_chunk_size` frames. The
+        task is filled with the predictions of the clip ending at the last
+        chunk, or with the previous predictions if no chunk is complete. The
+        tasks must all come from a single stream.
+        Args:
+            task (TaskInfo object): task object that contain
+                the necessary information for action prediction. (e.g. frames, boxes)
+        """
+        frames = task.frames[task.num_buffer_frames :]
+        sampling_rate = self.cfg.DATA.SAMPLING_RATE
+        first = -self.num_stream_frames % sampling_rate
+        self.num_stream_frames += len(frames)
+        frames = frames[first::sampling_rate]
         if self.cfg.DEMO.INPUT_FORMAT == "BGR":
             frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+        self.pending_frames.extend(
+            cv2_transform.scale(self.cfg.DATA.TEST_CROP_SIZE, frame)
+            for frame in frames
+        )
 
-        frames = [
-            cv2_transform.scale(self.cfg.DATA.TEST_CROP_SIZE, frame) for frame in frames
-        ]
-        inputs = process_cv2_inputs(frames, self.cfg)
-        if bboxes is not None:
-            index_pad = torch.full(
-                size=(bboxes.shape[0], 1),
-                fill_value=float(0),
-                device=bboxes.device,
+        chunk_size = get_stream_chunk_size(self.cfg)
+        num_frames = len(self.pending_frames) // chunk_size * chunk_size
+        if num_frames > 0:
+            inputs = process_cv2_stream_inputs(
+                self.pending_frames[:num_frames], self.cfg
             )
+            self.pending_frames = self.pending_frames[num_frames:]
+            if self.cfg.NUM_GPUS > 0:
+                inputs = [
+                    inp.cuda(device=torch.device(self.gpu_id), non_blocking=True)
+                    for inp in inputs
+                ]
+            with torch.no_grad():
+                self.stream_preds = self.model(inputs).detach().cpu()
+        task.add_action_preds(self.stream_preds)
 
-            # Pad frame index for each box.
-            bboxes = torch.cat([index_pad, bboxes], axis=1)
+    def predict_group(self, group):
+        """
+        Predict clips of the same size with one forward pass and fill their
+        tasks with the predictions.
+        Args:
+            group (list): tuples of a task and its inputs and boxes from
+                `prepare_inputs`.
+        """
+        inputs = [
+            torch.cat(pathway) for pathway in zip(*[x[1] for x in group])
+        ]
+        bboxes = None
+        if group[0][2] is not None:
+            # Pad the index of the clip in the batch for each box.
+            bboxes = torch.cat(
+                [
+                    torch.cat(
+                        [
+                            torch.full(
+                                size=(boxes.shape[0], 1),
+                                fill_value=float(idx),
+                                device=boxes.device,
+                            ),
+                            boxes,
+                        ],
+                        axis=1,
+                    )
+                    for idx, (_, _, boxes) in enumerate(group)
+                ]
+            )
         if self.cfg.NUM_GPUS > 0:
             # Transfer the data to the current GPU device.
-            if isinstance(inputs, (list,)):
-                for i in range(len(inputs)):
-                    inputs[i] = inputs[i].cuda(
-                        device=torch.device(self.gpu_id), non_blocking=True
-                    )
-            else:
-                inputs = inputs.cuda(
+            for i in range(len(inputs)):
+                inputs[i] = inputs[i].cuda(
                     device=torch.device(self.gpu_id), non_blocking=True
                 )
         if self.cfg.DETECTION.ENABLE and not bboxes.shape[0]:
             preds = torch.tensor([])
+        elif self.cfg.DEMO.BACKEND != "pytorch":
+            preds = self.model(inputs)
         else:
             preds = self.model(inputs, bboxes)
 
@@ -105,11 +233,18 @@ class Predictor:
                 bboxes = bboxes.detach().cpu()
 
         preds = preds.detach()
-        task.add_action_preds(preds)
-        if bboxes is not None:
-            task.add_bboxes(bboxes[:, 1:])
-
-        return task
+        if bboxes is None:
+            for idx, (task, _, _) in enumerate(group):
+                task.add_action_preds(preds[idx : idx + 1])
+            return
+        counts = [boxes.shape[0] for _, _, boxes in group]
+        if not preds.shape[0]:
+            preds = preds.new_zeros((0, self.cfg.MODEL.NUM_CLASSES))
+        for (task, _, _), task_preds, task_bboxes in zip(
+            group, preds.split(counts), bboxes.split(counts)
+        ):
+            task.add_action_preds(task_preds)
+            task.add_bboxes(task_bboxes[:, 1:])
 
 
 class ActionPredictor:
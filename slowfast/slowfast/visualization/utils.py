@@ -3,13 +3,16 @@
 
 import itertools
 
+import cv2
 import matplotlib.pyplot as plt
 import numpy as np
 
 import slowfast.utils.logging as logging
 import torch
 from sklearn.metrics import confusion_matrix
+from slowfast.datasets import cv2_transform
 from slowfast.datasets.utils import pack_pathway_output, tensor_normalize
+from slowfast.models.streaming import get_stream_num_frames, pack_stream_pathways
 
 logger = logging.get_logger(__name__)
 
@@ -321,6 +324,116 @@ def process_cv2_inputs(frames, cfg):
     return inputs
 
 
+def process_cv2_stream_inputs(frames, cfg):
+    """
+    Normalize the new frames of a stream and split them into the pathways of
+    the streaming model, see `slowfast.models.streaming`. Unlike
+    `process_cv2_inputs`, all the frames are kept.
+    Args:
+        frames (list of array): list of new input images in range [0, 255].
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    inputs = torch.from_numpy(np.array(frames)).float() / 255
+    inputs = tensor_normalize(inputs, cfg.DATA.MEAN, cfg.DATA.STD)
+    # T H W C -> 1 C T H W.
+    inputs = inputs.permute(3, 0, 1, 2).unsqueeze(0)
+    return pack_stream_pathways(
+        inputs, len(get_stream_num_frames(cfg)), cfg.SLOWFAST.ALPHA
+    )
+
+
+class ClipPreprocessor:
+    """
+    Fused preprocessing of the demo clips, equivalent to converting the
+    frames to RGB, scaling them and `process_cv2_inputs`. Only the
+    `NUM_FRAMES` frames sampled from a clip are scaled, straight into a uint8
+    clip buffer reused across clips and pinned when running on GPU. The
+    buffer is then converted to RGB, normalized and permuted into the float
+    clip in one pass, on the GPU when NUM_GPUS > 0.
+    """
+
+    def __init__(self, cfg, gpu_id=None):
+        """
+        Args:
+            cfg (CfgNode): configs. Details can be found in
+                slowfast/config/defaults.py
+            gpu_id (Optional[int]): GPU id.
+        """
+        self.cfg = cfg
+        self.device = torch.device("cpu")
+        if cfg.NUM_GPUS > 0:
+            self.device = torch.device(
+                "cuda", torch.cuda.current_device() if gpu_id is None else gpu_id
+            )
+        # Channel of the frames of every RGB channel of the clip.
+        self.channels = [2, 1, 0] if cfg.DEMO.INPUT_FORMAT == "BGR" else [0, 1, 2]
+        self.mean = torch.tensor(cfg.DATA.MEAN, device=self.device).view(
+            3, 1, 1, 1
+        )
+        self.std = torch.tensor(cfg.DATA.STD, device=self.device).view(
+            3, 1, 1, 1
+        )
+        self.buffer = None
+        self.copy_done = None
+
+    def get_buffer(self, height, width):
+        """
+        Get the uint8 clip buffer, `num frames` x `height` x `width` x 3.
+        Args:
+            height (int): height of the scaled frames.
+            width (int): width of the scaled frames.
+        """
+        shape = (self.cfg.DATA.NUM_FRAMES, height, width, 3)
+        if self.buffer is None or tuple(self.buffer.shape) != shape:
+            self.buffer = torch.empty(
+                shape, dtype=torch.uint8, pin_memory=self.cfg.NUM_GPUS > 0
+            )
+        elif self.copy_done is not None:
+            # Wait for the previous clip to leave the buffer.
+            self.copy_done.synchronize()
+        return self.buffer
+
+    def __call__(self, frames):
+        """
+        Args:
+            frames (list of array): uint8 frames of a clip in
+                DEMO.INPUT_FORMAT, `height` x `width` x 3.
+        Returns:
+            inputs (list): one tensor per pathway, of batch size 1.
+        """
+        index = torch.linspace(0, len(frames) - 1, self.cfg.DATA.NUM_FRAMES)
+        height, width = cv2_transform.scale_size(
+            self.cfg.DATA.TEST_CROP_SIZE, *frames[0].shape[:2]
+        )
+        buffer = self.get_buffer(height, width)
+        buffer_np = buffer.numpy()
+        for i, idx in enumerate(index.long().tolist()):
+            frame = frames[idx]
+            if frame.shape[:2] == (height, width):
+                buffer_np[i] = frame
+            else:
+                cv2.resize(
+                    frame,
+                    (width, height),
+                    dst=buffer_np[i],
+                    interpolation=cv2.INTER_LINEAR,
+                )
+
+        if self.cfg.NUM_GPUS > 0:
+            buffer = buffer.to(self.device, non_blocking=True)
+            self.copy_done = torch.cuda.Event()
+            self.copy_done.record()
+        inputs = torch.empty(
+            (3,) + tuple(buffer.shape[:3]), dtype=torch.float, device=self.device
+        )
+        for channel, frame_channel in enumerate(self.channels):
+            inputs[channel].copy_(buffer[..., frame_channel])
+        inputs.div_(255.0).sub_(self.mean).div_(self.std)
+        inputs = pack_pathway_output(self.cfg, inputs)
+        return [inp.unsqueeze(0) for inp in inputs]
+
+
 def get_layer(model, layer_name):
     """
     Return the targeted layer (nn.Module Object) given a hierarchical layer name,
@@ -350,6 +463,8 @@ class TaskInfo:
         self.img_width = -1
         self.crop_size = -1
         self.clip_vis_size = -1
+        # Id of the request of the task in InferenceServer.
+        self.request_id = -1
 
     def add_frames(self, idx, frames):
         """
@@ -5,7 +5,22 @@ A script to benchmark data loading.
 """
 
 import slowfast.utils.logging as logging
-from slowfast.utils.benchmark import benchmark_data_loading
+from slowfast.utils.benchmark import (
+    benchmark_ava_startup,
+    benchmark_batch_augmentation,
+    benchmark_data_loading,
+    benchmark_frame_index,
+    benchmark_gaze_attention,
+    benchmark_inference,
+    benchmark_meccano_decoding,
+    benchmark_preprocessing,
+    benchmark_pyav_decode,
+    benchmark_quantized_x3d,
+    benchmark_server,
+    benchmark_streaming,
+    benchmark_test_meter,
+    benchmark_uint8_clips,
+)
 from slowfast.utils.misc import launch_job
 from slowfast.utils.parser import load_config, parse_args
 
@@ -14,9 +29,39 @@ logger = logging.get_logger(__name__)
 
 def main():
     args = parse_args()
-    cfg = load_config(args)
-
-    launch_job(cfg=cfg, init_method=args.init_method, func=benchmark_data_loading)
+    for path_to_config in args.cfg_files:
+        cfg = load_config(args, path_to_config)
+        if cfg.BENCHMARK.MODE == "meccano_decode":
+            func = benchmark_meccano_decoding
+        elif cfg.BENCHMARK.MODE == "gaze_attention":
+            func = benchmark_gaze_attention
+        elif cfg.BENCHMARK.MODE == "test_meter":
+            func = benchmark_test_meter
+        elif cfg.BENCHMARK.MODE == "quantized_x3d":
+            func = benchmark_quantized_x3d
+        elif cfg.BENCHMARK.MODE == "inference":
+            func = benchmark_inference
+        elif cfg.BENCHMARK.MODE == "batch_augment":
+            func = benchmark_batch_augmentation
+        elif cfg.BENCHMARK.MODE == "pyav_decode":
+            func = benchmark_pyav_decode
+        elif cfg.BENCHMARK.MODE == "ava_startup":
+            func = benchmark_ava_startup
+        elif cfg.BENCHMARK.MODE == "frame_index":
+            func = benchmark_frame_index
+        elif cfg.BENCHMARK.MODE == "uint8_clips":
+            func = benchmark_uint8_clips
+        elif cfg.BENCHMARK.MODE == "preprocess":
+            func = benchmark_preprocessing
+        elif cfg.BENCHMARK.MODE == "streaming":
+            func = benchmark_streaming
+        elif cfg.BENCHMARK.MODE == "server":
+            # The server starts a prediction worker per GPU itself.
+            benchmark_server(cfg)
+            continue
+        else:
+            func = benchmark_data_loading
+        launch_job(cfg=cfg, init_method=args.init_method, func=func)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Index the frame and keyframe PTS of the videos of a Kinetics style dataset.
+
+The index is read by the Kinetics loader when DATA.VIDEO_INDEX_DIR is set and
+DATA.DECODING_BACKEND is `pyav`.
+Example:
+    python tools/build_video_index.py --cfg configs/Kinetics/SLOWFAST_8x8_R50.yaml \
+        --opts DATA.VIDEO_INDEX_DIR /path/to/index
+"""
+
+import os
+
+import slowfast.utils.logging as logging
+from slowfast.datasets import video_index
+from slowfast.utils.env import pathmgr
+from slowfast.utils.parser import load_config, parse_args
+
+logger = logging.get_logger(__name__)
+
+
+def read_video_paths(cfg, split):
+    """
+    Read the video paths of a split, as the Kinetics loader.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+        split (str): the split name, `train`, `val` or `test`.
+    Returns:
+        paths (list): the paths of the videos.
+    """
+    path_to_file = os.path.join(cfg.DATA.PATH_TO_DATA_DIR, "{}.csv".format(split))
+    if not pathmgr.exists(path_to_file):
+        return []
+    paths = []
+    with pathmgr.open(path_to_file, "r") as f:
+        for path_label in f.read().splitlines():
+            path = path_label.split(cfg.DATA.PATH_LABEL_SEPARATOR)[0]
+            paths.append(os.path.join(cfg.DATA.PATH_PREFIX, path))
+    return paths
+
+
+def index_split(cfg, split):
+    """
+    Index every video of a split.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+        split (str): the split name, `train`, `val` or `test`.
+    """
+    paths = read_video_paths(cfg, split)
+    if len(paths) == 0:
+        logger.info("Skipping split {}: no videos found.".format(split))
+        return
+    index = video_index.build_video_index(paths, cfg.DATA_LOADER.NUM_WORKERS)
+    index_dir = os.path.join(cfg.DATA.VIDEO_INDEX_DIR, split)
+    index.save(index_dir)
+    logger.info(
+        "Indexed {} videos ({} frames, {} keyframes) of split {} into {}".format(
+            len(index),
+            index.num_frames,
+            index.num_keyframes,
+            split,
+            index_dir,
+        )
+    )
+
+
+def main():
+    args = parse_args()
+    for path_to_config in args.cfg_files:
+        cfg = load_config(args, path_to_config)
+        assert cfg.DATA.VIDEO_INDEX_DIR, "DATA.VIDEO_INDEX_DIR is not set."
+        logging.setup_logging(cfg.OUTPUT_DIR)
+        for split in ["train", "val", "test"]:
+            index_split(cfg, split)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,20 +2,16 @@
 
 import os
 import torch
-import time
 import argparse
 import numpy as np
-from tqdm import tqdm
 
-import slowfast.utils.checkpoint as cu
 import slowfast.utils.distributed as du
 import slowfast.utils.logging as logging
 import slowfast.utils.misc as misc
-from slowfast.models import build_model
-from slowfast.datasets.utils import pack_pathway_output
 from slowfast.config.defaults import get_cfg
 from slowfast.utils.parser import load_config
 import slowfast.models.optimizer as optim
+from slowfast.utils.benchmark import build_inference_model
 
 logger = logging.get_logger(__name__)
 
@@ -36,31 +32,17 @@ def parse_args():
     return parser.parse_args()
 
 
-# This function measures CPU inference time using torch.autograd.profiler.profile.
+# This function measures the wall-clock CPU inference time of every forward pass.
 def measure_cpu_time_and_fps(model, inputs, num_warmup=50, num_iterations=1000):
-    # Warm up
-    for _ in range(num_warmup):
-        model(inputs)
-    
-    # Measure inference time using profiler
-    with torch.autograd.profiler.profile(use_cuda=False) as prof:
-        for _ in tqdm(range(num_iterations)):
-            model(inputs)
-    
-    # Print detailed profiling information
-    print("\nDetailed CPU Profiling Information:")
-    print(prof.key_averages().table(sort_by="self_cpu_time_total"))
-    
-    # Calculate average time per forward pass
-    print(prof.self_cpu_time_total)
-    elapsed_time = prof.self_cpu_time_total / 1000000  # Convert from microsecond to seconds
-    cpu_time_for_one_iteration = elapsed_time  / num_iterations  # Convert from milliseconds to seconds
-    
-    # Calcaute fbs
-    total_frames = num_iterations * inputs[0].shape[2]  # Assuming inputs[0] shape is [B, C, T, H, W]
+    latencies = misc.measure_latencies(model, inputs, num_iterations, num_warmup)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+
+    # Calculate fps from the mean latency
+    elapsed_time = latencies.sum() / 1000.0
+    total_frames = num_iterations * inputs[0][0].shape[0] * inputs[0][0].shape[2]  # inputs[0][0] shape is [B, C, T, H, W]
     fps = total_frames / elapsed_time
 
-    return cpu_time_for_one_iteration, fps, total_frames, num_iterations
+    return (p50, p95, p99), fps, total_frames, num_iterations
 
 
 def main():
@@ -85,75 +67,39 @@ def main():
     np.random.seed(cfg.RNG_SEED)
     torch.manual_seed(cfg.RNG_SEED)
     
-    # Build the model
+    # Build the model and load the checkpoint, dense, pruned or quantized
     print("Building the model...")
-    model = build_model(cfg)
-    
-    # Load checkpoint
-    print("Loading the checkpoint...")
+    model, kind = build_inference_model(cfg)
+    print(f"Loaded {kind} model")
 
-    if cfg.PRUNING.ENABLE:
-        _, model = cu.load_checkpoint(cfg.TEST.CHECKPOINT_FILE_PATH, model, pruned=True)
-    else:
-        cu.load_checkpoint(cfg.TEST.CHECKPOINT_FILE_PATH, model)
-
-
-    model.eval()
-    model = model.cpu()  # Move the model to CPU for inference
-
-    # Create random input
-    rgb_dimension = 3
-    input_tensors = torch.rand(
-        rgb_dimension,
-        cfg.DATA.NUM_FRAMES,
-        cfg.DATA.TEST_CROP_SIZE,
-        cfg.DATA.TEST_CROP_SIZE,
-    )
-    
-    inputs = pack_pathway_output(cfg, input_tensors)  # list of tensors (channels, time, height, width)
-
-    if cfg.NUM_GPUS:
-        # Transfer the data to the current GPU device
-        if isinstance(inputs, (list,)):
-            for i in range(len(inputs)):
-                inputs[i] = inputs[i].cuda(non_blocking=True)
-        else:
-            inputs = inputs.cuda(non_blocking=True)
-    
     batch_sizes = [1]
 
     print("\nMeasuring inference speed...")
     
     for batch_size in batch_sizes:
-        # Duplicate the input to simulate a batch
-        if isinstance(inputs, (list,)):
-            batch_inputs = [x.repeat(batch_size, 1, 1, 1, 1) for x in inputs]
-        else:
-            batch_inputs = inputs.repeat(batch_size, 1, 1, 1, 1)
+        batch_inputs = misc.get_random_inputs(cfg, batch_size)
         
         # Measure FPS and CPU time
-        with torch.no_grad():
-            print(batch_inputs[0].shape)
-            cpu_time, fps, _, _ = measure_cpu_time_and_fps(model, batch_inputs, num_warmup=50, num_iterations=1000)
+        print(batch_inputs[0][0].shape)
+        (p50, p95, p99), fps, _, _ = measure_cpu_time_and_fps(model, batch_inputs, num_warmup=50, num_iterations=1000)
 
 
         print(f"\nResults for batch size {batch_size}:")
         print(f"  - Average FPS: {fps:.2f}")
         print(f"  - Time per frame: {1000/fps:.2f} ms")
-        print(f"  - Average CPU time per forward pass: {cpu_time} seconds")
+        print(f"  - Latency per forward pass: p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms")
     
     # Model information
     params = sum(p.numel() for p in model.parameters())
     print(f"\nModel parameters: {params:,}")
     
     # Model size
-    model_size = sum(p.element_size() * p.nelement() for p in model.parameters())
-    print(f"Model size: {model_size / (1024 ** 2):.2f} MB")
+    print(f"Model size: {misc.get_model_size(model):.2f} MB")
 
-    # Calculate model FLOPs
-    inputs_flops = [inp[0:1].clone() for inp in inputs]  # Take only the first item in batch for FLOP calculation
-    flops, _ = misc.log_model_info(model, cfg, use_train_input=False)
-    print(f"Model FLOPs: {flops:,}")
+    # Calculate model FLOPs, the flop counter cannot trace TorchScript models
+    if kind != "ptq":
+        flops, _ = misc.log_model_info(model, cfg, use_train_input=False)
+        print(f"Model FLOPs: {flops:,}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
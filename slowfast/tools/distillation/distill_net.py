@@ -17,6 +17,7 @@ import argparse
 import itertools
 import copy
 from fvcore.common.config import CfgNode
+from fvcore.common.timer import Timer
 
 import slowfast.models.losses as losses
 import slowfast.models.optimizer as optim
@@ -26,7 +27,9 @@ import slowfast.utils.logging as logging
 import slowfast.utils.metrics as metrics
 import slowfast.utils.misc as misc
 from slowfast.datasets import loader
+from slowfast.datasets.batch_transform import batch_augment
 from slowfast.models import build_model
+from slowfast.utils.logit_store import TeacherLogitStore
 from slowfast.utils.meters import AVAMeter, EpochTimer, TrainMeter, ValMeter
 from slowfast.utils.multigrid import MultigridSchedule
 from slowfast.config.defaults import get_cfg
@@ -49,7 +52,8 @@ def train_epoch(
     """
     Perform knowledge distillation training for one epoch.
     Args:
-        teacher_model (model): the pre-trained teacher model.
+        teacher_model (model): the pre-trained teacher model. If None, the
+            teacher logits are read from the store of distill_loss_fn.
         student_model (model): the student model to train.
         loader (loader): video loader.
         distill_loss_fn (nn.Module): distillation loss function.
@@ -61,33 +65,41 @@ def train_epoch(
             to writer Tensorboard log.
     """
     # Enable train mode.
-    teacher_model.eval()  # Teacher is always in evaluation mode
+    if teacher_model is not None:
+        teacher_model.eval()  # Teacher is always in evaluation mode
     student_model.train()
     
     train_meter.iter_tic()
     data_size = len(loader)
+    aug_seed = loader.dataset.aug_seed if teacher_model is None else 0
     
-    for cur_iter, (inputs, labels, _, meta) in enumerate(loader):
+    for cur_iter, (inputs, labels, index, time, meta) in enumerate(loader):
         # Transfer the data to the current GPU device.
         if isinstance(inputs, (list,)):
             for i in range(len(inputs)):
                 inputs[i] = inputs[i].cuda(non_blocking=True)
         else:
             inputs = inputs.cuda(non_blocking=True)
+        if cfg.DATA.BATCH_AUGMENTATION:
+            inputs = batch_augment(inputs[0], meta["spatial_params"], cfg)
         
         # Transfer the labels and meta data to the current GPU device.
         labels = labels.cuda()
         
         # Get teacher predictions (no grad needed)
-        with torch.no_grad():
-            teacher_preds = teacher_model(inputs)
+        teacher_preds = None
+        if teacher_model is not None:
+            with torch.no_grad():
+                teacher_preds = teacher_model(inputs)
         
         # Update the student model
         student_optimizer.zero_grad()
         student_preds = student_model(inputs)
         
         # Calculate distillation loss
-        loss = distill_loss_fn(student_preds, teacher_preds, labels)
+        loss = distill_loss_fn(
+            student_preds, teacher_preds, labels, index=index, aug_seed=aug_seed
+        )
         
         # Check Nan Loss.
         misc.check_nan_losses(loss)
@@ -152,13 +164,15 @@ def eval_epoch(
     student_model.eval()
     val_meter.iter_tic()
 
-    for cur_iter, (inputs, labels, _, meta) in enumerate(val_loader):
+    for cur_iter, (inputs, labels, _, _, meta) in enumerate(val_loader):
         # Transfer the data to the current GPU device.
         if isinstance(inputs, (list,)):
             for i in range(len(inputs)):
                 inputs[i] = inputs[i].cuda(non_blocking=True)
         else:
             inputs = inputs.cuda(non_blocking=True)
+        if cfg.DATA.BATCH_AUGMENTATION:
+            inputs = batch_augment(inputs[0], meta["spatial_params"], cfg)
             
         labels = labels.cuda()
 
@@ -299,6 +313,80 @@ def build_teacher_model(cfg, teacher_cfg):
     return model
 
 
+@torch.no_grad()
+def build_teacher_logit_store(cfg, teacher_cfg, teacher_model, dataset, path):
+    """
+    Run the teacher once over the training set for every augmentation seed
+    and store its logits. Each rank handles its share of the samples.
+    Args:
+        cfg (CfgNode): configs for distillation.
+        teacher_cfg (CfgNode): configs for the teacher model.
+        teacher_model (model): the pre-trained teacher model.
+        dataset (Dataset): the training dataset. It must support seeded
+            augmentations through its `aug_seed` attribute.
+        path (str): directory of the store.
+    Returns:
+        teacher_seconds (float): the time spent in the teacher forward for one
+            pass over the training set, i.e. the time saved per epoch.
+    """
+    assert hasattr(
+        dataset, "aug_seed"
+    ), "Caching teacher logits requires seeded augmentations."
+    num_seeds = cfg.DISTILLATION.TEACHER_CACHE_NUM_SEEDS
+    if du.is_master_proc(cfg.NUM_GPUS * cfg.NUM_SHARDS):
+        TeacherLogitStore.create(
+            path,
+            num_seeds,
+            len(dataset),
+            teacher_cfg.MODEL.NUM_CLASSES,
+            cfg.DISTILLATION.TEACHER_CACHE_TOPK,
+        )
+    du.synchronize()
+    store = TeacherLogitStore(path, mode="r+")
+
+    sampler = (
+        torch.utils.data.distributed.DistributedSampler(dataset, shuffle=False)
+        if cfg.NUM_GPUS > 1
+        else None
+    )
+    data_loader = torch.utils.data.DataLoader(
+        dataset,
+        batch_size=int(cfg.TRAIN.BATCH_SIZE / max(1, cfg.NUM_GPUS)),
+        shuffle=False,
+        sampler=sampler,
+        num_workers=cfg.DATA_LOADER.NUM_WORKERS,
+        pin_memory=cfg.DATA_LOADER.PIN_MEMORY,
+    )
+    teacher_model.eval()
+    teacher_seconds = 0.0
+    for seed in range(num_seeds):
+        # Workers are created per pass and pick up the seed.
+        dataset.aug_seed = seed
+        for inputs, _, index, _, meta in tqdm.tqdm(data_loader):
+            if cfg.NUM_GPUS > 0:
+                if isinstance(inputs, (list,)):
+                    for i in range(len(inputs)):
+                        inputs[i] = inputs[i].cuda(non_blocking=True)
+                else:
+                    inputs = inputs.cuda(non_blocking=True)
+            if cfg.DATA.BATCH_AUGMENTATION:
+                inputs = batch_augment(inputs[0], meta["spatial_params"], cfg)
+            if cfg.NUM_GPUS > 0:
+                torch.cuda.synchronize()
+            timer = Timer()
+            preds = teacher_model(inputs)
+            if cfg.NUM_GPUS > 0:
+                torch.cuda.synchronize()
+            teacher_seconds += timer.seconds()
+            store.write(seed, index, preds)
+    store.flush()
+    du.synchronize()
+    teacher_seconds /= num_seeds
+    if du.is_master_proc(cfg.NUM_GPUS * cfg.NUM_SHARDS):
+        TeacherLogitStore.mark_complete(path, teacher_seconds)
+    return teacher_seconds
+
+
 def build_student_model(cfg):
     """
     Build the student model (X3D-M).
@@ -341,19 +429,44 @@ def distill_knowledge(cfg , teacher_cfg):
     
     
     # Build teacher and student models
-    teacher_model = build_teacher_model(teacher_cfg)
+    teacher_model = build_teacher_model(cfg, teacher_cfg)
     student_model = build_student_model(cfg)
     
+    # Create the video train and val loaders
+    train_loader = loader.construct_loader(cfg, "train")
+    val_loader = loader.construct_loader(cfg, "val")
+
+    # Precompute the teacher logits, the teacher is not needed afterwards
+    teacher_store = None
+    if cfg.DISTILLATION.CACHE_TEACHER_LOGITS:
+        store_path = cfg.DISTILLATION.TEACHER_CACHE_DIR or os.path.join(
+            cfg.OUTPUT_DIR, "teacher_logits"
+        )
+        if not TeacherLogitStore.exists(store_path):
+            timer = Timer()
+            build_teacher_logit_store(
+                cfg, teacher_cfg, teacher_model, train_loader.dataset, store_path
+            )
+            logger.info(
+                "Cached teacher logits in {} in {:.2f} seconds.".format(
+                    store_path, timer.seconds()
+                )
+            )
+        teacher_store = TeacherLogitStore(store_path)
+        logger.info(
+            "Using cached teacher logits from {}, teacher forward takes {:.2f} "
+            "seconds per epoch.".format(store_path, teacher_store.teacher_seconds)
+        )
+        teacher_model = None
+        torch.cuda.empty_cache()
+
     # Create distillation loss function
     distill_loss_fn = losses.DistillationLoss(
         alpha=cfg.DISTILLATION.ALPHA, 
-        temperature=cfg.DISTILLATION.TEMPERATURE
+        temperature=cfg.DISTILLATION.TEMPERATURE,
+        teacher_store=teacher_store,
     )
     
-    # Create the video train and val loaders
-    train_loader = loader.construct_loader(cfg, "train")
-    val_loader = loader.construct_loader(cfg, "val")
-    
     # Create meters to metric the training and validation stats
     train_meter = TrainMeter(len(train_loader), cfg)
     val_meter = ValMeter(len(val_loader), cfg)
@@ -387,6 +500,9 @@ def distill_knowledge(cfg , teacher_cfg):
         # Shuffle the dataset
         loader.shuffle_dataset(train_loader, cur_epoch)
         
+        if teacher_store is not None:
+            train_loader.dataset.aug_seed = cur_epoch % teacher_store.num_seeds
+
         # Train for one epoch
         epoch_timer.epoch_tic()
         train_epoch(
@@ -401,6 +517,15 @@ def distill_knowledge(cfg , teacher_cfg):
             writer,
         )
         epoch_timer.epoch_toc()
+        if teacher_store is not None:
+            logger.info(
+                "Epoch {} took {:.2f} seconds with cached teacher logits, "
+                "saving {:.2f} seconds of teacher forward.".format(
+                    cur_epoch,
+                    epoch_timer.last_epoch_time(),
+                    teacher_store.teacher_seconds,
+                )
+            )
         
         # Update learning rate
         lr = student_scheduler.get_last_lr()[0]
@@ -500,9 +625,9 @@ def load_config(args):
     if args.cfg_file is not None:
         cfg.merge_from_file(args.cfg_file)
 
-    if args.DISTILLATION.TEACHER_CFG_FILE is not None:
+    if cfg.DISTILLATION.TEACHER_CFG_FILE:
         teacher_cfg = get_cfg()
-        teacher_cfg.merge_from_file(args.DISTILLATION.TEACHER_CFG_FILE)   
+        teacher_cfg.merge_from_file(cfg.DISTILLATION.TEACHER_CFG_FILE)
 
 
     # Create output directory if not exists
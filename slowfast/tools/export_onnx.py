@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+"""
+Export a video model, e.g. X3D or SlowFast, to ONNX for ONNX Runtime on CPU,
+optionally with int8 static quantization, and compare its outputs and CPU
+latency to the eager model.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import pprint
+
+import numpy as np
+import onnx
+import torch
+import torch.nn as nn
+from onnxruntime import quantization
+
+import slowfast.utils.logging as logging
+import slowfast.utils.misc as misc
+from slowfast.config.defaults import assert_and_infer_cfg, get_cfg
+from slowfast.models.utils import replace_swish
+from slowfast.utils.benchmark import build_inference_model
+from slowfast.utils.exported_model import META_FILE, OnnxModel
+
+from export_torchscript import get_export_meta, get_trace_crop_size
+from ptq_x3d import get_calibration_loader
+
+logger = logging.get_logger(__name__)
+
+# Calibration methods of ONNX Runtime for QUANTIZATION.OBSERVER.
+_CALIBRATION_METHODS = {
+    "minmax": quantization.CalibrationMethod.MinMax,
+    "histogram": quantization.CalibrationMethod.Entropy,
+    "percentile": quantization.CalibrationMethod.Percentile,
+}
+
+
+class FlatInputs(nn.Module):
+    """
+    Call a model with one tensor per pathway followed by its other inputs,
+    e.g. the gaze heatmaps, so every input of the ONNX graph is a named
+    tensor.
+    """
+
+    def __init__(self, model, num_pathways):
+        """
+        Args:
+            model (nn.Module): model taking a list of pathways.
+            num_pathways (int): number of pathways of the model.
+        """
+        super(FlatInputs, self).__init__()
+        self.model = model
+        self.num_pathways = num_pathways
+
+    def forward(self, *inputs):
+        return self.model(
+            list(inputs[: self.num_pathways]), *inputs[self.num_pathways :]
+        )
+
+
+class CalibrationReader(quantization.CalibrationDataReader):
+    """
+    Feed the calibration clips one at a time to the ONNX Runtime calibration.
+    The calibration keeps the activations of all the clips of a range in
+    memory, so the ranges are of a single clip, see `quantize_onnx`.
+    """
+
+    def __init__(self, calib_batches, input_names):
+        """
+        Args:
+            calib_batches (list): batches in the format of the data loaders.
+            input_names (list): names of the pathway inputs of the graph.
+        """
+        self.calib_batches = calib_batches
+        self.input_names = input_names
+        self.clips = [
+            (batch_idx, clip_idx)
+            for batch_idx, (inputs, _, _, _, _) in enumerate(calib_batches)
+            for clip_idx in range(inputs[0].size(0))
+        ]
+        self.set_range(0, len(self.clips))
+
+    def __len__(self):
+        return len(self.clips)
+
+    def set_range(self, start_index, end_index):
+        self.indices = iter(self.clips[start_index:end_index])
+
+    def get_next(self):
+        index = next(self.indices, None)
+        if index is None:
+            return None
+        batch_idx, clip_idx = index
+        inputs = self.calib_batches[batch_idx][0]
+        return {
+            name: x[clip_idx : clip_idx + 1].cpu().numpy()
+            for name, x in zip(self.input_names, inputs)
+        }
+
+
+def get_input_names(cfg):
+    """
+    Returns:
+        input_names (list): names of the inputs of the ONNX graph.
+    """
+    input_names = [
+        "pathway{}".format(i) for i in range(len(cfg.DATA.INPUT_CHANNEL_NUM))
+    ]
+    if cfg.MECCANO.GAZE_ENABLE:
+        input_names.append("gaze")
+    return input_names
+
+
+def export_onnx(model, inputs, input_names, path, meta, opset=17):
+    """
+    Export a model to ONNX with a dynamic batch size, height and width. The
+    heads are traced on their fully convolutional test path, so the inputs
+    should be larger than the train crop size, see `get_trace_crop_size`.
+    Args:
+        model (nn.Module): model in eval mode on CPU. Its Swish activations
+            are replaced in place, see `replace_swish`.
+        inputs (tuple): positional inputs of the model to trace it with.
+        input_names (list): names of the inputs of the graph.
+        path (str): path of the ONNX model.
+        meta (dict): metadata stored in the ONNX model.
+        opset (int): ONNX opset version.
+    """
+    replace_swish(model)
+    flat_inputs = tuple(inputs[0]) + tuple(inputs[1:])
+    dynamic_axes = {
+        name: {0: "batch", 3: "height", 4: "width"}
+        for name in input_names
+        if name.startswith("pathway")
+    }
+    if "gaze" in input_names:
+        dynamic_axes["gaze"] = {0: "batch", 2: "gaze_height", 3: "gaze_width"}
+    dynamic_axes["preds"] = {0: "batch"}
+    with torch.no_grad():
+        # The TorchScript based exporter evaluates the shape checks of the
+        # heads at the traced size, which torch.export cannot.
+        torch.onnx.export(
+            FlatInputs(model, len(inputs[0])).eval(),
+            flat_inputs,
+            path,
+            input_names=input_names,
+            output_names=["preds"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False,
+        )
+    onnx_model = onnx.load(path)
+    onnx.helper.set_model_props(onnx_model, {META_FILE: json.dumps(meta)})
+    onnx.save(onnx_model, path)
+
+
+def quantize_onnx(fp32_path, int8_path, calib_batches, input_names, cfg):
+    """
+    Quantize an ONNX model to int8 with ONNX Runtime static quantization, in
+    the QDQ format, with the QUANTIZATION configs of FX quantization.
+    Args:
+        fp32_path (str): path of the float ONNX model.
+        int8_path (str): path of the int8 ONNX model.
+        calib_batches (list): calibration batches.
+        input_names (list): names of the pathway inputs of the graph.
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    observer = cfg.QUANTIZATION.OBSERVER
+    assert (
+        observer in _CALIBRATION_METHODS
+    ), "Observer {} not supported by ONNX Runtime".format(observer)
+    nodes_to_exclude = []
+    if cfg.QUANTIZATION.FLOAT_DEPTHWISE:
+        for node in onnx.load(fp32_path).graph.node:
+            groups = [a.i for a in node.attribute if a.name == "group"]
+            if node.op_type == "Conv" and groups and groups[0] > 1:
+                nodes_to_exclude.append(node.name)
+    quantization.quantize_static(
+        fp32_path,
+        int8_path,
+        CalibrationReader(calib_batches, input_names),
+        quant_format=quantization.QuantFormat.QDQ,
+        per_channel=cfg.QUANTIZATION.PER_CHANNEL_WEIGHTS,
+        reduce_range=cfg.QUANTIZATION.BACKEND != "qnnpack",
+        activation_type=quantization.QuantType.QUInt8,
+        weight_type=quantization.QuantType.QInt8,
+        nodes_to_exclude=nodes_to_exclude,
+        calibrate_method=_CALIBRATION_METHODS[observer],
+        extra_options={
+            "CalibPercentile": cfg.QUANTIZATION.OBSERVER_PERCENTILE,
+            # Merge the ranges after every clip to bound the memory.
+            "CalibStridedMinMax": 1,
+        },
+    )
+    # quantize_static keeps the graph but not the metadata properties.
+    int8_model = onnx.load(int8_path)
+    onnx.helper.set_model_props(
+        int8_model,
+        {p.key: p.value for p in onnx.load(fp32_path).metadata_props},
+    )
+    onnx.save(int8_model, int8_path)
+
+
+def top1_agreement(preds, ref_preds):
+    """
+    Returns:
+        float: percentage of the clips with the same top-1 class.
+    """
+    return 100.0 * (preds.argmax(1) == ref_preds.argmax(1)).float().mean().item()
+
+
+def export(cfg, output_path, quantize=False, latency_iters=20):
+    """
+    Export the model of a config to ONNX, and optionally to an int8 ONNX
+    model next to it, check their outputs against the eager model on random
+    clips and, for int8, on the calibration clips, and write a report of the
+    parity and of the CPU latency of all the models to
+    OUTPUT_DIR/onnx_export_report.json.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+        output_path (str): path of the float ONNX model.
+        quantize (bool): if True, also export an int8 model, calibrated with
+            QUANTIZATION.CALIBRATION_NUM_BATCHES batches.
+        latency_iters (int): number of timed forward passes of the latency.
+    Returns:
+        report (dict): output differences and latencies.
+    """
+    logging.setup_logging(cfg.OUTPUT_DIR)
+    logger.info("Export ONNX with config:")
+    logger.info(pprint.pformat(cfg))
+
+    model, kind = build_inference_model(cfg)
+    assert kind in [
+        "dense",
+        "distilled",
+        "pruned",
+    ], "Only float models can be exported to ONNX, got a {} model".format(kind)
+    input_names = get_input_names(cfg)
+    inputs = misc.get_random_inputs(cfg)
+    with torch.no_grad():
+        eager_preds = model(*inputs)
+
+    export_onnx(
+        model,
+        misc.get_random_inputs(cfg, crop_size=get_trace_crop_size(cfg)),
+        input_names,
+        output_path,
+        get_export_meta(cfg, kind),
+    )
+    logger.info(f"ONNX model saved to: {output_path}")
+
+    num_threads = torch.get_num_threads()
+    report = {
+        "kind": kind,
+        "num_threads": num_threads,
+        "eager_latency_ms": float(
+            np.median(misc.measure_latencies(model, inputs, latency_iters))
+        ),
+    }
+    paths = {"fp32": output_path}
+    if quantize:
+        assert (
+            not cfg.MECCANO.GAZE_ENABLE
+        ), "Gaze attention models are not supported by int8 calibration"
+        calib_batches = list(
+            itertools.islice(
+                get_calibration_loader(cfg),
+                cfg.QUANTIZATION.CALIBRATION_NUM_BATCHES,
+            )
+        )
+        paths["int8"] = os.path.splitext(output_path)[0] + "_int8.onnx"
+        quantize_onnx(output_path, paths["int8"], calib_batches, input_names, cfg)
+        logger.info(f"int8 ONNX model saved to: {paths['int8']}")
+
+    for name, path in paths.items():
+        onnx_model = OnnxModel(path, num_threads=num_threads)
+        preds = onnx_model(*inputs)
+        stats = {
+            "max_abs_diff": (preds - eager_preds).abs().max().item(),
+            "latency_ms": float(
+                np.median(
+                    misc.measure_latencies(onnx_model, inputs, latency_iters)
+                )
+            ),
+        }
+        if name == "int8":
+            # Random clips do not tell the int8 error apart, so also compare
+            # the top-1 classes on the calibration clips.
+            agreement = []
+            with torch.no_grad():
+                for batch_inputs, _, _, _, _ in calib_batches:
+                    agreement.append(
+                        top1_agreement(
+                            onnx_model(batch_inputs), model(batch_inputs)
+                        )
+                    )
+            stats["calibration_top1_agreement"] = float(np.mean(agreement))
+        stats["speedup"] = report["eager_latency_ms"] / stats["latency_ms"]
+        logger.info(
+            f"{name}: max output difference {stats['max_abs_diff']:.2e}, "
+            f"latency {stats['latency_ms']:.2f} ms, "
+            f"speedup {stats['speedup']:.2f}x"
+        )
+        report[name] = stats
+
+    report_path = os.path.join(cfg.OUTPUT_DIR, "onnx_export_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Report saved to: {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export a video model to ONNX for ONNX Runtime"
+    )
+    parser.add_argument(
+        "--cfg",
+        dest="cfg_file",
+        help="Path to the config file",
+        required=True,
+        type=str,
+    )
+    parser.add_argument(
+        "--output",
+        dest="output",
+        help="Path of the ONNX model, OUTPUT_DIR/exported_model.onnx if empty",
+        default="",
+        type=str,
+    )
+    parser.add_argument(
+        "--quantize",
+        dest="quantize",
+        help="Also export an int8 model with ONNX Runtime static quantization",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--latency_iters",
+        dest="latency_iters",
+        help="Number of timed forward passes for the latency",
+        default=20,
+        type=int,
+    )
+    parser.add_argument(
+        "opts",
+        help="See slowfast/config/defaults.py for all options",
+        default=None,
+        nargs=argparse.REMAINDER,
+    )
+    args = parser.parse_args()
+
+    cfg = get_cfg()
+    cfg.merge_from_file(args.cfg_file)
+    if args.opts is not None:
+        cfg.merge_from_list(args.opts)
+    # ONNX Runtime runs on CPU.
+    cfg.NUM_GPUS = 0
+    cfg = assert_and_infer_cfg(cfg)
+    os.makedirs(cfg.OUTPUT_DIR, exist_ok=True)
+
+    export(
+        cfg,
+        args.output or os.path.join(cfg.OUTPUT_DIR, "exported_model.onnx"),
+        args.quantize,
+        args.latency_iters,
+    )
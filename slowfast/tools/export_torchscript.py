@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+"""
+Export a video model, e.g. X3D, SlowFast or the int8 QuantizedX3D, to a frozen
+TorchScript file for CPU serving, and compare its cold-start time and
+steady-state latency to the eager model.
+"""
+
+import argparse
+import json
+import os
+import pprint
+import subprocess
+import sys
+
+import numpy as np
+import torch
+from fvcore.common.timer import Timer
+
+import slowfast.utils.logging as logging
+import slowfast.utils.misc as misc
+from slowfast.config.defaults import assert_and_infer_cfg, get_cfg
+from slowfast.models.utils import replace_swish
+from slowfast.utils.benchmark import build_inference_model
+from slowfast.utils.exported_model import META_FILE, ExportedModel
+
+logger = logging.get_logger(__name__)
+
+# Load the model and run a first forward pass in a new process, from the
+# imports on, so the cold-start times include the imports they need.
+_EAGER_COLD_START = """
+import sys, time
+start = time.perf_counter()
+import torch
+import slowfast.utils.misc as misc
+from slowfast.config.defaults import assert_and_infer_cfg, get_cfg
+from slowfast.utils.benchmark import build_inference_model
+cfg = get_cfg()
+cfg.merge_from_file(sys.argv[1])
+cfg.merge_from_list(sys.argv[2:])
+cfg.NUM_GPUS = 0
+model, _ = build_inference_model(assert_and_infer_cfg(cfg))
+with torch.no_grad():
+    model(*misc.get_random_inputs(cfg))
+print(time.perf_counter() - start)
+"""
+
+_EXPORTED_COLD_START = """
+import sys, time
+start = time.perf_counter()
+import torch
+from slowfast.utils.exported_model import ExportedModel
+model = ExportedModel(sys.argv[1])
+meta = model.meta
+size = meta["crop_size"]
+frames = torch.rand(1, 3, meta["num_frames"], size, size)
+extra_inputs = []
+if meta["gaze"]:
+    extra_inputs.append(torch.ones(1, meta["num_frames"], size // 32, size // 32))
+model(model.pack_pathways(frames), *extra_inputs)
+print(time.perf_counter() - start)
+"""
+
+
+def _time_cold_start(code, args):
+    """
+    Returns:
+        float: seconds to load the model and run a first forward pass in a new
+            python process.
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", code] + list(args),
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(output.stdout.strip().split("\n")[-1])
+
+
+def get_trace_crop_size(cfg):
+    """
+    Get the clip size to trace the models with: the test crop size, or a
+    larger one for the heads to take their fully convolutional test path, so
+    the traced models take any clip at least as large as the train crop.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    Returns:
+        crop_size (int): height and width of the clips to trace with.
+    """
+    return max(cfg.DATA.TEST_CROP_SIZE, cfg.DATA.TRAIN_CROP_SIZE + 32)
+
+
+def export_model(model, kind, inputs):
+    """
+    Convert a model to a frozen TorchScript module. Eager models are traced
+    with their pathway list, TorchScript models, e.g. of ptq_x3d, are only
+    frozen. `ExportedModel` optimizes the frozen module for inference when
+    loading it.
+    Args:
+        model (nn.Module): model in eval mode on CPU.
+        kind (str): kind of model of `build_inference_model`.
+        inputs (tuple): positional inputs of the model to trace it with.
+    Returns:
+        exported (ScriptModule): the frozen module.
+    """
+    if kind != "ptq":
+        # Swish is a python autograd function, which cannot be exported.
+        replace_swish(model)
+        with torch.no_grad():
+            model = torch.jit.trace(model, inputs)
+    return torch.jit.freeze(model.eval())
+
+
+def get_export_meta(cfg, kind):
+    """
+    Returns:
+        meta (dict): what a client needs to build the inputs of the model.
+    """
+    return {
+        "arch": cfg.MODEL.ARCH,
+        "model_name": cfg.MODEL.MODEL_NAME,
+        "kind": kind,
+        "num_classes": cfg.MODEL.NUM_CLASSES,
+        "num_pathways": len(cfg.DATA.INPUT_CHANNEL_NUM),
+        "alpha": cfg.SLOWFAST.ALPHA,
+        "num_frames": cfg.DATA.NUM_FRAMES,
+        "sampling_rate": cfg.DATA.SAMPLING_RATE,
+        "crop_size": cfg.DATA.TEST_CROP_SIZE,
+        "mean": cfg.DATA.MEAN,
+        "std": cfg.DATA.STD,
+        "reverse_input_channel": cfg.DATA.REVERSE_INPUT_CHANNEL,
+        "gaze": cfg.MECCANO.GAZE_ENABLE,
+    }
+
+
+def export(cfg, cfg_file, opts, output_path, latency_iters=20):
+    """
+    Export the model of a config to a frozen TorchScript file, check that its
+    outputs match the eager model, and write a report of the cold-start time
+    and the steady-state latency of both to OUTPUT_DIR/export_report.json.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+        cfg_file (str): path to the config file, for the cold-start run.
+        opts (list): config overrides, for the cold-start run.
+        output_path (str): path of the exported model.
+        latency_iters (int): number of timed forward passes of the latency.
+    Returns:
+        report (dict): cold-start time, latency and max output difference.
+    """
+    logging.setup_logging(cfg.OUTPUT_DIR)
+    logger.info("Export TorchScript with config:")
+    logger.info(pprint.pformat(cfg))
+
+    model, kind = build_inference_model(cfg)
+    inputs = misc.get_random_inputs(cfg)
+    with torch.no_grad():
+        eager_preds = model(*inputs)
+    eager_latency = float(
+        np.median(misc.measure_latencies(model, inputs, latency_iters))
+    )
+
+    timer = Timer()
+    exported = export_model(
+        model,
+        kind,
+        misc.get_random_inputs(cfg, crop_size=get_trace_crop_size(cfg)),
+    )
+    logger.info(f"Exported {kind} model in {timer.seconds():.2f} seconds")
+    meta = get_export_meta(cfg, kind)
+
+    def _save():
+        torch.jit.save(
+            exported, output_path, _extra_files={META_FILE: json.dumps(meta)}
+        )
+
+    # MKLDNN layouts do not speed up every model and CPU, e.g. the small 3D
+    # convolutions of X3D, so only optimize the model if it is faster.
+    _save()
+    latencies = {}
+    for optimize in [False, True]:
+        loaded = ExportedModel(output_path, optimize=optimize)
+        latencies[optimize] = float(
+            np.median(misc.measure_latencies(loaded.model, inputs, latency_iters))
+        )
+    meta["optimize"] = latencies[True] < latencies[False]
+    _save()
+    logger.info(f"Exported model saved to: {output_path}")
+
+    exported = ExportedModel(output_path)
+    max_diff = (exported(*inputs) - eager_preds).abs().max().item()
+    exported_latency = latencies[meta["optimize"]]
+    report = {
+        "kind": kind,
+        "num_threads": torch.get_num_threads(),
+        "optimize_for_inference": meta["optimize"],
+        "max_abs_diff": max_diff,
+        "eager_cold_start_s": _time_cold_start(
+            _EAGER_COLD_START, [cfg_file] + opts
+        ),
+        "exported_cold_start_s": _time_cold_start(
+            _EXPORTED_COLD_START, [output_path]
+        ),
+        "eager_latency_ms": eager_latency,
+        "frozen_latency_ms": latencies[False],
+        "optimized_latency_ms": latencies[True],
+        "exported_latency_ms": exported_latency,
+        "speedup": eager_latency / exported_latency,
+    }
+    logger.info(
+        f"Max output difference {max_diff:.2e}. Cold start: eager "
+        f"{report['eager_cold_start_s']:.2f} s, exported "
+        f"{report['exported_cold_start_s']:.2f} s. Latency: eager "
+        f"{eager_latency:.2f} ms, exported {exported_latency:.2f} ms, "
+        f"speedup {report['speedup']:.2f}x"
+    )
+    report_path = os.path.join(cfg.OUTPUT_DIR, "export_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Report saved to: {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export a video model to frozen TorchScript"
+    )
+    parser.add_argument(
+        "--cfg",
+        dest="cfg_file",
+        help="Path to the config file",
+        required=True,
+        type=str,
+    )
+    parser.add_argument(
+        "--output",
+        dest="output",
+        help="Path of the exported model, OUTPUT_DIR/exported_model.pt if "
+        "empty",
+        default="",
+        type=str,
+    )
+    parser.add_argument(
+        "--latency_iters",
+        dest="latency_iters",
+        help="Number of timed forward passes for the latency",
+        default=20,
+        type=int,
+    )
+    parser.add_argument(
+        "opts",
+        help="See slowfast/config/defaults.py for all options",
+        default=None,
+        nargs=argparse.REMAINDER,
+    )
+    args = parser.parse_args()
+
+    cfg = get_cfg()
+    cfg.merge_from_file(args.cfg_file)
+    opts = args.opts or []
+    cfg.merge_from_list(opts)
+    # Serving runs on CPU.
+    cfg.NUM_GPUS = 0
+    cfg = assert_and_infer_cfg(cfg)
+    os.makedirs(cfg.OUTPUT_DIR, exist_ok=True)
+
+    export(
+        cfg,
+        args.cfg_file,
+        opts,
+        args.output or os.path.join(cfg.OUTPUT_DIR, "exported_model.pt"),
+        args.latency_iters,
+    )
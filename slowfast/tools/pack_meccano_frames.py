@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Pack the per-frame JPEGs of MECCANO into one shard per video.
+
+The shards are read by the MECCANO loader when MECCANO.BACKEND is `shard`.
+Example:
+    python tools/pack_meccano_frames.py --cfg configs/meccano/X3D_M.yaml \
+        --opts MECCANO.SHARD_FORMAT raw MECCANO.SHARD_SHORT_SIDE 320
+"""
+
+import os
+from functools import partial
+from multiprocessing import Pool
+
+import slowfast.utils.logging as logging
+from slowfast.datasets import meccano_helper
+from slowfast.utils.parser import load_config, parse_args
+
+logger = logging.get_logger(__name__)
+
+
+def _pack(video_dir, shard_dir, shard_format, short_side):
+    return video_dir, meccano_helper.pack_video(
+        video_dir, shard_dir, shard_format, short_side
+    )
+
+
+def pack_split(cfg, split):
+    """
+    Pack every video folder of a split.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+        split (str): the split name, `train`, `val` or `test`.
+    """
+    split_dir = os.path.join(cfg.DATA.PATH_TO_DATA_DIR, split)
+    if not os.path.isdir(split_dir):
+        logger.info("Skipping split {}: {} not found.".format(split, split_dir))
+        return
+    shard_dir = meccano_helper.get_shard_dir(cfg, split)
+    os.makedirs(shard_dir, exist_ok=True)
+    video_dirs = sorted(
+        os.path.join(split_dir, name)
+        for name in os.listdir(split_dir)
+        if os.path.isdir(os.path.join(split_dir, name))
+    )
+    func = partial(
+        _pack,
+        shard_dir=shard_dir,
+        shard_format=cfg.MECCANO.SHARD_FORMAT,
+        short_side=cfg.MECCANO.SHARD_SHORT_SIDE,
+    )
+    num_frames = 0
+    with Pool(max(cfg.DATA_LOADER.NUM_WORKERS, 1)) as pool:
+        for video_dir, count in pool.imap_unordered(func, video_dirs):
+            num_frames += count
+            logger.info("Packed {} frames from {}".format(count, video_dir))
+    logger.info(
+        "Packed {} videos ({} frames) of split {} into {}".format(
+            len(video_dirs), num_frames, split, shard_dir
+        )
+    )
+
+
+def main():
+    args = parse_args()
+    for path_to_config in args.cfg_files:
+        cfg = load_config(args, path_to_config)
+        logging.setup_logging(cfg.OUTPUT_DIR)
+        for split in ["train", "val", "test"]:
+            pack_split(cfg, split)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@
 """Model pruning script using torch-pruning library."""
 
 import argparse
+import csv
+import json
 import os
 import torch
 import torch_pruning as tp
@@ -16,14 +18,21 @@ sys.path.insert(0, '/home/milkyway/Desktop/Student Thesis/Slowfast/slowfast')
 
 from slowfast.utils.parser import load_config, parse_args
 from slowfast.models import build_model
-from slowfast.config.defaults import get_cfg
+from slowfast.models.pruning_helper import get_pruned_manifest
+from slowfast.config.defaults import assert_and_infer_cfg, get_cfg
 from slowfast.utils.checkpoint import load_checkpoint
 from slowfast.utils.misc import launch_job
 from slowfast.utils.distributed import init_distributed_training
 from slowfast.datasets.utils import pack_pathway_output
+import slowfast.models.losses as losses
+import slowfast.models.optimizer as optim
 import slowfast.utils.logging as logging
+import slowfast.utils.misc as misc
+from slowfast.datasets import loader
+from slowfast.datasets.batch_transform import batch_augment
+from slowfast.utils.meters import TrainMeter, ValMeter
 from test_net import test
-from train_net import train
+from train_net import eval_epoch, train, train_epoch
 
 
 # Set up proper logging
@@ -52,6 +61,7 @@ def setup_cfg(args):
     """
     cfg = get_cfg()
     cfg.merge_from_file(args.cfg_file)
+    cfg = assert_and_infer_cfg(cfg)
     
     # Create output folder
     if not os.path.exists(cfg.OUTPUT_DIR):
@@ -87,38 +97,16 @@ def prepare_dummy_input(cfg):
     return inputs
 
 
-def prune_model(cfg, args):
+def build_pruner(cfg, model, example_inputs, iterative_steps=1, pruning_ratio=None, scheduler=None):
     """
-    Prune the model using torch-pruning
+    Build the torch-pruning pruner configured by cfg.PRUNING.
+    Args:
+        iterative_steps (int): number of pruner.step() calls to reach the
+            final pruning ratio.
+        pruning_ratio (float): final pruning ratio, PRUNING.PRUNING_RATE if None.
+        scheduler (callable): pruning ratio of every step, as
+            `scheduler(pruning_ratio, iterative_steps)`. Linear if None.
     """
-    # Build the model
-    model = build_model(cfg)
-    
-    checkpoint_path = cfg.PRUNING.CHECKPOINT_FILE_PATH
-
-    # Load pretrained weights
-    if os.path.exists(checkpoint_path):
-        load_checkpoint(checkpoint_path, model, cfg.NUM_GPUS > 1, None, weights_only=False)
-        logger.info(f"Loaded checkpoint from {checkpoint_path}")
-    else:
-        logger.info(f"No checkpoint found at {checkpoint_path}, using random initialization")
-    
-
-    # Move model to device
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model = model.to(device)
-    model.eval()
-    
-    # Prepare example inputs
-    example_inputs = prepare_dummy_input(cfg)
-    
-    # Move inputs to the same device as the model
-    if isinstance(example_inputs, (list,)):
-        for i in range(len(example_inputs)):
-            example_inputs[i] = example_inputs[i].to(device)
-    else:
-        example_inputs = example_inputs.to(device)
-    
     # Configure importance criterion based on method
     if cfg.PRUNING.PRUNING_METHOD == "l1":
         importance = tp.importance.MagnitudeImportance(p=1)
@@ -145,10 +133,57 @@ def prune_model(cfg, args):
     for m in model.modules():
         if isinstance(m, torch.nn.Linear) and m.out_features == cfg.MODEL.NUM_CLASSES:
             ignored_layers.append(m)
+
+    kwargs = {}
+    if scheduler is not None:
+        kwargs["iterative_pruning_ratio_scheduler"] = scheduler
+    return tp.pruner.BasePruner(
+        model,
+        example_inputs=example_inputs,
+        importance=importance,
+        iterative_steps=iterative_steps,
+        pruning_ratio=cfg.PRUNING.PRUNING_RATE if pruning_ratio is None else pruning_ratio,
+        global_pruning=cfg.PRUNING.GLOBAL,
+        isomorphic=cfg.PRUNING.ISOMORPHIC,
+        ignored_layers=ignored_layers,
+        **kwargs,
+    )
+
+
+def prune_model(cfg, args):
+    """
+    Prune the model using torch-pruning
+    """
+    checkpoint_path = cfg.PRUNING.CHECKPOINT_FILE_PATH
+
+    # Build the model with the architecture of the checkpoint to prune, which
+    # may itself be a pruned checkpoint.
+    cfg.PRUNING.MANIFEST_FILE_PATH = checkpoint_path
+    model = build_model(cfg)
+
+    # Load pretrained weights
+    if os.path.exists(checkpoint_path):
+        load_checkpoint(checkpoint_path, model, cfg.NUM_GPUS > 1, None, pruned=True, weights_only=True)
+        logger.info(f"Loaded checkpoint from {checkpoint_path}")
+    else:
+        logger.info(f"No checkpoint found at {checkpoint_path}, using random initialization")
     
-    # Configure pruner
-    iterative_steps = 1
 
+    # Move model to device
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = model.to(device)
+    model.eval()
+    
+    # Prepare example inputs
+    example_inputs = prepare_dummy_input(cfg)
+    
+    # Move inputs to the same device as the model
+    if isinstance(example_inputs, (list,)):
+        for i in range(len(example_inputs)):
+            example_inputs[i] = example_inputs[i].to(device)
+    else:
+        example_inputs = example_inputs.to(device)
+    
     # Debug inputs
     if isinstance(example_inputs, (list,)):
         logger.info(f"Input is a list of length {len(example_inputs)}")
@@ -157,31 +192,7 @@ def prune_model(cfg, args):
     else:
         logger.info(f"Input shape: {example_inputs.shape}, dtype: {example_inputs.dtype}, device: {example_inputs.device}")
 
-    # Create a forward hook to wrap the model for torch_pruning
-    # This addresses the pathway mismatch issue
-    def model_forward_wrapper(model, model_input):
-        #print(f"Model input type: {type(model_input)}")
-        if not isinstance(model_input, (list, tuple)):
-            if cfg.MODEL.ARCH in ["x3d", "mvit", "vision_transformer"]:
-                # For X3D and other single pathway models, wrap in a list
-                return model([model_input])
-            else:
-                return model(model_input)
-        else:
-            return model([model_input])
-
-
-    pruner = tp.pruner.BasePruner(
-        model,
-        example_inputs=example_inputs,
-        importance=importance,
-        iterative_steps=iterative_steps,
-        pruning_ratio=cfg.PRUNING.PRUNING_RATE,
-        global_pruning=cfg.PRUNING.GLOBAL,
-        isomorphic=cfg.PRUNING.ISOMORPHIC,
-        ignored_layers=ignored_layers,
-        #forward_fn=model_forward_wrapper  # Use the wrapper to handle input formatting
-    )
+    pruner = build_pruner(cfg, model, example_inputs)
     
     logger.info(f"Using Global Pruning method: {cfg.PRUNING.GLOBAL}")
 
@@ -220,16 +231,184 @@ def prune_model(cfg, args):
         f"pruned_model_{cfg.PRUNING.PRUNING_METHOD}_ratio{int(cfg.PRUNING.PRUNING_RATE*100)}.pyth"
     )
     
-    # Save the whole model with wieghts, since it's stucture is changed    
+    save_pruned_model(model, cfg, pruned_model_path)
+    
+    return pruned_model_path
+
+
+def save_pruned_model(model, cfg, path):
+    """
+    Save the plain state dict next to the pruned manifest, from which
+    build_model constructs the pruned architecture.
+    """
     checkpoint = {
-        "model": model,
+        "model_state": model.state_dict(),
+        "pruned_manifest": get_pruned_manifest(model),
+        "cfg": cfg.dump(),
     }
-    torch.save(checkpoint, pruned_model_path)
+    torch.save(checkpoint, path)
+    logger.info(f"Pruned model saved to {path}")
 
 
-    logger.info(f"Pruned model saved to {pruned_model_path}")
-    
-    return pruned_model_path
+def get_rate_scheduler(cfg):
+    """
+    Pruning ratio scheduler growing linearly from PRUNING.PRUNING_RATE at the
+    first step to PRUNING.PRUNING_MAX_RATE at the last step. The ratios are
+    relative to the final ratio given to the pruner, so ratios that are 0
+    (e.g. for attention heads) stay 0.
+    """
+    start = cfg.PRUNING.PRUNING_RATE / cfg.PRUNING.PRUNING_MAX_RATE
+
+    def scheduler(pruning_ratio, steps):
+        fractions = [
+            start + (1.0 - start) * i / max(steps - 1, 1) for i in range(steps)
+        ]
+        return [0.0] + [pruning_ratio * f for f in fractions]
+
+    return scheduler
+
+
+def accumulate_taylor_gradients(model, train_loader, cfg, num_batches=1):
+    """
+    Accumulate the gradients of the training loss over a few batches, as
+    needed by the taylor importance.
+    """
+    loss_fun = losses.get_loss_func(cfg.MODEL.LOSS_FUNC)(reduction="mean")
+    model.train()
+    misc.frozen_bn_stats(model)
+    model.zero_grad()
+    for cur_iter, (inputs, labels, _, _, meta) in enumerate(train_loader):
+        if cur_iter == num_batches:
+            break
+        if cfg.NUM_GPUS:
+            inputs = [x.cuda(non_blocking=True) for x in inputs]
+            labels = labels.cuda(non_blocking=True)
+        if cfg.DATA.BATCH_AUGMENTATION:
+            inputs = batch_augment(inputs[0], meta["spatial_params"], cfg)
+        if cfg.MECCANO.GAZE_ENABLE:
+            gaze = meta["gaze"].cuda(non_blocking=True) if cfg.NUM_GPUS else meta["gaze"]
+            preds = model(inputs, gaze)
+        else:
+            preds = model(inputs)
+        loss_fun(preds, labels).backward()
+    model.eval()
+
+
+def write_pareto_curve(results, output_dir):
+    """
+    Write the accuracy/latency results of the pruning steps to
+    `pareto.json` and `pareto.csv` in output_dir. A step is on the Pareto
+    front if no other step is both faster and at least as accurate.
+    """
+    for r in results:
+        r["pareto"] = not any(
+            o["latency_ms"] < r["latency_ms"] and o["top1_acc"] >= r["top1_acc"]
+            for o in results
+        )
+    with open(os.path.join(output_dir, "pareto.json"), "w") as f:
+        json.dump(results, f, indent=2)
+    with open(os.path.join(output_dir, "pareto.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def iterative_prune(cfg):
+    """
+    Prune the model iteratively inside one training run. The pruning rate
+    grows from PRUNING.PRUNING_RATE to PRUNING.PRUNING_MAX_RATE over
+    PRUNING.NUM_STEPS steps, and the model is finetuned for
+    PRUNING.PRUNING_MAX_EPOCH epochs after every step. After every step the
+    batch 1 CPU latency and the validation top-1 are measured, and the
+    schedule stops early once PRUNING.LATENCY_TARGET_MS is met. The results
+    are written as a Pareto curve of accuracy vs latency.
+    """
+    assert cfg.NUM_GPUS <= 1, "Iterative pruning runs on a single device"
+    np.random.seed(cfg.RNG_SEED)
+    torch.manual_seed(cfg.RNG_SEED)
+    logging.setup_logging(cfg.OUTPUT_DIR)
+
+    # Every finetuning phase has its own learning rate schedule.
+    ft_cfg = cfg.clone()
+    ft_cfg.SOLVER.MAX_EPOCH = cfg.PRUNING.PRUNING_MAX_EPOCH
+    ft_cfg.SOLVER.WARMUP_EPOCHS = 0.0
+
+    checkpoint_path = cfg.PRUNING.CHECKPOINT_FILE_PATH
+    cfg.PRUNING.MANIFEST_FILE_PATH = checkpoint_path
+    model = build_model(cfg)
+    if os.path.exists(checkpoint_path):
+        load_checkpoint(checkpoint_path, model, False, None, pruned=True, weights_only=True)
+        logger.info(f"Loaded checkpoint from {checkpoint_path}")
+
+    train_loader = loader.construct_loader(cfg, "train")
+    val_loader = loader.construct_loader(cfg, "val")
+    train_meter = TrainMeter(len(train_loader), ft_cfg)
+    val_meter = ValMeter(len(val_loader), ft_cfg)
+    scaler = torch.cuda.amp.GradScaler(enabled=cfg.TRAIN.MIXED_PRECISION)
+
+    model.eval()
+    pruner = build_pruner(
+        cfg,
+        model,
+        prepare_dummy_input(cfg),
+        iterative_steps=cfg.PRUNING.NUM_STEPS,
+        pruning_ratio=cfg.PRUNING.PRUNING_MAX_RATE,
+        scheduler=get_rate_scheduler(cfg),
+    )
+    ori_size = tp.utils.count_params(model)
+
+    def evaluate(step, epoch):
+        eval_epoch(val_loader, model, val_meter, epoch, ft_cfg, train_loader, None)
+        result = {
+            "step": step,
+            "pruning_rate": pruner.per_step_pruning_ratio[step],
+            "params": tp.utils.count_params(model),
+            "latency_ms": misc.measure_cpu_latency(model, cfg, cfg.PRUNING.LATENCY_ITERS),
+            "top1_acc": 100.0 - val_meter.get_epoch_stats()["top1_err"],
+        }
+        logger.info(f"Pruning step {step}: {result}")
+        return result
+
+    results = [evaluate(0, 0)]
+    num_epochs = 0
+    for step in range(1, cfg.PRUNING.NUM_STEPS + 1):
+        if cfg.PRUNING.PRUNING_METHOD == "taylor":
+            accumulate_taylor_gradients(model, train_loader, cfg)
+        model.eval()
+        pruner.step()
+        logger.info(
+            f"Pruning step {step}/{cfg.PRUNING.NUM_STEPS}: pruning rate {pruner.per_step_pruning_ratio[step]:.3f}, "
+            f"parameters {ori_size} -> {tp.utils.count_params(model)}"
+        )
+
+        # The pruned layers hold new parameters, so the optimizer is rebuilt.
+        optimizer = optim.construct_optimizer(model, ft_cfg)
+        for cur_epoch in range(cfg.PRUNING.PRUNING_MAX_EPOCH):
+            loader.shuffle_dataset(train_loader, num_epochs)
+            train_epoch(train_loader, model, optimizer, scaler, train_meter, cur_epoch, ft_cfg)
+            num_epochs += 1
+
+        results.append(evaluate(step, num_epochs))
+        save_pruned_model(
+            model,
+            cfg,
+            os.path.join(cfg.OUTPUT_DIR, f"pruned_model_step{step}_ratio{int(pruner.per_step_pruning_ratio[step]*100)}.pyth"),
+        )
+        write_pareto_curve(results, cfg.OUTPUT_DIR)
+
+        target = cfg.PRUNING.LATENCY_TARGET_MS
+        if target > 0 and results[-1]["latency_ms"] <= target:
+            logger.info(f"Latency target of {target} ms met at step {step}")
+            break
+
+    # Also marks the unpruned model when no step ran.
+    write_pareto_curve(results, cfg.OUTPUT_DIR)
+    for r in results:
+        if r["pareto"]:
+            logger.info(
+                f"Pareto: rate {r['pruning_rate']:.3f}, top-1 {r['top1_acc']:.2f}, latency {r['latency_ms']:.2f} ms"
+            )
+    return results
 
 
 def finetune_model(cfg, pruned_model_path):
@@ -238,6 +417,7 @@ def finetune_model(cfg, pruned_model_path):
     """
     # Update config for finetuning
     cfg.TRAIN.CHECKPOINT_FILE_PATH = pruned_model_path
+    cfg.PRUNING.MANIFEST_FILE_PATH = pruned_model_path
     cfg.TRAIN.ENABLE = True
     cfg.TEST.ENABLE = False
 
@@ -272,6 +452,10 @@ def run_pipeline(args):
     Run the complete pruning pipeline based on the specified mode
     """
     cfg = setup_cfg(args)
+
+    if cfg.PRUNING.ITERATIVE:
+        iterative_prune(cfg)
+        return
     
     pruning_max_rate = cfg.PRUNING.PRUNING_MAX_RATE
     output_dir = cfg.OUTPUT_DIR
@@ -1,359 +1,375 @@
 #!/usr/bin/env python3
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
 
-"""Apply post-training static quantization to a pre-trained X3D model."""
+"""
+Apply FX graph mode post-training static quantization to a pre-trained video
+model, e.g. X3D, I3D or SlowFast, and report the int8 accuracy and CPU
+latency against the fp32 baseline.
+"""
 
-import numpy as np
-import pprint
-import torch
-import os
-import sys
 import argparse
-import time
-
-# Add the path to the slowfast module
-sys.path.insert(0, '/home/milkyway/Desktop/Student Thesis/Slowfast/slowfast')
+import copy
+import json
+import os
+import pprint
 
-import torch.nn as nn
-import torch.quantization as quantization
-from torch.quantization import get_default_qconfig, prepare, convert
+import numpy as np
+import torch
+from fvcore.common.timer import Timer
 
 import slowfast.utils.checkpoint as cu
-import slowfast.utils.distributed as du
 import slowfast.utils.logging as logging
 import slowfast.utils.metrics as metrics
 import slowfast.utils.misc as misc
-from slowfast.datasets import loader
+from slowfast.config.defaults import assert_and_infer_cfg, get_cfg
+from slowfast.datasets import build_dataset, loader
+from slowfast.datasets.batch_transform import batch_augment
 from slowfast.models import build_model
+from slowfast.models.quantization_helper import (
+    convert_model_fx,
+    count_quantized_modules,
+    get_qconfig,
+    prepare_model_fx,
+)
+from slowfast.utils.calibration_cache import CalibrationCache
 from slowfast.utils.meters import ValMeter
-from slowfast.config.defaults import get_cfg
 
 logger = logging.get_logger(__name__)
 
-def dequantize_model(model):
+
+def build_float_model(cfg):
+    """
+    Build the fp32 model on CPU and load QUANTIZATION.FLOAT_CHECKPOINT_FILE_PATH
+    if set, the test checkpoint otherwise.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    Returns:
+        model (nn.Module): the fp32 model in eval mode.
+    """
+    float_cfg = cfg.clone()
+    float_cfg.QUANTIZATION.ENABLE = False
+    if cfg.QUANTIZATION.FLOAT_CHECKPOINT_FILE_PATH:
+        float_cfg.TEST.CHECKPOINT_FILE_PATH = (
+            cfg.QUANTIZATION.FLOAT_CHECKPOINT_FILE_PATH
+        )
+    model = build_model(float_cfg)
+    cu.load_test_checkpoint(float_cfg, model)
+    return model.eval()
+
+
+def get_calibration_key(cfg):
+    """
+    Returns:
+        key (dict): the configs the calibration clips depend on.
+    """
+    return {
+        "dataset": cfg.TRAIN.DATASET,
+        "path_to_data_dir": cfg.DATA.PATH_TO_DATA_DIR,
+        "arch": cfg.MODEL.ARCH,
+        "alpha": cfg.SLOWFAST.ALPHA,
+        "num_frames": cfg.DATA.NUM_FRAMES,
+        "sampling_rate": cfg.DATA.SAMPLING_RATE,
+        "jitter_scales": cfg.DATA.TRAIN_JITTER_SCALES,
+        "crop_size": cfg.DATA.TRAIN_CROP_SIZE,
+        "batch_size": cfg.TRAIN.BATCH_SIZE,
+        "num_batches": cfg.QUANTIZATION.CALIBRATION_NUM_BATCHES,
+        "rng_seed": cfg.RNG_SEED,
+    }
+
+
+@torch.no_grad()
+def build_calibration_cache(cfg, dataset, path):
+    """
+    Preprocess a fixed random subset of CALIBRATION_NUM_BATCHES batches of the
+    training set once and store its clips. The augmentations are seeded per
+    clip, so the store is the same across runs.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+        dataset (Dataset): the training set, with seeded augmentations.
+        path (str): directory of the store.
+    """
+    dataset.aug_seed = 0
+    batch_size = int(cfg.TRAIN.BATCH_SIZE / max(1, cfg.NUM_GPUS))
+    num_samples = min(
+        cfg.QUANTIZATION.CALIBRATION_NUM_BATCHES * batch_size, len(dataset)
+    )
+    indices = np.random.RandomState(cfg.RNG_SEED).choice(
+        len(dataset), num_samples, replace=False
+    )
+    data_loader = torch.utils.data.DataLoader(
+        torch.utils.data.Subset(dataset, np.sort(indices).tolist()),
+        batch_size=batch_size,
+        shuffle=False,
+        num_workers=cfg.DATA_LOADER.NUM_WORKERS,
+    )
+    cache = None
+    start = 0
+    for inputs, labels, _, _, meta in data_loader:
+        if cfg.DATA.BATCH_AUGMENTATION:
+            # Store the model inputs, not the uint8 frames.
+            inputs = batch_augment(inputs[0], meta["spatial_params"], cfg)
+        if cache is None:
+            CalibrationCache.create(
+                path,
+                [x.shape[1:] for x in inputs],
+                num_samples,
+                batch_size,
+                cfg.DATA.MEAN,
+                cfg.DATA.STD,
+                get_calibration_key(cfg),
+            )
+            cache = CalibrationCache(path, mode="r+")
+        cache.write(start, inputs, labels)
+        start += labels.size(0)
+    cache.flush()
+    CalibrationCache.mark_complete(path)
+
+
+def get_calibration_loader(cfg):
+    """
+    Get the calibration batches. If QUANTIZATION.CACHE_CALIBRATION, they are
+    read from the calibration clip store, which is built on the first run.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    Returns:
+        calib_loader (loader): calibration data loader, or calibration store.
+    """
+    # The batched augmentation is not applied by the loader, use the same
+    # per-clip transforms instead.
+    loader_cfg = cfg.clone()
+    loader_cfg.DATA.BATCH_AUGMENTATION = False
+    if not cfg.QUANTIZATION.CACHE_CALIBRATION:
+        return loader.construct_loader(loader_cfg, "train")
+    path = cfg.QUANTIZATION.CALIBRATION_CACHE_DIR or os.path.join(
+        cfg.OUTPUT_DIR, "calibration_cache"
+    )
+    if not CalibrationCache.exists(path, get_calibration_key(cfg)):
+        dataset = build_dataset(cfg.TRAIN.DATASET, cfg, "train")
+        if not hasattr(dataset, "aug_seed"):
+            logger.warning(
+                f"Dataset {cfg.TRAIN.DATASET} has no seeded augmentations, "
+                "calibrating on random training batches instead of cached "
+                "clips."
+            )
+            return loader.construct_loader(loader_cfg, "train")
+        timer = Timer()
+        build_calibration_cache(cfg, dataset, path)
+        logger.info(
+            f"Cached calibration clips in {path} in {timer.seconds():.2f} "
+            "seconds."
+        )
+    logger.info(f"Using cached calibration clips from {path}")
+    return CalibrationCache(path)
+
+
+def calibrate(prepared, calib_loader, num_batches):
     """
-    Dequantize a quantized model to floating point for modules
-    that don't support quantization
+    Run the observed model on the calibration batches to collect the ranges
+    of the activations.
+    Args:
+        prepared (GraphModule): model returned by `prepare_model_fx`.
+        calib_loader (loader): calibration data loader.
+        num_batches (int): number of batches to calibrate with.
     """
-    logger.info("Dequantizing problematic layers...")
-    
-    # Create state dict to hold dequantized parameters
-    state_dict = {}
-    
-    # Dequantize state_dict
-    for k, v in model.state_dict().items():
-        if hasattr(v, 'is_quantized') and v.is_quantized:
-            try:
-                state_dict[k] = torch.dequantize(v)
-            except Exception as e:
-                logger.warning(f"Failed to dequantize {k}: {e}")
-                state_dict[k] = v
-        else:
-            state_dict[k] = v
-    
-    # Load dequantized state dict
-    model.load_state_dict(state_dict)
-    
-    return model
-
-def apply_static_quantization(cfg):
+    with torch.no_grad():
+        for cur_iter, (inputs, _, _, _, _) in enumerate(calib_loader):
+            if cur_iter >= num_batches:
+                break
+            prepared(*[x.cpu() for x in inputs])
+
+
+def quantize_model(
+    model_fp, example_inputs, calib_batches, cfg, quantized_groups=None
+):
     """
-    Apply post-training static quantization to a model.
+    Quantize a copy of a float model with FX graph mode post-training static
+    quantization.
     Args:
+        model_fp (nn.Module): float model on CPU, left untouched.
+        example_inputs (list): list of pathway tensors, one per pathway.
+        calib_batches (loader): calibration data loader, or list of batches.
         cfg (CfgNode): configs. Details can be found in
             slowfast/config/defaults.py
+        quantized_groups (list): names of the module groups to quantize, see
+            `get_quantization_groups`. If None, quantize all but SE.
+    Returns:
+        model_int8 (nn.Module): the quantized model.
+    """
+    num_calib_batches = min(
+        cfg.QUANTIZATION.CALIBRATION_NUM_BATCHES, len(calib_batches)
+    )
+    prepared = prepare_model_fx(
+        copy.deepcopy(model_fp),
+        example_inputs,
+        cfg.QUANTIZATION.BACKEND,
+        quantized_groups=quantized_groups,
+        float_depthwise=cfg.QUANTIZATION.FLOAT_DEPTHWISE,
+        qconfig=get_qconfig(
+            cfg.QUANTIZATION.BACKEND,
+            cfg.QUANTIZATION.OBSERVER,
+            cfg.QUANTIZATION.PER_CHANNEL_WEIGHTS,
+            cfg.QUANTIZATION.OBSERVER_PERCENTILE,
+        ),
+    )
+    calibrate(prepared, calib_batches, num_calib_batches)
+    return convert_model_fx(prepared)
+
+
+def evaluate(model, test_loader, cfg, num_batches=0):
+    """
+    Compute the clip level top-1 and top-5 accuracy of a model on CPU.
+    Args:
+        model (nn.Module): model taking a list of pathways.
+        test_loader (loader): test data loader, or a list of batches.
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+        num_batches (int): number of batches to evaluate, 0 for all of them.
+    Returns:
+        stats (dict): top-1 and top-5 accuracy in percent and number of clips.
+    """
+    if num_batches <= 0:
+        num_batches = len(test_loader)
+    val_meter = ValMeter(num_batches, cfg)
+    with torch.no_grad():
+        for cur_iter, (inputs, labels, _, _, _) in enumerate(test_loader):
+            if cur_iter >= num_batches:
+                break
+            preds = model([x.cpu() for x in inputs])
+            top1_err, top5_err = metrics.topk_errors(preds, labels.cpu(), (1, 5))
+            val_meter.update_stats(
+                top1_err.item(), top5_err.item(), preds.size(0)
+            )
+    val_meter.log_epoch_stats(0)
+    stats = val_meter.get_epoch_stats()
+    return {
+        "top1_acc": 100.0 - stats["top1_err"],
+        "top5_acc": 100.0 - stats["top5_err"],
+        "num_clips": val_meter.num_samples,
+    }
+
+
+def apply_static_quantization(cfg, num_eval_batches=0, latency_iters=20):
+    """
+    Quantize a model to int8 with FX graph mode post-training static
+    quantization. The model is traced with one input per pathway, so the
+    pathway lists of SlowFast and the Fast to Slow concatenations are
+    quantized. Swish, the SE blocks and, if QUANTIZATION.FLOAT_DEPTHWISE,
+    the depthwise convolutions are left in float. The TorchScript int8 model
+    and a json report comparing it to the fp32 baseline are written to
+    OUTPUT_DIR.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+        num_eval_batches (int): number of test batches to evaluate the
+            accuracy on, 0 for the whole test set.
+        latency_iters (int): number of timed forward passes of the latency.
+    Returns:
+        report (dict): accuracy, latency and size of both models.
     """
-    # Set up environment
-    du.init_distributed_training(cfg)
     np.random.seed(cfg.RNG_SEED)
     torch.manual_seed(cfg.RNG_SEED)
-
-    # Setup logging format
     logging.setup_logging(cfg.OUTPUT_DIR)
-
-    # Print config
-    logger.info("Post-Training Static Quantization with config:")
+    logger.info("Post-training static quantization with config:")
     logger.info(pprint.pformat(cfg))
-    
-    # Set quantization backend
-    backend = cfg.QUANTIZATION.BACKEND if cfg.QUANTIZATION.BACKEND else 'fbgemm'
-    torch.backends.quantized.engine = backend
-    logger.info(f"Using quantization backend: {backend}")
-    
-    # Create calibration data loader
-    logger.info("Creating calibration data loader...")
-    calib_loader = loader.construct_loader(cfg, "train")
-    
-    # Limit calibration batches for efficiency
-    cfg.QUANTIZATION.CALIBRATION_NUM_BATCHES = min(
-        cfg.QUANTIZATION.CALIBRATION_NUM_BATCHES 
-        if hasattr(cfg.QUANTIZATION, "CALIBRATION_NUM_BATCHES") else 10, 
-        len(calib_loader)
+    assert (
+        not cfg.MECCANO.GAZE_ENABLE
+    ), "Gaze attention models are not supported by FX quantization"
+
+    backend = cfg.QUANTIZATION.BACKEND
+    logger.info(
+        f"Using quantization backend: {backend}, "
+        f"observer: {cfg.QUANTIZATION.OBSERVER}, "
+        f"per channel weights: {cfg.QUANTIZATION.PER_CHANNEL_WEIGHTS}"
     )
-    logger.info(f"Using {cfg.QUANTIZATION.CALIBRATION_NUM_BATCHES} batches for calibration")
-    
-    # Build floating point model
-    logger.info("Building floating point model...")
-    original_cfg = cfg.clone()
-    original_cfg.QUANTIZATION.ENABLE = False
-    model_fp = build_model(original_cfg)
-    
-    # Load pre-trained model weights
-    logger.info(f"Loading weights from {cfg.TEST.CHECKPOINT_FILE_PATH}")
-    if not os.path.exists(cfg.TEST.CHECKPOINT_FILE_PATH):
-        logger.error(f"Checkpoint file not found: {cfg.TEST.CHECKPOINT_FILE_PATH}")
-        return
-        
-    cu.load_test_checkpoint(cfg, model_fp)
-    
-    # Set model to evaluation mode
-    model_fp.eval()
-    
-    # Print model information
-    if du.is_master_proc() and cfg.LOG_MODEL_INFO:
+
+    model_fp = build_float_model(cfg)
+    if cfg.LOG_MODEL_INFO:
         misc.log_model_info(model_fp, cfg, use_train_input=False)
-    
-    # Setup quantization configuration
-    logger.info("Setting up quantization configuration...")
-    
-    # Set qconfig for the model
-    if backend == 'fbgemm':
-        qconfig = get_default_qconfig('fbgemm')
-    else:
-        qconfig = get_default_qconfig('qnnpack')
-    
-    # Define qconfig mapping to skip certain layers
-    #qconfig_mapping = torch.quantization.QConfigMapping()
-    #qconfig_mapping.global_qconfig = qconfig 
-    
-    # Optional: Skip quantization for specific modules (adapt as needed)
-    # qconfig_mapping.set_module_name("model.head", None)  # Skip head quantization if problematic
-    
-    # Create a modified version of the model with QuantStubs and DeQuantStubs
-    class ModelWithStubs(torch.nn.Module):
-        def __init__(self, model):
-            super().__init__()
-            self.quant = torch.quantization.QuantStub()
-            self.model = model
-            self.dequant = torch.quantization.DeQuantStub()
-            
-        def forward(self, x):
-            if isinstance(x, list):
-                # Handle list inputs for SlowFast
-                result = []
-                for pathway in x:
-                    pathway = self.quant(pathway)
-                    # We leave the model's internal operations unmodified
-                result = self.model(x)
-                return result
-            else:
-                x = self.quant(x)
-                x = self.model(x)
-                x = self.dequant(x)
-                return x
-    
-    # Create model with stubs and set to CPU
-    model_fp = ModelWithStubs(model_fp)
-    model_fp.qconfig = qconfig
-    
-    model_fp.cpu()
-    model_fp.eval()  # Set to evaluation mode
-    
-    # Prepare model for static quantization
-    logger.info("Preparing model for static quantization...")
-    prepared_model = prepare(model_fp)
-    
-    # Calibrate the model
-    logger.info("Calibrating model...")
+
+    calib_loader = get_calibration_loader(cfg)
+    num_calib_batches = min(
+        cfg.QUANTIZATION.CALIBRATION_NUM_BATCHES, len(calib_loader)
+    )
+    example_inputs = [x.cpu() for x in next(iter(calib_loader))[0]]
+
+    logger.info(f"Quantizing with {num_calib_batches} calibration batches...")
+    model_int8 = quantize_model(model_fp, example_inputs, calib_loader, cfg)
+    num_quantized, float_modules = count_quantized_modules(model_int8)
+    logger.info(
+        f"{num_quantized} int8 modules, "
+        f"{len(float_modules)} float modules: {float_modules}"
+    )
+
+    quantized_model_path = os.path.join(
+        cfg.OUTPUT_DIR, "static_quantized_model.pt"
+    )
     with torch.no_grad():
-        batch_count = 0
-        for inputs, _, _, _, _ in calib_loader:
-            # Move inputs to CPU as quantization only supports CPU
-            if isinstance(inputs, (list,)):
-                for i in range(len(inputs)):
-                    inputs[i] = inputs[i].cpu()
-            else:
-                inputs = inputs.cpu()
-            
-            # Forward pass to collect statistics for quantization
-            prepared_model(inputs)
-            
-            batch_count += 1
-            if batch_count >= cfg.QUANTIZATION.CALIBRATION_NUM_BATCHES:
-                break
-    
-    # Convert the model to quantized version
-    logger.info("Converting model to quantized format...")
-    try:
-        quantized_model = convert(prepared_model, inplace=False)
-        logger.info("Model successfully converted to quantized format")
-    except Exception as e:
-        logger.error(f"Error during model conversion: {e}")
-        logger.info("Attempting fallback approach with dequantized problematic layers...")
-        # If full quantization fails, try to dequantize problematic layers
-        quantized_model = dequantize_model(prepared_model)
-    
-    # Save the quantized model
-    quantized_model_path = os.path.join(cfg.OUTPUT_DIR, "static_quantized_model.pth")
-    torch.save({
-        "model_state": quantized_model.state_dict(),
-        "cfg": cfg,
-    }, quantized_model_path)
+        traced = torch.jit.trace(model_int8, (example_inputs,))
+    torch.jit.save(traced, quantized_model_path)
     logger.info(f"Quantized model saved to: {quantized_model_path}")
-    
-    # Create test data loader
-    logger.info("Creating test data loader...")
+
     test_loader = loader.construct_loader(cfg, "test")
-    
-    # Create meters for testing
-    test_meter = ValMeter(len(test_loader), cfg)
-    
-    # Benchmark and evaluate floating point model
-    logger.info("Benchmarking and evaluating floating point model...")
-    benchmark_model(model_fp, "Floating Point Model", test_loader, cfg, test_meter)
-    
-    # Benchmark and evaluate quantized model
-    logger.info("Benchmarking and evaluating quantized model...")
-    benchmark_model(quantized_model, "Quantized Model", test_loader, cfg, test_meter)
-    
-    # Print model size comparison
-    fp_size = get_model_size(model_fp)
-    q_size = get_model_size(quantized_model)
-    logger.info(f"Floating point model size: {fp_size:.2f} MB")
-    logger.info(f"Quantized model size: {q_size:.2f} MB")
-    logger.info(f"Size reduction: {(1 - q_size/fp_size) * 100:.2f}%")
-    
-    return quantized_model
-
-def get_model_size(model):
-    """Calculate model size in MB"""
-    torch.save(model.state_dict(), "temp_model.pt")
-    size_mb = os.path.getsize("temp_model.pt") / (1024 * 1024)
-    os.remove("temp_model.pt")
-    return size_mb
-
-def benchmark_model(model, model_name, test_loader, cfg, test_meter):
-    """Benchmark and evaluate a model"""
-    # Reset meter
-    test_meter.reset()
-    test_meter.iter_tic()
-    
-    # Set model to evaluation mode
-    model.eval()
-    
-    # Move model to appropriate device
-    device = "cpu" if not cfg.NUM_GPUS else "cuda"
-    model = model.to(device)
-    
-    # Warming up
-    logger.info(f"Warming up {model_name}...")
-    dummy_inputs = next(iter(test_loader))[0]
-    if isinstance(dummy_inputs, (list,)):
-        for i in range(len(dummy_inputs)):
-            dummy_inputs[i] = dummy_inputs[i].to(device)
-    else:
-        dummy_inputs = dummy_inputs.to(device)
-    
-    with torch.no_grad():
-        for _ in range(10):
-            _ = model(dummy_inputs)
-    
-    # Timing
-    logger.info(f"Measuring inference time for {model_name}...")
-    inference_times = []
-    
-    # Test loop
-    for cur_iter, (inputs, labels, _, _, meta) in enumerate(test_loader):
-        # Transfer the data to the current device
-        if device == "cuda":
-            if isinstance(inputs, (list,)):
-                for i in range(len(inputs)):
-                    inputs[i] = inputs[i].cuda(non_blocking=True)
-            else:
-                inputs = inputs.cuda(non_blocking=True)
-            labels = labels.cuda()
-            
-            for key, val in meta.items():
-                if isinstance(val, (list,)):
-                    for i in range(len(val)):
-                        val[i] = val[i].cuda(non_blocking=True)
-                else:
-                    meta[key] = val.cuda(non_blocking=True)
-        
-        test_meter.data_toc()
-        
-        # Measure inference time
-        torch.cuda.synchronize() if device == "cuda" else None
-        start_time = time.time()
-        
-        with torch.no_grad():
-            preds = model(inputs)
-            
-        torch.cuda.synchronize() if device == "cuda" else None
-        end_time = time.time()
-        inference_times.append(end_time - start_time)
-        
-        # Compute error metrics
-        if not cfg.DATA.MULTI_LABEL:
-            # Compute the errors
-            num_topks_correct = metrics.topks_correct(preds, labels, (1, 5))
-            
-            # Combine the errors across the GPUs
-            top1_err, top5_err = [
-                (1.0 - x / preds.size(0)) * 100.0 for x in num_topks_correct
-            ]
-            
-            if cfg.NUM_GPUS > 1:
-                top1_err, top5_err = du.all_reduce([top1_err, top5_err])
-                
-            # Copy the errors from GPU to CPU (sync point)
-            top1_err, top5_err = top1_err.item(), top5_err.item()
-            
-            test_meter.iter_toc()
-            # Update and log stats
-            test_meter.update_stats(
-                top1_err,
-                top5_err,
-                inputs[0].size(0) if isinstance(inputs, list) else inputs.size(0)
-            )
-            test_meter.update_predictions(preds, labels)
-        
-        test_meter.log_iter_stats(0, cur_iter)
-        test_meter.iter_tic()
-    
-    # Log final stats
-    test_meter.log_epoch_stats(0)
-    
-    # Calculate average inference time
-    avg_inference_time = sum(inference_times) / len(inference_times)
-    logger.info(f"{model_name} - Average inference time: {avg_inference_time*1000:.2f} ms")
-    
-    # Calculate parameter stats
-    total_params = sum(p.numel() for p in model.parameters())
-    logger.info(f"{model_name} - Total parameters: {total_params/1e6:.2f}M")
+    report = {
+        "backend": backend,
+        "observer": cfg.QUANTIZATION.OBSERVER,
+        "per_channel_weights": cfg.QUANTIZATION.PER_CHANNEL_WEIGHTS,
+        "num_threads": torch.get_num_threads(),
+        "calibration_batches": num_calib_batches,
+        "int8_modules": num_quantized,
+        "float_modules": float_modules,
+    }
+    for name, model in [("fp32", model_fp), ("int8", model_int8)]:
+        logger.info(f"Evaluating {name} model...")
+        stats = evaluate(model, test_loader, cfg, num_eval_batches)
+        stats["latency_ms"] = misc.measure_cpu_latency(
+            model, cfg, num_iters=latency_iters
+        )
+        stats["size_mb"] = misc.get_model_size(model)
+        logger.info(
+            f"{name}: top1 {stats['top1_acc']:.2f}%, "
+            f"top5 {stats['top5_acc']:.2f}%, "
+            f"latency {stats['latency_ms']:.2f} ms, "
+            f"size {stats['size_mb']:.2f} MB"
+        )
+        report[name] = stats
+    report["top1_drop"] = report["fp32"]["top1_acc"] - report["int8"]["top1_acc"]
+    report["speedup"] = (
+        report["fp32"]["latency_ms"] / report["int8"]["latency_ms"]
+    )
+    logger.info(
+        f"Top-1 drop {report['top1_drop']:.2f}, "
+        f"speedup {report['speedup']:.2f}x"
+    )
+
+    report_path = os.path.join(cfg.OUTPUT_DIR, "ptq_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Report saved to: {report_path}")
+    return report
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Post-Training Static Quantization for Video Classification"
     )
-    
     parser.add_argument(
         "--cfg",
         dest="cfg_file",
         help="Path to the config file",
-        default="/home/milkyway/Desktop/Student Thesis/Slowfast/slowfast/configs/meccano/X3D_M.yaml",
+        required=True,
         type=str,
     )
-    
     parser.add_argument(
         "--backend",
         dest="backend",
         help="Quantization backend: 'fbgemm' (x86) or 'qnnpack' (ARM)",
-        default="x86",
+        default="fbgemm",
         choices=["fbgemm", "qnnpack", "x86"],
         type=str,
     )
-    
     parser.add_argument(
         "--calib_batches",
         dest="calib_batches",
@@ -361,26 +377,40 @@ if __name__ == "__main__":
         default=10,
         type=int,
     )
-    
+    parser.add_argument(
+        "--eval_batches",
+        dest="eval_batches",
+        help="Number of test batches for the accuracy, 0 for all",
+        default=0,
+        type=int,
+    )
+    parser.add_argument(
+        "--latency_iters",
+        dest="latency_iters",
+        help="Number of timed forward passes for the latency",
+        default=20,
+        type=int,
+    )
+    parser.add_argument(
+        "opts",
+        help="See slowfast/config/defaults.py for all options, e.g. "
+        "QUANTIZATION.OBSERVER mse",
+        default=None,
+        nargs=argparse.REMAINDER,
+    )
     args = parser.parse_args()
-    
-    # Load config
+
     cfg = get_cfg()
     cfg.merge_from_file(args.cfg_file)
-    
-    # Update config with command line arguments
-
-    if not os.path.exists(cfg.OUTPUT_DIR):
-        os.makedirs(cfg.OUTPUT_DIR)
-    
-    # Set quantization parameters
+    if args.opts is not None:
+        cfg.merge_from_list(args.opts)
+    # int8 kernels only run on CPU.
+    cfg.NUM_GPUS = 0
     cfg.QUANTIZATION.ENABLE = True
-    cfg.QUANTIZATION.QAT = False  # Using PTQ, not QAT
+    cfg.QUANTIZATION.QAT = False
     cfg.QUANTIZATION.BACKEND = args.backend
     cfg.QUANTIZATION.CALIBRATION_NUM_BATCHES = args.calib_batches
-    
-    # Print config
-    logger.info(pprint.pformat(cfg))
-    
-    # Apply post-training static quantization
-    apply_static_quantization(cfg)
\ No newline at end of file
+    cfg = assert_and_infer_cfg(cfg)
+    os.makedirs(cfg.OUTPUT_DIR, exist_ok=True)
+
+    apply_static_quantization(cfg, args.eval_batches, args.latency_iters)
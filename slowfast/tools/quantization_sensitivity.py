@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+
+"""
+Measure the per-layer-group sensitivity of a video model to post-training
+static quantization, and pick a mixed int8/fp32 assignment of the groups
+meeting a CPU latency budget.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import pprint
+
+import numpy as np
+import torch
+
+import slowfast.utils.logging as logging
+import slowfast.utils.misc as misc
+from slowfast.config.defaults import assert_and_infer_cfg, get_cfg
+from slowfast.datasets import loader
+from slowfast.datasets.batch_transform import batch_augment
+from slowfast.models.quantization_helper import get_quantization_groups
+
+from ptq_x3d import (
+    build_float_model,
+    evaluate,
+    get_calibration_loader,
+    quantize_model,
+)
+
+logger = logging.get_logger(__name__)
+
+
+def select_groups(fp32_latency, sensitivity, latency_budget):
+    """
+    Greedily pick the groups to quantize. Groups are taken by increasing
+    top-1 drop per millisecond of latency gain, until the estimated latency,
+    the fp32 latency minus the gains of the picked groups, meets the budget.
+    Args:
+        fp32_latency (float): latency of the fp32 model in ms.
+        sensitivity (dict): per group dict with the `top1_drop` and the
+            `latency_gain_ms` of quantizing only that group.
+        latency_budget (float): target latency in ms. If not positive, pick
+            all the groups with a latency gain.
+    Returns:
+        selected (list): names of the groups to quantize.
+        estimated_latency (float): estimated latency of the mixed model in ms.
+    """
+    candidates = [
+        group
+        for group, stats in sensitivity.items()
+        if stats["latency_gain_ms"] > 0
+    ]
+    candidates.sort(
+        key=lambda group: sensitivity[group]["top1_drop"]
+        / sensitivity[group]["latency_gain_ms"]
+    )
+    selected = []
+    estimated_latency = fp32_latency
+    for group in candidates:
+        if latency_budget > 0 and estimated_latency <= latency_budget:
+            break
+        selected.append(group)
+        estimated_latency -= sensitivity[group]["latency_gain_ms"]
+    return selected, estimated_latency
+
+
+def run_sensitivity(
+    cfg, latency_budget=0.0, num_eval_batches=10, latency_iters=20
+):
+    """
+    Quantize one module group at a time (stem, each res stage, the SE blocks
+    and the head), measure its top-1 drop on held-out val batches and its
+    latency gain over the fp32 model, then quantize the groups picked by
+    `select_groups` together. The report is written to
+    OUTPUT_DIR/quantization_sensitivity.json.
+    Args:
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+        latency_budget (float): target CPU latency in ms, see `select_groups`.
+        num_eval_batches (int): number of val batches to evaluate on.
+        latency_iters (int): number of timed forward passes of the latency.
+    Returns:
+        report (dict): per group sensitivity and the mixed model stats.
+    """
+    np.random.seed(cfg.RNG_SEED)
+    torch.manual_seed(cfg.RNG_SEED)
+    logging.setup_logging(cfg.OUTPUT_DIR)
+    logger.info("Quantization sensitivity with config:")
+    logger.info(pprint.pformat(cfg))
+
+    model_fp = build_float_model(cfg)
+    # Every candidate is calibrated and evaluated on the same batches.
+    calib_batches = list(
+        itertools.islice(
+            get_calibration_loader(cfg),
+            cfg.QUANTIZATION.CALIBRATION_NUM_BATCHES,
+        )
+    )
+    eval_batches = list(
+        itertools.islice(loader.construct_loader(cfg, "val"), num_eval_batches)
+    )
+    if cfg.DATA.BATCH_AUGMENTATION:
+        # Augment the uint8 clips once, all candidates see the same inputs.
+        eval_batches = [
+            (
+                batch_augment(inputs[0], meta["spatial_params"], cfg),
+                labels,
+                index,
+                time,
+                meta,
+            )
+            for inputs, labels, index, time, meta in eval_batches
+        ]
+    example_inputs = [x.cpu() for x in calib_batches[0][0]]
+
+    def _measure(model):
+        stats = evaluate(model, eval_batches, cfg)
+        stats["latency_ms"] = misc.measure_cpu_latency(
+            model, cfg, num_iters=latency_iters
+        )
+        return stats
+
+    fp32 = _measure(model_fp)
+    logger.info(
+        f"fp32: top1 {fp32['top1_acc']:.2f}%, latency {fp32['latency_ms']:.2f} ms"
+    )
+
+    sensitivity = {}
+    for group in get_quantization_groups(model_fp):
+        model_int8 = quantize_model(
+            model_fp, example_inputs, calib_batches, cfg, [group]
+        )
+        stats = _measure(model_int8)
+        stats["top1_drop"] = fp32["top1_acc"] - stats["top1_acc"]
+        stats["latency_gain_ms"] = fp32["latency_ms"] - stats["latency_ms"]
+        logger.info(
+            f"{group}: top1 drop {stats['top1_drop']:.2f}, "
+            f"latency gain {stats['latency_gain_ms']:.2f} ms"
+        )
+        sensitivity[group] = stats
+
+    selected, estimated_latency = select_groups(
+        fp32["latency_ms"], sensitivity, latency_budget
+    )
+    logger.info(
+        f"Selected groups {selected}, estimated latency "
+        f"{estimated_latency:.2f} ms"
+    )
+    mixed = _measure(
+        quantize_model(model_fp, example_inputs, calib_batches, cfg, selected)
+    )
+    mixed["top1_drop"] = fp32["top1_acc"] - mixed["top1_acc"]
+    mixed["estimated_latency_ms"] = estimated_latency
+    logger.info(
+        f"Mixed model: top1 drop {mixed['top1_drop']:.2f}, "
+        f"latency {mixed['latency_ms']:.2f} ms"
+    )
+    if latency_budget > 0 and mixed["latency_ms"] > latency_budget:
+        logger.warning(
+            f"Latency {mixed['latency_ms']:.2f} ms is over the budget of "
+            f"{latency_budget:.2f} ms"
+        )
+
+    report = {
+        "backend": cfg.QUANTIZATION.BACKEND,
+        "observer": cfg.QUANTIZATION.OBSERVER,
+        "per_channel_weights": cfg.QUANTIZATION.PER_CHANNEL_WEIGHTS,
+        "num_threads": torch.get_num_threads(),
+        "latency_budget_ms": latency_budget,
+        "fp32": fp32,
+        "groups": sensitivity,
+        "selected_groups": selected,
+        "mixed": mixed,
+    }
+    report_path = os.path.join(cfg.OUTPUT_DIR, "quantization_sensitivity.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Report saved to: {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Per-layer quantization sensitivity and mixed-precision "
+        "selection for video classification"
+    )
+    parser.add_argument(
+        "--cfg",
+        dest="cfg_file",
+        help="Path to the config file",
+        required=True,
+        type=str,
+    )
+    parser.add_argument(
+        "--backend",
+        dest="backend",
+        help="Quantization backend: 'fbgemm' (x86) or 'qnnpack' (ARM)",
+        default="fbgemm",
+        choices=["fbgemm", "qnnpack", "x86"],
+        type=str,
+    )
+    parser.add_argument(
+        "--calib_batches",
+        dest="calib_batches",
+        help="Number of batches for calibration",
+        default=10,
+        type=int,
+    )
+    parser.add_argument(
+        "--eval_batches",
+        dest="eval_batches",
+        help="Number of held-out val batches for the accuracy",
+        default=10,
+        type=int,
+    )
+    parser.add_argument(
+        "--latency_budget",
+        dest="latency_budget",
+        help="Target CPU latency in ms, 0 to quantize every group that "
+        "lowers the latency",
+        default=0.0,
+        type=float,
+    )
+    parser.add_argument(
+        "--latency_iters",
+        dest="latency_iters",
+        help="Number of timed forward passes for the latency",
+        default=20,
+        type=int,
+    )
+    parser.add_argument(
+        "opts",
+        help="See slowfast/config/defaults.py for all options",
+        default=None,
+        nargs=argparse.REMAINDER,
+    )
+    args = parser.parse_args()
+
+    cfg = get_cfg()
+    cfg.merge_from_file(args.cfg_file)
+    if args.opts is not None:
+        cfg.merge_from_list(args.opts)
+    # int8 kernels only run on CPU.
+    cfg.NUM_GPUS = 0
+    cfg.QUANTIZATION.ENABLE = True
+    cfg.QUANTIZATION.QAT = False
+    cfg.QUANTIZATION.BACKEND = args.backend
+    cfg.QUANTIZATION.CALIBRATION_NUM_BATCHES = args.calib_batches
+    cfg = assert_and_infer_cfg(cfg)
+    os.makedirs(cfg.OUTPUT_DIR, exist_ok=True)
+
+    run_sensitivity(
+        cfg, args.latency_budget, args.eval_batches, args.latency_iters
+    )
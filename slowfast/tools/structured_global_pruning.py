@@ -18,6 +18,23 @@ from functools import partial
 import time
 import logging
 
+import slowfast.models.losses as losses
+import slowfast.utils.checkpoint as cu
+from slowfast.config.defaults import assert_and_infer_cfg, get_cfg
+from slowfast.datasets import loader
+from slowfast.models import build_model
+from slowfast.models.pruning_helper import (
+    get_pruned_manifest,
+    get_removable_layers,
+    remove_dead_channels,
+)
+from slowfast.utils.misc import (
+    _get_model_analysis_input,
+    frozen_bn_stats,
+    measure_latencies,
+    params_count,
+)
+
 # Setup basic logging
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -36,18 +53,24 @@ def parse_args():
                        help="Target pruning ratio (0.0-1.0)")
     parser.add_argument("--dim", type=int, default=0, choices=[0, 1],
                        help="Dimension to prune: 0=filter pruning, 1=channel pruning")
-    parser.add_argument("--norm", type=str, default="L1", choices=["L1", "L2"],
-                       help="Norm to use for ranking importance")
+    parser.add_argument("--norm", type=str, default="L1", choices=["L1", "L2", "taylor", "bn_gamma"],
+                       help="Criterion to use for ranking importance")
+    parser.add_argument("--taylor_batches", type=int, default=32,
+                       help="Number of training batches to accumulate gradients over for the taylor criterion")
     parser.add_argument("--module_types", type=str, default="Conv2d,Conv3d", 
                        help="Comma-separated list of module types to prune")
-    parser.add_argument("--config_file", type=str, default=None,
-                       help="Path to model configuration file (if needed)")
+    parser.add_argument("--config_file", type=str, required=True,
+                       help="Path to the SlowFast config file of the model")
     parser.add_argument("--device", type=str, default="cuda:0",
                        help="Device to use for pruning")
+    parser.add_argument("--latency_iters", type=int, default=20,
+                       help="Number of timed forward passes for CPU latency")
     parser.add_argument("--evaluate", action="store_true",
                        help="Evaluate model before and after pruning")
     parser.add_argument("--save_mask", action="store_true",
                        help="Save pruning masks for future reference")
+    parser.add_argument("--all_modules", action="store_true",
+                       help="Also rank the filters/channels that cannot be physically removed, which are only zeroed")
     return parser.parse_args()
 
 class StructuredGlobalPruning:
@@ -55,19 +78,29 @@ class StructuredGlobalPruning:
     Implements one-shot structured global pruning across a PyTorch model.
     This pruning removes entire filters/channels based on global ranking of their importance.
     """
-    def __init__(self, model, sparsity=0.5, dim=0, norm_type="L1", module_types=None):
+    def __init__(self, model, sparsity=0.5, dim=0, norm_type="L1", module_types=None, removable_only=True):
         """
         Args:
             model: PyTorch model to prune
             sparsity: Target pruning ratio (0.0-1.0)
             dim: Dimension to prune (0=filters, 1=channels)
-            norm_type: Norm to use for importance ranking ("L1" or "L2")
+            norm_type: Criterion to use for importance ranking: "L1" or "L2"
+                weight norm, "taylor" (|sum(weight * grad)|, gradients must be
+                accumulated beforehand) or "bn_gamma" (|gamma| of the BN
+                following each filter, filter pruning only)
             module_types: List of module types to prune (e.g., [nn.Conv2d, nn.Conv3d])
+            removable_only: Only rank the filters/channels that
+                remove_pruned_filters physically removes, see
+                get_removable_layers. Otherwise, the pruned filters/channels
+                of the other layers are zeroed but stay in the model
         """
         self.model = model
         self.sparsity = sparsity
         self.dim = dim  # 0 for filter pruning, 1 for channel pruning
         self.norm_type = norm_type
+        self.removable_only = removable_only
+        assert norm_type in ["L1", "L2", "taylor", "bn_gamma"], f"Unknown importance criterion {norm_type}"
+        assert not (norm_type == "bn_gamma" and dim != 0), "bn_gamma importance only supports filter pruning"
         
         if module_types is None:
             self.module_types = [nn.Conv2d, nn.Conv3d]
@@ -82,69 +115,100 @@ class StructuredGlobalPruning:
         """
         Find all prunable modules in the model.
         """
+        if self.removable_only:
+            removable = set(map(id, get_removable_layers(self.model, self.dim)))
         for name, module in self.model.named_modules():
+            if self.removable_only and id(module) not in removable:
+                continue
             if any(isinstance(module, module_type) for module_type in self.module_types):
                 self.prunable_modules.append((name, module))
                 
         logger.info(f"Found {len(self.prunable_modules)} prunable modules")
         
+    def _module_scores(self, name, module, named_modules):
+        """
+        Compute the importance of every filter/channel of one module.
+        Returns None if the module cannot be ranked with the current criterion.
+        """
+        weight = module.weight.detach()
+        # Reduce over every dimension except the pruned one.
+        reduce_dims = [d for d in range(weight.dim()) if d != self.dim]
+        
+        if self.norm_type == "L1":
+            return weight.abs().sum(dim=reduce_dims)
+        elif self.norm_type == "L2":
+            return weight.pow(2).sum(dim=reduce_dims).sqrt()
+        elif self.norm_type == "taylor":
+            # First-order Taylor estimate of the loss change when removing
+            # the filter/channel, from the accumulated weight gradients.
+            if module.weight.grad is None:
+                return None
+            return (weight * module.weight.grad.detach()).sum(dim=reduce_dims).abs()
+        else:  # bn_gamma
+            # Scale of the BN that follows the filter (`<conv>_bn`).
+            bn = named_modules.get(name + "_bn")
+            if bn is None or not getattr(bn, "affine", False):
+                return None
+            return bn.weight.detach().abs()
+    
     def compute_importance_scores(self):
         """
         Compute importance scores for filters/channels in all prunable modules.
-        Returns a global ranking of all filters/channels based on their importance.
+        The scores of all modules are concatenated into one tensor so that the
+        global ranking runs on device without per-filter host syncs.
+        
+        Returns:
+            scores (tensor): importance of every filter/channel of every module.
+            offsets (list): list of (module name, start, end), the slice of
+                scores holding the filters/channels of each ranked module.
         """
+        named_modules = dict(self.model.named_modules())
         all_scores = []
-        
+        offsets = []
+        start = 0
         for name, module in self.prunable_modules:
-            weight = module.weight.data
-            
-            if self.dim == 0:  # Filter pruning
-                # For each output filter, compute its importance
-                if self.norm_type == "L1":
-                    scores = weight.abs().sum(dim=[1, 2, 3] if weight.dim() == 4 else [1, 2, 3, 4])
-                else:  # L2
-                    scores = torch.sqrt((weight ** 2).sum(dim=[1, 2, 3] if weight.dim() == 4 else [1, 2, 3, 4]))
-            else:  # Channel pruning (dim == 1)
-                # For each input channel, compute its importance across all filters
-                if self.norm_type == "L1":
-                    scores = weight.abs().sum(dim=[0, 2, 3] if weight.dim() == 4 else [0, 2, 3, 4])
-                else:  # L2
-                    scores = torch.sqrt((weight ** 2).sum(dim=[0, 2, 3] if weight.dim() == 4 else [0, 2, 3, 4]))
-            
-            # Store (module_index, filter_index, score)
-            for i, score in enumerate(scores):
-                all_scores.append((name, i, score.item()))
+            scores = self._module_scores(name, module, named_modules)
+            if scores is None:
+                continue
+            all_scores.append(scores.float())
+            offsets.append((name, start, start + scores.numel()))
+            start += scores.numel()
         
-        return all_scores
+        if len(all_scores) == 0:
+            return torch.zeros(0), offsets
+        return torch.cat(all_scores), offsets
     
     def prune(self):
         """
         Perform one-shot structured global pruning.
         """
         logger.info(f"Starting structured {'filter' if self.dim == 0 else 'channel'} pruning with sparsity {self.sparsity}")
+        start_time = time.perf_counter()
         
         # Get importance scores
-        all_scores = self.compute_importance_scores()
-        
-        # Sort scores by importance (ascending, so less important first)
-        all_scores.sort(key=lambda x: x[2])
+        scores, offsets = self.compute_importance_scores()
         
         # Calculate number of filters/channels to prune
-        num_filters_to_prune = int(len(all_scores) * self.sparsity)
+        num_filters_to_prune = int(scores.numel() * self.sparsity)
         
-        logger.info(f"Pruning {num_filters_to_prune} out of {len(all_scores)} {'filters' if self.dim == 0 else 'channels'}")
+        logger.info(f"Pruning {num_filters_to_prune} out of {scores.numel()} {'filters' if self.dim == 0 else 'channels'}")
         
-        # Create pruning masks
-        masks = {}
-        for module_name, module in self.prunable_modules:
-            masks[module_name] = torch.ones_like(module.weight.data, dtype=torch.bool)
+        # Select the globally least important filters/channels and flag them
+        # with a single scatter.
+        pruned = torch.zeros(scores.numel(), dtype=torch.bool, device=scores.device)
+        if num_filters_to_prune > 0:
+            pruned_idx = torch.topk(scores, num_filters_to_prune, largest=False, sorted=False).indices
+            pruned.index_fill_(0, pruned_idx, True)
         
-        # Set masks for filters/channels to prune
-        for module_name, filter_idx, _ in all_scores[:num_filters_to_prune]:
-            if self.dim == 0:  # Filter pruning
-                masks[module_name][filter_idx] = 0
-            else:  # Channel pruning
-                masks[module_name][:, filter_idx] = 0
+        # Create pruning masks, broadcasting the per filter/channel flags over
+        # the weights of each module.
+        masks = {}
+        modules = dict(self.prunable_modules)
+        for module_name, start, end in offsets:
+            weight = modules[module_name].weight.data
+            shape = [1] * weight.dim()
+            shape[self.dim] = end - start
+            masks[module_name] = (~pruned[start:end]).view(shape).expand_as(weight)
         
         # Apply masks
         for module_name, mask in masks.items():
@@ -157,48 +221,93 @@ class StructuredGlobalPruning:
             # Also zero out the corresponding bias if exists
             if hasattr(module, 'bias') and module.bias is not None:
                 if self.dim == 0:  # For filter pruning, zero out corresponding bias
-                    module.bias.data *= mask[:, 0, 0, 0] if mask.dim() == 4 else mask[:, 0, 0, 0, 0]
+                    module.bias.data *= mask.reshape(mask.shape[0], -1)[:, 0]
         
-        # Calculate actual sparsity after pruning
-        total_params = 0
-        zero_params = 0
+        # For filter pruning, also zero the affine parameters of the BN that
+        # follows each pruned filter (`<conv>_bn` by naming convention), so the
+        # channel is exactly zero and can be physically removed afterwards.
+        if self.dim == 0:
+            named_modules = dict(self.model.named_modules())
+            for module_name, mask in masks.items():
+                bn = named_modules.get(module_name + "_bn")
+                if bn is None or not getattr(bn, "affine", False):
+                    continue
+                keep = mask.reshape(mask.shape[0], -1)[:, 0]
+                bn.weight.data *= keep
+                bn.bias.data *= keep
+        
+        logger.info(f"Ranked and masked in {(time.perf_counter() - start_time) * 1000:.1f} ms")
         
-        for _, module in self.prunable_modules:
-            weight = module.weight.data
-            total_params += weight.numel()
-            zero_params += (weight == 0).sum().item()
+        # Calculate actual sparsity after pruning
+        total_params = sum(module.weight.numel() for _, module in self.prunable_modules)
+        zero_params = sum((module.weight.data == 0).sum() for _, module in self.prunable_modules)
         
-        actual_sparsity = zero_params / total_params if total_params > 0 else 0
+        actual_sparsity = float(zero_params) / total_params if total_params > 0 else 0
         logger.info(f"Actual weight sparsity after pruning: {actual_sparsity:.4f}")
         
         return masks
     
     def remove_pruned_filters(self):
         """
-        Advanced feature: Actually remove pruned filters/channels from the model
-        to create a smaller model. This is more complex and requires modifying
-        model architecture, not just zeroing weights.
-        
-        Note: This is a placeholder implementation that would need to be expanded
-        for actual use with specific model architectures.
+        Physically remove the pruned channels from the model to create a
+        smaller model. Channels are removed per dependency group (the inner
+        channels of X3D/Bottleneck/Basic blocks and of the X3D head): a channel
+        is removed when its last producing filter and BN affine parameters are
+        zero, or when its input channel is zero in every layer reading it,
+        which leaves the outputs of the model unchanged. Channels of the
+        residual stream, including the input of ResNetBasicHead, are shared
+        across blocks and are kept. The pruned filters/channels that cannot
+        be removed are counted and logged.
+
+        Returns:
+            spec (dict): number of channels of every channel group, which
+                describes the architecture of the smaller model.
+        """
+        num_params = params_count(self.model)
+        num_pruned = self._count_pruned()
+        spec = remove_dead_channels(self.model)
+        self.prunable_modules = []
+        self._map_modules()
+        logger.info(f"Removed pruned channels: {num_params:,} -> {params_count(self.model):,} parameters")
+        # The pruned filters/channels left in the model are still all zero.
+        num_kept = self._count_pruned()
+        logger.info(
+            f"{num_pruned - num_kept} of {num_pruned} pruned {'filters' if self.dim == 0 else 'channels'} "
+            f"removed, {num_kept} could not be removed and are only zeroed"
+        )
+        return spec
+
+    def _count_pruned(self):
+        """
+        Count the all zero filters/channels of the modules of the model
+        matching module_types.
         """
-        logger.warning("Filter removal is not yet implemented - the model still has the same structure with zeroed weights")
-        # This would require a more sophisticated implementation that analyzes the model graph
-        # and rebuilds a new model with removed filters/channels
-        pass
+        num_pruned = 0
+        for module in self.model.modules():
+            if not any(isinstance(module, module_type) for module_type in self.module_types):
+                continue
+            weight = module.weight.detach().transpose(0, self.dim)
+            num_pruned += int((weight.reshape(weight.shape[0], -1).abs().sum(1) == 0).sum())
+        return num_pruned
 
-def save_model(model, output_dir, sparsity, masks=None):
+def save_model(model, output_dir, sparsity, masks=None, cfg=None):
     """
-    Save pruned model and optionally the pruning masks.
+    Save pruned model and optionally the pruning masks. The state dict is
+    saved next to the pruned manifest, from which build_model constructs the
+    smaller architecture.
     """
     os.makedirs(output_dir, exist_ok=True)
     
     # Save pruned model
     model_filename = os.path.join(output_dir, f"pruned_model_sparsity_{int(sparsity*100)}.pth")
-    torch.save({
-        "model_state_dict": model.state_dict(),
+    checkpoint = {
+        "model_state": model.state_dict(),
+        "pruned_manifest": get_pruned_manifest(model),
         "sparsity": sparsity,
-    }, model_filename)
+    }
+    if cfg is not None:
+        checkpoint["cfg"] = cfg.dump()
+    torch.save(checkpoint, model_filename)
     logger.info(f"Pruned model saved to {model_filename}")
     
     # Optionally save masks
@@ -219,68 +328,67 @@ def evaluate_model(model, data_loader, device):
     # 3. Calculate and return metrics (accuracy, etc.)
     return {"accuracy": 0.0, "loss": 0.0}  # Return placeholder metrics
 
-def measure_inference_time(model, input_shape, device, num_iterations=100):
+def accumulate_gradients(model, cfg, num_batches, device):
+    """
+    Accumulate the weight gradients of the training loss over a few training
+    batches, as needed by the taylor importance criterion.
+    """
+    train_loader = loader.construct_loader(cfg, "train")
+    loss_fun = losses.get_loss_func(cfg.MODEL.LOSS_FUNC)(reduction="mean")
+    # Use the training head, but keep BN in eval mode so the running
+    # statistics are not updated.
+    model.train()
+    frozen_bn_stats(model)
+    model.zero_grad()
+    for cur_iter, (inputs, labels, _, _, _) in enumerate(train_loader):
+        if cur_iter == num_batches:
+            break
+        inputs = [x.to(device) for x in inputs] if isinstance(inputs, list) else inputs.to(device)
+        preds = model(inputs)
+        loss = loss_fun(preds, labels.to(device))
+        loss.backward()
+    logger.info(f"Accumulated gradients over {min(num_batches, len(train_loader))} batches")
+
+def measure_inference_time(model, inputs, device, num_iterations=100):
     """
-    Measure model inference time.
+    Measure the median model inference time in seconds.
+    Args:
+        inputs (tuple): positional inputs of the model, e.g. the list of
+            pathway tensors of a video model.
     """
     model.eval()
     model.to(device)
-    
-    # Create random input
-    dummy_input = torch.randn(input_shape).to(device)
-    
-    # Warm-up
-    with torch.no_grad():
-        for _ in range(10):
-            _ = model(dummy_input)
-    
-    # Measure inference time
-    start_time = time.time()
-    with torch.no_grad():
-        for _ in range(num_iterations):
-            _ = model(dummy_input)
-    end_time = time.time()
-    
-    avg_time = (end_time - start_time) / num_iterations
-    return avg_time
+    inputs = [
+        [x.to(device) for x in inp] if isinstance(inp, (list, tuple)) else inp.to(device)
+        for inp in inputs
+    ]
+    latencies = measure_latencies(model, inputs, num_iterations, num_warmup=10)
+    return float(np.median(latencies)) / 1000.0
 
-def load_model(model_path, config_file=None, device="cuda:0"):
+def load_model(model_path, config_file, device="cuda:0"):
     """
-    Load PyTorch model from checkpoint.
-    For specialized frameworks like SlowFast, you might need custom logic here.
+    Build the SlowFast model described by config_file, with the architecture
+    of model_path if it is a pruned checkpoint, and load its weights.
+    Returns:
+        model (nn.Module): the model, or None if it could not be loaded.
+        cfg (CfgNode): the configs of the model.
     """
-    # This is a placeholder implementation that would need to be adapted based on your needs
     try:
-        checkpoint = torch.load(model_path, map_location=device)
-        
-        # Try to directly load the model based on common checkpoint formats
-        if "model_state_dict" in checkpoint:
-            # Create model instance based on config
-            if config_file:
-                # This part depends on your model framework
-                logger.error("Custom model loading from config not implemented")
-                return None
-            
-            # For simple cases where we just need to load state dict
-            model = torch.nn.Module()  # Placeholder, should be your actual model
-            model.load_state_dict(checkpoint["model_state_dict"])
-        elif "model_state" in checkpoint:
-            model = torch.nn.Module()  # Placeholder
-            model.load_state_dict(checkpoint["model_state"])
-        elif isinstance(checkpoint, dict) and not any(k in checkpoint for k in ["model_state_dict", "model_state"]):
-            # Assume checkpoint is directly the state dict
-            model = torch.nn.Module()  # Placeholder
-            model.load_state_dict(checkpoint)
-        else:
-            logger.error("Unsupported checkpoint format")
-            return None
+        cfg = get_cfg()
+        cfg.merge_from_file(config_file)
+        cfg.NUM_GPUS = 1 if device.type == "cuda" else 0
+        cfg.PRUNING.MANIFEST_FILE_PATH = model_path
+        cfg = assert_and_infer_cfg(cfg)
+
+        model = build_model(cfg)
+        _, model = cu.load_checkpoint(model_path, model, data_parallel=False, pruned=True)
             
         model.to(device)
-        return model
+        return model, cfg
         
     except Exception as e:
         logger.error(f"Error loading model: {e}")
-        return None
+        return None, None
 
 def main():
     """
@@ -305,9 +413,7 @@ def main():
     device = torch.device(args.device if torch.cuda.is_available() and args.device.startswith("cuda") else "cpu")
     logger.info(f"Using device: {device}")
     
-    # Custom model loading function (placeholder)
-    # You would need to customize this based on your model format
-    model = load_model(args.model_path, args.config_file, device)
+    model, cfg = load_model(args.model_path, args.config_file, device)
     if model is None:
         logger.error("Failed to load model. Exiting.")
         return
@@ -323,19 +429,18 @@ def main():
             module_types.append(nn.Linear)
         # Add more module types as needed
     
-    # 2. Evaluate original model if specified
+    # Test-time input of the model, e.g. [slow, fast] pathways for SlowFast.
+    inputs = _get_model_analysis_input(cfg, use_train_input=False)
+    cpu = torch.device("cpu")
+    
+    # 2. Measure the CPU latency of the original model
     if args.evaluate:
         logger.info("Evaluating original model")
         # This would be replaced with your actual evaluation logic
         # For example: original_metrics = evaluate_model(model, validation_loader)
-        
-        # Measure inference time (placeholder)
-        original_inference_time = measure_inference_time(
-            model, 
-            (1, 3, 8, 224, 224),  # Example shape for video model, adjust as needed
-            device
-        )
-        logger.info(f"Original model inference time: {original_inference_time*1000:.2f} ms")
+    original_inference_time = measure_inference_time(model, inputs, cpu, args.latency_iters)
+    logger.info(f"Original model CPU inference time: {original_inference_time*1000:.2f} ms")
+    model.to(device)
     
     # 3. Create pruner instance
     pruner = StructuredGlobalPruning(
@@ -343,36 +448,32 @@ def main():
         sparsity=args.sparsity,
         dim=args.dim,
         norm_type=args.norm,
-        module_types=module_types
+        module_types=module_types,
+        removable_only=not args.all_modules,
     )
     
-    # 4. Perform pruning
+    # 4. Perform pruning and remove the pruned channels
+    if args.norm == "taylor":
+        accumulate_gradients(model, cfg, args.taylor_batches, device)
     masks = pruner.prune()
+    pruner.remove_pruned_filters()
     
-    # 5. Evaluate pruned model if specified
+    # 5. Measure the CPU latency of the smaller model
     if args.evaluate:
         logger.info("Evaluating pruned model")
         # pruned_metrics = evaluate_model(model, validation_loader)
-        
-        # Measure inference time for pruned model
-        pruned_inference_time = measure_inference_time(
-            model, 
-            (1, 3, 8, 224, 224),  # Example shape, adjust as needed
-            device
-        )
-        logger.info(f"Pruned model inference time: {pruned_inference_time*1000:.2f} ms")
-        
-        # Calculate speedup
-        if 'original_inference_time' in locals():
-            speedup = original_inference_time / pruned_inference_time
-            logger.info(f"Speedup factor: {speedup:.2f}x")
+    pruned_inference_time = measure_inference_time(model, inputs, cpu, args.latency_iters)
+    logger.info(f"Pruned model CPU inference time: {pruned_inference_time*1000:.2f} ms")
+    speedup = original_inference_time / pruned_inference_time
+    logger.info(f"Speedup factor: {speedup:.2f}x")
     
     # 6. Save pruned model
     save_model(
         model=model,
         output_dir=args.output_dir,
         sparsity=args.sparsity,
-        masks=masks if args.save_mask else None
+        masks=masks if args.save_mask else None,
+        cfg=cfg,
     )
     
     logger.info("Pruning completed successfully")
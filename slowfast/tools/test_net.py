@@ -109,6 +109,8 @@ def perform_test(test_loader, model, test_meter, cfg, writer=None):
                 yd_transform.view(batchSize, -1, 1),
             )
             preds = torch.sum(probs, 1)
+        elif cfg.MECCANO.GAZE_ENABLE:
+            preds = model(inputs, meta["gaze"])
         else:
             # Perform the forward pass.
             preds = model(inputs)
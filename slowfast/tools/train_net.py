@@ -20,6 +20,7 @@ import torch
 from torch.quantization import get_default_qat_qconfig, prepare_qat, convert
 from fvcore.nn.precise_bn import get_bn_modules, update_bn_stats
 from slowfast.datasets import loader
+from slowfast.datasets.batch_transform import batch_augment
 from slowfast.datasets.mixup import MixUp
 from slowfast.models import build_model
 from slowfast.models.contrastive import (
@@ -99,6 +100,8 @@ def train_epoch(
                         val[i] = val[i].cuda(non_blocking=True)
                 else:
                     meta[key] = val.cuda(non_blocking=True)
+        if cfg.DATA.BATCH_AUGMENTATION:
+            inputs = batch_augment(inputs[0], meta["spatial_params"], cfg)
 
         batch_size = (
             inputs[0][0].size(0) if isinstance(inputs[0], list) else inputs[0].size(0)
@@ -132,6 +135,8 @@ def train_epoch(
                 preds = model(inputs, meta["boxes"])
             elif cfg.MASK.ENABLE:
                 preds, labels = model(inputs)
+            elif cfg.MECCANO.GAZE_ENABLE:
+                preds = model(inputs, meta["gaze"])
             else:
                 preds = model(inputs)
             if cfg.TASK == "ssl" and cfg.MODEL.MODEL_NAME == "ContrastiveModel":
@@ -317,6 +322,8 @@ def eval_epoch(val_loader, model, val_meter, cur_epoch, cfg, train_loader, write
                     meta[key] = val.cuda(non_blocking=True)
             index = index.cuda()
 #            time = time.cuda()
+        if cfg.DATA.BATCH_AUGMENTATION:
+            inputs = batch_augment(inputs[0], meta["spatial_params"], cfg)
         batch_size = (
             inputs[0][0].size(0) if isinstance(inputs[0], list) else inputs[0].size(0)
         )
@@ -364,6 +371,8 @@ def eval_epoch(val_loader, model, val_meter, cur_epoch, cfg, train_loader, write
                     yd_transform.view(batch_size, -1, 1),
                 )
                 preds = torch.sum(probs, 1)
+            elif cfg.MECCANO.GAZE_ENABLE:
+                preds = model(inputs, meta["gaze"])
             else:
                 preds = model(inputs)
 
@@ -425,7 +434,9 @@ def eval_epoch(val_loader, model, val_meter, cur_epoch, cfg, train_loader, write
     val_meter.reset()
 
 
-def calculate_and_update_precise_bn(loader, model, num_iters=200, use_gpu=True):
+def calculate_and_update_precise_bn(
+    loader, model, num_iters=200, use_gpu=True, cfg=None
+):
     """
     Update the stats in bn layers by calculate the precise stats.
     Args:
@@ -433,16 +444,20 @@ def calculate_and_update_precise_bn(loader, model, num_iters=200, use_gpu=True):
         model (model): model to update the bn stats.
         num_iters (int): number of iterations to compute and update the bn stats.
         use_gpu (bool): whether to use GPU or not.
+        cfg (CfgNode): configs, to apply DATA.BATCH_AUGMENTATION. If None,
+            the loader returns the model inputs.
     """
 
     def _gen_loader():
-        for inputs, *_ in loader:
+        for inputs, _, _, _, meta in loader:
             if use_gpu:
                 if isinstance(inputs, (list,)):
                     for i in range(len(inputs)):
                         inputs[i] = inputs[i].cuda(non_blocking=True)
                 else:
                     inputs = inputs.cuda(non_blocking=True)
+            if cfg is not None and cfg.DATA.BATCH_AUGMENTATION:
+                inputs = batch_augment(inputs[0], meta["spatial_params"], cfg)
             yield inputs
 
     # Update the bn stats.
@@ -785,6 +800,7 @@ def train(cfg):
                 model,
                 min(cfg.BN.NUM_BATCHES_PRECISE, len(precise_bn_loader)),
                 cfg.NUM_GPUS > 0,
+                cfg,
             )
         _ = misc.aggregate_sub_bn_stats(model)
 
@@ -24,6 +24,7 @@ import slowfast.utils.logging as logging
 import slowfast.utils.metrics as metrics
 import slowfast.utils.misc as misc
 from slowfast.datasets import loader
+from slowfast.datasets.batch_transform import batch_augment
 from slowfast.models import build_model
 from slowfast.utils.meters import TrainMeter, ValMeter
 from slowfast.utils.multigrid import MultigridSchedule
@@ -100,6 +101,8 @@ def train_epoch(
                         val[i] = val[i].cuda(non_blocking=True)
                 else:
                     meta[key] = val.cuda(non_blocking=True)
+        if cfg.DATA.BATCH_AUGMENTATION:
+            inputs = batch_augment(inputs[0], meta["spatial_params"], cfg)
 
         batch_size = (
             inputs[0][0].size(0) if isinstance(inputs[0], list) else inputs[0].size(0)
@@ -318,6 +321,8 @@ def eval_epoch(val_loader, model, val_meter, cur_epoch, cfg, train_loader, write
                     meta[key] = val.cuda(non_blocking=True)
             index = index.cuda()
 #            time = time.cuda()
+        if cfg.DATA.BATCH_AUGMENTATION:
+            inputs = batch_augment(inputs[0], meta["spatial_params"], cfg)
         batch_size = (
             inputs[0][0].size(0) if isinstance(inputs[0], list) else inputs[0].size(0)
         )
@@ -447,15 +452,30 @@ def train(cfg):
     logger.info(pprint.pformat(cfg))
 
     # Build the video model and print model statistics.
-    model = build_model(cfg)
+    if cfg.QUANTIZATION.FLOAT_CHECKPOINT_FILE_PATH:
+        # Build the model in float, it is prepared for QAT once the float
+        # weights are loaded and the BN statistics recomputed.
+        float_cfg = cfg.clone()
+        float_cfg.QUANTIZATION.QAT = False
+        model = build_model(float_cfg)
+        prepare_from_float_checkpoint(model, cfg)
+    else:
+        model = build_model(cfg)
     if du.is_master_proc() and cfg.LOG_MODEL_INFO:
         misc.log_model_info(model, cfg, use_train_input=True)
 
     # Construct the optimizer.
     optimizer = optim.construct_optimizer(model, cfg)
-
-    # Apply quantization configuration
-    if cfg.QUANTIZATION.ENABLE and cfg.QUANTIZATION.QAT:
+    scaler = torch.cuda.amp.GradScaler(enabled=cfg.TRAIN.MIXED_PRECISION)
+    multigrid = None
+
+    # Apply quantization configuration. QuantizedX3D prepares itself.
+    model_without_ddp = model.module if cfg.NUM_GPUS > 1 else model
+    if (
+        cfg.QUANTIZATION.ENABLE
+        and cfg.QUANTIZATION.QAT
+        and not hasattr(model_without_ddp, "prepare_qat")
+    ):
         logger.info("Preparing model for quantization-aware training")
         
         # Set QAT configuration
@@ -511,7 +531,14 @@ def train(cfg):
 
         # Train for one epoch.
         train_epoch(
-            train_loader, model, optimizer, train_meter, cur_epoch, cfg, writer
+            train_loader,
+            model,
+            optimizer,
+            scaler,
+            train_meter,
+            cur_epoch,
+            cfg,
+            writer,
         )
 
         # Compute precise BN stats.
@@ -521,6 +548,7 @@ def train(cfg):
                 model,
                 min(cfg.BN.NUM_BATCHES_PRECISE, len(precise_bn_loader)),
                 cfg.NUM_GPUS > 0,
+                cfg,
             )
         
         # Save a checkpoint.
@@ -533,7 +561,9 @@ def train(cfg):
         if misc.is_eval_epoch(
             cfg, cur_epoch, None if multigrid is None else multigrid.schedule
         ):
-            eval_epoch(val_loader, model, val_meter, cur_epoch, cfg, writer)
+            eval_epoch(
+                val_loader, model, val_meter, cur_epoch, cfg, train_loader, writer
+            )
 
     # Convert the model to fully quantized version after training
     if cfg.QUANTIZATION.ENABLE and cfg.QUANTIZATION.QAT:
@@ -551,7 +581,44 @@ def train(cfg):
         writer.close()
 
 
-def calculate_and_update_precise_bn(loader, model, num_iters, use_gpu):
+def prepare_from_float_checkpoint(model, cfg):
+    """
+    Start quantization aware training from a float checkpoint. Replacing
+    Swish by QUANTIZATION.ACTIVATION shifts the inputs of the following
+    layers, so the BN statistics are recomputed with the new activation
+    before the model is prepared for QAT. A short QAT finetune then recovers
+    the accuracy, see configs/meccano/quantized/X3D_M_QAT_RELU6.yaml.
+    Args:
+        model (model): float QuantizedX3D model.
+        cfg (CfgNode): configs. Details can be found in
+            slowfast/config/defaults.py
+    """
+    logger.info(
+        "Loading float checkpoint {} with {} activations".format(
+            cfg.QUANTIZATION.FLOAT_CHECKPOINT_FILE_PATH,
+            cfg.QUANTIZATION.ACTIVATION,
+        )
+    )
+    cu.load_checkpoint(
+        cfg.QUANTIZATION.FLOAT_CHECKPOINT_FILE_PATH, model, cfg.NUM_GPUS > 1
+    )
+    if cfg.BN.NUM_BATCHES_PRECISE > 0:
+        precise_bn_loader = loader.construct_loader(
+            cfg, "train", is_precise_bn=True
+        )
+        logger.info("Recomputing the BN statistics")
+        calculate_and_update_precise_bn(
+            precise_bn_loader,
+            model,
+            min(cfg.BN.NUM_BATCHES_PRECISE, len(precise_bn_loader)),
+            cfg.NUM_GPUS > 0,
+            cfg,
+        )
+    model_without_ddp = model.module if cfg.NUM_GPUS > 1 else model
+    model_without_ddp.prepare_qat()
+
+
+def calculate_and_update_precise_bn(loader, model, num_iters, use_gpu, cfg=None):
     """
     Update the stats in bn layers by calculate the precise stats.
     Args:
@@ -559,16 +626,20 @@ def calculate_and_update_precise_bn(loader, model, num_iters, use_gpu):
         model (model): model to update the bn stats.
         num_iters (int): number of iterations to compute and update the bn stats.
         use_gpu (bool): whether to use GPU or not.
+        cfg (CfgNode): configs, to apply DATA.BATCH_AUGMENTATION. If None,
+            the loader returns the model inputs.
     """
 
     def _gen_loader():
-        for inputs, *_ in loader:
+        for inputs, _, _, _, meta in loader:
             if use_gpu:
                 if isinstance(inputs, (list,)):
                     for i in range(len(inputs)):
                         inputs[i] = inputs[i].cuda(non_blocking=True)
                 else:
                     inputs = inputs.cuda(non_blocking=True)
+            if cfg is not None and cfg.DATA.BATCH_AUGMENTATION:
+                inputs = batch_augment(inputs[0], meta["spatial_params"], cfg)
             yield inputs
 
     # Update the bn stats.
@@ -684,24 +755,26 @@ def test(cfg):
 
 
 if __name__ == "__main__":
-    # parser = argparse.ArgumentParser(
-    #     description="Quantization Aware Training for Video Classification"
-    # )
-
-    # parser.add_argument(
-    #     "--cfg",
-    #     dest="cfg_file",
-    #     help="Path to the config file",
-    #     default="configs/meccano/quantized/X3D_M_QAT.yaml",
-    #     type=str,
-    # )
-
-    # parser.parse_args()
+    parser = argparse.ArgumentParser(
+        description="Quantization Aware Training for Video Classification"
+    )
+
+    parser.add_argument(
+        "--cfg",
+        dest="cfg_file",
+        help="Path to the config file, e.g. "
+        "configs/meccano/quantized/X3D_M_QAT_RELU6.yaml to finetune a float "
+        "X3D-M with ReLU6 activations",
+        default="configs/meccano/quantized/X3D_M_QAT.yaml",
+        type=str,
+    )
+
+    args = parser.parse_args()
     
     # Load config
     cfg = get_cfg()
 
-    cfg.merge_from_file('/home/milkyway/Desktop/Student Thesis/Slowfast/slowfast/configs/meccano/quantized/X3D_M_QAT.yaml')
+    cfg.merge_from_file(args.cfg_file)
     
     if not os.path.exists(cfg.OUTPUT_DIR):
         os.makedirs(cfg.OUTPUT_DIR)